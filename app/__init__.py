@@ -4,7 +4,12 @@ from dotenv import load_dotenv
 from app.extensions import db, mail, migrate
 from app.routes import api_bp
 from app.auth import auth_bp
-from app.models import User 
+from app.bootstrap import init_db_command
+from app.utils.db_metrics import init_db_metrics
+from app.utils.metrics import init_metrics
+from app.utils.logger import init_audit_logger
+from app.utils.mailer import init_mailer
+from app.utils.jobs import init_jobs
 from flask_cors import CORS
 
 load_dotenv()
@@ -19,7 +24,7 @@ def create_app():
         "https://crew-ai-front-laeros-projects.vercel.app",
         "https://crew-ai-front-3gqlmdm0i-laeros-projects.vercel.app",
         "http://localhost:5173"
-    ], supports_credentials=True)
+    ], supports_credentials=True, expose_headers=["X-Has-More", "X-Next-Cursor", "ETag"])
 
     app.config['JWT_SECRET_KEY'] = os.getenv('JWT_SECRET_KEY', 'change-me')
     app.config['JWT_ACCESS_TOKEN_EXPIRES'] = False
@@ -40,31 +45,18 @@ def create_app():
     db.init_app(app)
     mail.init_app(app)
     migrate.init_app(app, db)
+    init_db_metrics(app)
+    init_metrics(app)
+    init_audit_logger(app)
+    init_mailer(app)
+    init_jobs(app)
 
     # Registrar blueprints
     app.register_blueprint(api_bp)
     app.register_blueprint(auth_bp)
 
-    # Crear admin si no existe
-    with app.app_context():
-        db.create_all()
-
-        admin_email = os.getenv("DEFAULT_ADMIN_EMAIL")
-        admin_password = os.getenv("DEFAULT_ADMIN_PASSWORD")
-        if not admin_email or not admin_password:
-            raise RuntimeError("DEFAULT_ADMIN_EMAIL y DEFAULT_ADMIN_PASSWORD deben estar definidos")
-
-        if not User.query.filter_by(email=admin_email).first():
-            new_admin = User(
-                username='admin',
-                email=admin_email,
-                password=admin_password,
-                is_admin=True
-            )
-            db.session.add(new_admin)
-            db.session.commit()
-            print(f"✅ Admin creado: {admin_email}")
-        else:
-            print("ℹ️ Admin ya existe.")
+    # El esquema se migra con `flask db upgrade` y el administrador se crea
+    # con `flask init-db` antes del despliegue, no al arrancar cada worker
+    app.cli.add_command(init_db_command)
 
     return app
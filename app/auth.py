@@ -1,13 +1,15 @@
-from flask import Blueprint, request, jsonify
+from flask import Blueprint, request, jsonify, current_app
 from functools import wraps
+import threading
 from app.models import User, db
-from flask_mail import Message
-from app import mail
 from itsdangerous import URLSafeTimedSerializer, BadSignature, SignatureExpired
 from flask_cors import cross_origin
 import re
 import os
 from app.utils.logger import log_event
+from app.utils.mailer import queue_mail, notify_mail_worker
+from app.utils.cache import LRUCache
+from app.utils.agent_cache import listener_available, on_invalidation, publish_invalidation
 
 auth_bp = Blueprint('auth', __name__, url_prefix='/api/auth')
 serializer = URLSafeTimedSerializer(os.getenv("JWT_SECRET_KEY", "clave-ultra-secreta"))
@@ -22,35 +24,133 @@ ALLOWED_ORIGINS = [
 
 # ------------------- UTILIDADES -------------------
 
+class Principal:
+    """
+    Instantánea de solo lectura del usuario autenticado. No está ligada a la
+    sesión de base de datos, por lo que puede guardarse en caché; las rutas
+    que modifican al usuario deben cargarlo con db.session.get(User, id).
+    """
+    __slots__ = ('id', 'username', 'email', 'is_admin', 'is_active', '_data')
+
+    def __init__(self, user):
+        self._data = user.to_dict()
+        self.id = user.id
+        self.username = user.username
+        self.email = user.email
+        self.is_admin = bool(user.is_admin)
+        self.is_active = user.is_active
+
+    def to_dict(self):
+        return dict(self._data)
+
+# Caché de usuarios verificados por id. Los cambios de rol, estado, perfil o
+# contraseña se avisan a todos los workers por LISTEN/NOTIFY (ver
+# invalidate_principal); el TTL corto es solo una red de seguridad.
+_principal_cache = None
+_principal_stats = {'hits': 0, 'misses': 0, 'invalidations': 0}
+_principal_lock = threading.Lock()
+
+def _get_principal_cache():
+    global _principal_cache
+    if _principal_cache is None:
+        with _principal_lock:
+            if _principal_cache is None:
+                max_entries = int(current_app.config.get('AUTH_CACHE_MAX_ENTRIES', 10000))
+                # Cada entrada cuenta como tamaño 1, así que el límite es por número
+                _principal_cache = LRUCache(
+                    max_entries=max_entries,
+                    max_bytes=max_entries,
+                    ttl=float(current_app.config.get('AUTH_CACHE_TTL', 30))
+                )
+    return _principal_cache
+
+def _count(name):
+    with _principal_lock:
+        _principal_stats[name] += 1
+
+def verify_principal(token):
+    """
+    Verifica el JWT y devuelve el Principal del usuario, usando la caché para
+    evitar la consulta a la base de datos en cada petición. Devuelve None si
+    el usuario no existe o está desactivado.
+    """
+    payload = User.decode_token(token)
+    if not payload:
+        return None
+    user_id = payload.get('user_id')
+
+    use_cache = current_app.config.get('AUTH_CACHE_ENABLED', True) and listener_available()
+    if use_cache:
+        principal = _get_principal_cache().get(user_id)
+        if principal is not None:
+            _count('hits')
+            return principal if principal.is_active is not False else None
+        _count('misses')
+
+    user = db.session.get(User, user_id)
+    if not user:
+        return None
+    principal = Principal(user)
+    if use_cache:
+        _get_principal_cache().set(user_id, principal, size=1)
+    return principal if principal.is_active is not False else None
+
+def _evict_principals(user_ids):
+    if _principal_cache is not None:
+        if user_ids is None:
+            _principal_cache.clear()
+        else:
+            for user_id in user_ids:
+                _principal_cache.delete(user_id)
+    _count('invalidations')
+
+on_invalidation('user', _evict_principals)
+
+def invalidate_principal(user_id):
+    """
+    Descarta el usuario de la caché de todos los workers al cambiar rol,
+    estado, perfil o contraseña. Llamar antes del commit del cambio: el
+    aviso sale con la transacción.
+    """
+    publish_invalidation('user', [user_id])
+
+def get_principal_cache_stats():
+    with _principal_lock:
+        stats = dict(_principal_stats)
+    lookups = stats['hits'] + stats['misses']
+    stats['hit_rate'] = round(stats['hits'] / lookups, 3) if lookups else None
+    stats['pid'] = os.getpid()
+    stats['entries'] = _principal_cache.info()['entries'] if _principal_cache is not None else 0
+    return stats
+
+def _bearer_token():
+    if 'Authorization' not in request.headers:
+        return None
+    return request.headers['Authorization'].split(" ")[1]
+
 def token_required(f):
     @wraps(f)
     def decorated_function(*args, **kwargs):
-        token = None
-        if 'Authorization' in request.headers:
-            auth_header = request.headers['Authorization']
-            try:
-                token = auth_header.split(" ")[1]
-            except IndexError:
-                return jsonify({'message': 'Formato de token inválido'}), 401
+        try:
+            token = _bearer_token()
+        except IndexError:
+            return jsonify({'message': 'Formato de token inválido'}), 401
         if not token:
             return jsonify({'message': 'Token requerido'}), 401
-        current_user = User.verify_token(token)
+        current_user = verify_principal(token)
         if not current_user:
             return jsonify({'message': 'Token inválido o expirado'}), 401
         return f(current_user, *args, **kwargs)
     return decorated_function
 
 def get_current_user():
-    token = None
-    if 'Authorization' in request.headers:
-        auth_header = request.headers['Authorization']
-        try:
-            token = auth_header.split(" ")[1]
-        except IndexError:
-            return None
+    try:
+        token = _bearer_token()
+    except IndexError:
+        return None
     if not token:
         return None
-    return User.verify_token(token)
+    return verify_principal(token)
 
 def validate_email(email):
     pattern = r'^[a-zA-Z0-9._%+-]+@[a-zA-Z0-9.-]+\.[a-zA-Z]{2,}$'
@@ -176,7 +276,8 @@ def change_password(current_user):
         current_password = data['current_password']
         new_password = data['new_password']
 
-        if not current_user.check_password(current_password):
+        user = db.session.get(User, current_user.id)
+        if not user.check_password(current_password):
             log_event(f"🔒 Cambio de contraseña fallido para '{current_user.username}' (contraseña incorrecta)")
             return jsonify({'message': 'Contraseña actual incorrecta'}), 401
 
@@ -184,7 +285,8 @@ def change_password(current_user):
         if not is_valid_password:
             return jsonify({'message': password_message}), 400
 
-        current_user.set_password(new_password)
+        user.set_password(new_password)
+        invalidate_principal(user.id)
         db.session.commit()
 
         log_event(f"🔁 Contraseña cambiada exitosamente por '{current_user.username}'")
@@ -206,6 +308,8 @@ def update_profile(current_user):
         if not data:
             return jsonify({'message': 'Datos requeridos'}), 400
 
+        user = db.session.get(User, current_user.id)
+
         if 'username' in data:
             new_username = data['username'].strip()
             if len(new_username) < 3:
@@ -213,7 +317,7 @@ def update_profile(current_user):
             existing_user = User.query.filter_by(username=new_username).first()
             if existing_user and existing_user.id != current_user.id:
                 return jsonify({'message': 'El username ya está en uso'}), 409
-            current_user.username = new_username
+            user.username = new_username
 
         if 'email' in data:
             new_email = data['email'].strip().lower()
@@ -222,15 +326,16 @@ def update_profile(current_user):
             existing_user = User.query.filter_by(email=new_email).first()
             if existing_user and existing_user.id != current_user.id:
                 return jsonify({'message': 'El email ya está registrado'}), 409
-            current_user.email = new_email
+            user.email = new_email
 
+        invalidate_principal(user.id)
         db.session.commit()
 
-        log_event(f"✏️ Perfil actualizado por '{current_user.username}'")
+        log_event(f"✏️ Perfil actualizado por '{user.username}'")
 
         return jsonify({
             'message': 'Perfil actualizado exitosamente',
-            'user': current_user.to_dict()
+            'user': user.to_dict()
         }), 200
 
     except Exception as e:
@@ -262,8 +367,7 @@ def request_reset():
 
         reset_link = f"{frontend_url}/reset-password?token={token}"
 
-        msg = Message("Recuperación de contraseña", recipients=[email])
-        msg.body = f"""Hola {user.username},
+        body = f"""Hola {user.username},
 
 Recibiste este correo porque solicitaste restablecer tu contraseña.
 
@@ -275,13 +379,17 @@ Este enlace expira en 15 minutos. Si no lo solicitaste, puedes ignorarlo.
 Gracias,
 El equipo de CrewAIApp
 """
-        mail.send(msg)
+        # Se guarda en el outbox; la entrega SMTP ocurre en segundo plano
+        queue_mail("Recuperación de contraseña", [email], body)
+        db.session.commit()
+        notify_mail_worker()
 
         log_event(f"📧 Solicitud de recuperación enviada para '{email}'")
 
         return jsonify({'message': 'Se ha enviado un enlace de recuperación si el correo está registrado'}), 200
 
     except Exception as e:
+        db.session.rollback()
         return jsonify({'message': f'Error al enviar el correo: {str(e)}'}), 500
 
 @auth_bp.route('/reset-password', methods=['POST', 'OPTIONS'])
@@ -313,6 +421,7 @@ def reset_password():
             return jsonify({'message': 'Usuario no encontrado'}), 404
 
         user.set_password(new_password)
+        invalidate_principal(user.id)
         db.session.commit()
 
         log_event(f"🔁 Contraseña restablecida para '{email}'")
@@ -0,0 +1,59 @@
+# app/bootstrap.py
+
+import os
+import click
+from flask.cli import with_appcontext
+from sqlalchemy import text
+from app.extensions import db
+from app.models import User
+
+# Clave del advisory lock de Postgres que serializa la inicialización cuando
+# varias instancias despliegan a la vez
+BOOTSTRAP_LOCK_ID = 472019
+
+
+def init_database():
+    """
+    Crea el administrador por defecto. El esquema lo crean y actualizan las
+    migraciones (`flask db upgrade`), que deben aplicarse antes.
+    """
+    with db.engine.connect() as connection:
+        postgres = connection.dialect.name == 'postgresql'
+        if postgres:
+            connection.execute(text("SELECT pg_advisory_lock(:id)"), {'id': BOOTSTRAP_LOCK_ID})
+            connection.commit()
+        try:
+            ensure_admin()
+        finally:
+            if postgres:
+                connection.execute(text("SELECT pg_advisory_unlock(:id)"), {'id': BOOTSTRAP_LOCK_ID})
+                connection.commit()
+
+
+def ensure_admin():
+    """Crea el administrador DEFAULT_ADMIN_EMAIL si no existe."""
+    admin_email = os.getenv("DEFAULT_ADMIN_EMAIL")
+    admin_password = os.getenv("DEFAULT_ADMIN_PASSWORD")
+    if not admin_email or not admin_password:
+        raise RuntimeError("DEFAULT_ADMIN_EMAIL y DEFAULT_ADMIN_PASSWORD deben estar definidos")
+
+    if not User.query.filter_by(email=admin_email).first():
+        new_admin = User(
+            username='admin',
+            email=admin_email,
+            password=admin_password,
+            is_admin=True
+        )
+        db.session.add(new_admin)
+        db.session.commit()
+        print(f"✅ Admin creado: {admin_email}")
+    else:
+        print("ℹ️ Admin ya existe.")
+
+
+@click.command('init-db')
+@with_appcontext
+def init_db_command():
+    """Crea el administrador (paso previo al despliegue, tras `flask db upgrade`)."""
+    init_database()
+    print("Base de datos inicializada.")
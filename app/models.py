@@ -16,6 +16,8 @@ class User(db.Model):
     created_at = db.Column(db.DateTime, default=datetime.utcnow)
     is_active = db.Column(db.Boolean, default=True)
     is_admin = db.Column(db.Boolean, default=False)
+    # Se incrementa con cada cambio en los agentes del usuario (ETag de /agents)
+    agents_version = db.Column(db.Integer, nullable=False, default=0, server_default='0')
 
     agents = db.relationship('Agent', back_populates='user', cascade='all, delete-orphan')
 
@@ -42,15 +44,21 @@ class User(db.Model):
         return token if isinstance(token, str) else token.decode('utf-8')
 
     @staticmethod
-    def verify_token(token):
+    def decode_token(token):
         try:
-            payload = jwt.decode(token, os.getenv('JWT_SECRET_KEY', 'your-secret-key'), algorithms=['HS256'])
-            return User.query.get(payload['user_id'])
+            return jwt.decode(token, os.getenv('JWT_SECRET_KEY', 'your-secret-key'), algorithms=['HS256'])
         except jwt.ExpiredSignatureError:
             return None
         except jwt.InvalidTokenError:
             return None
 
+    @staticmethod
+    def verify_token(token):
+        payload = User.decode_token(token)
+        if not payload:
+            return None
+        return User.query.get(payload['user_id'])
+
     def promote_to_admin(self, target_user):
         if self.is_admin:
             target_user.is_admin = True
@@ -88,12 +96,20 @@ class Agent(db.Model):
     model = db.Column(db.String(50), nullable=False)
     temperature = db.Column(db.Float, nullable=False, default=0.1)
     max_tokens = db.Column(db.Integer, nullable=False, default=50)
+    cache_enabled = db.Column(db.Boolean, nullable=False, default=False, server_default=db.false())
+    # Segundos por llamada al modelo; NULL usa LLM_REQUEST_TIMEOUT
+    request_timeout = db.Column(db.Float, nullable=True)
+    # Caché semántica (preguntas parecidas); NULL usa SEMANTIC_CACHE_THRESHOLD
+    semantic_cache_enabled = db.Column(db.Boolean, nullable=False, default=False, server_default=db.false())
+    semantic_cache_threshold = db.Column(db.Float, nullable=True)
 
     user_id = db.Column(db.Integer, db.ForeignKey('users.id', ondelete='CASCADE'), nullable=False)
     user = db.relationship('User', back_populates='agents')
 
-    tools = db.relationship('Tool', secondary='agent_tool', backref='agents')
-    chat_logs = db.relationship('ChatLog', backref='agent', cascade='all, delete-orphan')
+    # passive_deletes: al borrar el agente, las filas hijas las elimina el
+    # ON DELETE CASCADE de la base de datos sin cargarlas en memoria
+    tools = db.relationship('Tool', secondary='agent_tool', backref='agents', passive_deletes=True)
+    chat_logs = db.relationship('ChatLog', backref='agent', cascade='all, delete-orphan', passive_deletes=True)
 
     def to_dict(self):
         return {
@@ -104,6 +120,10 @@ class Agent(db.Model):
             'model': self.model,
             'temperature': self.temperature,
             'max_tokens': self.max_tokens,
+            'cache_enabled': self.cache_enabled,
+            'request_timeout': self.request_timeout,
+            'semantic_cache_enabled': self.semantic_cache_enabled,
+            'semantic_cache_threshold': self.semantic_cache_threshold,
             'user_id': self.user_id,
             'tools': [tool.to_dict() for tool in self.tools]
         }
@@ -146,7 +166,216 @@ class ChatLog(db.Model):
     message = db.Column(db.Text, nullable=False)
     role = db.Column(db.String(20), default='user')  # 'user' o 'assistant'
     timestamp = db.Column(db.DateTime, default=datetime.utcnow)
+    # Consumo del turno (solo en mensajes del asistente)
+    model = db.Column(db.String(50))
+    prompt_tokens = db.Column(db.Integer)
+    completion_tokens = db.Column(db.Integer)
+    latency_ms = db.Column(db.Float)
+
+    # Índice para leer el historial de un agente en orden (paginación por cursor
+    # y ventana de mensajes recientes del chat)
+    __table_args__ = (
+        db.Index('ix_chat_log_agent_ts_id', 'agent_id', 'timestamp', 'id'),
+    )
     
+# ---------------- CHAT_SUMMARY ----------------
+class ChatSummary(db.Model):
+    __tablename__ = 'chat_summary'
+
+    agent_id = db.Column(db.Integer, db.ForeignKey('agent.id', ondelete='CASCADE'), primary_key=True)
+    summary = db.Column(db.Text, nullable=False, default='')
+    last_chat_id = db.Column(db.Integer, nullable=False, default=0)  # último ChatLog incluido en el resumen
+    updated_at = db.Column(db.DateTime, default=datetime.utcnow)
+
+# ---------------- BACKGROUND_JOB ----------------
+class BackgroundJob(db.Model):
+    __tablename__ = 'background_job'
+
+    id = db.Column(db.Integer, primary_key=True)
+    user_id = db.Column(db.Integer, db.ForeignKey('users.id', ondelete='CASCADE'), nullable=False, index=True)
+    kind = db.Column(db.String(50), nullable=False)
+    status = db.Column(db.String(20), nullable=False, default='pending')  # pending, running, done, error
+    progress = db.Column(db.Integer, nullable=False, default=0)
+    total = db.Column(db.Integer)
+    error = db.Column(db.Text)
+    created_at = db.Column(db.DateTime, default=datetime.utcnow)
+    updated_at = db.Column(db.DateTime, default=datetime.utcnow)
+    # Recuperación de trabajos huérfanos: función y argumentos para
+    # reencolarlos, ejecuciones empezadas y latido del worker que los tiene
+    params = db.Column(db.JSON)
+    attempts = db.Column(db.Integer, nullable=False, default=0, server_default='0')
+    started_at = db.Column(db.DateTime)
+    heartbeat_at = db.Column(db.DateTime)
+
+    def to_dict(self):
+        return {
+            'id': self.id,
+            'kind': self.kind,
+            'status': self.status,
+            'progress': self.progress,
+            'total': self.total,
+            'error': self.error,
+            'attempts': self.attempts,
+            'created_at': self.created_at.isoformat() if self.created_at else None,
+            'started_at': self.started_at.isoformat() if self.started_at else None,
+            'updated_at': self.updated_at.isoformat() if self.updated_at else None
+        }
+
+# ---------------- MAIL_OUTBOX ----------------
+class MailOutbox(db.Model):
+    __tablename__ = 'mail_outbox'
+
+    id = db.Column(db.Integer, primary_key=True)
+    subject = db.Column(db.String(255), nullable=False)
+    recipients = db.Column(db.JSON, nullable=False)
+    body = db.Column(db.Text, nullable=False)
+    html = db.Column(db.Text)
+    status = db.Column(db.String(20), nullable=False, default='pending')  # pending, sending, sent, failed
+    attempts = db.Column(db.Integer, nullable=False, default=0)
+    next_attempt_at = db.Column(db.DateTime, nullable=False, default=datetime.utcnow)
+    claimed_at = db.Column(db.DateTime)
+    last_error = db.Column(db.Text)
+    created_at = db.Column(db.DateTime, default=datetime.utcnow)
+    sent_at = db.Column(db.DateTime)
+
+    __table_args__ = (
+        db.Index('ix_mail_outbox_status_next', 'status', 'next_attempt_at'),
+    )
+
+# ---------------- CREW ----------------
+class Crew(db.Model):
+    __tablename__ = 'crew'
+
+    id = db.Column(db.Integer, primary_key=True)
+    name = db.Column(db.String(100), nullable=False)
+    description = db.Column(db.Text)
+    user_id = db.Column(db.Integer, db.ForeignKey('users.id', ondelete='CASCADE'), nullable=False, index=True)
+    created_at = db.Column(db.DateTime, default=datetime.utcnow)
+
+    tasks = db.relationship('CrewTask', backref='crew', cascade='all, delete-orphan', passive_deletes=True,
+                            order_by='CrewTask.position')
+
+    def to_dict(self):
+        return {
+            'id': self.id,
+            'name': self.name,
+            'description': self.description,
+            'created_at': self.created_at.isoformat() if self.created_at else None,
+            'tasks': [task.to_dict() for task in self.tasks]
+        }
+
+# ---------------- CREW_TASK ----------------
+class CrewTask(db.Model):
+    __tablename__ = 'crew_task'
+
+    id = db.Column(db.Integer, primary_key=True)
+    crew_id = db.Column(db.Integer, db.ForeignKey('crew.id', ondelete='CASCADE'), nullable=False, index=True)
+    key = db.Column(db.String(50), nullable=False)  # identificador de la tarea dentro del crew
+    agent_id = db.Column(db.Integer, db.ForeignKey('agent.id', ondelete='CASCADE'), nullable=False)
+    description = db.Column(db.Text, nullable=False)
+    depends_on = db.Column(db.JSON, nullable=False, default=list)  # claves de las tareas previas
+    position = db.Column(db.Integer, nullable=False, default=0)
+
+    __table_args__ = (
+        db.UniqueConstraint('crew_id', 'key', name='unique_crew_task_key'),
+    )
+
+    def to_dict(self):
+        return {
+            'key': self.key,
+            'agent_id': self.agent_id,
+            'description': self.description,
+            'depends_on': self.depends_on or []
+        }
+
+# ---------------- CREW_RUN ----------------
+class CrewRun(db.Model):
+    __tablename__ = 'crew_run'
+
+    id = db.Column(db.Integer, primary_key=True)
+    crew_id = db.Column(db.Integer, db.ForeignKey('crew.id', ondelete='CASCADE'), nullable=False, index=True)
+    user_id = db.Column(db.Integer, db.ForeignKey('users.id', ondelete='CASCADE'), nullable=False)
+    input = db.Column(db.Text)
+    status = db.Column(db.String(20), nullable=False, default='running')  # running, done, error
+    total_ms = db.Column(db.Float)
+    created_at = db.Column(db.DateTime, default=datetime.utcnow)
+    finished_at = db.Column(db.DateTime)
+
+    task_runs = db.relationship('CrewTaskRun', backref='run', cascade='all, delete-orphan', passive_deletes=True,
+                                order_by='CrewTaskRun.id')
+
+    def to_dict(self):
+        return {
+            'id': self.id,
+            'crew_id': self.crew_id,
+            'input': self.input,
+            'status': self.status,
+            'total_ms': self.total_ms,
+            'created_at': self.created_at.isoformat() if self.created_at else None,
+            'finished_at': self.finished_at.isoformat() if self.finished_at else None,
+            'tasks': [task_run.to_dict() for task_run in self.task_runs]
+        }
+
+# ---------------- CREW_TASK_RUN ----------------
+class CrewTaskRun(db.Model):
+    __tablename__ = 'crew_task_run'
+
+    id = db.Column(db.Integer, primary_key=True)
+    run_id = db.Column(db.Integer, db.ForeignKey('crew_run.id', ondelete='CASCADE'), nullable=False, index=True)
+    task_key = db.Column(db.String(50), nullable=False)
+    agent_id = db.Column(db.Integer)
+    status = db.Column(db.String(20), nullable=False)  # done, error, skipped
+    output = db.Column(db.Text)
+    error = db.Column(db.Text)
+    latency_ms = db.Column(db.Float)
+    prompt_tokens = db.Column(db.Integer)
+    completion_tokens = db.Column(db.Integer)
+
+    def to_dict(self):
+        return {
+            'key': self.task_key,
+            'agent_id': self.agent_id,
+            'status': self.status,
+            'output': self.output,
+            'error': self.error,
+            'latency_ms': self.latency_ms,
+            'prompt_tokens': self.prompt_tokens,
+            'completion_tokens': self.completion_tokens
+        }
+
+# ---------------- USAGE (agregados) ----------------
+class UsageRollup(db.Model):
+    """
+    Consumo agregado por periodo, usuario, agente y modelo. Se actualiza en
+    la misma transacción que guarda cada turno (las llamadas sin turno, como
+    call_llm o los resúmenes del historial, en una propia); agent_id no es
+    clave foránea para conservar el consumo de agentes eliminados.
+    """
+    __abstract__ = True
+
+    bucket = db.Column(db.DateTime, primary_key=True)  # inicio de la hora o del día (UTC)
+    user_id = db.Column(db.Integer, db.ForeignKey('users.id', ondelete='CASCADE'), primary_key=True)
+    agent_id = db.Column(db.Integer, primary_key=True)
+    model = db.Column(db.String(50), primary_key=True)
+    requests = db.Column(db.Integer, nullable=False, default=0)
+    prompt_tokens = db.Column(db.BigInteger, nullable=False, default=0)
+    completion_tokens = db.Column(db.BigInteger, nullable=False, default=0)
+    latency_ms = db.Column(db.Float, nullable=False, default=0)  # suma de latencias
+
+class UsageHourly(UsageRollup):
+    __tablename__ = 'usage_hourly'
+
+    __table_args__ = (
+        db.Index('ix_usage_hourly_user_bucket', 'user_id', 'bucket'),
+    )
+
+class UsageDaily(UsageRollup):
+    __tablename__ = 'usage_daily'
+
+    __table_args__ = (
+        db.Index('ix_usage_daily_user_bucket', 'user_id', 'bucket'),
+    )
+
 # ---------------- LOG_ENTRY ----------------
 class LogEntry(db.Model):
     __tablename__ = 'log_entry'
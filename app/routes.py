@@ -1,14 +1,54 @@
+import hmac
 import json
 import os
-from flask import Blueprint, request, jsonify
-from openai import OpenAI
+import time
+import logging
+from datetime import datetime, timezone
+from flask import Blueprint, current_app, request, jsonify, Response, stream_with_context
 from flask_cors import cross_origin
-from app.models import Agent as AgentModel, Tool as ToolModel, ChatLog, User, db
-from app.auth import token_required, get_current_user
+from app.models import (
+    Agent as AgentModel, Tool as ToolModel, ChatLog, BackgroundJob, User, Crew as CrewModel, CrewTask, CrewRun, db
+)
+from app.auth import token_required, get_current_user, invalidate_principal, get_principal_cache_stats
 from werkzeug.security import generate_password_hash
+from sqlalchemy import tuple_
+from sqlalchemy.orm import load_only, selectinload
 from sqlalchemy.exc import IntegrityError
+from app.services import (
+    build_messages, load_chat_context, release_connection, complete_chat, stream_chat, save_chat_turn,
+    save_chat_turns, run_chat_batch,
+    delete_chat_history, purge_chat_history, get_agents_version, touch_agents_version, tool_owner_ids
+)
+from app.utils.jobs import start_job
+from app.utils.admission import admission_required, get_admission_stats
+from app.utils.crew_engine import TaskPlan, crew_width, load_task_contexts, run_crew, validate_crew_tasks
+from app.utils.agent_cache import agents_using_tool, get_agent_cache_stats, invalidate_agents
+from app.utils.logger import get_audit_stats
+from app.utils.mailer import get_mail_stats
+from app.utils.tools import get_tool_stats
+from app.utils.db_metrics import get_db_stats
+from app.utils.metrics import render_metrics
+from app.utils.usage import GROUP_COLUMNS, PERIODS, TurnUsage, usage_series, usage_totals
+from app.utils.cache import get_response_cache
+from app.utils.semantic_cache import get_semantic_cache
+from app.utils.export import (
+    CHAT_EXPORT_COLUMNS, EXPORT_FORMATS, LOG_EXPORT_COLUMNS, chat_export_position, chat_export_query,
+    log_export_query, stream_export
+)
+from app.utils.llm_client import get_client_stats
+from app.utils.llm_router import get_llm_router, get_router_stats
+from app.utils.resilience import LLMUnavailable
 
 api_bp = Blueprint('api', __name__, url_prefix='/api')
+logger = logging.getLogger(__name__)
+
+# Campos admitidos en ?fields= de /agents
+AGENT_FIELDS = ('id', 'name', 'prompt', 'provider', 'model', 'temperature', 'max_tokens', 'cache_enabled',
+                'request_timeout', 'semantic_cache_enabled', 'semantic_cache_threshold', 'tools')
+
+# Tamaño de página del historial de chats
+CHATS_PAGE_DEFAULT = 50
+CHATS_PAGE_MAX = 200
 
 ALLOWED_ORIGINS = [
     "https://crew-ai-front.vercel.app",
@@ -18,6 +58,24 @@ ALLOWED_ORIGINS = [
     "http://localhost:3000"
 ]
 
+def _parse_request_timeout(value):
+    """Segundos por llamada al modelo del agente; None usa LLM_REQUEST_TIMEOUT."""
+    if value is None:
+        return None
+    timeout = float(value)
+    if not 0 < timeout <= 600:
+        raise ValueError(value)
+    return timeout
+
+def _parse_semantic_threshold(value):
+    """Similitud mínima de la caché semántica; None usa SEMANTIC_CACHE_THRESHOLD."""
+    if value is None:
+        return None
+    threshold = float(value)
+    if not 0 < threshold <= 1:
+        raise ValueError(value)
+    return threshold
+
 # Crear agente (requiere autenticación)
 @api_bp.route('/agents', methods=['POST'])
 @token_required
@@ -37,6 +95,16 @@ def create_agent(current_user):
         model = agent_data['model']
         temperature = agent_data.get('temperature', 0.1)
         max_tokens = agent_data.get('max_tokens', 50)
+        cache_enabled = bool(agent_data.get('cache_enabled', False))
+        try:
+            request_timeout = _parse_request_timeout(agent_data.get('request_timeout'))
+        except (TypeError, ValueError):
+            return jsonify({'message': 'request_timeout debe ser un número de segundos positivo'}), 400
+        semantic_cache_enabled = bool(agent_data.get('semantic_cache_enabled', False))
+        try:
+            semantic_cache_threshold = _parse_semantic_threshold(agent_data.get('semantic_cache_threshold'))
+        except (TypeError, ValueError):
+            return jsonify({'message': 'semantic_cache_threshold debe estar entre 0 y 1'}), 400
         tools = agent_data.get('tools', [])
 
         # Crear agente asociado al usuario actual
@@ -47,6 +115,10 @@ def create_agent(current_user):
             model=model,
             temperature=temperature,
             max_tokens=max_tokens,
+            cache_enabled=cache_enabled,
+            request_timeout=request_timeout,
+            semantic_cache_enabled=semantic_cache_enabled,
+            semantic_cache_threshold=semantic_cache_threshold,
             user_id=current_user.id  # Asociar al usuario actual
         )
 
@@ -56,6 +128,7 @@ def create_agent(current_user):
             agent.tools.extend(associated_tools)
 
         db.session.add(agent)
+        touch_agents_version([current_user.id])
         db.session.commit()
 
         return jsonify({
@@ -69,6 +142,10 @@ def create_agent(current_user):
                 "model": agent.model,
                 "temperature": agent.temperature,
                 "max_tokens": agent.max_tokens,
+                "cache_enabled": agent.cache_enabled,
+                "request_timeout": agent.request_timeout,
+                "semantic_cache_enabled": agent.semantic_cache_enabled,
+                "semantic_cache_threshold": agent.semantic_cache_threshold,
                 "tools": [tool.name for tool in agent.tools]
             }
         }), 201
@@ -124,19 +201,19 @@ def create_tool(current_user):
 @token_required
 def list_agents(current_user):
     try:
+        fields = _agent_fields()
+        if fields is None:
+            return jsonify({'message': 'Parámetro fields inválido'}), 400
+
+        # Sondeo del frontend: si nada cambió, basta con comparar la versión
+        etag = _agents_etag(current_user.id, 'all', fields)
+        if request.if_none_match.contains_weak(etag):
+            return _not_modified(etag)
+
         # Solo mostrar agentes del usuario actual
-        agents = AgentModel.query.filter_by(user_id=current_user.id).all()
-        agent_list = [{
-            "id": agent.id,
-            "name": agent.name,
-            "prompt": agent.prompt,
-            "provider": agent.provider,
-            "model": agent.model,
-            "temperature": agent.temperature,
-            "max_tokens": agent.max_tokens,
-            "tools": [tool.name for tool in agent.tools]
-        } for agent in agents]
-        return jsonify(agent_list), 200
+        agents = _agents_query(fields).filter_by(user_id=current_user.id).order_by(AgentModel.id).all()
+        agent_list = [_agent_to_dict(agent, fields, lambda tool: tool.name) for agent in agents]
+        return _with_etag(jsonify(agent_list), etag), 200
     except Exception as e:
         return jsonify({'message': f'Error al listar agentes: {str(e)}'}), 500
 
@@ -145,23 +222,70 @@ def list_agents(current_user):
 @token_required
 def get_agent(current_user, agent_id):  # ✅ CORREGIDO: current_user primero
     try:
-        agent = AgentModel.query.filter_by(id=agent_id, user_id=current_user.id).first()
+        fields = _agent_fields()
+        if fields is None:
+            return jsonify({'message': 'Parámetro fields inválido'}), 400
+
+        etag = _agents_etag(current_user.id, agent_id, fields)
+        if request.if_none_match.contains_weak(etag):
+            return _not_modified(etag)
+
+        agent = _agents_query(fields).filter_by(id=agent_id, user_id=current_user.id).first()
         if not agent:
             return jsonify({'message': 'Agente no encontrado'}), 404
-        
-        return jsonify({
-            "id": agent.id,
-            "name": agent.name,
-            "prompt": agent.prompt,
-            "provider": agent.provider,
-            "model": agent.model,
-            "temperature": agent.temperature,
-            "max_tokens": agent.max_tokens,
-            "tools": [{"id": tool.id, "name": tool.name} for tool in agent.tools]
-        }), 200
+
+        agent_dict = _agent_to_dict(agent, fields, lambda tool: {"id": tool.id, "name": tool.name})
+        return _with_etag(jsonify(agent_dict), etag), 200
     except Exception as e:
         return jsonify({'message': f'Error al obtener agente: {str(e)}'}), 500
 
+
+def _agent_fields():
+    """Campos pedidos en ?fields=a,b (todos si no se indica); None si alguno no existe."""
+    raw = request.args.get('fields')
+    if not raw:
+        return AGENT_FIELDS
+    fields = tuple(dict.fromkeys(field.strip() for field in raw.split(',') if field.strip()))
+    if not fields or any(field not in AGENT_FIELDS for field in fields):
+        return None
+    return fields
+
+
+def _agents_query(fields):
+    # Solo las columnas pedidas y, si hacen falta, las herramientas en una
+    # única consulta adicional para todos los agentes
+    columns = [getattr(AgentModel, field) for field in fields if field not in ('id', 'tools')]
+    query = AgentModel.query.options(load_only(AgentModel.id, *columns))
+    if 'tools' in fields:
+        query = query.options(selectinload(AgentModel.tools).load_only(ToolModel.id, ToolModel.name))
+    return query
+
+
+def _agent_to_dict(agent, fields, tool_repr):
+    data = {}
+    for field in fields:
+        if field == 'tools':
+            data['tools'] = [tool_repr(tool) for tool in agent.tools]
+        else:
+            data[field] = getattr(agent, field)
+    return data
+
+
+def _agents_etag(user_id, scope, fields):
+    # La versión cambia con cualquier alta, edición o baja de agentes del
+    # usuario (y con cambios en herramientas que usan)
+    return f"agents-{user_id}-{get_agents_version(user_id)}-{scope}-{'.'.join(fields)}"
+
+
+def _with_etag(response, etag):
+    response.set_etag(etag, weak=True)
+    response.headers['Cache-Control'] = 'private, no-cache'
+    return response
+
+
+def _not_modified(etag):
+    return _with_etag(Response(status=304), etag)
+
 # Actualizar agente (solo del usuario actual)
 @api_bp.route('/agents/<int:agent_id>', methods=['PUT'])
 @token_required
@@ -181,12 +305,28 @@ def update_agent(current_user, agent_id):  # ✅ CORREGIDO: current_user primero
         agent.model = data.get('model', agent.model)
         agent.temperature = data.get('temperature', agent.temperature)
         agent.max_tokens = data.get('max_tokens', agent.max_tokens)
+        if 'cache_enabled' in data:
+            agent.cache_enabled = bool(data['cache_enabled'])
+        if 'request_timeout' in data:
+            try:
+                agent.request_timeout = _parse_request_timeout(data['request_timeout'])
+            except (TypeError, ValueError):
+                return jsonify({'message': 'request_timeout debe ser un número de segundos positivo'}), 400
+        if 'semantic_cache_enabled' in data:
+            agent.semantic_cache_enabled = bool(data['semantic_cache_enabled'])
+        if 'semantic_cache_threshold' in data:
+            try:
+                agent.semantic_cache_threshold = _parse_semantic_threshold(data['semantic_cache_threshold'])
+            except (TypeError, ValueError):
+                return jsonify({'message': 'semantic_cache_threshold debe estar entre 0 y 1'}), 400
 
         # Actualizar herramientas asociadas
         if 'tools' in data:
             tools = ToolModel.query.filter(ToolModel.name.in_(data['tools'])).all()
             agent.tools = tools
 
+        touch_agents_version([current_user.id])
+        invalidate_agents([agent_id])
         db.session.commit()
         return jsonify({"message": "Agente actualizado correctamente"}), 200
     except Exception as e:
@@ -203,7 +343,15 @@ def delete_agent(current_user, agent_id):  # ✅ CORREGIDO: current_user primero
         if not agent:
             return jsonify({'message': 'Agente no encontrado'}), 404
         
+        # Historiales muy grandes: borrado por lotes en segundo plano
+        if _wants_async():
+            job = start_job(current_user.id, 'delete_agent', purge_chat_history, agent_id, True)
+            return _job_accepted(job, "Eliminación del agente en curso")
+
+        # Los chats y asociaciones se eliminan por ON DELETE CASCADE
         db.session.delete(agent)
+        touch_agents_version([current_user.id])
+        invalidate_agents([agent_id])
         db.session.commit()
         return jsonify({"message": "Agente eliminado correctamente"}), 200
     except Exception as e:
@@ -238,6 +386,8 @@ def update_tool(current_user, tool_id):  # ✅ CORREGIDO: current_user primero
         if 'parameters' in data:
             tool.parameters = data['parameters']
         
+        touch_agents_version(tool_owner_ids(tool_id))
+        invalidate_agents(agents_using_tool(tool_id))
         db.session.commit()
         return jsonify({"message": "Tool actualizada correctamente"}), 200
     except Exception as e:
@@ -250,34 +400,145 @@ def update_tool(current_user, tool_id):  # ✅ CORREGIDO: current_user primero
 def delete_tool(current_user, tool_id):  # ✅ CORREGIDO: current_user primero
     try:
         tool = ToolModel.query.get_or_404(tool_id)
+        agent_ids = agents_using_tool(tool_id)
+        touch_agents_version(tool_owner_ids(tool_id))
         db.session.delete(tool)
+        invalidate_agents(agent_ids)
         db.session.commit()
         return jsonify({"message": "Tool eliminada correctamente"}), 200
     except Exception as e:
         db.session.rollback()
         return jsonify({'message': f'Error al eliminar herramienta: {str(e)}'}), 500
 
-# Listar chats del agente (solo del usuario actual)
+# Listar chats del agente (solo del usuario actual), paginado por cursor.
+# ?limit=N&before=<chat_id> devuelve los N mensajes anteriores a ese chat (por
+# defecto, los más recientes); ?after=<chat_id> los N siguientes. El cuerpo
+# sigue siendo una lista cronológica y el cursor siguiente va en cabeceras.
 @api_bp.route('/agents/<int:agent_id>/chats', methods=['GET'])
 @token_required
 def list_chats(current_user, agent_id):  # ✅ CORREGIDO: current_user primero
     try:
+        try:
+            limit = int(request.args.get('limit', CHATS_PAGE_DEFAULT))
+            before = request.args.get('before', type=int)
+            after = request.args.get('after', type=int)
+        except ValueError:
+            return jsonify({'message': 'Parámetros de paginación inválidos'}), 400
+        limit = max(1, min(limit, CHATS_PAGE_MAX))
+
         # Verificar que el agente pertenece al usuario actual
         agent = AgentModel.query.filter_by(id=agent_id, user_id=current_user.id).first()
         if not agent:
             return jsonify({'message': 'Agente no encontrado'}), 404
-        
-        chats = ChatLog.query.filter_by(agent_id=agent_id).order_by(ChatLog.timestamp.asc()).all()
+
+        position = tuple_(ChatLog.timestamp, ChatLog.id)
+        query = ChatLog.query.with_entities(
+            ChatLog.id, ChatLog.message, ChatLog.role, ChatLog.timestamp
+        ).filter(ChatLog.agent_id == agent_id)
+
+        for cursor_id, newer in ((before, False), (after, True)):
+            if cursor_id is None:
+                continue
+            cursor = ChatLog.query.with_entities(ChatLog.timestamp, ChatLog.id).filter_by(
+                id=cursor_id, agent_id=agent_id
+            ).first()
+            if not cursor:
+                return jsonify({'message': 'Cursor de paginación no encontrado'}), 400
+            query = query.filter(position > tuple(cursor) if newer else position < tuple(cursor))
+
+        # Hacia delante si hay 'after'; si no, desde el más reciente hacia atrás
+        forward = after is not None
+        if forward:
+            query = query.order_by(ChatLog.timestamp.asc(), ChatLog.id.asc())
+        else:
+            query = query.order_by(ChatLog.timestamp.desc(), ChatLog.id.desc())
+
+        rows = query.limit(limit + 1).all()
+        has_more = len(rows) > limit
+        rows = rows[:limit]
+        if not forward:
+            rows.reverse()
+
         chat_list = [{
             "id": chat.id,
             "message": chat.message,
             "role": chat.role,
             "timestamp": chat.timestamp.isoformat() if chat.timestamp else None
-        } for chat in chats]
-        return jsonify(chat_list), 200
+        } for chat in rows]
+
+        response = jsonify(chat_list)
+        response.headers['X-Has-More'] = 'true' if has_more else 'false'
+        if has_more and rows:
+            response.headers['X-Next-Cursor'] = str(rows[-1].id if forward else rows[0].id)
+        return response, 200
     except Exception as e:
         return jsonify({'message': f'Error al listar chats: {str(e)}'}), 500
 
+def _export_params():
+    """Lee format, gzip, from y to de la consulta; devuelve (params, error)."""
+    fmt = request.args.get('format', 'ndjson')
+    if fmt not in EXPORT_FORMATS:
+        return None, 'Parámetro format inválido (ndjson o csv)'
+    compress = request.args.get('gzip', '').lower() in ('1', 'true', 'yes')
+    try:
+        start, end = (_parse_utc(request.args.get(name)) for name in ('from', 'to'))
+    except ValueError:
+        return None, 'Parámetros from/to inválidos (formato ISO 8601)'
+    return (fmt, compress, start, end), None
+
+def _export_response(rows, filename, fmt, compress):
+    if compress:
+        filename += '.gz'
+    return Response(
+        stream_with_context(rows),
+        mimetype='application/gzip' if compress else EXPORT_FORMATS[fmt],
+        headers={
+            'Content-Disposition': f'attachment; filename="{filename}"',
+            'Cache-Control': 'no-cache',
+            'X-Accel-Buffering': 'no'
+        }
+    )
+
+# Exportar el historial completo de un agente (propio o, para
+# administradores, cualquiera) en NDJSON o CSV, en streaming. Un export
+# interrumpido se reanuda con ?after=<id del último mensaje recibido>.
+@api_bp.route('/agents/<int:agent_id>/chats/export', methods=['GET'])
+@token_required
+def export_chats(current_user, agent_id):
+    try:
+        params, error = _export_params()
+        if error:
+            return jsonify({'message': error}), 400
+        fmt, compress, start, end = params
+        after_id = request.args.get('after')
+        if after_id is not None:
+            if not after_id.isdigit():
+                return jsonify({'message': 'Parámetro after inválido'}), 400
+            after_id = int(after_id)
+
+        query = AgentModel.query.filter_by(id=agent_id)
+        if not current_user.is_admin:
+            query = query.filter_by(user_id=current_user.id)
+        if not query.with_entities(AgentModel.id).first():
+            return jsonify({'message': 'Agente no encontrado'}), 404
+
+        after = None
+        if after_id is not None:
+            after = chat_export_position(agent_id, after_id)
+            if after is None:
+                return jsonify({'message': 'Cursor de exportación no encontrado'}), 400
+        release_connection()
+
+        build_query, key = chat_export_query(agent_id, start, end)
+        rows = stream_export(
+            build_query, key, CHAT_EXPORT_COLUMNS, fmt, compress, after,
+            chunk_rows=current_app.config.get('EXPORT_CHUNK_ROWS', 10000),
+            yield_per=current_app.config.get('EXPORT_YIELD_PER', 1000)
+        )
+        return _export_response(rows, f'agent-{agent_id}-chats.{fmt}', fmt, compress)
+    except Exception as e:
+        return jsonify({'message': f'Error al exportar chats: {str(e)}'}), 500
+
 # Eliminar chats del agente (solo del usuario actual)
 @api_bp.route('/agents/<int:agent_id>/chats', methods=['DELETE'])
 @token_required
@@ -288,18 +549,41 @@ def delete_chats(current_user, agent_id):  # ✅ CORREGIDO: current_user primero
         if not agent:
             return jsonify({'message': 'Agente no encontrado'}), 404
         
-        chats = ChatLog.query.filter_by(agent_id=agent_id).all()
-        for chat in chats:
-            db.session.delete(chat)
+        if _wants_async():
+            job = start_job(current_user.id, 'delete_chats', purge_chat_history, agent_id)
+            return _job_accepted(job, "Eliminación de chats en curso")
+
+        deleted = delete_chat_history(agent_id)
         db.session.commit()
-        return jsonify({"message": "Chats eliminados correctamente"}), 200
+        return jsonify({"message": "Chats eliminados correctamente", "deleted": deleted}), 200
     except Exception as e:
         db.session.rollback()
         return jsonify({'message': f'Error al eliminar chats: {str(e)}'}), 500
 
+def _wants_async():
+    return request.args.get('async', '').lower() in ('1', 'true', 'yes')
+
+def _job_accepted(job, message):
+    return jsonify({
+        "message": message,
+        "job_id": job.id,
+        "status_url": f"/api/jobs/{job.id}"
+    }), 202
+
+# Estado de un trabajo en segundo plano (propio o, para administradores, cualquiera)
+@api_bp.route('/jobs/<int:job_id>', methods=['GET'])
+@token_required
+def get_job(current_user, job_id):
+    job = db.session.get(BackgroundJob, job_id)
+    if not job or (job.user_id != current_user.id and not current_user.is_admin):
+        return jsonify({'message': 'Trabajo no encontrado'}), 404
+
+    return jsonify(job.to_dict()), 200
+
 # Chat con agente (solo del usuario actual)
 @api_bp.route('/chat/<int:agent_id>', methods=['POST'])
 @token_required
+@admission_required()
 def chat_with_agent(current_user, agent_id): 
     try:
         data = request.get_json()
@@ -307,108 +591,405 @@ def chat_with_agent(current_user, agent_id):
         if not data.get('message'):
             return jsonify({'message': 'Mensaje requerido'}), 400
         
-        # Verificar que el agente pertenece al usuario actual
-        agent_db = AgentModel.query.filter_by(id=agent_id, user_id=current_user.id).first()
-        if not agent_db:
+        # Cargar agente, herramientas e historial (solo agentes del usuario actual)
+        ctx = load_chat_context(agent_id, current_user.id)
+        if not ctx:
             return jsonify({'message': 'Agente no encontrado'}), 404
 
-        # Configurar OpenAI
-        os.environ["OPENAI_API_KEY"] = os.getenv("OPENAI_API_KEY")
-        client = OpenAI()
-
-        # Preparar herramientas
-        tools = []
-        for tool in agent_db.tools:
-            if tool.description and tool.parameters:
-                tools.append({
-                    "type": "function",
-                    "function": {
-                        "name": tool.name,
-                        "description": tool.description,
-                        "parameters": tool.parameters
-                    }
-                })
-
-        # Obtener historial de chat reciente (últimos 20 mensajes)
-        recent_chats = ChatLog.query.filter_by(agent_id=agent_id).order_by(ChatLog.timestamp.desc()).limit(20).all()
-        recent_chats.reverse()  # Ordenar cronológicamente
-
-        # Construir mensajes
-        messages = [{"role": "system", "content": agent_db.prompt}]
-        
-        # Agregar historial reciente
-        for chat in recent_chats:
-            messages.append({"role": chat.role, "content": chat.message})
+        # Devolver la conexión al pool antes de esperar al modelo
+        release_connection()
+
+        # Si el cliente acepta SSE, responder en streaming
+        if _wants_event_stream():
+            return _stream_chat_response(ctx, data["message"], current_user.id)
+
+        started = time.perf_counter()
+        usage = {}
+        messages = build_messages(ctx.prompt, ctx.history, data["message"])
+        final_message = complete_chat(get_llm_router(), ctx, messages, usage)
+
+        # Guardar mensajes y consumo en el historial (transacción corta)
+        save_chat_turn(agent_id, data["message"], final_message, TurnUsage(
+            user_id=current_user.id,
+            agent_id=agent_id,
+            model=ctx.model,
+            prompt_tokens=usage['prompt_tokens'],
+            completion_tokens=usage['completion_tokens'],
+            latency_ms=round((time.perf_counter() - started) * 1000, 1)
+        ))
         
-        # Agregar mensaje actual del usuario
-        messages.append({"role": "user", "content": data["message"]})
-
-        # Primera llamada al modelo
-        response = client.chat.completions.create(
-            model=agent_db.model,
-            messages=messages,
-            tools=tools if tools else None,
-            tool_choice="auto" if tools else None,
-            temperature=agent_db.temperature,
-            max_tokens=agent_db.max_tokens
-        )
+        return jsonify({"respuesta": final_message}), 200
+    
+    except LLMUnavailable as e:
+        return _llm_unavailable(e)
+    except Exception as e:
+        db.session.rollback()
+        return jsonify({'message': f'Error en el chat: {str(e)}'}), 500
 
-        assistant_message = response.choices[0].message
-        tool_calls = assistant_message.tool_calls
-        tool_messages = []
+# Chat con agente en streaming (Server-Sent Events)
+@api_bp.route('/chat/<int:agent_id>/stream', methods=['POST'])
+@token_required
+@admission_required()
+def chat_with_agent_stream(current_user, agent_id):
+    try:
+        data = request.get_json()
 
-        if tool_calls:
-            for tool_call in tool_calls:
-                tool_name = tool_call.function.name
-                try:
-                    tool_args = json.loads(tool_call.function.arguments)
-                except Exception:
-                    tool_args = {}
+        if not data.get('message'):
+            return jsonify({'message': 'Mensaje requerido'}), 400
+
+        ctx = load_chat_context(agent_id, current_user.id)
+        if not ctx:
+            return jsonify({'message': 'Agente no encontrado'}), 404
+
+        release_connection()
+        return _stream_chat_response(ctx, data["message"], current_user.id)
+    except Exception as e:
+        db.session.rollback()
+        return jsonify({'message': f'Error en el chat: {str(e)}'}), 500
+
+# Lote de chats: varios (agent_id, mensaje), o un mensaje a varios agentes
+# con "agent_ids". Las llamadas al modelo se hacen en paralelo y todos los
+# ChatLog se guardan en una sola transacción; los fallos son por elemento.
+@api_bp.route('/chat/batch', methods=['POST'])
+@token_required
+@admission_required(cost=lambda: _batch_size(), slots=lambda: _batch_slots())
+def chat_batch(current_user):
+    try:
+        started = time.perf_counter()
+        data = request.get_json() or {}
+
+        items = _expand_batch_items(data.get('items'))
+        if items is None:
+            return jsonify({'message': 'Formato de lote inválido'}), 400
+        max_items = current_app.config.get('CHAT_BATCH_MAX_ITEMS', 50)
+        if len(items) > max_items:
+            return jsonify({'message': f'El lote admite como máximo {max_items} elementos'}), 400
+
+        try:
+            concurrency = int(data.get('concurrency') or current_app.config.get('CHAT_BATCH_CONCURRENCY', 4))
+        except (TypeError, ValueError):
+            return jsonify({'message': 'Parámetro concurrency inválido'}), 400
+        concurrency = max(1, min(concurrency, _batch_slots()))
+
+        # Un contexto por agente distinto (solo agentes del usuario actual)
+        contexts = {
+            agent_id: load_chat_context(agent_id, current_user.id)
+            for agent_id in dict.fromkeys(agent_id for agent_id, _ in items)
+        }
+        release_connection()
 
-                # Simular ejecución de herramientas
-                if tool_name == "buscar_web":
-                    result = f"Resultado simulado para búsqueda: {tool_args.get('query', '')}"
+        results = run_chat_batch(items, contexts, concurrency)
+        save_chat_turns([
+            (result['agent_id'], message, result['respuesta'], TurnUsage(
+                user_id=current_user.id,
+                agent_id=result['agent_id'],
+                model=contexts[result['agent_id']].model,
+                prompt_tokens=result['usage'].get('prompt_tokens'),
+                completion_tokens=result['usage'].get('completion_tokens'),
+                latency_ms=result['elapsed_ms']
+            ))
+            for (_, message), result in zip(items, results) if result['status'] == 'ok'
+        ])
+
+        succeeded = sum(1 for result in results if result['status'] == 'ok')
+        return jsonify({
+            "results": results,
+            "succeeded": succeeded,
+            "failed": len(results) - succeeded,
+            "total_ms": round((time.perf_counter() - started) * 1000, 1)
+        }), 200
+    except Exception as e:
+        db.session.rollback()
+        return jsonify({'message': f'Error en el lote de chat: {str(e)}'}), 500
+
+def _batch_size():
+    data = request.get_json(silent=True) or {}
+    return len(_expand_batch_items(data.get('items')) or [])
+
+def _batch_slots():
+    # Llamadas simultáneas del lote: nunca más que las plazas que reserva la
+    # admisión para el usuario
+    limit = current_app.config.get('CHAT_BATCH_CONCURRENCY', 4)
+    if current_app.config.get('ADMISSION_ENABLED', True):
+        limit = min(limit, current_app.config.get('ADMISSION_USER_MAX_IN_FLIGHT', 4))
+    return max(1, min(limit, _batch_size() or 1))
+
+def _expand_batch_items(raw_items):
+    """Convierte los elementos del lote en tuplas (agent_id, mensaje); None si son inválidos."""
+    if not isinstance(raw_items, list) or not raw_items:
+        return None
+    items = []
+    for raw in raw_items:
+        if not isinstance(raw, dict):
+            return None
+        message = raw.get('message')
+        agent_ids = raw.get('agent_ids', [raw.get('agent_id')])
+        if not isinstance(message, str) or not message or not isinstance(agent_ids, list) or not agent_ids:
+            return None
+        if not all(isinstance(agent_id, int) and not isinstance(agent_id, bool) for agent_id in agent_ids):
+            return None
+        items.extend((agent_id, message) for agent_id in agent_ids)
+    return items
+
+def _wants_event_stream():
+    return 'text/event-stream' in request.headers.get('Accept', '')
+
+def _llm_unavailable(e):
+    # Proveedor caído o circuito abierto: el cliente puede reintentar más tarde
+    response = jsonify({'message': e.message, 'reason': e.reason})
+    response.status_code = 503
+    response.headers['Retry-After'] = str(e.retry_after)
+    return response
+
+def _sse(event, payload):
+    return f"event: {event}\ndata: {json.dumps(payload, ensure_ascii=False)}\n\n"
+
+def _stream_chat_response(ctx, user_message, user_id):
+    """
+    Devuelve una respuesta SSE que retransmite los tokens del modelo a medida
+    que llegan. El par de ChatLog se guarda al terminar el stream o cuando el
+    cliente lo aborta (con la respuesta parcial generada hasta ese momento).
+    """
+    messages = build_messages(ctx.prompt, ctx.history, user_message)
+    router = get_llm_router()
+
+    def generate():
+        started = time.perf_counter()
+        ttft = None
+        parts = []
+        usage = {}
+        completed = False
+        try:
+            for kind, value in stream_chat(router, ctx, messages, usage):
+                if kind == "token":
+                    if ttft is None:
+                        ttft = time.perf_counter() - started
+                    parts.append(value)
+                    yield _sse("token", {"delta": value})
                 else:
-                    result = f"[Simulación] Herramienta '{tool_name}' ejecutada con argumentos: {tool_args}"
-
-                tool_messages.append({
-                    "role": "tool",
-                    "tool_call_id": tool_call.id,
-                    "content": result
-                })
-
-            # Añadir mensajes de herramientas
-            messages.append({
-                "role": "assistant",
-                "content": None,
-                "tool_calls": [tc.model_dump() for tc in tool_calls]
+                    yield _sse("tool", value)
+            completed = True
+            total = time.perf_counter() - started
+            yield _sse("done", {
+                "respuesta": "".join(parts),
+                "ttft_ms": round(ttft * 1000, 1) if ttft is not None else None,
+                "total_ms": round(total * 1000, 1)
             })
-            messages.extend(tool_messages)
-
-            # Segunda llamada al modelo
-            final_response = client.chat.completions.create(
-                model=agent_db.model,
-                messages=messages,
-                temperature=agent_db.temperature,
-                max_tokens=agent_db.max_tokens
+        except LLMUnavailable as e:
+            yield _sse("error", {"message": e.message, "reason": e.reason, "retry_after": e.retry_after})
+        except Exception as e:
+            yield _sse("error", {"message": f"Error en el chat: {str(e)}"})
+        finally:
+            # También se ejecuta si el cliente cierra la conexión (GeneratorExit)
+            total = time.perf_counter() - started
+            logger.info(
+                "chat stream agent=%s ttft_ms=%s total_ms=%.1f completed=%s",
+                ctx.agent_id, f"{ttft * 1000:.1f}" if ttft is not None else "-", total * 1000, completed
             )
-            final_message = final_response.choices[0].message.content
-        else:
-            final_message = assistant_message.content
+            if parts:
+                try:
+                    # Si el cliente abortó, el consumo de la última llamada no llegó
+                    save_chat_turn(ctx.agent_id, user_message, "".join(parts), TurnUsage(
+                        user_id=user_id,
+                        agent_id=ctx.agent_id,
+                        model=ctx.model,
+                        prompt_tokens=usage.get('prompt_tokens'),
+                        completion_tokens=usage.get('completion_tokens'),
+                        latency_ms=round(total * 1000, 1)
+                    ))
+                except Exception:
+                    logger.exception("No se pudo guardar el historial del chat en streaming")
 
-        # Guardar mensajes en el historial
-        user_log = ChatLog(agent_id=agent_id, message=data["message"], role="user")
-        assistant_log = ChatLog(agent_id=agent_id, message=final_message, role="assistant")
-        
-        db.session.add(user_log)
-        db.session.add(assistant_log)
+    return Response(
+        stream_with_context(generate()),
+        mimetype='text/event-stream',
+        headers={'Cache-Control': 'no-cache', 'X-Accel-Buffering': 'no'}
+    )
+
+# Crear crew: grafo de tareas sobre agentes del usuario actual
+@api_bp.route('/crews', methods=['POST'])
+@token_required
+def create_crew(current_user):
+    try:
+        data = request.get_json() or {}
+        if not data.get('name'):
+            return jsonify({'message': 'El campo name es requerido'}), 400
+
+        error = _check_crew_tasks(data.get('tasks'), current_user.id)
+        if error:
+            return jsonify({'message': error}), 400
+
+        crew = CrewModel(name=data['name'], description=data.get('description'), user_id=current_user.id)
+        crew.tasks = _build_crew_tasks(data['tasks'])
+        db.session.add(crew)
         db.session.commit()
-        
-        return jsonify({"respuesta": final_message}), 200
-    
+        return jsonify({"message": "Crew creado exitosamente", "crew": crew.to_dict()}), 201
     except Exception as e:
         db.session.rollback()
-        return jsonify({'message': f'Error en el chat: {str(e)}'}), 500
+        return jsonify({'message': f'Error al crear crew: {str(e)}'}), 500
+
+# Listar crews del usuario actual
+@api_bp.route('/crews', methods=['GET'])
+@token_required
+def list_crews(current_user):
+    try:
+        crews = CrewModel.query.options(selectinload(CrewModel.tasks)).filter_by(
+            user_id=current_user.id
+        ).order_by(CrewModel.id).all()
+        return jsonify([crew.to_dict() for crew in crews]), 200
+    except Exception as e:
+        return jsonify({'message': f'Error al listar crews: {str(e)}'}), 500
+
+# Obtener crew del usuario actual
+@api_bp.route('/crews/<int:crew_id>', methods=['GET'])
+@token_required
+def get_crew(current_user, crew_id):
+    try:
+        crew = CrewModel.query.filter_by(id=crew_id, user_id=current_user.id).first()
+        if not crew:
+            return jsonify({'message': 'Crew no encontrado'}), 404
+        return jsonify(crew.to_dict()), 200
+    except Exception as e:
+        return jsonify({'message': f'Error al obtener crew: {str(e)}'}), 500
+
+# Actualizar crew (las tareas, si se envían, reemplazan a las anteriores)
+@api_bp.route('/crews/<int:crew_id>', methods=['PUT'])
+@token_required
+def update_crew(current_user, crew_id):
+    try:
+        data = request.get_json() or {}
+        crew = CrewModel.query.filter_by(id=crew_id, user_id=current_user.id).first()
+        if not crew:
+            return jsonify({'message': 'Crew no encontrado'}), 404
+
+        if 'tasks' in data:
+            error = _check_crew_tasks(data['tasks'], current_user.id)
+            if error:
+                return jsonify({'message': error}), 400
+            crew.tasks = []
+            db.session.flush()
+            crew.tasks = _build_crew_tasks(data['tasks'])
+
+        crew.name = data.get('name', crew.name)
+        crew.description = data.get('description', crew.description)
+        db.session.commit()
+        return jsonify({"message": "Crew actualizado correctamente", "crew": crew.to_dict()}), 200
+    except Exception as e:
+        db.session.rollback()
+        return jsonify({'message': f'Error al actualizar crew: {str(e)}'}), 500
+
+# Eliminar crew (sus tareas y ejecuciones se eliminan por ON DELETE CASCADE)
+@api_bp.route('/crews/<int:crew_id>', methods=['DELETE'])
+@token_required
+def delete_crew(current_user, crew_id):
+    try:
+        crew = CrewModel.query.filter_by(id=crew_id, user_id=current_user.id).first()
+        if not crew:
+            return jsonify({'message': 'Crew no encontrado'}), 404
+        db.session.delete(crew)
+        db.session.commit()
+        return jsonify({"message": "Crew eliminado correctamente"}), 200
+    except Exception as e:
+        db.session.rollback()
+        return jsonify({'message': f'Error al eliminar crew: {str(e)}'}), 500
+
+# Ejecutar crew. Con Accept: text/event-stream se emite un evento por tarea
+# (task_started, task_done, task_error, task_skipped) y uno final "done";
+# si no, se responde al terminar con el resultado de todas las tareas.
+@api_bp.route('/crews/<int:crew_id>/run', methods=['POST'])
+@token_required
+@admission_required(slots=lambda: _crew_run_slots())
+def run_crew_route(current_user, crew_id):
+    try:
+        data = request.get_json(silent=True) or {}
+        crew = CrewModel.query.filter_by(id=crew_id, user_id=current_user.id).first()
+        if not crew:
+            return jsonify({'message': 'Crew no encontrado'}), 404
+
+        # Un agente borrado elimina sus tareas; el grafo puede haber quedado roto
+        tasks = [task.to_dict() for task in crew.tasks]
+        error = validate_crew_tasks(tasks)
+        if error:
+            return jsonify({'message': f'Crew inválido: {error}'}), 409
+
+        plans = [TaskPlan(task['key'], task['agent_id'], task['description'], task['depends_on']) for task in tasks]
+        contexts = load_task_contexts(plans, current_user.id)
+        run = CrewRun(crew_id=crew.id, user_id=current_user.id, input=data.get('input'))
+        db.session.add(run)
+        db.session.commit()
+        run_id = run.id
+        release_connection()
+
+        events = run_crew(run_id, plans, contexts, current_user.id, data.get('input'), _crew_parallelism(tasks))
+        if _wants_event_stream():
+            def generate():
+                try:
+                    for event, payload in events:
+                        yield _sse(event, payload)
+                except Exception as e:
+                    yield _sse("error", {"message": f"Error en el crew: {str(e)}"})
+
+            return Response(
+                stream_with_context(generate()),
+                mimetype='text/event-stream',
+                headers={'Cache-Control': 'no-cache', 'X-Accel-Buffering': 'no'}
+            )
+
+        for _ in events:
+            pass
+        return jsonify(db.session.get(CrewRun, run_id).to_dict()), 200
+    except Exception as e:
+        db.session.rollback()
+        return jsonify({'message': f'Error al ejecutar crew: {str(e)}'}), 500
+
+def _crew_parallelism(tasks):
+    # Tareas simultáneas de una ejecución: el ancho del grafo, sin pasar de
+    # CREW_USER_CONCURRENCY ni de las plazas que reserva la admisión
+    limit = current_app.config.get('CREW_USER_CONCURRENCY', 4)
+    if current_app.config.get('ADMISSION_ENABLED', True):
+        limit = min(limit, current_app.config.get('ADMISSION_USER_MAX_IN_FLIGHT', 4),
+                    current_app.config.get('ADMISSION_GLOBAL_MAX_IN_FLIGHT', 32))
+    return max(1, min(limit, crew_width(tasks)))
+
+def _crew_run_slots():
+    # Se calcula antes de comprobar el propietario: un crew ajeno o inválido
+    # reserva una plaza y la ruta responde 404 o 409
+    tasks = [task.to_dict() for task in CrewTask.query.filter_by(crew_id=request.view_args['crew_id']).all()]
+    if not tasks or validate_crew_tasks(tasks):
+        return 1
+    return _crew_parallelism(tasks)
+
+# Resultado de una ejecución de crew
+@api_bp.route('/crews/runs/<int:run_id>', methods=['GET'])
+@token_required
+def get_crew_run(current_user, run_id):
+    run = db.session.get(CrewRun, run_id)
+    if not run or run.user_id != current_user.id:
+        return jsonify({'message': 'Ejecución no encontrada'}), 404
+    return jsonify(run.to_dict()), 200
+
+def _check_crew_tasks(tasks, user_id):
+    """Valida el grafo y que todos los agentes pertenezcan al usuario."""
+    error = validate_crew_tasks(tasks)
+    if error:
+        return error
+    agent_ids = {task['agent_id'] for task in tasks}
+    owned = {agent_id for (agent_id,) in db.session.query(AgentModel.id).filter(
+        AgentModel.id.in_(agent_ids), AgentModel.user_id == user_id
+    )}
+    missing = sorted(agent_ids - owned)
+    if missing:
+        return f"Agentes no encontrados: {', '.join(map(str, missing))}"
+    return None
+
+def _build_crew_tasks(tasks):
+    return [CrewTask(
+        key=task['key'],
+        agent_id=task['agent_id'],
+        description=task['description'],
+        depends_on=list(task.get('depends_on', [])),
+        position=position
+    ) for position, task in enumerate(tasks)]
 
 # Ruta de estado para verificar conectividad
 @api_bp.route('/status', methods=['GET'])
@@ -433,7 +1014,8 @@ def list_users(current_user):
         'id': user.id,
         'username': user.username,
         'email': user.email,
-        'is_admin': user.is_admin
+        'is_admin': user.is_admin,
+        'is_active': user.is_active
     } for user in users]
 
     return jsonify(user_list), 200
@@ -459,11 +1041,40 @@ def update_user_role(current_user, user_id):
         return jsonify({'message': 'Usuario no encontrado'}), 404
 
     user.is_admin = bool(is_admin)
+    invalidate_principal(user.id)
     db.session.commit()
 
     return jsonify({'message': f'Rol de usuario "{user.username}" actualizado correctamente'}), 200
 
 
+@api_bp.route('/admin/users/<int:user_id>/status', methods=['PUT'])
+@token_required
+def update_user_status(current_user, user_id):
+    if not current_user.is_admin:
+        return jsonify({'message': 'Acceso denegado'}), 403
+
+    if current_user.id == user_id:
+        return jsonify({'message': 'No puedes modificar tu propio estado'}), 400
+
+    data = request.get_json()
+    is_active = data.get('is_active')
+
+    if is_active is None:
+        return jsonify({'message': 'El campo "is_active" es requerido'}), 400
+
+    user = db.session.get(User, user_id)
+    if not user:
+        return jsonify({'message': 'Usuario no encontrado'}), 404
+
+    user.is_active = bool(is_active)
+    # Los tokens ya emitidos dejan de valer en todos los workers con el commit
+    invalidate_principal(user.id)
+    db.session.commit()
+
+    state = 'activado' if user.is_active else 'desactivado'
+    return jsonify({'message': f'Usuario "{user.username}" {state} correctamente'}), 200
+
+
 @api_bp.route('/admin/logs', methods=['GET'])
 @token_required
 def view_logs(current_user):
@@ -476,7 +1087,243 @@ def view_logs(current_user):
     log_list = [{
         'id': log.id,
         'timestamp': log.timestamp.isoformat(),
-        'event': log.event
+        'event': log.message
     } for log in logs]
 
     return jsonify(log_list), 200
+
+
+# Log de auditoría completo en NDJSON o CSV, en streaming (reanudable con ?after=<id>)
+@api_bp.route('/admin/logs/export', methods=['GET'])
+@token_required
+def export_logs(current_user):
+    if not current_user.is_admin:
+        return jsonify({'message': 'Acceso denegado'}), 403
+
+    params, error = _export_params()
+    if error:
+        return jsonify({'message': error}), 400
+    fmt, compress, start, end = params
+    after = request.args.get('after')
+    if after is not None:
+        if not after.isdigit():
+            return jsonify({'message': 'Parámetro after inválido'}), 400
+        after = int(after)
+    release_connection()
+
+    build_query, key = log_export_query(start, end)
+    rows = stream_export(
+        build_query, key, LOG_EXPORT_COLUMNS, fmt, compress, after,
+        chunk_rows=current_app.config.get('EXPORT_CHUNK_ROWS', 10000),
+        yield_per=current_app.config.get('EXPORT_YIELD_PER', 1000)
+    )
+    return _export_response(rows, f'audit-log.{fmt}', fmt, compress)
+
+
+@api_bp.route('/admin/llm/clients', methods=['GET'])
+@token_required
+def llm_client_stats(current_user):
+    if not current_user.is_admin:
+        return jsonify({'message': 'Acceso denegado'}), 403
+
+    return jsonify(get_client_stats()), 200
+
+
+@api_bp.route('/admin/llm/router', methods=['GET'])
+@token_required
+def llm_router_stats(current_user):
+    if not current_user.is_admin:
+        return jsonify({'message': 'Acceso denegado'}), 403
+
+    return jsonify(get_router_stats()), 200
+
+
+@api_bp.route('/admin/db/pool', methods=['GET'])
+@token_required
+def db_pool_stats(current_user):
+    if not current_user.is_admin:
+        return jsonify({'message': 'Acceso denegado'}), 403
+
+    return jsonify(get_db_stats()), 200
+
+
+@api_bp.route('/metrics', methods=['GET'])
+def metrics():
+    """
+    Métricas en formato de texto de Prometheus, agregadas entre todos los
+    workers. Acceso con METRICS_TOKEN como bearer, desde una IP de
+    METRICS_ALLOWED_IPS o con un token de administrador.
+    """
+    metrics_token = current_app.config.get('METRICS_TOKEN')
+    auth_header = request.headers.get('Authorization', '')
+    allowed = (
+        (metrics_token and hmac.compare_digest(auth_header, f'Bearer {metrics_token}'))
+        or request.remote_addr in current_app.config.get('METRICS_ALLOWED_IPS', [])
+    )
+    if not allowed:
+        current_user = get_current_user()
+        if not current_user:
+            return jsonify({'message': 'Token requerido'}), 401
+        if not current_user.is_admin:
+            return jsonify({'message': 'Acceso denegado'}), 403
+
+    body, content_type = render_metrics()
+    return Response(body, content_type=content_type)
+
+
+@api_bp.route('/admin/llm/cache', methods=['GET', 'DELETE'])
+@token_required
+def llm_cache(current_user):
+    if not current_user.is_admin:
+        return jsonify({'message': 'Acceso denegado'}), 403
+
+    cache = get_response_cache()
+    if request.method == 'DELETE':
+        cache.clear()
+        return jsonify({'message': 'Caché de respuestas vaciada'}), 200
+
+    return jsonify(cache.stats()), 200
+
+
+# Caché semántica de este worker: aciertos, memoria y últimos aciertos con
+# su similitud para revisar la calidad; DELETE la vacía (o solo ?agent_id=)
+@api_bp.route('/admin/llm/semantic-cache', methods=['GET', 'DELETE'])
+@token_required
+def llm_semantic_cache(current_user):
+    if not current_user.is_admin:
+        return jsonify({'message': 'Acceso denegado'}), 403
+
+    cache = get_semantic_cache()
+    if request.method == 'DELETE':
+        agent_id = request.args.get('agent_id', type=int)
+        if agent_id is not None:
+            cache.invalidate(agent_id)
+        else:
+            cache.clear()
+        return jsonify({'message': 'Caché semántica vaciada'}), 200
+
+    return jsonify(cache.stats()), 200
+
+
+@api_bp.route('/admin/agents/cache', methods=['GET'])
+@token_required
+def agent_cache_stats(current_user):
+    if not current_user.is_admin:
+        return jsonify({'message': 'Acceso denegado'}), 403
+
+    return jsonify(get_agent_cache_stats()), 200
+
+
+@api_bp.route('/admin/admission', methods=['GET'])
+@token_required
+def admission_stats(current_user):
+    if not current_user.is_admin:
+        return jsonify({'message': 'Acceso denegado'}), 403
+
+    return jsonify(get_admission_stats()), 200
+
+
+def _parse_utc(value):
+    # Los agregados guardan fechas UTC sin zona horaria
+    if not value:
+        return None
+    moment = datetime.fromisoformat(value)
+    if moment.tzinfo is not None:
+        moment = moment.astimezone(timezone.utc).replace(tzinfo=None)
+    return moment
+
+
+def _usage_params():
+    """Lee period, from, to y filtros de la consulta; devuelve (params, error)."""
+    period = request.args.get('period', 'day')
+    if period not in PERIODS:
+        return None, 'Parámetro period inválido (hour o day)'
+    try:
+        start, end = (_parse_utc(request.args.get(name)) for name in ('from', 'to'))
+    except ValueError:
+        return None, 'Parámetros from/to inválidos (formato ISO 8601)'
+    filters = {
+        'user_id': request.args.get('user_id', type=int),
+        'agent_id': request.args.get('agent_id', type=int),
+        'model': request.args.get('model'),
+    }
+    return (period, start, end, filters), None
+
+
+# Consumo de tokens por hora o día, leído de los agregados (no de chat_log)
+@api_bp.route('/admin/usage', methods=['GET'])
+@token_required
+def usage_report(current_user):
+    if not current_user.is_admin:
+        return jsonify({'message': 'Acceso denegado'}), 403
+
+    params, error = _usage_params()
+    if error:
+        return jsonify({'message': error}), 400
+    group_by = tuple(name for name in request.args.get('group_by', '').split(',') if name)
+    if any(name not in GROUP_COLUMNS for name in group_by):
+        return jsonify({'message': 'Parámetro group_by inválido (user, agent, model)'}), 400
+
+    period, start, end, filters = params
+    try:
+        return jsonify(usage_series(period, start, end, filters, group_by)), 200
+    except Exception as e:
+        return jsonify({'message': f'Error al consultar el consumo: {str(e)}'}), 500
+
+
+# Ranking de consumo por usuario, agente o modelo en un intervalo
+@api_bp.route('/admin/usage/top', methods=['GET'])
+@token_required
+def usage_top(current_user):
+    if not current_user.is_admin:
+        return jsonify({'message': 'Acceso denegado'}), 403
+
+    params, error = _usage_params()
+    if error:
+        return jsonify({'message': error}), 400
+    by = request.args.get('by', 'user')
+    if by not in GROUP_COLUMNS:
+        return jsonify({'message': 'Parámetro by inválido (user, agent, model)'}), 400
+    limit = max(1, min(request.args.get('limit', 20, type=int), 100))
+
+    period, start, end, filters = params
+    try:
+        return jsonify(usage_totals(period, by, start, end, filters, limit)), 200
+    except Exception as e:
+        return jsonify({'message': f'Error al consultar el consumo: {str(e)}'}), 500
+
+
+@api_bp.route('/admin/auth/cache', methods=['GET'])
+@token_required
+def auth_cache_stats(current_user):
+    if not current_user.is_admin:
+        return jsonify({'message': 'Acceso denegado'}), 403
+
+    return jsonify(get_principal_cache_stats()), 200
+
+
+@api_bp.route('/admin/logs/stats', methods=['GET'])
+@token_required
+def audit_log_stats(current_user):
+    if not current_user.is_admin:
+        return jsonify({'message': 'Acceso denegado'}), 403
+
+    return jsonify(get_audit_stats()), 200
+
+
+@api_bp.route('/admin/mail/outbox', methods=['GET'])
+@token_required
+def mail_outbox_stats(current_user):
+    if not current_user.is_admin:
+        return jsonify({'message': 'Acceso denegado'}), 403
+
+    return jsonify(get_mail_stats()), 200
+
+
+@api_bp.route('/admin/tools/stats', methods=['GET'])
+@token_required
+def tool_stats(current_user):
+    if not current_user.is_admin:
+        return jsonify({'message': 'Acceso denegado'}), 403
+
+    return jsonify(get_tool_stats()), 200
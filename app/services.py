@@ -1,23 +1,569 @@
 import os
+import time
 import logging
-from openai import OpenAI
-from openai.types.chat import (
-    ChatCompletionSystemMessageParam,
-    ChatCompletionUserMessageParam
-)
-from openai.types.chat.chat_completion_tool_param import ChatCompletionToolParam
-from app.models import Agent as AgentModel, db
-
-# Configuración del cliente OpenAI
-client = OpenAI(api_key=os.getenv("OPENAI_API_KEY"))
+import threading
+from collections import namedtuple
+from concurrent.futures import ThreadPoolExecutor, FIRST_COMPLETED, wait
+from flask import current_app
+from sqlalchemy import delete, func, select, true, update
+from app.models import Agent as AgentModel, AgentTool, ChatLog, ChatSummary, User, db
+from app.utils.llm_router import get_llm_router
+from app.utils.cache import get_response_cache, make_cache_key
+from app.utils.semantic_cache import get_semantic_cache, is_follow_up, semantic_scope, word_count
+from app.utils.context_builder import build_history
+from app.utils.jobs import update_job
+from app.utils.metrics import LLMTimer
+from app.utils.resilience import LLMUnavailable
+from app.utils.tools import run_tool_calls
+from app.utils.usage import TurnUsage, record_usage, record_usage_separately
+from app.utils.agent_cache import CompiledAgent, build_tools, get_compiled_agent, invalidate_agents
+
 logger = logging.getLogger(__name__)
 
+# Datos necesarios para llamar al modelo, desacoplados de la sesión de BD
+ChatContext = namedtuple('ChatContext', [
+    'agent_id', 'prompt', 'provider', 'model', 'temperature', 'max_tokens', 'tools', 'history', 'cache_enabled',
+    'request_timeout', 'semantic_cache_enabled', 'semantic_cache_threshold'
+])
+
+# Resumen acumulado leído junto con el historial
+HistorySummary = namedtuple('HistorySummary', ['summary', 'last_chat_id'])
+
+
+def build_messages(system_prompt, history, message):
+    """
+    Construye la lista de mensajes: prompt de sistema, historial y mensaje actual.
+
+    Args:
+        system_prompt (str): prompt del agente.
+        history (list): mensajes {"role", "content"} en orden cronológico.
+        message (str): mensaje actual del usuario.
+    """
+    messages = [{"role": "system", "content": system_prompt}]
+    messages.extend(history)
+    messages.append({"role": "user", "content": message})
+    return messages
+
+
+def load_history_window(agent_id, limit):
+    """
+    Trae en una sola consulta los `limit` mensajes más recientes del agente y
+    su resumen acumulado. La fila del agente ancla el resultado, así que el
+    resumen llega aunque no haya mensajes.
+
+    Returns:
+        tuple | None: (mensajes del más reciente al más antiguo, HistorySummary
+        o None), o None si el agente ya no existe.
+    """
+    recent = select(ChatLog.id, ChatLog.role, ChatLog.message, ChatLog.timestamp).where(
+        ChatLog.agent_id == agent_id
+    ).order_by(ChatLog.timestamp.desc(), ChatLog.id.desc()).limit(limit).subquery()
+
+    rows = db.session.execute(
+        select(
+            ChatSummary.summary.label('summary_text'),
+            ChatSummary.last_chat_id.label('summary_last_chat_id'),
+            recent.c.id, recent.c.role, recent.c.message
+        ).select_from(AgentModel)
+        .outerjoin(ChatSummary, ChatSummary.agent_id == AgentModel.id)
+        .outerjoin(recent, true())
+        .where(AgentModel.id == agent_id)
+        .order_by(recent.c.timestamp.desc(), recent.c.id.desc())
+    ).all()
+    if not rows:
+        return None
+
+    first = rows[0]
+    summary = None
+    if first.summary_text is not None:
+        summary = HistorySummary(first.summary_text, first.summary_last_chat_id)
+    return [row for row in rows if row.id is not None], summary
+
+
+def load_chat_context(agent_id, user_id):
+    """
+    Toma la configuración compilada del agente (desde la caché del worker) y
+    carga historial reciente y resumen en una sola consulta, copiándolo todo a
+    un ChatContext inmutable, de modo que la sesión pueda cerrarse (y la
+    conexión volver al pool) antes de llamar al modelo. El historial se
+    recorta según un presupuesto de tokens.
+
+    Returns:
+        ChatContext | None: None si el agente no existe o no pertenece al usuario.
+    """
+    agent = get_compiled_agent(agent_id)
+    if not agent or agent.user_id != user_id:
+        return None
+
+    history_limit = current_app.config.get('CHAT_HISTORY_MAX_MESSAGES', 50)
+    window = load_history_window(agent_id, history_limit)
+    if window is None:
+        return None
+    recent_chats, summary = window
+
+    return ChatContext(
+        agent_id=agent.id,
+        prompt=agent.prompt,
+        provider=agent.provider,
+        model=agent.model,
+        temperature=agent.temperature,
+        max_tokens=agent.max_tokens,
+        tools=agent.tools,
+        history=build_history(agent, recent_chats, summary),
+        cache_enabled=agent.cache_enabled,
+        request_timeout=agent.request_timeout,
+        semantic_cache_enabled=agent.semantic_cache_enabled,
+        semantic_cache_threshold=agent.semantic_cache_threshold
+    )
+
+
+def get_agents_version(user_id):
+    """Versión actual del conjunto de agentes del usuario."""
+    return db.session.execute(select(User.agents_version).where(User.id == user_id)).scalar()
+
+
+def touch_agents_version(user_ids):
+    """
+    Incrementa la versión del conjunto de agentes de los usuarios indicados
+    para invalidar los ETag de /agents. No confirma la transacción.
+    """
+    user_ids = set(user_ids)
+    if user_ids:
+        db.session.execute(
+            update(User).where(User.id.in_(user_ids)).values(agents_version=User.agents_version + 1),
+            execution_options={'synchronize_session': False}
+        )
+
+
+def tool_owner_ids(tool_id):
+    """IDs de los usuarios con algún agente que usa la herramienta."""
+    return db.session.execute(
+        select(AgentModel.user_id).join(AgentTool, AgentTool.agent_id == AgentModel.id)
+        .where(AgentTool.tool_id == tool_id).distinct()
+    ).scalars().all()
+
+
+def release_connection():
+    """Cierra la sesión actual para devolver la conexión al pool."""
+    db.session.close()
+
+
+def _add_chat_turn(agent_id, user_message, reply, usage):
+    db.session.add(ChatLog(agent_id=agent_id, message=user_message, role="user"))
+    db.session.add(ChatLog(
+        agent_id=agent_id,
+        message=reply,
+        role="assistant",
+        model=usage.model if usage else None,
+        prompt_tokens=usage.prompt_tokens if usage else None,
+        completion_tokens=usage.completion_tokens if usage else None,
+        latency_ms=usage.latency_ms if usage else None
+    ))
+
+
+def save_chat_turn(agent_id, user_message, reply, usage=None):
+    """
+    Guarda el par de mensajes usuario/asistente en una transacción corta y,
+    si se indica el consumo (TurnUsage), lo suma a los agregados de uso.
+    """
+    try:
+        _add_chat_turn(agent_id, user_message, reply, usage)
+        if usage:
+            record_usage([usage])
+        db.session.commit()
+    except Exception:
+        db.session.rollback()
+        raise
+
+
+def save_chat_turns(turns):
+    """
+    Guarda varios pares usuario/asistente, y su consumo, en una sola transacción.
+
+    Args:
+        turns (list): tuplas (agent_id, mensaje del usuario, respuesta, TurnUsage o None).
+    """
+    try:
+        for agent_id, user_message, reply, usage in turns:
+            _add_chat_turn(agent_id, user_message, reply, usage)
+        usages = [usage for _, _, _, usage in turns if usage]
+        if usages:
+            record_usage(usages)
+        db.session.commit()
+    except Exception:
+        db.session.rollback()
+        raise
+
+
+def delete_chat_history(agent_id):
+    """
+    Elimina el historial de un agente con un único DELETE en el servidor,
+    sin cargar los mensajes en memoria. No confirma la transacción.
+
+    Returns:
+        int: número de mensajes eliminados.
+    """
+    deleted = db.session.execute(delete(ChatLog).where(ChatLog.agent_id == agent_id)).rowcount
+    # El resumen acumulado ya no corresponde a ningún mensaje
+    db.session.execute(delete(ChatSummary).where(ChatSummary.agent_id == agent_id))
+    return deleted
+
+
+def purge_chat_history(job_id, agent_id, delete_agent=False):
+    """
+    Trabajo en segundo plano: elimina el historial de un agente por lotes de
+    CHAT_DELETE_CHUNK_SIZE filas, cada uno en su propia transacción, e informa
+    el progreso. Si delete_agent es True, al final elimina también el agente.
+    """
+    chunk_size = int(current_app.config.get('CHAT_DELETE_CHUNK_SIZE', 5000))
+    total = db.session.execute(
+        select(func.count()).select_from(ChatLog).where(ChatLog.agent_id == agent_id)
+    ).scalar()
+    update_job(job_id, total=total)
+
+    deleted = 0
+    while True:
+        chunk_ids = select(ChatLog.id).where(ChatLog.agent_id == agent_id).limit(chunk_size).scalar_subquery()
+        count = db.session.execute(delete(ChatLog).where(ChatLog.id.in_(chunk_ids))).rowcount
+        db.session.commit()
+        deleted += count
+        update_job(job_id, progress=deleted)
+        if count < chunk_size:
+            break
+
+    db.session.execute(delete(ChatSummary).where(ChatSummary.agent_id == agent_id))
+    if delete_agent:
+        owner_id = db.session.execute(select(AgentModel.user_id).where(AgentModel.id == agent_id)).scalar()
+        if owner_id is not None:
+            touch_agents_version([owner_id])
+        db.session.execute(delete(AgentModel).where(AgentModel.id == agent_id))
+        invalidate_agents([agent_id])
+    db.session.commit()
+
+
+def _cache_key(ctx, messages):
+    if not ctx.cache_enabled:
+        return None
+    return make_cache_key(ctx.model, messages, ctx.tools, ctx.temperature, ctx.max_tokens)
+
+
+def _semantic_lookup(ctx, messages):
+    """
+    (ámbito, pregunta, umbral) para la caché semántica, o None si el agente
+    no la usa o el último mensaje no es una pregunta del usuario con al menos
+    SEMANTIC_CACHE_MIN_WORDS palabras significativas.
+    """
+    if not ctx.semantic_cache_enabled or not messages or messages[-1].get('role') != 'user':
+        return None
+    question = messages[-1].get('content') or ''
+    if word_count(question) < int(current_app.config.get('SEMANTIC_CACHE_MIN_WORDS', 2)):
+        return None
+    threshold = ctx.semantic_cache_threshold or float(current_app.config.get('SEMANTIC_CACHE_THRESHOLD', 0.92))
+    # El historial del agente crece en cada turno: solo las preguntas de
+    # seguimiento llevan al ámbito el resumen y el último intercambio
+    context = None
+    if is_follow_up(question):
+        history = messages[1:-1]
+        context = [m for m in history if m.get('role') == 'system'] + [m for m in history if m.get('role') != 'system'][-2:]
+    scope = semantic_scope(ctx.model, ctx.prompt, ctx.tools, ctx.temperature, ctx.max_tokens, context)
+    return scope, question, threshold
+
+
+def complete_chat(router, ctx, messages, usage=None):
+    """
+    Ejecuta la conversación sin streaming. Si el agente tiene la caché
+    habilitada, una llamada idéntica devuelve la respuesta guardada; con la
+    caché semántica, también una pregunta parecida a otra ya respondida.
+
+    Args:
+        usage (dict): si se indica, acumula prompt_tokens y completion_tokens
+            de todas las llamadas al modelo (cero si la respuesta viene de caché).
+
+    Returns:
+        str: respuesta final del modelo.
+    """
+    if usage is not None:
+        usage.setdefault('prompt_tokens', 0)
+        usage.setdefault('completion_tokens', 0)
+
+    cache_key = _cache_key(ctx, messages)
+    if cache_key:
+        cached = get_response_cache().get(cache_key)
+        if cached is not None:
+            return cached
+
+    semantic = _semantic_lookup(ctx, messages)
+    if semantic:
+        scope, question, threshold = semantic
+        cached = get_semantic_cache().lookup(ctx.agent_id, scope, question, threshold)
+        if cached is not None:
+            return cached
+
+    reply = _complete_chat(router, ctx, messages, usage)
+    if cache_key:
+        get_response_cache().set(cache_key, reply)
+    if semantic:
+        get_semantic_cache().store(ctx.agent_id, scope, question, reply)
+    return reply
+
+
+def stream_chat(router, ctx, messages, usage=None):
+    """
+    Versión en streaming de complete_chat. Una respuesta en caché se emite
+    como un único fragmento; solo se guarda en caché un stream completo.
+
+    Args:
+        usage (dict): como en complete_chat; se rellena al terminar cada stream.
+
+    Yields:
+        tuple: ("token", str) por cada fragmento de texto y
+               ("tool", dict) por cada herramienta ejecutada.
+    """
+    if usage is not None:
+        usage.setdefault('prompt_tokens', 0)
+        usage.setdefault('completion_tokens', 0)
+
+    cache_key = _cache_key(ctx, messages)
+    if cache_key:
+        cached = get_response_cache().get(cache_key)
+        if cached is not None:
+            yield "token", cached
+            return
+
+    semantic = _semantic_lookup(ctx, messages)
+    if semantic:
+        scope, question, threshold = semantic
+        cached = get_semantic_cache().lookup(ctx.agent_id, scope, question, threshold)
+        if cached is not None:
+            yield "token", cached
+            return
+
+    parts = []
+    for kind, value in _stream_chat(router, ctx, messages, usage):
+        if kind == "token":
+            parts.append(value)
+        yield kind, value
+
+    if cache_key:
+        get_response_cache().set(cache_key, "".join(parts))
+    if semantic:
+        get_semantic_cache().store(ctx.agent_id, scope, question, "".join(parts))
+
+
+def _max_tool_rounds():
+    return int(current_app.config.get('TOOL_MAX_ROUNDS', 3))
+
+
+def _tool_round_messages(tool_calls, results):
+    """Mensajes assistant (con tool_calls) y tool que se añaden tras una ronda."""
+    messages = [{"role": "assistant", "content": None, "tool_calls": tool_calls}]
+    for call, result in zip(tool_calls, results):
+        messages.append({"role": "tool", "tool_call_id": call["id"], "content": result})
+    return messages
+
+
+def _add_usage(usage, response_usage):
+    if usage is not None and response_usage is not None:
+        usage['prompt_tokens'] += response_usage.prompt_tokens or 0
+        usage['completion_tokens'] += response_usage.completion_tokens or 0
+
+
+def _complete_chat(router, ctx, messages, usage=None):
+    """
+    Llama al modelo y, mientras pida herramientas, las ejecuta en paralelo y
+    vuelve a llamarlo, hasta TOOL_MAX_ROUNDS rondas. En la última llamada no
+    se ofrecen herramientas para obligar a una respuesta final.
+    """
+    max_rounds = _max_tool_rounds()
+    rounds = 0
+    while True:
+        offer_tools = bool(ctx.tools) and rounds < max_rounds
+        with LLMTimer(ctx.model):
+            response = router.completion(
+                ctx.provider,
+                ctx.model,
+                messages=messages,
+                tools=ctx.tools if offer_tools else None,
+                tool_choice="auto" if offer_tools else None,
+                temperature=ctx.temperature,
+                max_tokens=ctx.max_tokens,
+                timeout=ctx.request_timeout
+            )
+        _add_usage(usage, response.usage)
+
+        assistant_message = response.choices[0].message
+        if not assistant_message.tool_calls:
+            return assistant_message.content
+
+        tool_calls = [tc.model_dump() for tc in assistant_message.tool_calls]
+        results = run_tool_calls([
+            {"id": tc["id"], "name": tc["function"]["name"], "arguments": tc["function"]["arguments"]}
+            for tc in tool_calls
+        ])
+        messages = messages + _tool_round_messages(tool_calls, results)
+        rounds += 1
+
+
+def _stream_chat(router, ctx, messages, usage=None):
+    """
+    Genera la respuesta del modelo en streaming. Si el modelo pide
+    tool_calls, se ejecutan en paralelo y se abre otra llamada en streaming
+    con sus resultados, hasta TOOL_MAX_ROUNDS rondas.
+    """
+    max_rounds = _max_tool_rounds()
+    rounds = 0
+    while True:
+        offer_tools = bool(ctx.tools) and rounds < max_rounds
+        # Los tool_calls llegan fragmentados; se acumulan por índice
+        pending_calls = {}
+        with LLMTimer(ctx.model, stream=True) as timer:
+            stream = router.completion(
+                ctx.provider,
+                ctx.model,
+                messages=messages,
+                tools=ctx.tools if offer_tools else None,
+                tool_choice="auto" if offer_tools else None,
+                temperature=ctx.temperature,
+                max_tokens=ctx.max_tokens,
+                timeout=ctx.request_timeout,
+                stream=True,
+                # El consumo llega en el último fragmento (sin choices en
+                # OpenAI, junto al último delta en litellm)
+                stream_options={"include_usage": True} if usage is not None else None
+            )
+            for chunk in stream:
+                _add_usage(usage, getattr(chunk, 'usage', None))
+                if not chunk.choices:
+                    continue
+                delta = chunk.choices[0].delta
+                if delta.content or delta.tool_calls:
+                    timer.first_token()
+                if delta.content:
+                    yield "token", delta.content
+                for tc in delta.tool_calls or []:
+                    call = pending_calls.setdefault(tc.index, {"id": None, "name": "", "arguments": ""})
+                    if tc.id:
+                        call["id"] = tc.id
+                    if tc.function and tc.function.name:
+                        call["name"] += tc.function.name
+                    if tc.function and tc.function.arguments:
+                        call["arguments"] += tc.function.arguments
+
+        if not pending_calls:
+            return
+
+        calls = [pending_calls[index] for index in sorted(pending_calls)]
+        results = run_tool_calls(calls)
+        for call, result in zip(calls, results):
+            yield "tool", {"name": call["name"], "result": result}
+
+        tool_calls = [{
+            "id": call["id"],
+            "type": "function",
+            "function": {"name": call["name"], "arguments": call["arguments"]}
+        } for call in calls]
+        messages = messages + _tool_round_messages(tool_calls, results)
+        rounds += 1
+
+
+_batch_executor = None
+_batch_executor_lock = threading.Lock()
+
+
+def _get_batch_executor():
+    global _batch_executor
+    if _batch_executor is None:
+        with _batch_executor_lock:
+            if _batch_executor is None:
+                _batch_executor = ThreadPoolExecutor(
+                    max_workers=int(current_app.config.get('CHAT_BATCH_POOL_SIZE', 16)),
+                    thread_name_prefix='chat-batch'
+                )
+    return _batch_executor
+
+
+def _run_batch_item(app, ctx, message):
+    started = time.perf_counter()
+    try:
+        usage = {}
+        with app.app_context():
+            messages = build_messages(ctx.prompt, ctx.history, message)
+            reply = complete_chat(get_llm_router(), ctx, messages, usage)
+        result = {"status": "ok", "respuesta": reply, "usage": usage}
+    except LLMUnavailable as e:
+        logger.warning("Modelo no disponible en un elemento del lote (agente %s): %s", ctx.agent_id, e.message)
+        result = {"status": "error", "error": e.message, "reason": e.reason, "retry_after": e.retry_after}
+    except Exception as e:
+        logger.exception("Error en un elemento del lote (agente %s)", ctx.agent_id)
+        result = {"status": "error", "error": str(e)}
+    result["elapsed_ms"] = round((time.perf_counter() - started) * 1000, 1)
+    return result
+
+
+def run_chat_batch(items, contexts, concurrency):
+    """
+    Ejecuta las llamadas al modelo de un lote en paralelo, con como mucho
+    `concurrency` llamadas en vuelo a la vez. Un fallo solo afecta a su
+    elemento. No toca la base de datos.
+
+    Args:
+        items (list): tuplas (agent_id, mensaje) en el orden de la petición.
+        contexts (dict): agent_id -> ChatContext, o None si no está disponible.
+        concurrency (int): máximo de llamadas simultáneas de este lote.
+
+    Returns:
+        list: un dict por elemento, en el mismo orden que `items`.
+    """
+    app = current_app._get_current_object()
+    executor = _get_batch_executor()
+    results = [None] * len(items)
+    remaining = iter(enumerate(items))
+    pending = {}
+
+    def submit_next():
+        for index, (agent_id, message) in remaining:
+            ctx = contexts.get(agent_id)
+            if ctx is None:
+                results[index] = {"status": "error", "error": "Agente no encontrado", "elapsed_ms": 0.0}
+                continue
+            pending[executor.submit(_run_batch_item, app, ctx, message)] = index
+            return
+
+    for _ in range(concurrency):
+        submit_next()
+    while pending:
+        done, _ = wait(pending, return_when=FIRST_COMPLETED)
+        for future in done:
+            results[pending.pop(future)] = future.result()
+            submit_next()
+
+    return [
+        {"index": index, "agent_id": agent_id, **result}
+        for index, ((agent_id, _), result) in enumerate(zip(items, results))
+    ]
+
+
+def _record_call_usage(agent, response_usage, latency_ms):
+    # Sin ChatLog asociado: solo se suma a los agregados de uso, en una
+    # transacción propia para no confirmar ni deshacer la del llamador
+    if response_usage is None or getattr(agent, 'user_id', None) is None:
+        return
+    record_usage_separately([TurnUsage(
+        user_id=agent.user_id,
+        agent_id=agent.id,
+        model=agent.model,
+        prompt_tokens=response_usage.prompt_tokens,
+        completion_tokens=response_usage.completion_tokens,
+        latency_ms=latency_ms
+    )])
+
+
 def call_llm(agent, message, use_tools=True, debug=False):
     """
     Realiza una llamada a un modelo LLM (OpenAI) con o sin herramientas.
 
     Args:
-        agent: objeto agente (de la base de datos).
+        agent: agente compilado (CompiledAgent) u objeto agente de la base de datos.
         message (str): mensaje del usuario.
         use_tools (bool): si se deben incluir herramientas en la llamada.
         debug (bool): si se debe imprimir información de depuración.
@@ -28,23 +574,14 @@ def call_llm(agent, message, use_tools=True, debug=False):
     try:
         # Preparar mensajes
         messages = [
-            ChatCompletionSystemMessageParam(role="system", content=agent.prompt),
-            ChatCompletionUserMessageParam(role="user", content=message)
+            {"role": "system", "content": agent.prompt},
+            {"role": "user", "content": message}
         ]
 
         # Construir tools si corresponde
-        tools: list[ChatCompletionToolParam] = []
+        tools = []
         if use_tools and hasattr(agent, 'tools'):
-            for tool in agent.tools:
-                if tool.parameters:
-                    tools.append({
-                        "type": "function",
-                        "function": {
-                            "name": tool.name,
-                            "description": tool.description,
-                            "parameters": tool.parameters
-                        }
-                    })
+            tools = agent.tools if isinstance(agent, CompiledAgent) else build_tools(agent)
 
         if debug:
             print("===== Llamada a OpenAI =====")
@@ -53,14 +590,27 @@ def call_llm(agent, message, use_tools=True, debug=False):
             print("Tools:", tools)
             print("=============================")
 
-        # Ejecutar llamada al modelo
-        response = client.chat.completions.create(
-            model=agent.model,
-            messages=messages,
-            tools=tools if tools else None,
-            temperature=agent.temperature,
-            max_tokens=agent.max_tokens
-        )
+        # Respuesta en caché si el agente la tiene habilitada
+        cache_key = None
+        if getattr(agent, 'cache_enabled', False):
+            cache_key = make_cache_key(agent.model, messages, tools, agent.temperature, agent.max_tokens)
+            cached = get_response_cache().get(cache_key)
+            if cached is not None:
+                return cached
+
+        # Ejecutar llamada al modelo a través del router de proveedores
+        started = time.perf_counter()
+        with LLMTimer(agent.model):
+            response = get_llm_router().completion(
+                agent.provider,
+                agent.model,
+                messages=messages,
+                tools=tools if tools else None,
+                temperature=agent.temperature,
+                max_tokens=agent.max_tokens,
+                timeout=getattr(agent, 'request_timeout', None)
+            )
+        _record_call_usage(agent, response.usage, (time.perf_counter() - started) * 1000)
 
         if debug:
             print("===== Respuesta bruta de OpenAI =====")
@@ -68,10 +618,16 @@ def call_llm(agent, message, use_tools=True, debug=False):
             print("=============================")
 
         if response.choices and response.choices[0].message:
-            return response.choices[0].message.content
+            content = response.choices[0].message.content
+            if cache_key:
+                get_response_cache().set(cache_key, content)
+            return content
         else:
             return "La respuesta está vacía o no contiene contenido."
 
+    except LLMUnavailable as e:
+        logger.warning("Modelo no disponible (%s): %s", e.reason, e.message)
+        return f"Modelo no disponible temporalmente: {e.message}"
     except Exception as e:
         logger.exception(f"Error al llamar al modelo LLM: {str(e)}")
         return f"Error en la llamada al modelo: {str(e)}"
@@ -91,7 +647,7 @@ def call_llm_from_id(agent_id, message, use_tools=True, debug=False):
         str: respuesta generada por el modelo, o mensaje de error.
     """
     try:
-        agent = AgentModel.query.get(agent_id)
+        agent = get_compiled_agent(agent_id)
         if not agent:
             return f"No se encontró ningún agente con ID {agent_id}."
 
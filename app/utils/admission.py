@@ -0,0 +1,360 @@
+# app/utils/admission.py
+
+import os
+import math
+import time
+import uuid
+import threading
+from functools import wraps
+from flask import current_app, jsonify, make_response
+
+
+class MemoryAdmissionBackend:
+    """Cubos de tokens y contadores de llamadas en curso en memoria del proceso."""
+
+    name = 'memory'
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._buckets = {}  # clave -> (tokens, instante de la última recarga)
+        self._slots = {}    # clave -> llamadas en curso
+
+    def take_tokens(self, key, rate, burst, cost):
+        """
+        Consume `cost` tokens del cubo `key` si hay suficientes.
+
+        Returns:
+            tuple: (admitido, segundos hasta que haya tokens suficientes)
+        """
+        now = time.monotonic()
+        with self._lock:
+            tokens, updated = self._buckets.get(key, (burst, now))
+            tokens = min(burst, tokens + (now - updated) * rate)
+            if tokens >= cost:
+                self._buckets[key] = (tokens - cost, now)
+                return True, 0.0
+            self._buckets[key] = (tokens, now)
+            return False, (cost - tokens) / rate
+
+    def refund_tokens(self, key, burst, cost):
+        """Devuelve al cubo `key` tokens consumidos por una petición no admitida."""
+        with self._lock:
+            if key in self._buckets:
+                tokens, updated = self._buckets[key]
+                self._buckets[key] = (min(burst, tokens + cost), updated)
+
+    def acquire_slots(self, key, count, limit, holder):
+        with self._lock:
+            current = self._slots.get(key, 0)
+            if current + count > limit:
+                return False
+            self._slots[key] = current + count
+            return True
+
+    def release_slots(self, key, count, holder):
+        with self._lock:
+            current = self._slots.get(key, 0) - count
+            if current > 0:
+                self._slots[key] = current
+            else:
+                self._slots.pop(key, None)
+
+    def in_flight(self, key):
+        with self._lock:
+            return self._slots.get(key, 0)
+
+
+class RedisAdmissionBackend:
+    """
+    Backend compartido por todos los workers sobre Redis (requiere el paquete
+    opcional `redis`). Las operaciones son scripts Lua atómicos. Las plazas
+    ocupadas son un ZSET por clave con un miembro por plaza y su plazo
+    (`slot_ttl` desde que se ocupó) como puntuación: cada intento de ocupar
+    descarta las vencidas, así que las de un worker que muere sin liberarlas
+    caducan solas, y liberar una plaza ya vencida no afecta a las demás.
+    """
+
+    name = 'redis'
+
+    TAKE_TOKENS = """
+    local now_parts = redis.call('TIME')
+    local now = tonumber(now_parts[1]) + tonumber(now_parts[2]) / 1000000
+    local rate = tonumber(ARGV[1])
+    local burst = tonumber(ARGV[2])
+    local cost = tonumber(ARGV[3])
+    local data = redis.call('HMGET', KEYS[1], 'tokens', 'ts')
+    local tokens = tonumber(data[1]) or burst
+    local ts = tonumber(data[2]) or now
+    tokens = math.min(burst, tokens + math.max(now - ts, 0) * rate)
+    local allowed = 0
+    local wait = 0
+    if tokens >= cost then
+        tokens = tokens - cost
+        allowed = 1
+    else
+        wait = (cost - tokens) / rate
+    end
+    redis.call('HSET', KEYS[1], 'tokens', tokens, 'ts', now)
+    redis.call('PEXPIRE', KEYS[1], math.ceil(burst / rate * 1000) + 1000)
+    return {allowed, tostring(wait)}
+    """
+
+    REFUND_TOKENS = """
+    local tokens = tonumber(redis.call('HGET', KEYS[1], 'tokens'))
+    if tokens then
+        redis.call('HSET', KEYS[1], 'tokens', math.min(tonumber(ARGV[1]), tokens + tonumber(ARGV[2])))
+    end
+    return 1
+    """
+
+    ACQUIRE_SLOTS = """
+    local now_parts = redis.call('TIME')
+    local now = tonumber(now_parts[1]) + tonumber(now_parts[2]) / 1000000
+    local count = tonumber(ARGV[2])
+    local ttl = tonumber(ARGV[4])
+    redis.call('ZREMRANGEBYSCORE', KEYS[1], '-inf', now)
+    if redis.call('ZCARD', KEYS[1]) + count > tonumber(ARGV[3]) then
+        return 0
+    end
+    for i = 1, count do
+        redis.call('ZADD', KEYS[1], now + ttl, ARGV[1] .. ':' .. i)
+    end
+    -- La clave dura lo que la plaza más reciente; no alarga las demás
+    redis.call('PEXPIRE', KEYS[1], math.ceil(ttl * 1000))
+    return 1
+    """
+
+    IN_FLIGHT = """
+    local now_parts = redis.call('TIME')
+    local now = tonumber(now_parts[1]) + tonumber(now_parts[2]) / 1000000
+    redis.call('ZREMRANGEBYSCORE', KEYS[1], '-inf', now)
+    return redis.call('ZCARD', KEYS[1])
+    """
+
+    def __init__(self, url, prefix='admission:', slot_ttl=300):
+        try:
+            import redis
+        except ImportError:
+            raise RuntimeError("Se requiere el paquete 'redis' para usar ADMISSION_REDIS_URL")
+        self.prefix = prefix
+        self.slot_ttl = float(slot_ttl)
+        self._redis = redis.Redis.from_url(url, socket_timeout=0.2)
+        self._take_tokens = self._redis.register_script(self.TAKE_TOKENS)
+        self._refund_tokens = self._redis.register_script(self.REFUND_TOKENS)
+        self._acquire_slots = self._redis.register_script(self.ACQUIRE_SLOTS)
+        self._in_flight = self._redis.register_script(self.IN_FLIGHT)
+
+    def take_tokens(self, key, rate, burst, cost):
+        allowed, wait = self._take_tokens(keys=[self.prefix + 'bucket:' + key], args=[rate, burst, cost])
+        return bool(allowed), float(wait)
+
+    def refund_tokens(self, key, burst, cost):
+        self._refund_tokens(keys=[self.prefix + 'bucket:' + key], args=[burst, cost])
+
+    def acquire_slots(self, key, count, limit, holder):
+        return bool(self._acquire_slots(keys=[self.prefix + 'slots:' + key],
+                                        args=[holder, count, limit, self.slot_ttl]))
+
+    def release_slots(self, key, count, holder):
+        self._redis.zrem(self.prefix + 'slots:' + key, *(f'{holder}:{i}' for i in range(1, count + 1)))
+
+    def in_flight(self, key):
+        return int(self._in_flight(keys=[self.prefix + 'slots:' + key]))
+
+
+class AdmissionRejected(Exception):
+    def __init__(self, status, message, retry_after, reason):
+        super().__init__(message)
+        self.status = status
+        self.message = message
+        self.retry_after = max(1, math.ceil(retry_after))
+        self.reason = reason
+
+
+class AdmissionTicket:
+    """Plazas ocupadas por una petición admitida; release() es idempotente."""
+
+    def __init__(self, backend, keys, count, holder):
+        self._backend = backend
+        self._keys = keys
+        self._count = count
+        self._holder = holder
+        self._released = False
+        self._lock = threading.Lock()
+
+    def release(self):
+        with self._lock:
+            if self._released:
+                return
+            self._released = True
+        for key in self._keys:
+            try:
+                self._backend.release_slots(key, self._count, self._holder)
+            except Exception:
+                _count('backend_errors')
+
+
+_backend = None
+_backend_lock = threading.Lock()
+_stats_lock = threading.Lock()
+_stats = {
+    'admitted': 0,
+    'rejected_user_rate': 0,
+    'rejected_global_rate': 0,
+    'rejected_user_in_flight': 0,
+    'rejected_global_in_flight': 0,
+    'backend_errors': 0,
+}
+
+
+def _count(name):
+    with _stats_lock:
+        _stats[name] += 1
+
+
+def get_admission_backend():
+    """Backend configurado: Redis si ADMISSION_REDIS_URL, si no memoria del proceso."""
+    global _backend
+    if _backend is None:
+        with _backend_lock:
+            if _backend is None:
+                redis_url = current_app.config.get('ADMISSION_REDIS_URL')
+                if redis_url:
+                    _backend = RedisAdmissionBackend(redis_url, slot_ttl=current_app.config.get('ADMISSION_SLOT_TTL', 300))
+                else:
+                    _backend = MemoryAdmissionBackend()
+    return _backend
+
+
+def admit(user_id, cost=1, slots=1):
+    """
+    Decide si se admite una petición que lanzará llamadas al modelo:
+    primero las plazas de llamadas en curso (por usuario y global) y después
+    los cubos de tokens (ritmo por usuario y global). Una petición rechazada
+    libera sus plazas y devuelve los tokens que llegó a consumir, así que un
+    rechazo no gasta el ritmo del usuario.
+
+    Args:
+        cost (int): tokens que consume la petición.
+        slots (int): llamadas al modelo simultáneas que ocupará.
+
+    Returns:
+        AdmissionTicket: plazas ocupadas; hay que llamar a release() al terminar.
+
+    Raises:
+        AdmissionRejected: 429 por límites del usuario, 503 por saturación global.
+    """
+    config = current_app.config
+    backend = get_admission_backend()
+    retry_after = float(config.get('ADMISSION_RETRY_AFTER', 2))
+    user_key = f'user:{user_id}'
+    user_limit = int(config.get('ADMISSION_USER_MAX_IN_FLIGHT', 4))
+    global_limit = int(config.get('ADMISSION_GLOBAL_MAX_IN_FLIGHT', 32))
+    slots = min(slots, user_limit, global_limit)
+
+    buckets = [(user_key, config.get('ADMISSION_USER_RATE', 1.0), config.get('ADMISSION_USER_BURST', 10),
+                429, 'rejected_user_rate', 'Demasiadas solicitudes; inténtalo más tarde')]
+    if config.get('ADMISSION_GLOBAL_RATE'):
+        buckets.append(('global', config['ADMISSION_GLOBAL_RATE'], config.get('ADMISSION_GLOBAL_BURST', 50),
+                        503, 'rejected_global_rate', 'Servicio saturado; inténtalo más tarde'))
+    slot_limits = [
+        (user_key, user_limit, 429, 'rejected_user_in_flight', 'Demasiadas solicitudes en curso; inténtalo más tarde'),
+        ('global', global_limit, 503, 'rejected_global_in_flight', 'Servicio saturado; inténtalo más tarde'),
+    ]
+
+    # Identifica las plazas de esta petición en el backend
+    holder = uuid.uuid4().hex
+    acquired = []
+    taken = []
+    try:
+        for key, limit, status, reason, message in slot_limits:
+            if not backend.acquire_slots(key, slots, limit, holder):
+                _count(reason)
+                raise AdmissionRejected(status, message, retry_after, reason)
+            acquired.append(key)
+
+        for key, rate, burst, status, reason, message in buckets:
+            # Una petición más cara que la ráfaga completa nunca pasaría
+            tokens = min(cost, burst)
+            allowed, wait = backend.take_tokens(key, float(rate), float(burst), tokens)
+            if not allowed:
+                _count(reason)
+                raise AdmissionRejected(status, message, wait, reason)
+            taken.append((key, float(burst), tokens))
+    except AdmissionRejected:
+        _undo_admission(backend, acquired, slots, holder, taken)
+        raise
+    except Exception:
+        # Si el backend compartido falla, se admite la petición sin límites
+        _undo_admission(backend, acquired, slots, holder, taken)
+        _count('backend_errors')
+        _count('admitted')
+        return AdmissionTicket(backend, [], 0, holder)
+
+    _count('admitted')
+    return AdmissionTicket(backend, acquired, slots, holder)
+
+
+def _undo_admission(backend, acquired, slots, holder, taken):
+    AdmissionTicket(backend, acquired, slots, holder).release()
+    for key, burst, tokens in taken:
+        try:
+            backend.refund_tokens(key, burst, tokens)
+        except Exception:
+            _count('backend_errors')
+
+
+def admission_required(cost=None, slots=None):
+    """
+    Decorador para rutas que llaman al modelo. Va debajo de @token_required.
+    Las plazas se liberan al terminar la petición o, en respuestas en
+    streaming, cuando se cierra el stream.
+
+    Args:
+        cost (callable): devuelve los tokens de la petición (por defecto 1).
+        slots (callable): devuelve las llamadas simultáneas que ocupará (por defecto 1).
+    """
+    def decorator(f):
+        @wraps(f)
+        def decorated_function(current_user, *args, **kwargs):
+            if not current_app.config.get('ADMISSION_ENABLED', True):
+                return f(current_user, *args, **kwargs)
+
+            try:
+                ticket = admit(
+                    current_user.id,
+                    cost=max(1, cost()) if cost else 1,
+                    slots=max(1, slots()) if slots else 1
+                )
+            except AdmissionRejected as e:
+                response = jsonify({'message': e.message})
+                response.status_code = e.status
+                response.headers['Retry-After'] = str(e.retry_after)
+                return response
+
+            try:
+                response = make_response(f(current_user, *args, **kwargs))
+            except Exception:
+                ticket.release()
+                raise
+            if response.is_streamed:
+                response.call_on_close(ticket.release)
+            else:
+                ticket.release()
+            return response
+        return decorated_function
+    return decorator
+
+
+def get_admission_stats():
+    """Contadores de admisión de este worker y llamadas en curso en el backend."""
+    backend = get_admission_backend()
+    with _stats_lock:
+        stats = dict(_stats)
+    try:
+        stats['global_in_flight'] = backend.in_flight('global')
+    except Exception:
+        stats['global_in_flight'] = None
+    stats['backend'] = backend.name
+    stats['pid'] = os.getpid()
+    return stats
@@ -0,0 +1,259 @@
+# app/utils/agent_cache.py
+
+import os
+import time
+import select
+import logging
+import threading
+from collections import namedtuple
+from flask import current_app
+from sqlalchemy import event, text
+from sqlalchemy.orm import Session, joinedload
+from app.models import Agent as AgentModel, AgentTool, db
+
+logger = logging.getLogger(__name__)
+
+# Configuración de un agente lista para enviar al modelo
+CompiledAgent = namedtuple('CompiledAgent', [
+    'id', 'user_id', 'prompt', 'provider', 'model', 'temperature', 'max_tokens', 'cache_enabled', 'request_timeout',
+    'semantic_cache_enabled', 'semantic_cache_threshold', 'tools'
+])
+
+# Canal de Postgres por el que los workers se avisan de cambios en agentes
+# y en otras cachés por worker (payload "tipo:id,id,...")
+CHANNEL = 'agent_config'
+_PENDING = 'pending_invalidations'
+
+_cache = {}  # agent_id -> (CompiledAgent, expires_at)
+_lock = threading.Lock()
+_generation = 0
+_stats = {'hits': 0, 'misses': 0, 'invalidations': 0, 'notifications': 0}
+_listener = None
+_listener_pid = None
+_listener_ready = threading.Event()
+_handlers = {}  # tipo -> función que descarta esos ids (None = todos) de la caché local
+
+
+def build_tools(agent):
+    """
+    Construye la lista de herramientas en formato OpenAI a partir de las
+    herramientas asociadas al agente.
+    """
+    tools = []
+    for tool in agent.tools:
+        if tool.description and tool.parameters:
+            tools.append({
+                "type": "function",
+                "function": {
+                    "name": tool.name,
+                    "description": tool.description,
+                    "parameters": tool.parameters
+                }
+            })
+    return tools
+
+
+def compile_agent(agent):
+    return CompiledAgent(
+        id=agent.id,
+        user_id=agent.user_id,
+        prompt=agent.prompt,
+        provider=agent.provider,
+        model=agent.model,
+        temperature=agent.temperature,
+        max_tokens=agent.max_tokens,
+        cache_enabled=agent.cache_enabled,
+        request_timeout=agent.request_timeout,
+        semantic_cache_enabled=agent.semantic_cache_enabled,
+        semantic_cache_threshold=agent.semantic_cache_threshold,
+        tools=build_tools(agent)
+    )
+
+
+def _is_postgres():
+    return db.engine.dialect.name == 'postgresql'
+
+
+def listener_available():
+    """
+    True si las cachés por worker pueden usarse: en Postgres solo mientras
+    el listener esté conectado, porque sin él no habría forma de enterarse
+    de los cambios hechos por otros workers.
+    """
+    if _is_postgres():
+        _ensure_listener()
+        return _listener_ready.is_set()
+    return True
+
+
+def _can_cache():
+    return current_app.config.get('AGENT_CACHE_ENABLED', True) and listener_available()
+
+
+def get_compiled_agent(agent_id):
+    """
+    Devuelve la configuración compilada del agente (prompt, parámetros y
+    herramientas) desde la caché del worker, cargándola si no está.
+
+    Returns:
+        CompiledAgent | None: None si el agente no existe.
+    """
+    cacheable = _can_cache()
+    if cacheable:
+        with _lock:
+            entry = _cache.get(agent_id)
+            if entry and entry[1] > time.monotonic():
+                _stats['hits'] += 1
+                return entry[0]
+            _stats['misses'] += 1
+            generation = _generation
+
+    agent = AgentModel.query.options(joinedload(AgentModel.tools)).filter_by(id=agent_id).first()
+    if not agent:
+        return None
+    compiled = compile_agent(agent)
+
+    if cacheable:
+        ttl = float(current_app.config.get('AGENT_CACHE_TTL', 300))
+        with _lock:
+            # Si hubo una invalidación durante la carga, no guardar datos viejos
+            if generation == _generation:
+                _cache[agent_id] = (compiled, time.monotonic() + ttl)
+    return compiled
+
+
+def _evict(agent_ids):
+    global _generation
+    with _lock:
+        _generation += 1
+        if agent_ids is None:
+            _cache.clear()
+        else:
+            for agent_id in agent_ids:
+                _cache.pop(agent_id, None)
+        _stats['invalidations'] += 1
+
+
+def on_invalidation(kind, handler):
+    """Registra la función que descarta de la caché local los ids de `kind` (None = todos)."""
+    _handlers[kind] = handler
+
+
+def publish_invalidation(kind, ids):
+    """
+    Invalida los ids de `kind` en todos los workers. Llamar dentro de la
+    transacción que hace el cambio, antes del commit: en Postgres el NOTIFY
+    se entrega con el commit (y nunca si se deshace), y la caché de este
+    worker se vacía al confirmar.
+    """
+    ids = [int(value) for value in ids]
+    if not ids:
+        return
+    db.session.info.setdefault(_PENDING, {}).setdefault(kind, set()).update(ids)
+    if _is_postgres():
+        db.session.execute(
+            text("SELECT pg_notify(:channel, :payload)"),
+            {'channel': CHANNEL, 'payload': f"{kind}:{','.join(str(value) for value in ids)}"}
+        )
+
+
+@event.listens_for(Session, 'after_commit')
+def _evict_committed(session):
+    for kind, ids in session.info.pop(_PENDING, {}).items():
+        _handlers[kind](sorted(ids))
+
+
+@event.listens_for(Session, 'after_rollback')
+def _discard_uncommitted(session):
+    session.info.pop(_PENDING, None)
+
+
+def _evict_all():
+    for handler in list(_handlers.values()):
+        handler(None)
+
+
+def _dispatch(payload):
+    kind, _, values = payload.partition(':')
+    handler = _handlers.get(kind)
+    if handler is None:
+        return
+    ids = [int(value) for value in values.split(',') if value.strip().isdigit()]
+    handler(ids or None)
+
+
+def invalidate_agents(agent_ids):
+    """
+    Invalida la configuración de los agentes indicados en todos los workers.
+    Llamar antes del commit, en la misma transacción que los modifica (ver
+    publish_invalidation).
+    """
+    publish_invalidation('agent', agent_ids)
+
+
+on_invalidation('agent', _evict)
+
+
+def agents_using_tool(tool_id):
+    """IDs de los agentes que usan la herramienta (consultar antes de borrarla)."""
+    return [agent_id for (agent_id,) in db.session.query(AgentTool.agent_id).filter_by(tool_id=tool_id)]
+
+
+def _ensure_listener():
+    global _listener, _listener_pid
+    if _listener is not None and _listener_pid == os.getpid():
+        return
+    with _lock:
+        if _listener is not None and _listener_pid == os.getpid():
+            return
+        _listener_pid = os.getpid()
+        _listener_ready.clear()
+        _listener = threading.Thread(target=_listen_loop, args=(db.engine,), name='agent-config-listener', daemon=True)
+        _listener.start()
+
+
+def _listen_loop(engine):
+    while True:
+        connection = None
+        try:
+            # Conexión dedicada fuera del pool, en modo autocommit
+            cargs, cparams = engine.dialect.create_connect_args(engine.url)
+            connection = engine.dialect.connect(*cargs, **cparams)
+            connection.autocommit = True
+            cursor = connection.cursor()
+            cursor.execute(f"LISTEN {CHANNEL}")
+            # Lo cacheado mientras no había listener puede estar desactualizado
+            _evict_all()
+            _listener_ready.set()
+
+            while True:
+                if select.select([connection], [], [], 5) == ([], [], []):
+                    continue
+                connection.poll()
+                while connection.notifies:
+                    notify = connection.notifies.pop(0)
+                    with _lock:
+                        _stats['notifications'] += 1
+                    _dispatch(notify.payload)
+        except Exception:
+            _listener_ready.clear()
+            _evict_all()
+            logger.exception("Listener de configuración de agentes desconectado; reintentando")
+            time.sleep(5)
+        finally:
+            if connection is not None:
+                try:
+                    connection.close()
+                except Exception:
+                    pass
+
+
+def get_agent_cache_stats():
+    with _lock:
+        stats = dict(_stats)
+        stats['entries'] = len(_cache)
+    lookups = stats['hits'] + stats['misses']
+    stats['hit_rate'] = round(stats['hits'] / lookups, 3) if lookups else None
+    stats['listener_connected'] = _listener_ready.is_set()
+    stats['pid'] = os.getpid()
+    return stats
@@ -0,0 +1,209 @@
+# app/utils/benchmarks.py
+
+import os
+import sys
+import json
+import time
+import uuid
+import statistics
+import subprocess
+from contextlib import contextmanager
+from flask import current_app
+from sqlalchemy import event
+from app.models import Agent, AgentTool, ChatLog, ChatSummary, Tool, User, db
+from app.auth import invalidate_principal, verify_principal
+from app.services import delete_chat_history, load_chat_context
+from app.utils.agent_cache import build_tools, invalidate_agents
+
+
+@contextmanager
+def count_queries():
+    """Cuenta las consultas ejecutadas y el tiempo de BD dentro del bloque."""
+    stats = {'queries': 0, 'db_ms': 0.0}
+
+    def before(conn, cursor, statement, parameters, context, executemany):
+        conn.info.setdefault('bench_started', []).append(time.perf_counter())
+
+    def after(conn, cursor, statement, parameters, context, executemany):
+        stack = conn.info.get('bench_started')
+        if not stack:
+            return
+        started = stack.pop()
+        stats['queries'] += 1
+        stats['db_ms'] += (time.perf_counter() - started) * 1000
+
+    def failed(exception_context):
+        if exception_context.connection is not None and exception_context.execution_context is not None:
+            after(exception_context.connection, None, None, None, None, False)
+
+    engine = db.engine
+    event.listen(engine, 'before_cursor_execute', before)
+    event.listen(engine, 'after_cursor_execute', after)
+    event.listen(engine, 'handle_error', failed)
+    try:
+        yield stats
+    finally:
+        event.remove(engine, 'before_cursor_execute', before)
+        event.remove(engine, 'after_cursor_execute', after)
+        event.remove(engine, 'handle_error', failed)
+
+
+def _seed(messages, tools):
+    suffix = uuid.uuid4().hex[:8]
+    user = User(username=f'bench-{suffix}', email=f'bench-{suffix}@example.com', password=uuid.uuid4().hex)
+    tool_rows = [
+        Tool(name=f'bench-{suffix}-{i}', description='Herramienta de prueba',
+             parameters={'type': 'object', 'properties': {'q': {'type': 'string'}}})
+        for i in range(tools)
+    ]
+    agent = Agent(name='bench', prompt='Eres un asistente de prueba.', provider='openai',
+                  model='gpt-4o-mini', temperature=0.7, max_tokens=512, user=user, tools=tool_rows)
+    db.session.add(agent)
+    db.session.flush()
+    db.session.bulk_insert_mappings(ChatLog, [
+        {'agent_id': agent.id, 'role': 'user' if i % 2 == 0 else 'assistant', 'message': f'Mensaje de prueba {i} ' * 8}
+        for i in range(messages)
+    ])
+    db.session.commit()
+    return user.id, agent.id, [tool.id for tool in tool_rows], user.generate_token()
+
+
+def _cleanup(user_id, agent_id, tool_ids):
+    db.session.remove()
+    # Sin depender de ON DELETE CASCADE (SQLite no lo aplica por defecto)
+    AgentTool.query.filter(AgentTool.tool_id.in_(tool_ids)).delete(synchronize_session=False)
+    delete_chat_history(agent_id)
+    user = db.session.get(User, user_id)
+    if user:
+        db.session.delete(user)
+    Tool.query.filter(Tool.id.in_(tool_ids)).delete(synchronize_session=False)
+    invalidate_principal(user_id)
+    invalidate_agents([agent_id])
+    db.session.commit()
+
+
+def _legacy_context(token, agent_id, limit):
+    # Flujo anterior: usuario en token_required, agente, carga perezosa de
+    # herramientas, historial y resumen, cada uno en su propia consulta
+    user = User.verify_token(token)
+    agent = Agent.query.filter_by(id=agent_id, user_id=user.id).first()
+    build_tools(agent)
+    ChatLog.query.filter_by(agent_id=agent_id).order_by(
+        ChatLog.timestamp.desc(), ChatLog.id.desc()
+    ).limit(limit).all()
+    db.session.get(ChatSummary, agent_id)
+
+
+def _current_context(token, agent_id):
+    principal = verify_principal(token)
+    load_chat_context(agent_id, principal.id)
+
+
+def run_chat_context_benchmark(messages=200, tools=3, iterations=50):
+    """
+    Mide consultas y tiempo de BD por petición de chat (antes de llamar al
+    modelo) con el flujo anterior y con el actual, con cachés frías y calientes.
+    Crea un usuario y un agente temporales y los elimina al terminar.
+
+    Returns:
+        list: un dict por escenario con medias por petición.
+    """
+    limit = current_app.config.get('CHAT_HISTORY_MAX_MESSAGES', 50)
+    user_id, agent_id, tool_ids, token = _seed(messages, tools)
+
+    def clear_caches():
+        invalidate_principal(user_id)
+        invalidate_agents([agent_id])
+        db.session.commit()
+
+    scenarios = [
+        ('antes', None, lambda: _legacy_context(token, agent_id, limit)),
+        ('actual (caché fría)', clear_caches, lambda: _current_context(token, agent_id)),
+        ('actual (caché caliente)', None, lambda: _current_context(token, agent_id)),
+    ]
+    # Sin resúmenes en segundo plano, que añadirían consultas ajenas a la medida
+    summary_enabled = current_app.config.get('CHAT_SUMMARY_ENABLED', True)
+    current_app.config['CHAT_SUMMARY_ENABLED'] = False
+    results = []
+    try:
+        for name, setup, fn in scenarios:
+            fn()  # calentamiento
+            db.session.remove()
+            queries = db_ms = total_ms = 0.0
+            for _ in range(iterations):
+                if setup:
+                    setup()
+                started = time.perf_counter()
+                with count_queries() as stats:
+                    fn()
+                total_ms += (time.perf_counter() - started) * 1000
+                queries += stats['queries']
+                db_ms += stats['db_ms']
+                # Cada iteración simula una petición nueva
+                db.session.remove()
+            results.append({
+                'scenario': name,
+                'queries': queries / iterations,
+                'db_ms': db_ms / iterations,
+                'total_ms': total_ms / iterations,
+            })
+    finally:
+        current_app.config['CHAT_SUMMARY_ENABLED'] = summary_enabled
+        _cleanup(user_id, agent_id, tool_ids)
+    return results
+
+
+# Arranque de un worker: importar la app y ejecutar create_app
+_STARTUP_SNIPPET = """
+import json, time
+started = time.perf_counter()
+from app import create_app
+imported = time.perf_counter()
+create_app()
+created = time.perf_counter()
+print(json.dumps({'import_ms': (imported - started) * 1000, 'create_app_ms': (created - imported) * 1000}))
+"""
+
+
+def _parse_importtime(stderr):
+    """Filas (módulo, ms propios, ms acumulados) de la salida de -X importtime."""
+    rows = []
+    for line in stderr.splitlines():
+        if not line.startswith('import time:') or 'self [us]' in line:
+            continue
+        self_us, cumulative_us, name = line.split(':', 1)[1].split('|')
+        rows.append((name.strip(), int(self_us) / 1000, int(cumulative_us) / 1000))
+    return rows
+
+
+def run_startup_benchmark(runs=3, top=15):
+    """
+    Mide el arranque de un worker en procesos nuevos con `python -X importtime`:
+    tiempo de importación de la app, de create_app y coste de importación por
+    paquete y por módulo propio (última ejecución).
+
+    Returns:
+        dict: medianas de import_ms y create_app_ms, y los paquetes y módulos más caros.
+    """
+    root = os.path.dirname(current_app.root_path)
+    timings = []
+    for _ in range(runs):
+        result = subprocess.run(
+            [sys.executable, '-X', 'importtime', '-c', _STARTUP_SNIPPET],
+            cwd=root, capture_output=True, text=True, check=True
+        )
+        timings.append(json.loads(result.stdout.strip().splitlines()[-1]))
+    rows = _parse_importtime(result.stderr)
+
+    packages = {}
+    for name, self_ms, _ in rows:
+        package = name.split('.')[0]
+        packages[package] = packages.get(package, 0.0) + self_ms
+    modules = [(name, cumulative_ms) for name, _, cumulative_ms in rows if name == 'app' or name.startswith('app.')]
+
+    return {
+        'import_ms': statistics.median(t['import_ms'] for t in timings),
+        'create_app_ms': statistics.median(t['create_app_ms'] for t in timings),
+        'packages': sorted(packages.items(), key=lambda item: item[1], reverse=True)[:top],
+        'modules': sorted(modules, key=lambda item: item[1], reverse=True)[:top],
+    }
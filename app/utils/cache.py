@@ -0,0 +1,231 @@
+# app/utils/cache.py
+
+import os
+import json
+import time
+import hashlib
+import threading
+from collections import OrderedDict
+from flask import current_app, has_app_context
+
+
+class LRUCache:
+    """
+    Caché en memoria del proceso con expiración (TTL) y desalojo LRU,
+    acotada por número de entradas y por bytes totales.
+    """
+
+    def __init__(self, max_entries=1000, max_bytes=16 * 1024 * 1024, ttl=3600):
+        self.max_entries = max_entries
+        self.max_bytes = max_bytes
+        self.ttl = ttl
+        self._data = OrderedDict()  # key -> (value, size, expires_at)
+        self._bytes = 0
+        self._lock = threading.Lock()
+        self.evictions = 0
+
+    def get(self, key):
+        with self._lock:
+            item = self._data.get(key)
+            if item is None:
+                return None
+            value, size, expires_at = item
+            if expires_at < time.monotonic():
+                self._remove(key)
+                return None
+            self._data.move_to_end(key)
+            return value
+
+    def set(self, key, value, ttl=None, size=None):
+        if size is None:
+            size = len(value.encode('utf-8'))
+        if size > self.max_bytes:
+            return
+        with self._lock:
+            if key in self._data:
+                self._remove(key)
+            self._data[key] = (value, size, time.monotonic() + (ttl or self.ttl))
+            self._bytes += size
+            while len(self._data) > self.max_entries or self._bytes > self.max_bytes:
+                oldest = next(iter(self._data))
+                self._remove(oldest)
+                self.evictions += 1
+
+    def delete(self, key):
+        with self._lock:
+            if key in self._data:
+                self._remove(key)
+
+    def clear(self):
+        with self._lock:
+            self._data.clear()
+            self._bytes = 0
+
+    def _remove(self, key):
+        _, size, _ = self._data.pop(key)
+        self._bytes -= size
+
+    def info(self):
+        with self._lock:
+            return {
+                'entries': len(self._data),
+                'bytes': self._bytes,
+                'max_entries': self.max_entries,
+                'max_bytes': self.max_bytes,
+                'evictions': self.evictions,
+            }
+
+
+class SharedCacheTier:
+    """
+    Interfaz del nivel compartido entre workers. Las implementaciones deben
+    ser tolerantes a fallos: un error del backend equivale a un fallo de caché.
+    """
+
+    def get(self, key):
+        raise NotImplementedError
+
+    def set(self, key, value, ttl):
+        raise NotImplementedError
+
+    def clear(self):
+        raise NotImplementedError
+
+
+class RedisCacheTier(SharedCacheTier):
+    """Nivel compartido sobre Redis (requiere el paquete opcional `redis`)."""
+
+    def __init__(self, url, prefix='llmcache:'):
+        try:
+            import redis
+        except ImportError:
+            raise RuntimeError("Se requiere el paquete 'redis' para usar LLM_CACHE_REDIS_URL")
+        self.prefix = prefix
+        self._redis = redis.Redis.from_url(url, socket_timeout=0.2)
+
+    def get(self, key):
+        value = self._redis.get(self.prefix + key)
+        return value.decode('utf-8') if value is not None else None
+
+    def set(self, key, value, ttl):
+        self._redis.set(self.prefix + key, value.encode('utf-8'), ex=int(ttl))
+
+    def clear(self):
+        for key in self._redis.scan_iter(match=self.prefix + '*'):
+            self._redis.delete(key)
+
+
+class ResponseCache:
+    """
+    Caché de respuestas del modelo en dos niveles: memoria del proceso y,
+    opcionalmente, un nivel compartido entre workers.
+    """
+
+    def __init__(self, local, shared=None):
+        self.local = local
+        self.shared = shared
+        self._lock = threading.Lock()
+        self._stats = {'hits': 0, 'shared_hits': 0, 'misses': 0, 'stores': 0, 'bytes_served': 0, 'shared_errors': 0}
+
+    def _count(self, name, amount=1):
+        with self._lock:
+            self._stats[name] += amount
+
+    def get(self, key):
+        value = self.local.get(key)
+        if value is None and self.shared is not None:
+            try:
+                value = self.shared.get(key)
+            except Exception:
+                self._count('shared_errors')
+                value = None
+            if value is not None:
+                self._count('shared_hits')
+                self.local.set(key, value)
+        if value is None:
+            self._count('misses')
+            return None
+        self._count('hits')
+        self._count('bytes_served', len(value.encode('utf-8')))
+        return value
+
+    def set(self, key, value):
+        if not value:
+            return
+        self.local.set(key, value)
+        if self.shared is not None:
+            try:
+                self.shared.set(key, value, self.local.ttl)
+            except Exception:
+                self._count('shared_errors')
+        self._count('stores')
+
+    def clear(self):
+        self.local.clear()
+        if self.shared is not None:
+            try:
+                self.shared.clear()
+            except Exception:
+                self._count('shared_errors')
+
+    def stats(self):
+        with self._lock:
+            stats = dict(self._stats)
+        lookups = stats['hits'] + stats['misses']
+        stats['hit_rate'] = round(stats['hits'] / lookups, 3) if lookups else None
+        return {
+            'pid': os.getpid(),
+            **stats,
+            'local': self.local.info(),
+            'shared': type(self.shared).__name__ if self.shared is not None else None,
+        }
+
+
+_response_cache = None
+_cache_lock = threading.Lock()
+
+
+def _setting(name, default):
+    if has_app_context():
+        value = current_app.config.get(name)
+        if value is not None:
+            return value
+    return default
+
+
+def get_response_cache():
+    """Devuelve la caché de respuestas del proceso, creándola la primera vez."""
+    global _response_cache
+    if _response_cache is None:
+        with _cache_lock:
+            if _response_cache is None:
+                local = LRUCache(
+                    max_entries=int(_setting('LLM_CACHE_MAX_ENTRIES', 1000)),
+                    max_bytes=int(_setting('LLM_CACHE_MAX_BYTES', 16 * 1024 * 1024)),
+                    ttl=float(_setting('LLM_CACHE_TTL', 3600)),
+                )
+                redis_url = _setting('LLM_CACHE_REDIS_URL', None)
+                shared = RedisCacheTier(redis_url) if redis_url else None
+                _response_cache = ResponseCache(local, shared)
+    return _response_cache
+
+
+def _normalize(text):
+    return ' '.join(text.split()) if isinstance(text, str) else text
+
+
+def make_cache_key(model, messages, tools, temperature, max_tokens):
+    """
+    Calcula la clave exacta de una llamada al modelo: modelo, mensajes
+    (prompt de sistema, historial y mensaje actual con espacios normalizados),
+    conjunto de herramientas, temperatura y max_tokens.
+    """
+    payload = {
+        'model': model,
+        'messages': [[m.get('role'), _normalize(m.get('content'))] for m in messages],
+        'tools': sorted(tools or [], key=lambda t: t['function']['name']),
+        'temperature': temperature,
+        'max_tokens': max_tokens,
+    }
+    raw = json.dumps(payload, sort_keys=True, ensure_ascii=False, default=str)
+    return hashlib.sha256(raw.encode('utf-8')).hexdigest()
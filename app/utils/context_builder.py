@@ -0,0 +1,242 @@
+# app/utils/context_builder.py
+
+import time
+import logging
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime
+from flask import current_app
+from sqlalchemy import select
+from sqlalchemy.exc import IntegrityError
+from app.models import Agent, ChatLog, ChatSummary, db
+from app.utils.llm_router import get_llm_router
+from app.utils.metrics import LLMTimer
+from app.utils.usage import TurnUsage, record_usage_separately
+
+logger = logging.getLogger(__name__)
+
+# Ventana de contexto aproximada por prefijo de modelo (en tokens)
+MODEL_CONTEXT_WINDOWS = [
+    ('gpt-4o', 128000),
+    ('gpt-4.1', 128000),
+    ('gpt-4-turbo', 128000),
+    ('gpt-4-32k', 32768),
+    ('gpt-4', 8192),
+    ('gpt-3.5-turbo', 16385),
+    ('o1', 128000),
+    ('o3', 128000),
+]
+DEFAULT_CONTEXT_WINDOW = 8192
+
+# Tokens extra por mensaje (rol y separadores del formato de chat)
+MESSAGE_OVERHEAD_TOKENS = 4
+
+SUMMARY_PREFIX = "Resumen de la conversación anterior:\n"
+
+_executor = ThreadPoolExecutor(max_workers=2, thread_name_prefix='chat-summary')
+_pending = set()
+_pending_lock = threading.Lock()
+
+
+def estimate_tokens(text):
+    """Estimación rápida de tokens (~4 caracteres por token)."""
+    if not text:
+        return MESSAGE_OVERHEAD_TOKENS
+    return len(text) // 4 + 1 + MESSAGE_OVERHEAD_TOKENS
+
+
+def context_window(model):
+    model = (model or '').lower()
+    for prefix, window in MODEL_CONTEXT_WINDOWS:
+        if model.startswith(prefix):
+            return window
+    return DEFAULT_CONTEXT_WINDOW
+
+
+def history_token_budget(model, max_tokens, system_prompt, summary_text=None):
+    """
+    Calcula cuántos tokens puede ocupar el historial: lo que queda de la
+    ventana del modelo tras el prompt, el resumen y la respuesta esperada,
+    limitado por CHAT_HISTORY_TOKEN_BUDGET para acotar coste y latencia.
+    """
+    available = context_window(model) - (max_tokens or 0) - estimate_tokens(system_prompt)
+    if summary_text:
+        available -= estimate_tokens(summary_text)
+    cap = int(current_app.config.get('CHAT_HISTORY_TOKEN_BUDGET', 2000))
+    return max(min(available, cap), 0)
+
+
+def select_history(recent_chats, budget):
+    """
+    Selecciona los mensajes más recientes que caben en el presupuesto.
+
+    Args:
+        recent_chats (list): mensajes (id, role, message) del más reciente al más antiguo.
+        budget (int): tokens disponibles.
+
+    Returns:
+        list: ChatLog seleccionados en orden cronológico.
+    """
+    selected = []
+    used = 0
+    for chat in recent_chats:
+        cost = estimate_tokens(chat.message)
+        if used + cost > budget:
+            break
+        selected.append(chat)
+        used += cost
+    selected.reverse()
+    return selected
+
+
+def build_history(agent, recent_chats, summary):
+    """
+    Construye el historial que se envía al modelo: el resumen acumulado (si
+    existe) seguido de los mensajes recientes que caben en el presupuesto.
+    Si quedan mensajes fuera de la ventana sin resumir, programa la
+    actualización del resumen en segundo plano.
+
+    Args:
+        agent: Agent de la base de datos o CompiledAgent.
+        recent_chats (list): candidatos ordenados del más reciente al más antiguo.
+        summary (ChatSummary | HistorySummary | None): resumen acumulado del agente.
+
+    Returns:
+        list: mensajes {"role", "content"} en orden cronológico.
+    """
+    summary_text = summary.summary if summary and summary.summary else None
+    budget = history_token_budget(agent.model, agent.max_tokens, agent.prompt, summary_text)
+    selected = select_history(recent_chats, budget)
+
+    if recent_chats and current_app.config.get('CHAT_SUMMARY_ENABLED', True):
+        fetch_limit = int(current_app.config.get('CHAT_HISTORY_MAX_MESSAGES', 50))
+        truncated = len(selected) < len(recent_chats) or len(recent_chats) >= fetch_limit
+        boundary_id = selected[0].id if selected else recent_chats[0].id + 1
+        summarized_until = summary.last_chat_id if summary else 0
+        if truncated and boundary_id - 1 > summarized_until:
+            schedule_summary_update(agent.id, boundary_id, agent.provider, agent.model, agent.request_timeout)
+
+    history = []
+    if summary_text:
+        history.append({"role": "system", "content": SUMMARY_PREFIX + summary_text})
+    history.extend({"role": chat.role, "content": chat.message} for chat in selected)
+    return history
+
+
+def schedule_summary_update(agent_id, boundary_id, provider, model, timeout=None):
+    """
+    Programa (una sola vez por agente y worker) la incorporación al resumen
+    de los mensajes anteriores a boundary_id.
+    """
+    with _pending_lock:
+        if agent_id in _pending:
+            return
+        _pending.add(agent_id)
+    app = current_app._get_current_object()
+    _executor.submit(_run_summary_update, app, agent_id, boundary_id, provider, model, timeout)
+
+
+def _run_summary_update(app, agent_id, boundary_id, provider, model, timeout):
+    try:
+        with app.app_context():
+            update_summary(agent_id, boundary_id, provider, model, timeout)
+    except Exception:
+        logger.exception("Error al actualizar el resumen del agente %s", agent_id)
+    finally:
+        with _pending_lock:
+            _pending.discard(agent_id)
+
+
+def update_summary(agent_id, boundary_id, provider, model, timeout=None):
+    """
+    Incorpora al resumen del agente, por lotes, los mensajes con id entre el
+    último resumido y boundary_id (exclusivo). La escritura es optimista: si
+    otro worker actualizó el resumen entretanto, se descarta este resultado.
+
+    Args:
+        provider (str): proveedor del agente; el resumen usa su mismo
+            modelo salvo que se configure CHAT_SUMMARY_MODEL (con
+            CHAT_SUMMARY_PROVIDER).
+        timeout (float): segundos por llamada (request_timeout del agente).
+
+    Cada llamada al modelo se suma a los agregados de uso del agente (con el
+    modelo del resumen), en su propia transacción.
+    """
+    config = current_app.config
+    batch_size = int(config.get('CHAT_SUMMARY_BATCH', 40))
+    summary_provider, summary_model = provider, model
+    if config.get('CHAT_SUMMARY_MODEL'):
+        summary_provider = config.get('CHAT_SUMMARY_PROVIDER') or 'openai'
+        summary_model = config['CHAT_SUMMARY_MODEL']
+    summary_max_tokens = int(config.get('CHAT_SUMMARY_MAX_TOKENS', 300))
+
+    user_id = db.session.execute(select(Agent.user_id).where(Agent.id == agent_id)).scalar()
+    summary = db.session.get(ChatSummary, agent_id)
+    text = summary.summary if summary else ''
+    last_id = summary.last_chat_id if summary else 0
+    original_last_id = last_id
+
+    while True:
+        chats = ChatLog.query.filter(
+            ChatLog.agent_id == agent_id,
+            ChatLog.id > last_id,
+            ChatLog.id < boundary_id
+        ).order_by(ChatLog.id.asc()).limit(batch_size).all()
+        if not chats:
+            break
+
+        transcript = "\n".join(f"{chat.role}: {chat.message}" for chat in chats)
+        last_id = chats[-1].id
+        # No mantener la conexión mientras se espera al modelo
+        db.session.close()
+
+        started = time.perf_counter()
+        with LLMTimer(summary_model):
+            response = get_llm_router().completion(
+                summary_provider,
+                summary_model,
+                timeout=timeout,
+                messages=[
+                    {"role": "system", "content": (
+                        "Mantienes un resumen breve y factual de una conversación entre un usuario "
+                        "y un asistente. Integra los mensajes nuevos en el resumen existente, "
+                        "conservando datos, decisiones y preferencias relevantes."
+                    )},
+                    {"role": "user", "content": f"Resumen actual:\n{text or '(vacío)'}\n\nMensajes nuevos:\n{transcript}"}
+                ],
+                temperature=0,
+                max_tokens=summary_max_tokens
+            )
+        if response.usage is not None and user_id is not None:
+            record_usage_separately([TurnUsage(
+                user_id=user_id,
+                agent_id=agent_id,
+                model=summary_model,
+                prompt_tokens=response.usage.prompt_tokens,
+                completion_tokens=response.usage.completion_tokens,
+                latency_ms=(time.perf_counter() - started) * 1000
+            )])
+        text = (response.choices[0].message.content or text).strip()
+
+        if len(chats) < batch_size:
+            break
+
+    # Todo lo anterior a boundary_id queda cubierto por el resumen
+    last_id = max(last_id, boundary_id - 1)
+    _save_summary(agent_id, original_last_id, text, last_id, exists=summary is not None)
+
+
+def _save_summary(agent_id, expected_last_id, text, last_id, exists):
+    try:
+        if exists:
+            ChatSummary.query.filter_by(agent_id=agent_id, last_chat_id=expected_last_id).update({
+                'summary': text,
+                'last_chat_id': last_id,
+                'updated_at': datetime.utcnow()
+            }, synchronize_session=False)
+        else:
+            db.session.add(ChatSummary(agent_id=agent_id, summary=text, last_chat_id=last_id))
+        db.session.commit()
+    except IntegrityError:
+        # Otro worker creó el resumen antes; se conserva el suyo
+        db.session.rollback()
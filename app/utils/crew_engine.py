@@ -0,0 +1,333 @@
+# app/utils/crew_engine.py
+
+import time
+import logging
+import threading
+from collections import namedtuple
+from concurrent.futures import ThreadPoolExecutor, FIRST_COMPLETED, wait
+from datetime import datetime
+from flask import current_app
+from app.models import CrewRun, CrewTaskRun, db
+from app.services import ChatContext, build_messages, complete_chat
+from app.utils.agent_cache import get_compiled_agent
+from app.utils.llm_router import get_llm_router
+from app.utils.usage import TurnUsage, record_usage
+
+logger = logging.getLogger(__name__)
+
+# Tarea de un crew lista para ejecutar, desacoplada de la sesión de BD
+TaskPlan = namedtuple('TaskPlan', ['key', 'agent_id', 'description', 'depends_on'])
+
+_executor = None
+_executor_lock = threading.Lock()
+_user_slots = {}
+_user_slots_lock = threading.Lock()
+
+
+def validate_crew_tasks(tasks):
+    """
+    Comprueba la definición de las tareas de un crew: claves únicas,
+    dependencias que existen y ausencia de ciclos.
+
+    Args:
+        tasks (list): dicts {"key", "agent_id", "description", "depends_on"}.
+
+    Returns:
+        str | None: mensaje de error, o None si el grafo es válido.
+    """
+    if not isinstance(tasks, list) or not tasks:
+        return 'El crew necesita al menos una tarea'
+    max_tasks = int(current_app.config.get('CREW_MAX_TASKS', 20))
+    if len(tasks) > max_tasks:
+        return f'Un crew admite como máximo {max_tasks} tareas'
+
+    keys = set()
+    for task in tasks:
+        if not isinstance(task, dict):
+            return 'Formato de tarea inválido'
+        key = task.get('key')
+        if not isinstance(key, str) or not key or len(key) > 50:
+            return 'Cada tarea necesita una clave (key) de hasta 50 caracteres'
+        if key in keys:
+            return f"Clave de tarea duplicada: {key}"
+        if not isinstance(task.get('agent_id'), int) or not task.get('description'):
+            return f"La tarea '{key}' necesita agent_id y description"
+        if not isinstance(task.get('depends_on', []), list):
+            return f"depends_on de la tarea '{key}' debe ser una lista"
+        keys.add(key)
+
+    for task in tasks:
+        missing = [dep for dep in task.get('depends_on', []) if dep not in keys]
+        if missing:
+            return f"La tarea '{task['key']}' depende de tareas inexistentes: {', '.join(map(str, missing))}"
+
+    # Orden topológico (Kahn): si no se pueden ordenar todas, hay un ciclo
+    remaining = {task['key']: set(task.get('depends_on', [])) for task in tasks}
+    while remaining:
+        ready = [key for key, deps in remaining.items() if not deps]
+        if not ready:
+            return f"Las dependencias forman un ciclo: {', '.join(sorted(remaining))}"
+        for key in ready:
+            del remaining[key]
+        for deps in remaining.values():
+            deps.difference_update(ready)
+    return None
+
+
+def crew_width(tasks):
+    """
+    Máximo de tareas de un grafo válido que pueden ejecutarse a la vez: la
+    mayor anticadena (tareas sin dependencia directa ni indirecta entre sí).
+    Por el teorema de Dilworth es el número de tareas menos el
+    emparejamiento máximo entre cada tarea y las que dependen de ella.
+
+    Args:
+        tasks (list): dicts {"key", "depends_on"} que pasan validate_crew_tasks.
+
+    Returns:
+        int: ancho del grafo.
+    """
+    depends_on = {task['key']: set(task.get('depends_on') or []) for task in tasks}
+    ancestors = {}
+
+    def collect(key):
+        if key not in ancestors:
+            found = set()
+            for dep in depends_on[key]:
+                found.add(dep)
+                found |= collect(dep)
+            ancestors[key] = found
+        return ancestors[key]
+
+    matched = {}  # tarea previa -> tarea posterior emparejada
+
+    def augment(key, seen):
+        for dep in collect(key):
+            if dep in seen:
+                continue
+            seen.add(dep)
+            if dep not in matched or augment(matched[dep], seen):
+                matched[dep] = key
+                return True
+        return False
+
+    matching = sum(augment(key, set()) for key in depends_on)
+    return len(depends_on) - matching
+
+
+def _get_executor():
+    global _executor
+    if _executor is None:
+        with _executor_lock:
+            if _executor is None:
+                _executor = ThreadPoolExecutor(
+                    max_workers=int(current_app.config.get('CREW_POOL_SIZE', 16)),
+                    thread_name_prefix='crew'
+                )
+    return _executor
+
+
+def _user_semaphore(user_id):
+    # Límite de tareas simultáneas por usuario, compartido por todas sus
+    # ejecuciones en este worker
+    with _user_slots_lock:
+        semaphore = _user_slots.get(user_id)
+        if semaphore is None:
+            semaphore = threading.BoundedSemaphore(int(current_app.config.get('CREW_USER_CONCURRENCY', 4)))
+            _user_slots[user_id] = semaphore
+    return semaphore
+
+
+def load_task_contexts(plans, user_id):
+    """
+    Prepara un ChatContext sin historial por cada agente del crew.
+
+    Returns:
+        dict: agent_id -> ChatContext, o None si el agente no existe o no es del usuario.
+    """
+    contexts = {}
+    for agent_id in dict.fromkeys(plan.agent_id for plan in plans):
+        agent = get_compiled_agent(agent_id)
+        if not agent or agent.user_id != user_id:
+            contexts[agent_id] = None
+            continue
+        contexts[agent_id] = ChatContext(
+            agent_id=agent.id,
+            prompt=agent.prompt,
+            provider=agent.provider,
+            model=agent.model,
+            temperature=agent.temperature,
+            max_tokens=agent.max_tokens,
+            tools=agent.tools,
+            history=[],
+            cache_enabled=agent.cache_enabled,
+            request_timeout=agent.request_timeout,
+            semantic_cache_enabled=agent.semantic_cache_enabled,
+            semantic_cache_threshold=agent.semantic_cache_threshold
+        )
+    return contexts
+
+
+def _task_message(plan, user_input, outputs):
+    parts = [plan.description]
+    if user_input:
+        parts.append(f"Entrada:\n{user_input}")
+    for key in plan.depends_on:
+        parts.append(f"Resultado de la tarea '{key}':\n{outputs[key]}")
+    return "\n\n".join(parts)
+
+
+def _run_task(app, semaphore, ctx, message):
+    started = time.perf_counter()
+    usage = {}
+    try:
+        with app.app_context():
+            messages = build_messages(ctx.prompt, [], message)
+            output = complete_chat(get_llm_router(), ctx, messages, usage)
+        return output, (time.perf_counter() - started) * 1000, usage
+    finally:
+        semaphore.release()
+
+
+def execute_crew(plans, contexts, user_id, user_input=None, max_parallel=None):
+    """
+    Ejecuta el grafo de tareas: lanza en paralelo todas las tareas cuyas
+    dependencias han terminado, hasta `max_parallel` a la vez (las plazas
+    reservadas en la admisión) y respetando CREW_USER_CONCURRENCY, y pasa la
+    salida de cada tarea a las que dependen de ella. Si una tarea falla, sus
+    dependientes se omiten y el resto del grafo continúa. No usa la BD.
+
+    Genera tuplas (evento, datos) con evento en task_started, task_done,
+    task_error o task_skipped.
+    """
+    app = current_app._get_current_object()
+    executor = _get_executor()
+    semaphore = _user_semaphore(user_id)
+    max_parallel = max(1, max_parallel or int(current_app.config.get('CREW_USER_CONCURRENCY', 4)))
+    slot_timeout = float(current_app.config.get('CREW_SLOT_TIMEOUT', 60))
+    outputs = {}
+    status = {}
+    pending = list(plans)
+    running = {}
+
+    while pending or running:
+        progressed = False
+        for plan in list(pending):
+            failed = [dep for dep in plan.depends_on if status.get(dep) in ('error', 'skipped')]
+            if failed:
+                pending.remove(plan)
+                status[plan.key] = 'skipped'
+                progressed = True
+                yield 'task_skipped', {'key': plan.key, 'agent_id': plan.agent_id,
+                                       'error': f"Dependencias fallidas: {', '.join(failed)}"}
+
+        for plan in list(pending):
+            if len(running) >= max_parallel:
+                break
+            if not all(status.get(dep) == 'done' for dep in plan.depends_on):
+                continue
+            ctx = contexts.get(plan.agent_id)
+            if ctx is None:
+                pending.remove(plan)
+                status[plan.key] = 'error'
+                progressed = True
+                yield 'task_error', {'key': plan.key, 'agent_id': plan.agent_id,
+                                     'error': 'Agente no encontrado', 'latency_ms': 0.0}
+                continue
+            if running:
+                # Alguna tarea propia liberará su plaza: se espera a ella
+                if not semaphore.acquire(blocking=False):
+                    break
+            elif not semaphore.acquire(timeout=slot_timeout):
+                # Las plazas del usuario las ocupan otras ejecuciones
+                pending.remove(plan)
+                status[plan.key] = 'error'
+                progressed = True
+                yield 'task_error', {'key': plan.key, 'agent_id': plan.agent_id,
+                                     'error': 'No hay plazas libres para ejecutar la tarea', 'latency_ms': None}
+                continue
+            pending.remove(plan)
+            progressed = True
+            future = executor.submit(_run_task, app, semaphore, ctx, _task_message(plan, user_input, outputs))
+            running[future] = plan
+            yield 'task_started', {'key': plan.key, 'agent_id': plan.agent_id}
+
+        if not running:
+            if not progressed:
+                break
+            continue
+
+        done, _ = wait(running, return_when=FIRST_COMPLETED)
+        for future in done:
+            plan = running.pop(future)
+            try:
+                output, latency_ms, usage = future.result()
+            except Exception as e:
+                logger.exception("Error en la tarea '%s' del crew", plan.key)
+                status[plan.key] = 'error'
+                yield 'task_error', {'key': plan.key, 'agent_id': plan.agent_id, 'error': str(e), 'latency_ms': None}
+                continue
+            status[plan.key] = 'done'
+            outputs[plan.key] = output
+            yield 'task_done', {
+                'key': plan.key,
+                'agent_id': plan.agent_id,
+                'output': output,
+                'latency_ms': round(latency_ms, 1),
+                'prompt_tokens': usage.get('prompt_tokens'),
+                'completion_tokens': usage.get('completion_tokens')
+            }
+
+
+def run_crew(run_id, plans, contexts, user_id, user_input=None, max_parallel=None):
+    """
+    Ejecuta un crew y registra el resultado de cada tarea en crew_task_run a
+    medida que termina (transacciones cortas, junto con su consumo en los
+    agregados de uso), y el estado final en crew_run
+    (done, error o cancelled si el cliente corta el stream). Reemite los
+    eventos de execute_crew y termina con ('done', {...}).
+    """
+    started = time.perf_counter()
+    status = 'cancelled'
+    failed = False
+    try:
+        for event, data in execute_crew(plans, contexts, user_id, user_input, max_parallel):
+            if event != 'task_started':
+                failed = failed or event != 'task_done'
+                db.session.add(CrewTaskRun(
+                    run_id=run_id,
+                    task_key=data['key'],
+                    agent_id=data['agent_id'],
+                    status={'task_done': 'done', 'task_error': 'error', 'task_skipped': 'skipped'}[event],
+                    output=data.get('output'),
+                    error=data.get('error'),
+                    latency_ms=data.get('latency_ms'),
+                    prompt_tokens=data.get('prompt_tokens'),
+                    completion_tokens=data.get('completion_tokens')
+                ))
+                if event == 'task_done':
+                    record_usage([TurnUsage(
+                        user_id=user_id,
+                        agent_id=data['agent_id'],
+                        model=contexts[data['agent_id']].model,
+                        prompt_tokens=data['prompt_tokens'],
+                        completion_tokens=data['completion_tokens'],
+                        latency_ms=data['latency_ms']
+                    )])
+                db.session.commit()
+                db.session.close()
+            yield event, data
+        status = 'error' if failed else 'done'
+    except Exception:
+        db.session.rollback()
+        status = 'error'
+        raise
+    finally:
+        total_ms = round((time.perf_counter() - started) * 1000, 1)
+        CrewRun.query.filter_by(id=run_id).update(
+            {'status': status, 'total_ms': total_ms, 'finished_at': datetime.utcnow()},
+            synchronize_session=False
+        )
+        db.session.commit()
+
+    yield 'done', {'run_id': run_id, 'status': status, 'total_ms': total_ms}
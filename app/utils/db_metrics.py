@@ -0,0 +1,94 @@
+# app/utils/db_metrics.py
+
+import os
+import time
+import threading
+from flask import g, request
+from sqlalchemy import event
+from app.extensions import db
+
+# Estadísticas de tiempo de retención de conexiones por endpoint (por worker)
+_stats = {}
+_lock = threading.Lock()
+_engine = None
+
+
+def init_db_metrics(app):
+    """
+    Registra los eventos del pool para medir cuánto tiempo retiene cada
+    petición una conexión de base de datos.
+    """
+    global _engine
+    with app.app_context():
+        _engine = db.engine
+
+    @event.listens_for(_engine, 'checkout')
+    def _on_checkout(dbapi_connection, connection_record, connection_proxy):
+        connection_record.info['checkout_at'] = time.perf_counter()
+
+    @event.listens_for(_engine, 'checkin')
+    def _on_checkin(dbapi_connection, connection_record):
+        started = connection_record.info.pop('checkout_at', None)
+        if started is None:
+            return
+        held = time.perf_counter() - started
+        try:
+            if 'db_hold_endpoint' in g:
+                g.db_hold_seconds += held
+                g.db_checkouts += 1
+        except RuntimeError:
+            # Fuera de un contexto de aplicación (p.ej. tareas en segundo plano)
+            pass
+
+    @app.before_request
+    def _start_db_hold():
+        g.db_hold_endpoint = request.endpoint or 'unknown'
+        g.db_hold_seconds = 0.0
+        g.db_checkouts = 0
+
+    @app.after_request
+    def _server_timing(response):
+        if 'db_hold_endpoint' in g:
+            response.headers.add('Server-Timing', f"db-hold;dur={g.db_hold_seconds * 1000:.1f}")
+        return response
+
+    @app.teardown_appcontext
+    def _record_db_hold(exc):
+        if 'db_hold_endpoint' not in g:
+            return
+        # Se cierra la sesión aquí para que el último checkin quede medido
+        db.session.remove()
+        _record(g.db_hold_endpoint, g.db_hold_seconds, g.db_checkouts)
+
+
+def _record(endpoint, held, checkouts):
+    with _lock:
+        stats = _stats.setdefault(endpoint, {
+            'requests': 0,
+            'checkouts': 0,
+            'total_hold_ms': 0.0,
+            'max_hold_ms': 0.0,
+        })
+        stats['requests'] += 1
+        stats['checkouts'] += checkouts
+        stats['total_hold_ms'] += held * 1000
+        stats['max_hold_ms'] = max(stats['max_hold_ms'], held * 1000)
+
+
+def get_db_stats():
+    """Devuelve el estado del pool y el tiempo de retención por endpoint."""
+    with _lock:
+        endpoints = {
+            endpoint: {
+                **stats,
+                'total_hold_ms': round(stats['total_hold_ms'], 1),
+                'max_hold_ms': round(stats['max_hold_ms'], 1),
+                'avg_hold_ms': round(stats['total_hold_ms'] / stats['requests'], 1) if stats['requests'] else None,
+            }
+            for endpoint, stats in _stats.items()
+        }
+    return {
+        'pid': os.getpid(),
+        'pool': _engine.pool.status() if _engine is not None else None,
+        'endpoints': endpoints,
+    }
@@ -0,0 +1,128 @@
+# app/utils/export.py
+
+import io
+import csv
+import json
+import zlib
+from datetime import datetime
+from sqlalchemy import select, tuple_
+from app.models import ChatLog, LogEntry, db
+
+EXPORT_FORMATS = {'ndjson': 'application/x-ndjson', 'csv': 'text/csv'}
+
+CHAT_EXPORT_COLUMNS = ('id', 'role', 'message', 'timestamp', 'model', 'prompt_tokens', 'completion_tokens', 'latency_ms')
+LOG_EXPORT_COLUMNS = ('id', 'timestamp', 'message')
+
+
+def _value(value):
+    return value.isoformat() if isinstance(value, datetime) else value
+
+
+def _encode_ndjson(columns, rows):
+    return ''.join(
+        json.dumps({column: _value(value) for column, value in zip(columns, row)}, ensure_ascii=False) + '\n'
+        for row in rows
+    )
+
+
+def _encode_csv(columns, rows):
+    buffer = io.StringIO()
+    writer = csv.writer(buffer)
+    writer.writerows([_value(value) for value in row] for row in rows)
+    return buffer.getvalue()
+
+
+def stream_export(build_query, key, columns, fmt='ndjson', compress=False, after=None,
+                  chunk_rows=10000, yield_per=1000):
+    """
+    Genera un export en NDJSON o CSV con memoria constante. Las filas se
+    leen por tramos de `chunk_rows` (paginación por clave): cada tramo es una
+    consulta corta que se recorre con un cursor del servidor (`yield_per`
+    filas por lectura) y al terminarlo la conexión vuelve al pool, así que
+    ninguna transacción dura todo el export.
+
+    Args:
+        build_query (callable): recibe la posición de la última fila enviada
+            (o None) y devuelve el select ordenado de las filas siguientes.
+        key (callable): posición de una fila, en el formato de build_query.
+        columns (tuple): nombres de las columnas, en el orden del select.
+        compress (bool): comprimir la salida con gzip sobre la marcha.
+        after: posición desde la que reanudar un export interrumpido.
+
+    Yields:
+        bytes: fragmentos del fichero.
+    """
+    encode = _encode_csv if fmt == 'csv' else _encode_ndjson
+    compressor = zlib.compressobj(6, zlib.DEFLATED, 31) if compress else None
+
+    def emit(text):
+        data = text.encode('utf-8')
+        return compressor.compress(data) if compressor else data
+
+    if fmt == 'csv':
+        data = emit(_encode_csv(columns, [columns]))
+        if data:
+            yield data
+
+    position = after
+    while True:
+        count = 0
+        try:
+            result = db.session.execute(
+                build_query(position).limit(chunk_rows),
+                execution_options={'yield_per': yield_per}
+            )
+            for partition in result.partitions():
+                count += len(partition)
+                position = key(partition[-1])
+                data = emit(encode(columns, partition))
+                if data:
+                    yield data
+        finally:
+            # También si el cliente corta la descarga a mitad de un tramo
+            db.session.close()
+        if count < chunk_rows:
+            break
+
+    if compressor:
+        yield compressor.flush()
+
+
+def chat_export_query(agent_id, start=None, end=None):
+    """Consulta del historial de un agente en orden cronológico; la posición es (timestamp, id)."""
+    def build_query(position):
+        query = select(*(getattr(ChatLog, column) for column in CHAT_EXPORT_COLUMNS)).where(
+            ChatLog.agent_id == agent_id
+        )
+        if start is not None:
+            query = query.where(ChatLog.timestamp >= start)
+        if end is not None:
+            query = query.where(ChatLog.timestamp < end)
+        if position is not None:
+            query = query.where(tuple_(ChatLog.timestamp, ChatLog.id) > tuple(position))
+        return query.order_by(ChatLog.timestamp.asc(), ChatLog.id.asc())
+
+    return build_query, lambda row: (row.timestamp, row.id)
+
+
+def chat_export_position(agent_id, chat_id):
+    """Posición (timestamp, id) del mensaje `chat_id` del agente, o None si no existe."""
+    row = db.session.execute(
+        select(ChatLog.timestamp, ChatLog.id).where(ChatLog.id == chat_id, ChatLog.agent_id == agent_id)
+    ).first()
+    return tuple(row) if row else None
+
+
+def log_export_query(start=None, end=None):
+    """Consulta del log de auditoría por id; la posición es el id."""
+    def build_query(position):
+        query = select(*(getattr(LogEntry, column) for column in LOG_EXPORT_COLUMNS))
+        if start is not None:
+            query = query.where(LogEntry.timestamp >= start)
+        if end is not None:
+            query = query.where(LogEntry.timestamp < end)
+        if position is not None:
+            query = query.where(LogEntry.id > position)
+        return query.order_by(LogEntry.id.asc())
+
+    return build_query, lambda row: row.id
@@ -0,0 +1,167 @@
+# app/utils/fake_llm.py
+
+import sys
+import json
+import time
+import random
+import threading
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+
+class _Server(ThreadingHTTPServer):
+    daemon_threads = True
+
+    def handle_error(self, request, client_address):
+        # Un cliente que abandona la petición (timeout, fallback) no es un error
+        if not isinstance(sys.exc_info()[1], ConnectionError):
+            super().handle_error(request, client_address)
+
+
+class FakeLLMServer:
+    """
+    Servidor local compatible con /v1/chat/completions de OpenAI para medir
+    la app sin llamar al proveedor real. Responde con eco del último mensaje,
+    admite streaming (con include_usage) y, si el agente ofrece herramientas,
+    pide una tool_call en la primera ronda con probabilidad `tool_call_rate`.
+
+    Args:
+        latency (float): segundos hasta la respuesta o el primer fragmento.
+        token_delay (float): segundos entre fragmentos en streaming.
+        tokens (int): palabras de cada respuesta.
+        tool_call_rate (float): probabilidad de pedir una herramienta (0 a 1).
+        error_rate (float): probabilidad de responder con un error 500 (0 a 1).
+    """
+
+    def __init__(self, host='127.0.0.1', port=0, latency=0.05, token_delay=0.005, tokens=30, tool_call_rate=1.0,
+                 error_rate=0.0):
+        self.latency = latency
+        self.token_delay = token_delay
+        self.tokens = tokens
+        self.tool_call_rate = tool_call_rate
+        self.error_rate = error_rate
+        self.requests = 0
+        self._lock = threading.Lock()
+        self._server = _Server((host, port), self._handler())
+        self._thread = None
+
+    @property
+    def base_url(self):
+        host, port = self._server.server_address[:2]
+        return f'http://{host}:{port}/v1'
+
+    def start(self):
+        self._thread = threading.Thread(target=self._server.serve_forever, name='fake-llm', daemon=True)
+        self._thread.start()
+        return self
+
+    def stop(self):
+        self._server.shutdown()
+        self._server.server_close()
+
+    def serve_forever(self):
+        self._server.serve_forever()
+
+    def _reply(self, body):
+        messages = body.get('messages') or []
+        last = next((m.get('content') for m in reversed(messages) if m.get('role') == 'user'), '') or ''
+        words = (f"eco: {last} " * self.tokens).split()[:self.tokens]
+        prompt_tokens = sum(len(str(m.get('content') or '').split()) for m in messages)
+        wants_tool = (
+            bool(body.get('tools'))
+            and not any(m.get('role') == 'tool' for m in messages)
+            and random.random() < self.tool_call_rate
+        )
+        tool_call = None
+        if wants_tool:
+            tool = body['tools'][0]['function']
+            tool_call = {'id': f'call_{random.getrandbits(32):08x}', 'type': 'function',
+                         'function': {'name': tool['name'], 'arguments': json.dumps({'query': last[:50]})}}
+        usage = {'prompt_tokens': prompt_tokens, 'completion_tokens': 0 if tool_call else len(words),
+                 'total_tokens': prompt_tokens + (0 if tool_call else len(words))}
+        return words, tool_call, usage
+
+    def _handler(self):
+        server = self
+
+        class Handler(BaseHTTPRequestHandler):
+            protocol_version = 'HTTP/1.1'
+            # Cabeceras y cuerpo van en escrituras separadas; con Nagle cada
+            # respuesta esperaría al ACK retardado del cliente (~40 ms)
+            disable_nagle_algorithm = True
+
+            def log_message(self, *args):
+                pass
+
+            def do_GET(self):
+                if self.path.rstrip('/').endswith('/models'):
+                    return self._json(200, {'object': 'list', 'data': [{'id': 'fake', 'object': 'model'}]})
+                self._json(404, {'error': {'message': 'Not found'}})
+
+            def do_POST(self):
+                length = int(self.headers.get('Content-Length') or 0)
+                try:
+                    body = json.loads(self.rfile.read(length) or b'{}')
+                except ValueError:
+                    return self._json(400, {'error': {'message': 'JSON inválido'}})
+                if not self.path.rstrip('/').endswith('/chat/completions'):
+                    return self._json(404, {'error': {'message': 'Not found'}})
+
+                with server._lock:
+                    server.requests += 1
+                words, tool_call, usage = server._reply(body)
+                time.sleep(server.latency)
+                if random.random() < server.error_rate:
+                    return self._json(500, {'error': {'message': 'Fallo simulado', 'type': 'server_error'}})
+                if body.get('stream'):
+                    self._stream(body, words, tool_call, usage)
+                else:
+                    message = {'role': 'assistant', 'content': None if tool_call else ' '.join(words)}
+                    if tool_call:
+                        message['tool_calls'] = [tool_call]
+                    self._json(200, {
+                        'id': 'chatcmpl-fake', 'object': 'chat.completion', 'created': int(time.time()),
+                        'model': body.get('model'),
+                        'choices': [{'index': 0, 'message': message,
+                                     'finish_reason': 'tool_calls' if tool_call else 'stop'}],
+                        'usage': usage,
+                    })
+
+            def _stream(self, body, words, tool_call, usage):
+                self.send_response(200)
+                self.send_header('Content-Type', 'text/event-stream')
+                self.send_header('Transfer-Encoding', 'chunked')
+                self.end_headers()
+                base = {'id': 'chatcmpl-fake', 'object': 'chat.completion.chunk',
+                        'created': int(time.time()), 'model': body.get('model')}
+
+                def send(payload):
+                    data = f"data: {payload if isinstance(payload, str) else json.dumps(payload)}\n\n".encode()
+                    self.wfile.write(f"{len(data):x}\r\n".encode() + data + b"\r\n")
+                    self.wfile.flush()
+
+                if tool_call:
+                    send({**base, 'choices': [{'index': 0, 'finish_reason': None, 'delta': {
+                        'role': 'assistant', 'tool_calls': [{'index': 0, **tool_call}]}}]})
+                    finish = 'tool_calls'
+                else:
+                    for i, word in enumerate(words):
+                        if i:
+                            time.sleep(server.token_delay)
+                        send({**base, 'choices': [{'index': 0, 'finish_reason': None,
+                                                   'delta': {'content': word + ' '}}]})
+                    finish = 'stop'
+                send({**base, 'choices': [{'index': 0, 'delta': {}, 'finish_reason': finish}]})
+                if (body.get('stream_options') or {}).get('include_usage'):
+                    send({**base, 'choices': [], 'usage': usage})
+                send('[DONE]')
+                self.wfile.write(b"0\r\n\r\n")
+
+            def _json(self, status, payload):
+                data = json.dumps(payload).encode()
+                self.send_response(status)
+                self.send_header('Content-Type', 'application/json')
+                self.send_header('Content-Length', str(len(data)))
+                self.end_headers()
+                self.wfile.write(data)
+
+        return Handler
@@ -0,0 +1,204 @@
+# app/utils/jobs.py
+
+import os
+import time
+import logging
+import importlib
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime, timedelta
+from flask import current_app
+from sqlalchemy import func, select
+from app.models import BackgroundJob, db
+
+logger = logging.getLogger(__name__)
+
+_executor = ThreadPoolExecutor(max_workers=2, thread_name_prefix='jobs')
+
+# Trabajos encolados o en curso en este worker: un hilo refresca su latido
+# (heartbeat_at) y recupera los huérfanos de workers que murieron
+ACTIVE_STATUSES = ('pending', 'running')
+_app = None
+_owned = set()
+_owned_lock = threading.Lock()
+_worker = None
+_owner_pid = None
+_worker_lock = threading.Lock()
+
+
+def init_jobs(app):
+    """
+    Guarda la app. El hilo de latido y recuperación arranca con la primera
+    petición de cada worker, como el de correo.
+    """
+    global _app
+    _app = app
+    app.before_request(_ensure_worker)
+
+
+def _ensure_worker():
+    global _worker, _owner_pid
+    if _worker is not None and _owner_pid == os.getpid():
+        return
+    if _app is None:
+        return
+    with _worker_lock:
+        if _worker is not None and _owner_pid == os.getpid():
+            return
+        _owner_pid = os.getpid()
+        _worker = threading.Thread(target=_worker_loop, name='jobs-heartbeat', daemon=True)
+        _worker.start()
+
+
+def _job_target(fn):
+    return f'{fn.__module__}:{fn.__qualname__}'
+
+
+def _resolve_target(target):
+    module, _, name = target.partition(':')
+    return getattr(importlib.import_module(module), name)
+
+
+def start_job(user_id, kind, fn, *args):
+    """
+    Registra un trabajo en la tabla background_job y lo ejecuta en segundo
+    plano. El estado queda en base de datos para que cualquier worker pueda
+    consultarlo y, si el worker muere, recuperarlo (ver sweep_stale_jobs).
+
+    Args:
+        user_id (int): usuario propietario del trabajo.
+        kind (str): tipo de trabajo (p.ej. 'delete_chats').
+        fn (callable): función de módulo fn(job_id, *args) a ejecutar; debe
+            ser idempotente porque un trabajo interrumpido se repite.
+        args: argumentos serializables en JSON.
+
+    Returns:
+        BackgroundJob: el trabajo creado.
+    """
+    job = BackgroundJob(
+        user_id=user_id,
+        kind=kind,
+        params={'fn': _job_target(fn), 'args': list(args)},
+        heartbeat_at=datetime.utcnow()
+    )
+    db.session.add(job)
+    db.session.commit()
+
+    _submit(current_app._get_current_object(), job.id, fn, args)
+    return job
+
+
+def _submit(app, job_id, fn, args):
+    with _owned_lock:
+        _owned.add(job_id)
+    _executor.submit(_run_job, app, job_id, fn, args)
+
+
+def update_job(job_id, **fields):
+    """Actualiza el estado o el progreso de un trabajo y confirma el cambio."""
+    now = datetime.utcnow()
+    fields['updated_at'] = now
+    fields.setdefault('heartbeat_at', now)
+    BackgroundJob.query.filter_by(id=job_id).update(fields, synchronize_session=False)
+    db.session.commit()
+
+
+def _run_job(app, job_id, fn, args):
+    with app.app_context():
+        try:
+            update_job(job_id, status='running', started_at=datetime.utcnow(), attempts=BackgroundJob.attempts + 1)
+            fn(job_id, *args)
+            update_job(job_id, status='done')
+        except Exception as e:
+            db.session.rollback()
+            logger.exception("Error en el trabajo %s", job_id)
+            try:
+                update_job(job_id, status='error', error=str(e))
+            except Exception:
+                db.session.rollback()
+        finally:
+            with _owned_lock:
+                _owned.discard(job_id)
+
+
+def heartbeat_jobs():
+    """Marca como vivos los trabajos encolados o en curso en este worker."""
+    with _owned_lock:
+        owned = list(_owned)
+    if not owned:
+        return
+    BackgroundJob.query.filter(
+        BackgroundJob.id.in_(owned),
+        BackgroundJob.status.in_(ACTIVE_STATUSES)
+    ).update({'heartbeat_at': datetime.utcnow()}, synchronize_session=False)
+    db.session.commit()
+
+
+def sweep_stale_jobs():
+    """
+    Recupera los trabajos huérfanos: pendientes o en curso cuyo latido no se
+    actualiza desde hace JOB_STALE_SECONDS porque el worker que los tenía se
+    reinició o murió (max_requests, OOM, despliegue). Se vuelven a encolar en
+    este worker hasta JOB_MAX_ATTEMPTS ejecuciones; después quedan en error.
+    El reclamo es condicional, así que cada huérfano lo recupera un solo worker.
+
+    Returns:
+        int: trabajos recuperados (reencolados o marcados como error).
+    """
+    config = current_app.config
+    now = datetime.utcnow()
+    cutoff = now - timedelta(seconds=float(config.get('JOB_STALE_SECONDS', 90)))
+    max_attempts = int(config.get('JOB_MAX_ATTEMPTS', 3))
+    last_seen = func.coalesce(BackgroundJob.heartbeat_at, BackgroundJob.updated_at)
+    with _owned_lock:
+        owned = list(_owned)
+
+    stale = db.session.execute(
+        select(BackgroundJob.id, BackgroundJob.attempts, BackgroundJob.params).where(
+            BackgroundJob.status.in_(ACTIVE_STATUSES),
+            last_seen < cutoff,
+            BackgroundJob.id.notin_(owned)
+        )
+    ).all()
+
+    recovered = 0
+    for job_id, attempts, params in stale:
+        fn = None
+        if params and (attempts or 0) < max_attempts:
+            try:
+                fn = _resolve_target(params['fn'])
+            except (ImportError, AttributeError, KeyError):
+                logger.error("Trabajo %s: función %s no disponible", job_id, params.get('fn'))
+        if fn is not None:
+            values = {'status': 'pending', 'heartbeat_at': now, 'updated_at': now}
+        else:
+            values = {'status': 'error', 'error': 'Trabajo interrumpido: el worker que lo ejecutaba se detuvo',
+                      'updated_at': now}
+
+        claimed = BackgroundJob.query.filter(
+            BackgroundJob.id == job_id,
+            BackgroundJob.status.in_(ACTIVE_STATUSES),
+            last_seen < cutoff
+        ).update(values, synchronize_session=False)
+        db.session.commit()
+        if not claimed:
+            continue
+        recovered += 1
+        if fn is not None:
+            logger.warning("Trabajo %s huérfano: se reencola (intento %s)", job_id, (attempts or 0) + 1)
+            _submit(current_app._get_current_object(), job_id, fn, params.get('args', []))
+        else:
+            logger.error("Trabajo %s huérfano marcado como error", job_id)
+    return recovered
+
+
+def _worker_loop():
+    interval = float(_app.config.get('JOB_HEARTBEAT_SECONDS', 15))
+    while True:
+        time.sleep(interval)
+        try:
+            with _app.app_context():
+                heartbeat_jobs()
+                sweep_stale_jobs()
+        except Exception:
+            logger.exception("Error en el hilo de latido de trabajos")
@@ -0,0 +1,157 @@
+# app/utils/llm_client.py
+
+import os
+import atexit
+import threading
+from flask import current_app, has_app_context
+
+# Registro de clientes por proveedor. Cada worker de gunicorn mantiene el suyo:
+# si el proceso cambia (fork), se descartan los clientes heredados del padre.
+_clients = {}
+_stats = {}
+_owner_pid = os.getpid()
+_lock = threading.Lock()
+
+DEFAULT_SETTINGS = {
+    'LLM_POOL_MAX_CONNECTIONS': 20,
+    'LLM_POOL_MAX_KEEPALIVE': 10,
+    'LLM_POOL_KEEPALIVE_EXPIRY': 60.0,
+    'LLM_CONNECT_TIMEOUT': 5.0,
+    'LLM_REQUEST_TIMEOUT': 60.0,
+}
+
+
+def _setting(name):
+    if has_app_context():
+        value = current_app.config.get(name)
+        if value is not None:
+            return value
+    return DEFAULT_SETTINGS[name]
+
+
+def _new_stats():
+    return {
+        'requests': 0,
+        'new_connections': 0,
+        'tls_handshakes': 0,
+        'clients_created': 0,
+    }
+
+
+def _make_trace(stats):
+    # httpcore solo emite estos eventos cuando abre una conexión nueva,
+    # por lo que permiten distinguir conexiones reutilizadas del pool.
+    def trace(event_name, info):
+        if event_name == 'connection.connect_tcp.complete':
+            with _lock:
+                stats['new_connections'] += 1
+        elif event_name == 'connection.start_tls.complete':
+            with _lock:
+                stats['tls_handshakes'] += 1
+    return trace
+
+
+def _build_http_client(stats):
+    import httpx
+
+    trace = _make_trace(stats)
+
+    def on_request(request):
+        request.extensions['trace'] = trace
+        with _lock:
+            stats['requests'] += 1
+
+    return httpx.Client(
+        limits=httpx.Limits(
+            max_connections=int(_setting('LLM_POOL_MAX_CONNECTIONS')),
+            max_keepalive_connections=int(_setting('LLM_POOL_MAX_KEEPALIVE')),
+            keepalive_expiry=float(_setting('LLM_POOL_KEEPALIVE_EXPIRY')),
+        ),
+        timeout=httpx.Timeout(
+            float(_setting('LLM_REQUEST_TIMEOUT')),
+            connect=float(_setting('LLM_CONNECT_TIMEOUT')),
+        ),
+        event_hooks={'request': [on_request]},
+    )
+
+
+def _credentials(provider):
+    """
+    Obtiene API key y base URL del proveedor desde el entorno
+    (<PROVEEDOR>_API_KEY y <PROVEEDOR>_BASE_URL, p.ej. OPENAI_API_KEY).
+    """
+    prefix = provider.upper().replace('-', '_')
+    return os.getenv(f'{prefix}_API_KEY'), os.getenv(f'{prefix}_BASE_URL')
+
+
+def _reset_after_fork():
+    global _owner_pid
+    if os.getpid() != _owner_pid:
+        _clients.clear()
+        _stats.clear()
+        _owner_pid = os.getpid()
+
+
+def get_llm_client(provider='openai'):
+    """
+    Devuelve el cliente compartido del proveedor indicado, creándolo la
+    primera vez. El cliente mantiene un pool de conexiones keep-alive que se
+    reutiliza entre peticiones del mismo worker.
+
+    Args:
+        provider (str): nombre del proveedor (por defecto 'openai').
+
+    Returns:
+        OpenAI: cliente compatible con la API de OpenAI.
+    """
+    provider = (provider or 'openai').lower()
+    client = _clients.get(provider) if os.getpid() == _owner_pid else None
+    if client is not None:
+        return client
+
+    with _lock:
+        _reset_after_fork()
+        client = _clients.get(provider)
+        if client is None:
+            # El SDK tarda en importarse; se carga con el primer cliente
+            from openai import OpenAI
+
+            stats = _stats.setdefault(provider, _new_stats())
+            api_key, base_url = _credentials(provider)
+            client = OpenAI(
+                api_key=api_key,
+                base_url=base_url,
+                http_client=_build_http_client(stats),
+                timeout=float(_setting('LLM_REQUEST_TIMEOUT')),
+                # Los reintentos los decide el router (con presupuesto global)
+                max_retries=0,
+            )
+            stats['clients_created'] += 1
+            _clients[provider] = client
+    return client
+
+
+def get_client_stats():
+    """Devuelve los contadores de uso del pool por proveedor para este worker."""
+    with _lock:
+        result = {}
+        for provider, stats in _stats.items():
+            reused = max(stats['requests'] - stats['new_connections'], 0)
+            result[provider] = {
+                **stats,
+                'reused_connections': reused,
+                'reuse_ratio': round(reused / stats['requests'], 3) if stats['requests'] else None,
+            }
+        return {'pid': os.getpid(), 'providers': result}
+
+
+@atexit.register
+def close_llm_clients():
+    """Cierra los pools de conexiones al terminar el proceso."""
+    with _lock:
+        for client in _clients.values():
+            try:
+                client.close()
+            except Exception:
+                pass
+        _clients.clear()
@@ -0,0 +1,359 @@
+# app/utils/llm_router.py
+
+import os
+import time
+import logging
+import threading
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor, FIRST_COMPLETED, wait
+from flask import current_app
+from app.utils.llm_client import _credentials, get_llm_client
+from app.utils.metrics import observe_retry, observe_short_circuit
+from app.utils.resilience import (
+    CircuitBreaker, CircuitOpen, LLMUnavailable, RetryBudget, backoff_delay, is_retryable
+)
+
+logger = logging.getLogger(__name__)
+
+_router = None
+_router_lock = threading.Lock()
+
+
+def _is_timeout(error):
+    return isinstance(error, TimeoutError) or 'Timeout' in type(error).__name__
+
+
+def _should_fall_back(error):
+    # Solo fallos del destino (caído, lento, circuito abierto o credenciales
+    # de ese proveedor); un 400 o 422 fallaría igual en cualquier otro
+    if isinstance(error, CircuitOpen) or is_retryable(error) or _is_timeout(error):
+        return True
+    return getattr(error, 'status_code', None) == 401
+
+
+def _percentile(samples, p):
+    ordered = sorted(samples)
+    return ordered[max(0, int(round(p / 100 * len(ordered))) - 1)]
+
+
+class LLMRouter:
+    """
+    Envía cada llamada al proveedor del agente. Los proveedores compatibles
+    con la API de OpenAI (LLM_OPENAI_COMPATIBLE_PROVIDERS) usan el cliente
+    compartido con pool de get_llm_client; el resto pasa por litellm como
+    "<proveedor>/<modelo>".
+
+    Cada intento lleva el timeout del agente (LLM_REQUEST_TIMEOUT por
+    defecto). Los errores transitorios se reintentan con backoff y jitter
+    mientras quede presupuesto de reintentos, y cada destino tiene un
+    circuito que, abierto, falla al instante. Si un destino falla, o no
+    responde dentro de LLM_LATENCY_BUDGET, se prueba el siguiente de
+    LLM_FALLBACKS. Con LLM_HEDGE_ENABLED, una llamada sin streaming que
+    tarda más que el p95 de su destino lanza un segundo intento y se queda
+    con la primera respuesta.
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._stats = {}
+        self._breakers = {}
+        self._budget = None
+        self._executor = None
+
+    # ---- configuración ----
+
+    def _config(self, name, default):
+        value = current_app.config.get(name)
+        return default if value is None else value
+
+    def targets(self, provider, model):
+        """Destinos (proveedor, modelo) en orden: el del agente y sus fallbacks."""
+        provider = (provider or 'openai').lower()
+        fallbacks = self._config('LLM_FALLBACKS', {})
+        chain = fallbacks.get(f'{provider}/{model}', fallbacks.get(provider, []))
+        targets = [(provider, model)]
+        for target in chain:
+            fallback_provider, _, fallback_model = target.partition('/')
+            pair = (fallback_provider.lower(), fallback_model or model)
+            if pair not in targets:
+                targets.append(pair)
+        return targets
+
+    # ---- estadísticas ----
+
+    def _target_stats(self, target):
+        key = f'{target[0]}/{target[1]}'
+        with self._lock:
+            stats = self._stats.get(key)
+            if stats is None:
+                stats = self._stats[key] = {
+                    'requests': 0, 'errors': 0, 'timeouts': 0, 'retries': 0, 'short_circuited': 0,
+                    'fallbacks': 0, 'hedges': 0, 'hedge_wins': 0,
+                    'latencies': deque(maxlen=int(self._config('LLM_STATS_WINDOW', 200))),
+                    'first_chunk': deque(maxlen=int(self._config('LLM_STATS_WINDOW', 200))),
+                }
+            return stats
+
+    def _count(self, target, name):
+        stats = self._target_stats(target)
+        with self._lock:
+            stats[name] += 1
+
+    def _observe(self, target, seconds, stream):
+        stats = self._target_stats(target)
+        with self._lock:
+            stats['first_chunk' if stream else 'latencies'].append(seconds)
+
+    def p95(self, target):
+        stats = self._target_stats(target)
+        with self._lock:
+            samples = list(stats['latencies'])
+        if len(samples) < int(self._config('LLM_HEDGE_MIN_SAMPLES', 20)):
+            return None
+        return _percentile(samples, 95)
+
+    def stats(self):
+        with self._lock:
+            items = [(key, dict(stats), list(stats['latencies']), list(stats['first_chunk']))
+                     for key, stats in self._stats.items()]
+        result = {}
+        for key, stats, latencies, first_chunk in items:
+            stats.pop('latencies')
+            stats.pop('first_chunk')
+            for name, samples in (('latency', latencies), ('first_chunk', first_chunk)):
+                stats[f'{name}_samples'] = len(samples)
+                stats[f'{name}_p50_ms'] = round(_percentile(samples, 50) * 1000, 1) if samples else None
+                stats[f'{name}_p95_ms'] = round(_percentile(samples, 95) * 1000, 1) if samples else None
+            result[key] = stats
+        with self._lock:
+            breakers = list(self._breakers.items())
+        return {
+            'pid': os.getpid(),
+            'targets': result,
+            'circuits': {key: breaker.stats() for key, breaker in breakers},
+            'retry_budget': self.retry_budget().stats(),
+        }
+
+    # ---- resiliencia ----
+
+    def breaker(self, target):
+        key = f'{target[0]}/{target[1]}'
+        with self._lock:
+            breaker = self._breakers.get(key)
+            if breaker is None:
+                breaker = self._breakers[key] = CircuitBreaker(
+                    key,
+                    failure_threshold=int(self._config('LLM_BREAKER_FAILURES', 5)),
+                    cooldown=float(self._config('LLM_BREAKER_COOLDOWN', 30)),
+                )
+            return breaker
+
+    def retry_budget(self):
+        if self._budget is None:
+            with self._lock:
+                if self._budget is None:
+                    self._budget = RetryBudget(
+                        ratio=float(self._config('LLM_RETRY_BUDGET_RATIO', 0.1)),
+                        min_per_second=float(self._config('LLM_RETRY_BUDGET_MIN_PER_SECOND', 1)),
+                        window=float(self._config('LLM_RETRY_BUDGET_WINDOW', 10)),
+                    )
+        return self._budget
+
+    # ---- llamadas ----
+
+    def _send(self, target, params, timeout):
+        provider, model = target
+        params = {name: value for name, value in params.items() if value is not None}
+        if timeout:
+            params['timeout'] = timeout
+        if provider in self._config('LLM_OPENAI_COMPATIBLE_PROVIDERS', ['openai']):
+            return get_llm_client(provider).chat.completions.create(model=model, **params)
+
+        try:
+            # Sin descargar la tabla de precios de litellm al importarlo
+            os.environ.setdefault('LITELLM_LOCAL_MODEL_COST_MAP', 'True')
+            import litellm
+        except ImportError:
+            raise RuntimeError(f"Se requiere el paquete 'litellm' para el proveedor '{provider}'")
+        api_key, api_base = _credentials(provider)
+        return litellm.completion(model=f'{provider}/{model}', api_key=api_key, api_base=api_base, **params)
+
+    def _attempt(self, target, params, timeout):
+        """Una llamada a un destino, registrando latencia o error."""
+        stream = bool(params.get('stream'))
+        self._count(target, 'requests')
+        started = time.perf_counter()
+        try:
+            response = self._send(target, params, timeout)
+            if stream:
+                # Un destino que falla antes del primer fragmento aún admite fallback
+                iterator = iter(response)
+                first = next(iterator, None)
+        except Exception as e:
+            self._count(target, 'timeouts' if _is_timeout(e) else 'errors')
+            raise
+        self._observe(target, time.perf_counter() - started, stream)
+        if stream:
+            return self._chain(response, first, iterator)
+        return response
+
+    @staticmethod
+    def _chain(response, first, iterator):
+        try:
+            if first is not None:
+                yield first
+            yield from iterator
+        finally:
+            # Si el cliente aborta, la conexión vuelve al pool
+            close = getattr(response, 'close', None)
+            if close is not None:
+                close()
+
+    def _get_executor(self):
+        if self._executor is None:
+            with self._lock:
+                if self._executor is None:
+                    self._executor = ThreadPoolExecutor(
+                        max_workers=int(self._config('LLM_HEDGE_POOL_SIZE', 16)),
+                        thread_name_prefix='llm-hedge'
+                    )
+        return self._executor
+
+    def _hedged(self, target, params, timeout):
+        delay = self.p95(target) or float(self._config('LLM_HEDGE_DELAY', 2.0))
+        app = current_app._get_current_object()
+
+        def run():
+            with app.app_context():
+                return self._attempt(target, params, timeout)
+
+        executor = self._get_executor()
+        pending = {executor.submit(run): False}
+        done, _ = wait(pending, timeout=delay)
+        # El segundo intento también gasta presupuesto de reintentos
+        if not done and self.retry_budget().try_spend():
+            self._count(target, 'hedges')
+            pending[executor.submit(run)] = True
+
+        error = None
+        while pending:
+            done, _ = wait(pending, return_when=FIRST_COMPLETED)
+            for future in done:
+                is_hedge = pending.pop(future)
+                try:
+                    response = future.result()
+                except Exception as e:
+                    error = e
+                    continue
+                # El intento perdedor termina en segundo plano y se descarta
+                if is_hedge:
+                    self._count(target, 'hedge_wins')
+                return response
+        raise error
+
+    def _call_target(self, target, params, timeout, hedge, retry_timeouts=True):
+        """
+        Llama a un destino a través de su circuito, con reintentos acotados.
+        Con retry_timeouts=False un timeout pasa directamente al siguiente
+        destino (el presupuesto de latencia no se multiplica por reintentos).
+        """
+        breaker = self.breaker(target)
+        max_retries = int(self._config('LLM_MAX_RETRIES', 2))
+        attempt = 0
+        while True:
+            try:
+                breaker.before_call()
+            except CircuitOpen:
+                self._count(target, 'short_circuited')
+                observe_short_circuit(breaker.target)
+                raise
+            try:
+                if hedge:
+                    response = self._hedged(target, params, timeout)
+                else:
+                    response = self._attempt(target, params, timeout)
+            except Exception as e:
+                if not is_retryable(e):
+                    breaker.release()
+                    raise
+                breaker.record_failure()
+                if attempt >= max_retries or breaker.state == breaker.OPEN:
+                    raise
+                if not retry_timeouts and _is_timeout(e):
+                    raise
+                if not self.retry_budget().try_spend():
+                    observe_retry(breaker.target, 'budget_exhausted')
+                    raise
+                observe_retry(breaker.target, 'retried')
+                self._count(target, 'retries')
+                time.sleep(backoff_delay(
+                    attempt,
+                    float(self._config('LLM_RETRY_BASE_DELAY', 0.25)),
+                    float(self._config('LLM_RETRY_MAX_DELAY', 2)),
+                ))
+                attempt += 1
+                continue
+            breaker.record_success()
+            return response
+
+    def completion(self, provider, model, timeout=None, **params):
+        """
+        Equivalente a client.chat.completions.create con enrutado por
+        proveedor, reintentos, circuito, fallbacks y hedging. En streaming
+        devuelve un iterador de fragmentos; reintentos y fallback solo son
+        posibles antes del primero.
+
+        Args:
+            timeout (float): segundos por intento (por defecto LLM_REQUEST_TIMEOUT).
+
+        Raises:
+            LLMUnavailable: todos los destinos fallaron por errores del
+                proveedor o tienen el circuito abierto.
+            Exception: los errores de la petición (400, 422...) se propagan
+                sin probar los destinos siguientes.
+        """
+        targets = self.targets(provider, model)
+        timeout = float(timeout or self._config('LLM_REQUEST_TIMEOUT', 60))
+        budget = float(self._config('LLM_LATENCY_BUDGET', 0))
+        hedge = self._config('LLM_HEDGE_ENABLED', False) and not params.get('stream')
+        self.retry_budget().record_call()
+
+        error = None
+        for position, target in enumerate(targets):
+            # El último destino no tiene a quién ceder: solo el timeout del agente
+            last = position == len(targets) - 1
+            cut = bool(budget) and not last
+            attempt_timeout = min(timeout, budget) if cut else timeout
+            try:
+                return self._call_target(target, params, attempt_timeout, hedge, retry_timeouts=not cut)
+            except Exception as e:
+                if not _should_fall_back(e):
+                    raise
+                error = e
+                if not last:
+                    self._count(target, 'fallbacks')
+                    logger.warning("Fallo en %s/%s (%s); probando el siguiente destino", target[0], target[1], e)
+
+        if isinstance(error, LLMUnavailable):
+            raise error
+        if is_retryable(error):
+            raise LLMUnavailable(
+                f"El proveedor del modelo no responde: {error}",
+                float(self._config('LLM_UNAVAILABLE_RETRY_AFTER', 5)),
+                'provider_error'
+            ) from error
+        raise error
+
+
+def get_llm_router():
+    """Router compartido por el worker."""
+    global _router
+    if _router is None:
+        with _router_lock:
+            if _router is None:
+                _router = LLMRouter()
+    return _router
+
+
+def get_router_stats():
+    return get_llm_router().stats()
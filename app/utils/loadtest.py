@@ -0,0 +1,303 @@
+# app/utils/loadtest.py
+
+import os
+import json
+import math
+import time
+import uuid
+import threading
+import urllib.error
+import urllib.request
+from datetime import datetime
+from flask import current_app
+from sqlalchemy import delete
+from werkzeug.serving import WSGIRequestHandler, make_server
+from app.models import Agent, AgentTool, ChatLog, ChatSummary, Tool, UsageDaily, UsageHourly, User, db
+from app.auth import invalidate_principal
+from app.utils.agent_cache import invalidate_agents
+from app.utils.fake_llm import FakeLLMServer
+from app.utils.llm_client import close_llm_clients
+
+SCENARIOS = ('login', 'list_agents', 'chat', 'chat_stream', 'list_chats')
+DEFAULT_BASELINE = os.path.join('benchmarks', 'baseline.json')
+
+
+class _QuietRequestHandler(WSGIRequestHandler):
+    # Sin una línea de log por petición durante la medida
+    def log_request(self, *args, **kwargs):
+        pass
+
+
+def _seed(agents, history, tools):
+    """
+    Crea un usuario temporal con `agents` agentes; el primero tiene
+    herramientas y se usa para el chat, el segundo acumula `history`
+    mensajes para listar historiales grandes.
+    """
+    suffix = uuid.uuid4().hex[:8]
+    password = uuid.uuid4().hex
+    user = User(username=f'load-{suffix}', email=f'load-{suffix}@example.com', password=password)
+    tool_rows = [
+        Tool(name=f'load-{suffix}-{i}', description='Herramienta de prueba',
+             parameters={'type': 'object', 'properties': {'query': {'type': 'string'}}})
+        for i in range(tools)
+    ]
+    agent_rows = [
+        Agent(name=f'load-{i}', prompt='Eres un asistente de prueba.', provider='openai', model='gpt-4o-mini',
+              temperature=0.7, max_tokens=256, user=user, tools=tool_rows if i == 0 else [])
+        for i in range(max(agents, 2))
+    ]
+    db.session.add_all(agent_rows)
+    db.session.flush()
+
+    chat_agent, history_agent = agent_rows[0].id, agent_rows[1].id
+    rows = [
+        {'agent_id': agent_id, 'role': 'user' if i % 2 == 0 else 'assistant', 'message': f'Mensaje de prueba {i} ' * 8}
+        for agent_id, count in ((chat_agent, 20), (history_agent, history))
+        for i in range(count)
+    ]
+    for start in range(0, len(rows), 5000):
+        db.session.bulk_insert_mappings(ChatLog, rows[start:start + 5000])
+    db.session.commit()
+    return {
+        'user_id': user.id,
+        'login': user.username,
+        'password': password,
+        'token': user.generate_token(),
+        'chat_agent_id': chat_agent,
+        'history_agent_id': history_agent,
+        'agent_ids': [agent.id for agent in agent_rows],
+        'tool_ids': [tool.id for tool in tool_rows],
+    }
+
+
+def _cleanup(seed):
+    db.session.remove()
+    agent_ids, tool_ids = seed['agent_ids'], seed['tool_ids']
+    # Sin depender de ON DELETE CASCADE (SQLite no lo aplica por defecto)
+    db.session.execute(delete(ChatLog).where(ChatLog.agent_id.in_(agent_ids)))
+    db.session.execute(delete(ChatSummary).where(ChatSummary.agent_id.in_(agent_ids)))
+    db.session.execute(delete(AgentTool).where(AgentTool.agent_id.in_(agent_ids)))
+    for model_cls in (UsageHourly, UsageDaily):
+        db.session.execute(delete(model_cls).where(model_cls.user_id == seed['user_id']))
+    db.session.execute(delete(Agent).where(Agent.id.in_(agent_ids)))
+    db.session.execute(delete(Tool).where(Tool.id.in_(tool_ids)))
+    db.session.execute(delete(User).where(User.id == seed['user_id']))
+    invalidate_principal(seed['user_id'])
+    invalidate_agents(agent_ids)
+    db.session.commit()
+
+
+def _scenario_request(name, seed):
+    """Devuelve (método, ruta, cuerpo, usa token, streaming) del escenario."""
+    if name == 'login':
+        return 'POST', '/api/auth/login', {'login': seed['login'], 'password': seed['password']}, False, False
+    if name == 'list_agents':
+        return 'GET', '/api/agents', None, True, False
+    if name == 'chat':
+        return 'POST', f"/api/chat/{seed['chat_agent_id']}", {'message': '¿Qué tiempo hace hoy?'}, True, False
+    if name == 'chat_stream':
+        return 'POST', f"/api/chat/{seed['chat_agent_id']}/stream", {'message': 'Resume la conversación'}, True, True
+    if name == 'list_chats':
+        return 'GET', f"/api/agents/{seed['history_agent_id']}/chats?limit=50", None, True, False
+    raise ValueError(f'Escenario desconocido: {name}')
+
+
+def _send(base_url, method, path, body, token, stream):
+    """Envía una petición y devuelve (status, segundos, segundos hasta el primer token)."""
+    headers = {'Content-Type': 'application/json'}
+    if token:
+        headers['Authorization'] = f'Bearer {token}'
+    data = json.dumps(body).encode() if body is not None else None
+    request = urllib.request.Request(base_url + path, data=data, method=method, headers=headers)
+    started = time.perf_counter()
+    first_token = None
+    try:
+        with urllib.request.urlopen(request, timeout=120) as response:
+            if stream:
+                for line in response:
+                    if first_token is None and line.startswith(b'event: token'):
+                        first_token = time.perf_counter() - started
+            else:
+                response.read()
+            status = response.status
+    except urllib.error.HTTPError as e:
+        e.read()
+        status = e.code
+    except OSError:
+        status = 0
+    return status, time.perf_counter() - started, first_token
+
+
+def percentile(values, p):
+    """Percentil por rango más cercano de una lista ordenada."""
+    if not values:
+        return None
+    return values[max(0, math.ceil(p / 100 * len(values)) - 1)]
+
+
+def _summary(values):
+    values = sorted(values)
+    return {
+        'p50_ms': round(percentile(values, 50) * 1000, 2) if values else None,
+        'p95_ms': round(percentile(values, 95) * 1000, 2) if values else None,
+        'p99_ms': round(percentile(values, 99) * 1000, 2) if values else None,
+        'mean_ms': round(sum(values) / len(values) * 1000, 2) if values else None,
+    }
+
+
+def run_scenario(base_url, name, seed, requests=200, concurrency=8, warmup=5):
+    """
+    Lanza `requests` peticiones del escenario con `concurrency` hilos, cada
+    uno enviando la siguiente en cuanto recibe la respuesta anterior.
+
+    Returns:
+        dict: peticiones, errores, requests/s y percentiles de latencia (y de
+        tiempo hasta el primer token en streaming).
+    """
+    method, path, body, auth, stream = _scenario_request(name, seed)
+    token = seed['token'] if auth else None
+    for _ in range(warmup):
+        _send(base_url, method, path, body, token, stream)
+
+    lock = threading.Lock()
+    remaining = [requests]
+    latencies, first_tokens, statuses = [], [], {}
+
+    def worker():
+        while True:
+            with lock:
+                if remaining[0] <= 0:
+                    return
+                remaining[0] -= 1
+            status, elapsed, first_token = _send(base_url, method, path, body, token, stream)
+            with lock:
+                statuses[status] = statuses.get(status, 0) + 1
+                if 200 <= status < 400:
+                    latencies.append(elapsed)
+                    if first_token is not None:
+                        first_tokens.append(first_token)
+
+    started = time.perf_counter()
+    threads = [threading.Thread(target=worker, daemon=True) for _ in range(max(1, concurrency))]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    wall = time.perf_counter() - started
+
+    result = {
+        'requests': requests,
+        'errors': requests - len(latencies),
+        'statuses': {str(status): count for status, count in sorted(statuses.items())},
+        'rps': round(requests / wall, 2) if wall else None,
+        **_summary(latencies),
+    }
+    if stream:
+        result['ttft'] = _summary(first_tokens)
+    return result
+
+
+def run_load_test(scenarios=SCENARIOS, requests=200, concurrency=8, base_url=None,
+                  agents=10, history=5000, tools=2, fake_options=None):
+    """
+    Ejecuta los escenarios contra la app. Sin `base_url` arranca la app en
+    este proceso (servidor multihilo de Werkzeug) apuntando a un FakeLLMServer
+    local, con la admisión desactivada. Con `base_url` mide una instancia ya
+    desplegada, que debe usar el mismo DATABASE_URL y tener OPENAI_BASE_URL
+    apuntando a `manage.py fake_llm`. Crea los datos de prueba y los elimina
+    al terminar.
+
+    Returns:
+        dict: metadatos de la ejecución y resultados por escenario.
+    """
+    app = current_app._get_current_object()
+    fake_options = fake_options or {}
+    seed = _seed(agents, history, tools)
+
+    fake = server = None
+    saved_env = {name: os.environ.get(name) for name in ('OPENAI_BASE_URL', 'OPENAI_API_KEY')}
+    saved_config = {name: app.config.get(name) for name in ('ADMISSION_ENABLED',)}
+    try:
+        if base_url is None:
+            fake = FakeLLMServer(**fake_options).start()
+            os.environ['OPENAI_BASE_URL'] = fake.base_url
+            os.environ.setdefault('OPENAI_API_KEY', 'sk-fake')
+            close_llm_clients()
+            app.config['ADMISSION_ENABLED'] = False
+
+            server = make_server('127.0.0.1', 0, app, threaded=True, request_handler=_QuietRequestHandler)
+            threading.Thread(target=server.serve_forever, name='loadtest-app', daemon=True).start()
+            base_url = f'http://127.0.0.1:{server.server_port}'
+
+        results = {}
+        for name in scenarios:
+            results[name] = run_scenario(base_url, name, seed, requests, concurrency)
+    finally:
+        if server is not None:
+            server.shutdown()
+        if fake is not None:
+            fake.stop()
+            for name, value in saved_env.items():
+                if value is None:
+                    os.environ.pop(name, None)
+                else:
+                    os.environ[name] = value
+            close_llm_clients()
+        app.config.update(saved_config)
+        _cleanup(seed)
+
+    return {
+        'created_at': datetime.utcnow().isoformat(timespec='seconds'),
+        'database': db.engine.dialect.name,
+        'target': 'in-process' if fake is not None else base_url,
+        'requests': requests,
+        'concurrency': concurrency,
+        'history': history,
+        'fake_llm': fake_options if fake is not None else None,
+        'scenarios': results,
+    }
+
+
+def save_baseline(report, path=DEFAULT_BASELINE):
+    directory = os.path.dirname(path)
+    if directory:
+        os.makedirs(directory, exist_ok=True)
+    with open(path, 'w', encoding='utf-8') as f:
+        json.dump(report, f, indent=2, ensure_ascii=False)
+        f.write('\n')
+
+
+def load_baseline(path=DEFAULT_BASELINE):
+    with open(path, encoding='utf-8') as f:
+        return json.load(f)
+
+
+def compare_with_baseline(report, baseline, tolerance=0.2):
+    """
+    Compara con una línea base: hay regresión si el p95 sube, o los
+    requests/s bajan, más de `tolerance` (fracción), o si aparecen errores.
+
+    Returns:
+        list: dicts {scenario, metric, baseline, current, change} de cada regresión.
+    """
+    regressions = []
+    for name, current in report['scenarios'].items():
+        previous = baseline.get('scenarios', {}).get(name)
+        if not previous:
+            continue
+        checks = [
+            ('p95_ms', current.get('p95_ms'), previous.get('p95_ms'), 1),
+            ('rps', current.get('rps'), previous.get('rps'), -1),
+        ]
+        for metric, value, base, direction in checks:
+            if not value or not base:
+                continue
+            change = (value - base) / base
+            if change * direction > tolerance:
+                regressions.append({'scenario': name, 'metric': metric, 'baseline': base,
+                                    'current': value, 'change': round(change, 3)})
+        if current.get('errors') and not previous.get('errors'):
+            regressions.append({'scenario': name, 'metric': 'errors', 'baseline': 0,
+                                'current': current['errors'], 'change': None})
+    return regressions
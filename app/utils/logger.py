@@ -1,13 +1,157 @@
 # app/utils/logger.py
 
-from app.models import LogEntry, db
+import os
+import time
+import queue
+import atexit
+import threading
 from datetime import datetime
+from flask import current_app, has_app_context
+from app.models import LogEntry, db
+
+# Los eventos de auditoría se encolan y un hilo en segundo plano los inserta
+# por lotes con su propia conexión, fuera de la sesión de la petición.
+_queue = None
+_engine = None
+_config = {}
+_flusher = None
+_owner_pid = None
+_stop = threading.Event()
+_lock = threading.Lock()
+_stats = {'queued': 0, 'dropped': 0, 'flushed': 0, 'batches': 0, 'flush_errors': 0}
+
+OVERFLOW_POLICIES = ('drop_new', 'drop_old', 'block')
+
+
+def init_audit_logger(app):
+    """Configura la cola de auditoría a partir de la configuración de la app."""
+    global _engine, _queue
+    with app.app_context():
+        _engine = db.engine
+    _config.update({
+        'batch_size': int(app.config.get('AUDIT_FLUSH_EVENTS', 100)),
+        'interval': int(app.config.get('AUDIT_FLUSH_INTERVAL_MS', 500)) / 1000,
+        'overflow': app.config.get('AUDIT_OVERFLOW_POLICY', 'drop_new'),
+        'block_timeout': int(app.config.get('AUDIT_BLOCK_TIMEOUT_MS', 50)) / 1000,
+    })
+    if _config['overflow'] not in OVERFLOW_POLICIES:
+        raise RuntimeError(f"AUDIT_OVERFLOW_POLICY debe ser uno de {OVERFLOW_POLICIES}")
+    _queue = queue.Queue(maxsize=int(app.config.get('AUDIT_QUEUE_SIZE', 10000)))
+
+
+def _count(name, amount=1):
+    with _lock:
+        _stats[name] += amount
+
+
+def _ensure_flusher():
+    # Cada worker de gunicorn arranca su propio hilo tras el fork
+    global _flusher, _owner_pid
+    if _flusher is not None and _owner_pid == os.getpid():
+        return
+    with _lock:
+        if _flusher is not None and _owner_pid == os.getpid():
+            return
+        _owner_pid = os.getpid()
+        _stop.clear()
+        _flusher = threading.Thread(target=_flush_loop, name='audit-flusher', daemon=True)
+        _flusher.start()
+
 
 def log_event(message):
+    """
+    Encola un evento de auditoría. No toca la sesión de la petición ni espera
+    a la base de datos; si la cola está llena se aplica AUDIT_OVERFLOW_POLICY.
+    """
+    if _queue is None:
+        if not has_app_context():
+            print(f"⚠️ Log de auditoría no inicializado: {message}")
+            return
+        init_audit_logger(current_app._get_current_object())
+    _ensure_flusher()
+
+    event = {'message': message, 'timestamp': datetime.utcnow()}
+    policy = _config['overflow']
     try:
-        entry = LogEntry(message=message, timestamp=datetime.utcnow())
-        db.session.add(entry)
-        db.session.commit()
+        if policy == 'block':
+            _queue.put(event, timeout=_config['block_timeout'])
+        else:
+            _queue.put_nowait(event)
+    except queue.Full:
+        if policy != 'drop_old':
+            _count('dropped')
+            return
+        # Descartar el evento más antiguo para hacer sitio al nuevo
+        try:
+            _queue.get_nowait()
+            _count('dropped')
+            _queue.put_nowait(event)
+        except (queue.Empty, queue.Full):
+            _count('dropped')
+            return
+    _count('queued')
+
+
+def _drain(first):
+    batch = [first]
+    while len(batch) < _config['batch_size']:
+        try:
+            batch.append(_queue.get_nowait())
+        except queue.Empty:
+            break
+    return batch
+
+
+def _write_batch(batch):
+    try:
+        with _engine.begin() as conn:
+            conn.execute(LogEntry.__table__.insert(), batch)
+        _count('flushed', len(batch))
+        _count('batches')
     except Exception as e:
-        db.session.rollback()
-        print(f"⚠️ Error al guardar el log: {str(e)}")
+        _count('flush_errors')
+        print(f"⚠️ Error al guardar {len(batch)} logs: {str(e)}")
+
+
+def _flush_loop():
+    while not _stop.is_set():
+        try:
+            first = _queue.get(timeout=_config['interval'])
+        except queue.Empty:
+            continue
+        # Esperar a completar el lote o a que venza el intervalo
+        deadline = time.monotonic() + _config['interval']
+        batch = [first]
+        while len(batch) < _config['batch_size'] and time.monotonic() < deadline:
+            try:
+                batch.append(_queue.get(timeout=max(deadline - time.monotonic(), 0)))
+            except queue.Empty:
+                break
+        _write_batch(batch)
+
+
+def flush_audit_log(timeout=5):
+    """Escribe los eventos pendientes (se llama al terminar el proceso)."""
+    if _queue is None or _engine is None:
+        return
+    _stop.set()
+    if _flusher is not None and _owner_pid == os.getpid():
+        _flusher.join(timeout)
+    while True:
+        try:
+            first = _queue.get_nowait()
+        except queue.Empty:
+            break
+        _write_batch(_drain(first))
+
+
+atexit.register(flush_audit_log)
+
+
+def get_audit_stats():
+    with _lock:
+        stats = dict(_stats)
+    stats['pending'] = _queue.qsize() if _queue is not None else 0
+    stats['pid'] = os.getpid()
+    stats['overflow_policy'] = _config.get('overflow')
+    return stats
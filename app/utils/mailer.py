@@ -0,0 +1,179 @@
+# app/utils/mailer.py
+
+import os
+import random
+import logging
+import threading
+from datetime import datetime, timedelta
+from flask import current_app
+from flask_mail import Message
+from sqlalchemy import and_, func, or_
+from app.extensions import db, mail
+from app.models import MailOutbox
+
+logger = logging.getLogger(__name__)
+
+# Los correos se guardan en la tabla mail_outbox dentro de la petición y un
+# hilo de cada worker los entrega por lotes reutilizando una conexión SMTP.
+_app = None
+_worker = None
+_owner_pid = None
+_wakeup = threading.Event()
+_lock = threading.Lock()
+_stats = {'sent': 0, 'retried': 0, 'failed': 0, 'batches': 0, 'latency_total_ms': 0.0, 'latency_max_ms': 0.0}
+
+
+def init_mailer(app):
+    """
+    Guarda la app. El hilo de entrega (si MAIL_WORKER_ENABLED) arranca con la
+    primera petición de cada worker: ni los comandos de CLI ni el proceso
+    maestro de gunicorn con preload_app lo lanzan.
+    """
+    global _app
+    _app = app
+    if app.config.get('MAIL_WORKER_ENABLED', True):
+        app.before_request(_ensure_worker)
+
+
+def _ensure_worker():
+    global _worker, _owner_pid
+    if _worker is not None and _owner_pid == os.getpid():
+        return
+    if _app is None or not _app.config.get('MAIL_WORKER_ENABLED', True):
+        return
+    with _lock:
+        if _worker is not None and _owner_pid == os.getpid():
+            return
+        _owner_pid = os.getpid()
+        _worker = threading.Thread(target=_worker_loop, name='mail-outbox', daemon=True)
+        _worker.start()
+
+
+def queue_mail(subject, recipients, body, html=None):
+    """
+    Añade un correo al outbox en la sesión actual. El llamador confirma la
+    transacción; la entrega la hace el hilo en segundo plano.
+
+    Returns:
+        MailOutbox: la fila creada.
+    """
+    item = MailOutbox(subject=subject, recipients=list(recipients), body=body, html=html)
+    db.session.add(item)
+    return item
+
+
+def notify_mail_worker():
+    """Despierta al hilo de entrega tras confirmar nuevos correos."""
+    _ensure_worker()
+    _wakeup.set()
+
+
+def _count(name, amount=1):
+    with _lock:
+        _stats[name] += amount
+
+
+def _backoff(attempts, config):
+    base = float(config.get('MAIL_RETRY_BASE_SECONDS', 30))
+    delay = min(base * (2 ** (attempts - 1)), float(config.get('MAIL_RETRY_MAX_SECONDS', 3600)))
+    return timedelta(seconds=delay * random.uniform(0.8, 1.2))
+
+
+def deliver_pending(batch_size=None):
+    """
+    Entrega un lote de correos pendientes usando una sola conexión SMTP.
+    Requiere un contexto de aplicación.
+
+    Returns:
+        int: número de correos procesados.
+    """
+    config = current_app.config
+    batch_size = batch_size or int(config.get('MAIL_BATCH_SIZE', 20))
+    now = datetime.utcnow()
+    stale = now - timedelta(seconds=int(config.get('MAIL_CLAIM_TIMEOUT_SECONDS', 300)))
+
+    # Reclamar el lote; SKIP LOCKED evita que dos workers tomen el mismo correo
+    rows = MailOutbox.query.filter(or_(
+        and_(MailOutbox.status == 'pending', MailOutbox.next_attempt_at <= now),
+        and_(MailOutbox.status == 'sending', MailOutbox.claimed_at < stale)
+    )).order_by(MailOutbox.id).limit(batch_size).with_for_update(skip_locked=True).all()
+    if not rows:
+        db.session.rollback()
+        return 0
+
+    items = []
+    for row in rows:
+        row.status = 'sending'
+        row.claimed_at = now
+        row.attempts += 1
+        items.append((row.id, row.subject, row.recipients, row.body, row.html, row.created_at, row.attempts))
+    db.session.commit()
+    # No mantener la conexión a la BD durante la conversación SMTP
+    db.session.close()
+
+    errors = {}
+    attempted = set()
+    try:
+        with mail.connect() as conn:
+            for item_id, subject, recipients, body, html, _, _ in items:
+                attempted.add(item_id)
+                try:
+                    conn.send(Message(subject, recipients=recipients, body=body, html=html))
+                except Exception as e:
+                    errors[item_id] = str(e)
+    except Exception as e:
+        # Falló la conexión: lo que no se llegó a enviar se reintenta
+        for item in items:
+            if item[0] not in attempted:
+                errors[item[0]] = str(e)
+    _count('batches')
+
+    sent_at = datetime.utcnow()
+    max_attempts = int(config.get('MAIL_MAX_ATTEMPTS', 5))
+    for item_id, _, _, _, _, created_at, attempts in items:
+        error = errors.get(item_id)
+        if error is None:
+            values = {'status': 'sent', 'sent_at': sent_at, 'last_error': None}
+            latency_ms = (sent_at - created_at).total_seconds() * 1000
+            with _lock:
+                _stats['sent'] += 1
+                _stats['latency_total_ms'] += latency_ms
+                _stats['latency_max_ms'] = max(_stats['latency_max_ms'], latency_ms)
+        elif attempts >= max_attempts:
+            values = {'status': 'failed', 'last_error': error}
+            _count('failed')
+            logger.error("Correo %s descartado tras %s intentos: %s", item_id, attempts, error)
+        else:
+            values = {'status': 'pending', 'last_error': error, 'next_attempt_at': sent_at + _backoff(attempts, config)}
+            _count('retried')
+        MailOutbox.query.filter_by(id=item_id).update(values, synchronize_session=False)
+    db.session.commit()
+    return len(items)
+
+
+def _worker_loop():
+    interval = float(_app.config.get('MAIL_POLL_INTERVAL_SECONDS', 5))
+    while True:
+        _wakeup.wait(interval)
+        _wakeup.clear()
+        try:
+            with _app.app_context():
+                while deliver_pending():
+                    pass
+        except Exception:
+            logger.exception("Error en el hilo de entrega de correos")
+
+
+def get_mail_stats():
+    """Profundidad del outbox y contadores de entrega de este worker."""
+    depth = dict(
+        db.session.query(MailOutbox.status, func.count()).filter(
+            MailOutbox.status.in_(['pending', 'sending', 'failed'])
+        ).group_by(MailOutbox.status).all()
+    )
+    with _lock:
+        stats = dict(_stats)
+    stats['latency_avg_ms'] = round(stats['latency_total_ms'] / stats['sent'], 1) if stats['sent'] else None
+    stats['latency_total_ms'] = round(stats['latency_total_ms'], 1)
+    stats['latency_max_ms'] = round(stats['latency_max_ms'], 1)
+    return {'pid': os.getpid(), 'queue': depth, 'delivery': stats}
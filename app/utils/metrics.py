@@ -0,0 +1,187 @@
+# app/utils/metrics.py
+
+import os
+import time
+from flask import g, request
+from prometheus_client import (
+    CONTENT_TYPE_LATEST, REGISTRY, CollectorRegistry, Counter, Gauge, Histogram, generate_latest
+)
+from sqlalchemy import event
+from app.extensions import db
+
+# Con PROMETHEUS_MULTIPROC_DIR definido (gunicorn con varios workers), cada
+# proceso escribe sus métricas en ese directorio y /api/metrics las agrega.
+LATENCY_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30, 60)
+LLM_BUCKETS = (0.1, 0.25, 0.5, 1, 2, 4, 8, 15, 30, 60, 120)
+QUERY_COUNT_BUCKETS = (0, 1, 2, 3, 5, 8, 13, 21, 50, 100)
+
+REQUEST_LATENCY = Histogram(
+    'http_request_duration_seconds', 'Duración de las peticiones HTTP (incluye el streaming)',
+    ['blueprint', 'route', 'method', 'status'], buckets=LATENCY_BUCKETS
+)
+REQUESTS_IN_FLIGHT = Gauge(
+    'http_requests_in_flight', 'Peticiones HTTP en curso', multiprocess_mode='livesum'
+)
+DB_QUERIES = Histogram(
+    'db_queries_per_request', 'Consultas SQL por petición', ['route'], buckets=QUERY_COUNT_BUCKETS
+)
+DB_TIME = Histogram(
+    'db_query_seconds_per_request', 'Tiempo en consultas SQL por petición', ['route'], buckets=LATENCY_BUCKETS
+)
+LLM_TTFT = Histogram(
+    'llm_time_to_first_token_seconds', 'Tiempo hasta el primer token del modelo (streaming)',
+    ['model'], buckets=LLM_BUCKETS
+)
+LLM_LATENCY = Histogram(
+    'llm_request_duration_seconds', 'Duración total de cada llamada al modelo',
+    ['model', 'stream', 'outcome'], buckets=LLM_BUCKETS
+)
+LLM_IN_FLIGHT = Gauge(
+    'llm_calls_in_flight', 'Llamadas al modelo en curso', multiprocess_mode='livesum'
+)
+TOOL_LATENCY = Histogram(
+    'tool_duration_seconds', 'Duración de la ejecución de herramientas', ['tool', 'outcome'],
+    buckets=LATENCY_BUCKETS
+)
+TOOL_TIMEOUTS = Counter('tool_timeouts', 'Herramientas que superaron su tiempo límite', ['tool'])
+CIRCUIT_STATES = {'closed': 0, 'half_open': 1, 'open': 2}
+LLM_CIRCUIT_STATE = Gauge(
+    'llm_circuit_state', 'Estado del circuito por destino (0 cerrado, 1 semiabierto, 2 abierto)',
+    ['target'], multiprocess_mode='livemax'
+)
+LLM_CIRCUIT_TRANSITIONS = Counter(
+    'llm_circuit_transitions', 'Cambios de estado del circuito por destino', ['target', 'state']
+)
+LLM_SHORT_CIRCUITS = Counter(
+    'llm_short_circuited', 'Llamadas rechazadas sin salir porque el circuito estaba abierto', ['target']
+)
+LLM_RETRIES = Counter(
+    'llm_retries', 'Reintentos de llamadas al modelo (retried o budget_exhausted)', ['target', 'outcome']
+)
+
+
+def init_metrics(app):
+    """Instrumenta las peticiones y las consultas SQL de la app."""
+    with app.app_context():
+        engine = db.engine
+
+    @event.listens_for(engine, 'before_cursor_execute')
+    def _before_query(conn, cursor, statement, parameters, context, executemany):
+        conn.info.setdefault('metrics_query_started', []).append(time.perf_counter())
+
+    def _record_query(conn):
+        stack = conn.info.get('metrics_query_started')
+        if not stack:
+            return
+        started = stack.pop()
+        try:
+            if 'metrics_started' in g:
+                g.metrics_queries += 1
+                g.metrics_query_seconds += time.perf_counter() - started
+        except RuntimeError:
+            # Fuera de un contexto de aplicación (hilos en segundo plano)
+            pass
+
+    @event.listens_for(engine, 'after_cursor_execute')
+    def _after_query(conn, cursor, statement, parameters, context, executemany):
+        _record_query(conn)
+
+    # Una sentencia que falla no dispara after_cursor_execute: sin esto su
+    # inicio quedaría en la pila de la conexión, que vuelve al pool
+    @event.listens_for(engine, 'handle_error')
+    def _failed_query(exception_context):
+        if exception_context.connection is not None and exception_context.execution_context is not None:
+            _record_query(exception_context.connection)
+
+    @app.before_request
+    def _start_request():
+        g.metrics_started = time.perf_counter()
+        g.metrics_queries = 0
+        g.metrics_query_seconds = 0.0
+        g.metrics_status = 500
+        REQUESTS_IN_FLIGHT.inc()
+
+    @app.after_request
+    def _keep_status(response):
+        g.metrics_status = response.status_code
+        return response
+
+    # teardown_request corre al terminar la respuesta, incluido el streaming
+    @app.teardown_request
+    def _record_request(exc):
+        if 'metrics_started' not in g:
+            return
+        route = request.url_rule.rule if request.url_rule else 'unmatched'
+        REQUESTS_IN_FLIGHT.dec()
+        REQUEST_LATENCY.labels(
+            request.blueprint or '', route, request.method, str(g.metrics_status)
+        ).observe(time.perf_counter() - g.metrics_started)
+        DB_QUERIES.labels(route).observe(g.metrics_queries)
+        DB_TIME.labels(route).observe(g.metrics_query_seconds)
+        g.pop('metrics_started')
+
+
+class LLMTimer:
+    """
+    Mide una llamada al modelo. Usar como context manager; en streaming,
+    llamar a first_token() al recibir el primer fragmento.
+    """
+
+    def __init__(self, model, stream=False):
+        self.model = model or 'unknown'
+        self.stream = stream
+        self._first_token = None
+
+    def __enter__(self):
+        self._started = time.perf_counter()
+        LLM_IN_FLIGHT.inc()
+        return self
+
+    def first_token(self):
+        if self._first_token is None:
+            self._first_token = time.perf_counter() - self._started
+            LLM_TTFT.labels(self.model).observe(self._first_token)
+
+    def __exit__(self, exc_type, exc, tb):
+        if exc_type is None:
+            outcome = 'ok'
+        elif exc_type is GeneratorExit:
+            outcome = 'cancelled'
+        else:
+            outcome = 'error'
+        LLM_IN_FLIGHT.dec()
+        LLM_LATENCY.labels(self.model, 'true' if self.stream else 'false', outcome).observe(
+            time.perf_counter() - self._started
+        )
+        return False
+
+
+def observe_tool(name, seconds=None, error=False, timeout=False):
+    if timeout:
+        TOOL_TIMEOUTS.labels(name).inc()
+        return
+    TOOL_LATENCY.labels(name, 'error' if error else 'ok').observe(seconds)
+
+
+def observe_circuit(target, state):
+    LLM_CIRCUIT_STATE.labels(target).set(CIRCUIT_STATES[state])
+    LLM_CIRCUIT_TRANSITIONS.labels(target, state).inc()
+
+
+def observe_short_circuit(target):
+    LLM_SHORT_CIRCUITS.labels(target).inc()
+
+
+def observe_retry(target, outcome):
+    LLM_RETRIES.labels(target, outcome).inc()
+
+
+def render_metrics():
+    """Devuelve (cuerpo, content type) en formato de texto de Prometheus."""
+    if os.getenv('PROMETHEUS_MULTIPROC_DIR'):
+        from prometheus_client import multiprocess
+        registry = CollectorRegistry()
+        multiprocess.MultiProcessCollector(registry)
+    else:
+        registry = REGISTRY
+    return generate_latest(registry), CONTENT_TYPE_LATEST
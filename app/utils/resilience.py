@@ -0,0 +1,167 @@
+# app/utils/resilience.py
+
+import math
+import time
+import random
+import threading
+from collections import deque
+from app.utils.metrics import observe_circuit
+
+# Errores del proveedor que justifican reintentar (y cuentan para el circuito)
+RETRYABLE_STATUS = {408, 409, 425, 429, 500, 502, 503, 504}
+
+
+class LLMUnavailable(Exception):
+    """El modelo no está disponible: reintentos y fallbacks agotados o circuito abierto."""
+
+    def __init__(self, message, retry_after, reason):
+        super().__init__(message)
+        self.message = message
+        self.retry_after = max(1, math.ceil(retry_after))
+        self.reason = reason
+
+
+class CircuitOpen(LLMUnavailable):
+    def __init__(self, target, retry_after):
+        super().__init__(f"Circuito abierto para {target}", retry_after, 'circuit_open')
+        self.target = target
+
+
+def is_retryable(error):
+    """Timeouts, errores de conexión, 429 y 5xx; no los errores de la petición (400, 401...)."""
+    if isinstance(error, LLMUnavailable):
+        return False
+    status = getattr(error, 'status_code', None)
+    if isinstance(status, int):
+        return status in RETRYABLE_STATUS or status >= 500
+    name = type(error).__name__
+    return isinstance(error, (TimeoutError, ConnectionError)) or 'Timeout' in name or 'Connection' in name
+
+
+def backoff_delay(attempt, base, cap):
+    """Espera antes del reintento `attempt` (desde 0): backoff exponencial con jitter completo."""
+    return random.uniform(0, min(cap, base * 2 ** attempt))
+
+
+class CircuitBreaker:
+    """
+    Circuito por destino (proveedor/modelo). Tras `failure_threshold` fallos
+    seguidos se abre y las llamadas fallan al instante durante `cooldown`
+    segundos; después deja pasar una única llamada de prueba (semiabierto)
+    que lo cierra si tiene éxito o lo vuelve a abrir si falla.
+    """
+
+    CLOSED, HALF_OPEN, OPEN = 'closed', 'half_open', 'open'
+
+    def __init__(self, target, failure_threshold=5, cooldown=30.0):
+        self.target = target
+        self.failure_threshold = failure_threshold
+        self.cooldown = cooldown
+        self.state = self.CLOSED
+        self.failures = 0
+        self.opened_at = None
+        self.transitions = 0
+        self._probe_in_flight = False
+        self._lock = threading.Lock()
+
+    def _transition(self, state):
+        self.state = state
+        self.transitions += 1
+        observe_circuit(self.target, state)
+
+    def before_call(self):
+        """Lanza CircuitOpen si la llamada no debe salir hacia el proveedor."""
+        with self._lock:
+            if self.state == self.OPEN:
+                remaining = self.opened_at + self.cooldown - time.monotonic()
+                if remaining > 0:
+                    raise CircuitOpen(self.target, remaining)
+                self._transition(self.HALF_OPEN)
+            if self.state == self.HALF_OPEN:
+                if self._probe_in_flight:
+                    raise CircuitOpen(self.target, self.cooldown)
+                self._probe_in_flight = True
+
+    def record_success(self):
+        with self._lock:
+            self.failures = 0
+            self._probe_in_flight = False
+            if self.state != self.CLOSED:
+                self._transition(self.CLOSED)
+
+    def record_failure(self):
+        with self._lock:
+            self.failures += 1
+            self._probe_in_flight = False
+            if self.state == self.HALF_OPEN or (self.state == self.CLOSED and self.failures >= self.failure_threshold):
+                self.opened_at = time.monotonic()
+                self._transition(self.OPEN)
+
+    def release(self):
+        """La llamada terminó sin decir nada del proveedor (p.ej. un 400)."""
+        with self._lock:
+            self._probe_in_flight = False
+
+    def stats(self):
+        with self._lock:
+            return {
+                'state': self.state,
+                'consecutive_failures': self.failures,
+                'transitions': self.transitions,
+                'retry_in': round(max(0.0, self.opened_at + self.cooldown - time.monotonic()), 1)
+                if self.state == self.OPEN else None,
+            }
+
+
+class RetryBudget:
+    """
+    Limita los reintentos (y hedges) a una fracción de las llamadas
+    recientes: en `window` segundos se permiten `ratio` reintentos por
+    llamada más `min_per_second` por segundo. Si el proveedor cae, los
+    reintentos no multiplican la carga más allá de esa fracción.
+    """
+
+    def __init__(self, ratio=0.1, min_per_second=1.0, window=10.0):
+        self.ratio = ratio
+        self.min_per_second = min_per_second
+        self.window = window
+        self.exhausted = 0
+        self._calls = deque()
+        self._retries = deque()
+        self._lock = threading.Lock()
+
+    def _expire(self, now):
+        for timestamps in (self._calls, self._retries):
+            while timestamps and timestamps[0] < now - self.window:
+                timestamps.popleft()
+
+    def _allowance(self):
+        return self.ratio * len(self._calls) + self.min_per_second * self.window
+
+    def record_call(self):
+        now = time.monotonic()
+        with self._lock:
+            self._expire(now)
+            self._calls.append(now)
+
+    def try_spend(self):
+        """Reserva un reintento si queda presupuesto."""
+        now = time.monotonic()
+        with self._lock:
+            self._expire(now)
+            if len(self._retries) >= self._allowance():
+                self.exhausted += 1
+                return False
+            self._retries.append(now)
+            return True
+
+    def stats(self):
+        with self._lock:
+            self._expire(time.monotonic())
+            return {
+                'calls': len(self._calls),
+                'retries': len(self._retries),
+                'allowance': round(self._allowance(), 1),
+                'exhausted': self.exhausted,
+                'window_seconds': self.window,
+            }
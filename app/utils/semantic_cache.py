@@ -0,0 +1,414 @@
+# app/utils/semantic_cache.py
+
+import os
+import re
+import time
+import hashlib
+import threading
+import unicodedata
+from collections import OrderedDict, deque
+from datetime import datetime
+from flask import current_app, has_app_context
+from app.utils.cache import make_cache_key
+from app.utils.logger import log_event
+
+_WORD = re.compile(r'\w+')
+
+# Palabras vacías (español e inglés) que no distinguen una pregunta de otra
+STOPWORDS = frozenset("""
+a al algo como con cual cuales cuando de del donde el ella en es esa ese esta este hay la las le lo los me mi mis
+muy no nos o para pero por puedo que quien se si sin su sus te tengo tu un una unas unos y ya yo
+an and are as at be by can could do does for from how i in is it me my of on or please should that the their
+this to was we what when where which who why will with would you your
+""".split())
+
+# Días y meses (español e inglés): preguntas casi iguales que los cambian
+# piden otra respuesta
+NAMED_TOKENS = frozenset("""
+lunes martes miercoles jueves viernes sabado domingo
+enero febrero marzo abril mayo junio julio agosto septiembre setiembre octubre noviembre diciembre
+monday tuesday wednesday thursday friday saturday sunday
+january february march april may june july august september october november december
+""".split())
+
+_SENTENCE_START = set('.!?¿¡:;\n')
+
+# Preguntas de seguimiento: empiezan con un conector o remiten a lo anterior
+# con un pronombre o demostrativo (sin "esta", que se confunde con "está")
+FOLLOW_UP_STARTS = frozenset("""
+y e o pero entonces tambien ademas and but also so then
+""".split()) | {'what about', 'how about'}
+ANAPHORA = frozenset("""
+eso esto aquello ese esos esas este estos aquel aquella ello ellos ellas anterior anteriores mismo misma
+it its that this these those they them their previous above same
+""".split())
+
+
+def _strip_accents(text):
+    text = unicodedata.normalize('NFKD', text)
+    return ''.join(ch for ch in text if not unicodedata.combining(ch))
+
+
+def _hash64(text):
+    return int.from_bytes(hashlib.blake2b(text.encode('utf-8'), digest_size=8).digest(), 'little')
+
+
+def _words(text):
+    words = _WORD.findall(_strip_accents(text.lower()))
+    # Los tokens de un carácter se conservan aunque sean palabras vacías (plan A)
+    return [word for word in words if word not in STOPWORDS or len(word) == 1] or words
+
+
+def key_tokens(text):
+    """
+    Tokens que deben coincidir exactamente para reutilizar una respuesta:
+    números, letras sueltas, días y meses, y nombres propios (palabras con
+    mayúscula que no empiezan frase). Preguntas casi idénticas que difieren
+    en uno de ellos (pedido 12345 o 67890, plan A o plan B, lunes o domingo)
+    no comparten respuesta aunque su similitud supere el umbral.
+    """
+    text = _strip_accents(text)
+    tokens = set()
+    previous_end = None
+    for match in _WORD.finditer(text):
+        word = match.group()
+        lower = word.lower()
+        starts_sentence = previous_end is None or any(
+            ch in _SENTENCE_START for ch in text[previous_end:match.start()]
+        )
+        previous_end = match.end()
+        if any(ch.isdigit() for ch in word) or lower in NAMED_TOKENS:
+            tokens.add(lower)
+        elif len(word) == 1:
+            # El pronombre inglés "I" va siempre en mayúscula
+            if lower not in STOPWORDS or (word.isupper() and word != 'I' and not starts_sentence):
+                tokens.add(lower)
+        elif word[0].isupper() and not starts_sentence:
+            tokens.add(lower)
+    return tokens
+
+
+def key_hash(text):
+    """Huella de 64 bits de key_tokens (0 si la pregunta no tiene ninguno)."""
+    tokens = key_tokens(text)
+    return _hash64('\x1f'.join(sorted(tokens))) if tokens else 0
+
+
+def embed(text, dim=512, ngram=3):
+    """
+    Vector local del texto, sin llamadas de red: trigramas de caracteres de
+    cada palabra (sin acentos ni palabras vacías) y la palabra completa,
+    proyectados con hashing con signo a `dim` dimensiones. Se devuelve
+    normalizado, así que el producto escalar es la similitud coseno.
+    """
+    import numpy as np
+
+    positions, signs = [], []
+    for word in _words(text):
+        padded = f' {word} '
+        features = [padded[i:i + ngram] for i in range(max(1, len(padded) - ngram + 1))]
+        features.append('w:' + word)
+        for feature in features:
+            h = _hash64(feature)
+            positions.append(h % dim)
+            signs.append(1.0 if h >> 63 else -1.0)
+
+    vector = np.zeros(dim, dtype=np.float32)
+    np.add.at(vector, positions, np.asarray(signs, dtype=np.float32))
+    norm = float(np.linalg.norm(vector))
+    return vector / norm if norm else vector
+
+
+def word_count(text):
+    return len(_words(text))
+
+
+def is_follow_up(text):
+    """
+    True si la pregunta depende de la conversación ("¿y cuánto cuesta?",
+    "explícame eso", "what about it?"): su respuesta solo se reutiliza
+    con el mismo contexto.
+    """
+    words = _WORD.findall(_strip_accents(text.lower()))
+    if not words:
+        return False
+    return words[0] in FOLLOW_UP_STARTS or ' '.join(words[:2]) in FOLLOW_UP_STARTS or any(
+        word in ANAPHORA for word in words
+    )
+
+
+class SemanticIndex:
+    """
+    Preguntas ya respondidas de un agente: una matriz (entradas × dim) de
+    vectores normalizados que se recorre entera con un producto
+    matriz-vector. Solo se comparan entradas del mismo ámbito y con la misma
+    huella de key_tokens. Crece por duplicación hasta `capacity`; llena, reemplaza
+    la entrada caducada o la usada hace más tiempo.
+    """
+
+    def __init__(self, dim, capacity, ttl):
+        import numpy as np
+
+        self.capacity = capacity
+        self.ttl = ttl
+        self.size = 0
+        rows = min(16, capacity)
+        self.vectors = np.zeros((rows, dim), dtype=np.float32)
+        self.scopes = np.zeros(rows, dtype=np.uint64)
+        self.keys = np.zeros(rows, dtype=np.uint64)
+        self.expires = np.zeros(rows, dtype=np.float64)
+        self.last_used = np.zeros(rows, dtype=np.float64)
+        self.questions = []
+        self.answers = []
+        self.text_bytes = 0
+        self.lock = threading.Lock()
+
+    def nbytes(self):
+        arrays = (self.vectors.nbytes + self.scopes.nbytes + self.keys.nbytes
+                  + self.expires.nbytes + self.last_used.nbytes)
+        return arrays + self.text_bytes
+
+    def search(self, vector, scope, key, now):
+        """
+        Devuelve (posición, similitud) de la entrada vigente más parecida del
+        mismo ámbito y la misma huella, o None.
+        """
+        import numpy as np
+
+        if not self.size:
+            return None
+        scores = self.vectors[:self.size] @ vector
+        valid = (
+            (self.scopes[:self.size] == np.uint64(scope))
+            & (self.keys[:self.size] == np.uint64(key))
+            & (self.expires[:self.size] > now)
+        )
+        if not valid.any():
+            return None
+        scores = np.where(valid, scores, -1.0)
+        position = int(np.argmax(scores))
+        return position, float(scores[position])
+
+    def touch(self, position, now):
+        self.last_used[position] = now
+
+    def _grow(self):
+        import numpy as np
+
+        rows = min(self.capacity, len(self.vectors) * 2)
+        for name in ('vectors', 'scopes', 'keys', 'expires', 'last_used'):
+            current = getattr(self, name)
+            grown = np.zeros((rows,) + current.shape[1:], dtype=current.dtype)
+            grown[:self.size] = current[:self.size]
+            setattr(self, name, grown)
+
+    def add(self, vector, scope, key, question, answer, now):
+        """
+        Guarda la pregunta; una casi idéntica del mismo ámbito se sobrescribe.
+
+        Returns:
+            bool: True si se desalojó otra entrada para hacer sitio.
+        """
+        import numpy as np
+
+        evicted = False
+        match = self.search(vector, scope, key, now)
+        if match is not None and match[1] >= 0.999:
+            position = match[0]
+        elif self.size < len(self.vectors):
+            position = self.size
+            self.size += 1
+            self.questions.append(None)
+            self.answers.append(None)
+        elif self.size < self.capacity:
+            self._grow()
+            position = self.size
+            self.size += 1
+            self.questions.append(None)
+            self.answers.append(None)
+        else:
+            # Primero las caducadas; si no hay, la menos usada
+            position = int(np.argmin(np.where(self.expires[:self.size] > now, self.last_used[:self.size], -1.0)))
+            evicted = True
+
+        if self.questions[position] is not None:
+            self.text_bytes -= len(self.questions[position]) + len(self.answers[position])
+        self.vectors[position] = vector
+        self.scopes[position] = np.uint64(scope)
+        self.keys[position] = np.uint64(key)
+        self.expires[position] = now + self.ttl
+        self.last_used[position] = now
+        self.questions[position] = question
+        self.answers[position] = answer
+        self.text_bytes += len(question) + len(answer)
+        return evicted
+
+
+class SemanticCache:
+    """
+    Caché aproximada de respuestas por agente. Una pregunta cuya similitud
+    coseno con otra ya respondida (mismo agente y configuración, el mismo
+    contexto si es de seguimiento, y los mismos números y nombres) supera el
+    umbral devuelve la respuesta
+    guardada. Los índices son por worker y
+    se desalojan por LRU cuando se supera SEMANTIC_CACHE_MAX_AGENTS o
+    SEMANTIC_CACHE_MAX_BYTES. Cada acierto queda en el log de auditoría con
+    la pregunta original, la encontrada y la similitud.
+    """
+
+    def __init__(self, dim=512, max_entries=500, max_agents=100, max_bytes=32 * 1024 * 1024,
+                 ttl=86400, recent_hits=200):
+        self.dim = dim
+        self.max_entries = max_entries
+        self.max_agents = max_agents
+        self.max_bytes = max_bytes
+        self.ttl = ttl
+        self._indexes = OrderedDict()  # agent_id -> SemanticIndex, del menos al más usado
+        self._lock = threading.Lock()
+        self._recent_hits = deque(maxlen=recent_hits)
+        self._stats = {'lookups': 0, 'hits': 0, 'misses': 0, 'near_misses': 0, 'stores': 0,
+                       'evictions': 0, 'agent_evictions': 0, 'hit_score_sum': 0.0}
+
+    def _count(self, name, amount=1):
+        with self._lock:
+            self._stats[name] += amount
+
+    def _index(self, agent_id, create=False):
+        with self._lock:
+            index = self._indexes.get(agent_id)
+            if index is not None:
+                self._indexes.move_to_end(agent_id)
+            elif create:
+                index = self._indexes[agent_id] = SemanticIndex(self.dim, self.max_entries, self.ttl)
+            return index
+
+    def _enforce_limits(self, keep):
+        with self._lock:
+            while len(self._indexes) > 1 and (
+                len(self._indexes) > self.max_agents
+                or sum(index.nbytes() for index in self._indexes.values()) > self.max_bytes
+            ):
+                oldest = next(iter(self._indexes))
+                if oldest == keep:
+                    break
+                del self._indexes[oldest]
+                self._stats['agent_evictions'] += 1
+
+    def lookup(self, agent_id, scope, message, threshold):
+        """Devuelve la respuesta de la pregunta más parecida si supera `threshold`, o None."""
+        self._count('lookups')
+        index = self._index(agent_id)
+        if index is None:
+            self._count('misses')
+            return None
+
+        vector = embed(message, self.dim)
+        now = time.monotonic()
+        with index.lock:
+            match = index.search(vector, scope, key_hash(message), now)
+            if match is None or match[1] < threshold:
+                self._count('misses')
+                # Preguntas que casi aciertan: sirven para ajustar el umbral
+                if match is not None and match[1] >= threshold - 0.05:
+                    self._count('near_misses')
+                return None
+            position, score = match
+            index.touch(position, now)
+            question, answer = index.questions[position], index.answers[position]
+
+        self._count('hits')
+        self._count('hit_score_sum', score)
+        self._audit(agent_id, message, question, score)
+        return answer
+
+    def store(self, agent_id, scope, message, answer):
+        if not answer:
+            return
+        vector = embed(message, self.dim)
+        index = self._index(agent_id, create=True)
+        with index.lock:
+            evicted = index.add(vector, scope, key_hash(message), message, answer, time.monotonic())
+        self._count('stores')
+        if evicted:
+            self._count('evictions')
+        self._enforce_limits(keep=agent_id)
+
+    def _audit(self, agent_id, message, question, score):
+        self._recent_hits.append({
+            'agent_id': agent_id,
+            'score': round(score, 4),
+            'message': message[:500],
+            'matched_question': question[:500],
+            'at': datetime.utcnow().isoformat(timespec='seconds'),
+        })
+        log_event(f"🧠 Caché semántica agente {agent_id} (similitud {score:.3f}): "
+                  f"'{message[:200]}' ≈ '{question[:200]}'")
+
+    def invalidate(self, agent_id):
+        with self._lock:
+            self._indexes.pop(agent_id, None)
+
+    def clear(self):
+        with self._lock:
+            self._indexes.clear()
+        self._recent_hits.clear()
+
+    def stats(self):
+        with self._lock:
+            stats = dict(self._stats)
+            indexes = list(self._indexes.values())
+        hit_score_sum = stats.pop('hit_score_sum')
+        stats['hit_rate'] = round(stats['hits'] / stats['lookups'], 3) if stats['lookups'] else None
+        stats['mean_hit_score'] = round(hit_score_sum / stats['hits'], 4) if stats['hits'] else None
+        return {
+            'pid': os.getpid(),
+            **stats,
+            'agents': len(indexes),
+            'entries': sum(index.size for index in indexes),
+            'bytes': sum(index.nbytes() for index in indexes),
+            'max_bytes': self.max_bytes,
+            'recent_hits': list(self._recent_hits),
+        }
+
+
+_semantic_cache = None
+_semantic_lock = threading.Lock()
+
+
+def _setting(name, default):
+    if has_app_context():
+        value = current_app.config.get(name)
+        if value is not None:
+            return value
+    return default
+
+
+def get_semantic_cache():
+    """Devuelve la caché semántica del proceso, creándola la primera vez."""
+    global _semantic_cache
+    if _semantic_cache is None:
+        with _semantic_lock:
+            if _semantic_cache is None:
+                _semantic_cache = SemanticCache(
+                    dim=int(_setting('SEMANTIC_CACHE_DIM', 512)),
+                    max_entries=int(_setting('SEMANTIC_CACHE_MAX_ENTRIES', 500)),
+                    max_agents=int(_setting('SEMANTIC_CACHE_MAX_AGENTS', 100)),
+                    max_bytes=int(_setting('SEMANTIC_CACHE_MAX_BYTES', 32 * 1024 * 1024)),
+                    ttl=float(_setting('SEMANTIC_CACHE_TTL', 86400)),
+                    recent_hits=int(_setting('SEMANTIC_CACHE_AUDIT_SIZE', 200)),
+                )
+    return _semantic_cache
+
+
+def semantic_scope(model, prompt, tools, temperature, max_tokens, context=None):
+    """
+    Ámbito de 64 bits de una entrada: solo se reutilizan respuestas generadas
+    con la misma configuración del agente (modelo, prompt, herramientas,
+    temperatura y max_tokens). `context` (resumen y último intercambio) solo
+    se pasa para preguntas de seguimiento, que dependen de lo anterior; las
+    demás comparten ámbito aunque el historial del agente haya cambiado.
+    Cambiar el agente deja sus entradas inalcanzables.
+    """
+    messages = [{'role': 'system', 'content': prompt}] + list(context or [])
+    key = make_cache_key(model, messages, tools, temperature, max_tokens)
+    return int(key[:16], 16)
@@ -0,0 +1,170 @@
+# app/utils/tools.py
+
+import os
+import json
+import time
+import logging
+import threading
+from collections import namedtuple
+from concurrent.futures import ThreadPoolExecutor, TimeoutError as FutureTimeout
+from flask import current_app, has_app_context
+from app.utils.metrics import observe_tool
+
+logger = logging.getLogger(__name__)
+
+# Registro de ejecutores: nombre de Tool -> función de Python
+ToolSpec = namedtuple('ToolSpec', ['fn', 'timeout', 'cancellable'])
+_registry = {}
+
+_executor = None
+_executor_lock = threading.Lock()
+_stats = {}
+_stats_lock = threading.Lock()
+
+
+def register_tool(name, timeout=None, cancellable=False):
+    """
+    Registra la función que ejecuta la herramienta `name`. La función recibe
+    los argumentos del modelo como kwargs y devuelve un str (o un objeto
+    serializable a JSON). Con cancellable=True recibe además `cancel_event`,
+    que se activa si se supera el tiempo límite.
+
+    Args:
+        name (str): nombre de la herramienta (Tool.name).
+        timeout (float): segundos máximos; por defecto TOOL_DEFAULT_TIMEOUT.
+        cancellable (bool): si la función acepta `cancel_event`.
+    """
+    def decorator(fn):
+        _registry[name] = ToolSpec(fn, timeout, cancellable)
+        return fn
+    return decorator
+
+
+def get_registered_tools():
+    return sorted(_registry)
+
+
+@register_tool('buscar_web')
+def buscar_web(query='', **kwargs):
+    return f"Resultado simulado para búsqueda: {query}"
+
+
+def _setting(name, default):
+    if has_app_context():
+        value = current_app.config.get(name)
+        if value is not None:
+            return value
+    return default
+
+
+def _get_executor():
+    global _executor
+    if _executor is None:
+        with _executor_lock:
+            if _executor is None:
+                _executor = ThreadPoolExecutor(
+                    max_workers=int(_setting('TOOL_POOL_SIZE', 8)),
+                    thread_name_prefix='tools'
+                )
+    return _executor
+
+
+def _record(name, elapsed=None, error=False, timeout=False):
+    observe_tool(name, elapsed, error=error, timeout=timeout)
+    with _stats_lock:
+        stats = _stats.setdefault(name, {'calls': 0, 'errors': 0, 'timeouts': 0, 'total_ms': 0.0, 'max_ms': 0.0})
+        if timeout:
+            # La llamada sigue en su hilo y se contabilizará al terminar
+            stats['timeouts'] += 1
+            return
+        stats['calls'] += 1
+        stats['total_ms'] += elapsed * 1000
+        stats['max_ms'] = max(stats['max_ms'], elapsed * 1000)
+        if error:
+            stats['errors'] += 1
+
+
+def _run(app, name, spec, kwargs):
+    started = time.perf_counter()
+    try:
+        if spec is None:
+            # Herramienta sin ejecutor registrado: se mantiene la simulación
+            result = f"[Simulación] Herramienta '{name}' ejecutada con argumentos: {kwargs}"
+        elif app is not None:
+            with app.app_context():
+                result = spec.fn(**kwargs)
+        else:
+            result = spec.fn(**kwargs)
+    except Exception:
+        _record(name, time.perf_counter() - started, error=True)
+        raise
+    _record(name, time.perf_counter() - started)
+    return result
+
+
+def run_tool_calls(calls):
+    """
+    Ejecuta en paralelo todas las herramientas pedidas por el modelo en un
+    turno, cada una con su tiempo límite. Un error o un timeout se devuelve
+    como texto para que el modelo pueda continuar.
+
+    Args:
+        calls (list): dicts {"id", "name", "arguments"} con los argumentos en JSON.
+
+    Returns:
+        list: resultados (str) en el mismo orden que `calls`.
+    """
+    app = current_app._get_current_object() if has_app_context() else None
+    default_timeout = float(_setting('TOOL_DEFAULT_TIMEOUT', 10))
+    executor = _get_executor()
+
+    pending = []
+    for call in calls:
+        try:
+            args = json.loads(call["arguments"] or "{}")
+        except Exception:
+            args = {}
+        if not isinstance(args, dict):
+            args = {}
+
+        spec = _registry.get(call["name"])
+        cancel_event = threading.Event()
+        if spec is not None and spec.cancellable:
+            args["cancel_event"] = cancel_event
+        timeout = (spec.timeout if spec is not None and spec.timeout else default_timeout)
+        future = executor.submit(_run, app, call["name"], spec, args)
+        pending.append((call, future, cancel_event, time.monotonic() + timeout))
+
+    results = []
+    for call, future, cancel_event, deadline in pending:
+        name = call["name"]
+        try:
+            result = future.result(timeout=max(deadline - time.monotonic(), 0))
+        except FutureTimeout:
+            future.cancel()
+            cancel_event.set()
+            _record(name, timeout=True)
+            logger.warning("La herramienta '%s' superó el tiempo límite", name)
+            result = f"Error: la herramienta '{name}' superó el tiempo límite"
+        except Exception as e:
+            logger.exception("Error al ejecutar la herramienta '%s'", name)
+            result = f"Error al ejecutar la herramienta '{name}': {str(e)}"
+        if not isinstance(result, str):
+            result = json.dumps(result, ensure_ascii=False, default=str)
+        results.append(result)
+    return results
+
+
+def get_tool_stats():
+    """Latencia y errores por herramienta en este worker."""
+    with _stats_lock:
+        tools = {
+            name: {
+                **stats,
+                'total_ms': round(stats['total_ms'], 1),
+                'max_ms': round(stats['max_ms'], 1),
+                'avg_ms': round(stats['total_ms'] / stats['calls'], 1) if stats['calls'] else None,
+            }
+            for name, stats in _stats.items()
+        }
+    return {'pid': os.getpid(), 'registered': get_registered_tools(), 'tools': tools}
@@ -0,0 +1,161 @@
+# app/utils/usage.py
+
+import logging
+from collections import namedtuple
+from datetime import datetime
+from sqlalchemy import func, insert, select, update
+from app.models import UsageDaily, UsageHourly, db
+
+logger = logging.getLogger(__name__)
+
+# Consumo de un turno del asistente
+TurnUsage = namedtuple('TurnUsage', [
+    'user_id', 'agent_id', 'model', 'prompt_tokens', 'completion_tokens', 'latency_ms'
+])
+
+PERIODS = {'hour': UsageHourly, 'day': UsageDaily}
+GROUP_COLUMNS = ('user', 'agent', 'model')
+_COUNTERS = ('requests', 'prompt_tokens', 'completion_tokens', 'latency_ms')
+
+
+def truncate(moment, period):
+    """Inicio de la hora o del día que contiene `moment`."""
+    if period == 'hour':
+        return moment.replace(minute=0, second=0, microsecond=0)
+    return moment.replace(hour=0, minute=0, second=0, microsecond=0)
+
+
+def record_usage(turns, moment=None, connection=None):
+    """
+    Suma el consumo de los turnos a los agregados por hora y por día con un
+    upsert por fila afectada. Sin `connection` no confirma la transacción:
+    llamar dentro de la misma que guarda los mensajes.
+
+    Args:
+        turns (list): TurnUsage de cada turno.
+        moment (datetime): instante del consumo (por defecto ahora, UTC).
+        connection: conexión propia en la que escribir en lugar de db.session.
+    """
+    moment = moment or datetime.utcnow()
+    executor = connection if connection is not None else db.session
+    for period, model_cls in PERIODS.items():
+        bucket = truncate(moment, period)
+        rows = {}
+        for turn in turns:
+            key = (bucket, turn.user_id, turn.agent_id, turn.model or 'unknown')
+            row = rows.setdefault(key, dict(zip(('bucket', 'user_id', 'agent_id', 'model'), key),
+                                            requests=0, prompt_tokens=0, completion_tokens=0, latency_ms=0.0))
+            row['requests'] += 1
+            row['prompt_tokens'] += turn.prompt_tokens or 0
+            row['completion_tokens'] += turn.completion_tokens or 0
+            row['latency_ms'] += turn.latency_ms or 0.0
+        # Orden fijo para que dos transacciones no se bloqueen mutuamente
+        for key in sorted(rows):
+            _upsert(executor, model_cls, rows[key])
+
+
+def record_usage_separately(turns):
+    """
+    Registra el consumo en su propia transacción, sin tocar la sesión del
+    llamador: para llamadas al modelo que no guardan mensajes (call_llm,
+    resúmenes del historial). Un error se registra y no se propaga.
+    """
+    try:
+        with db.engine.begin() as connection:
+            record_usage(turns, connection=connection)
+    except Exception:
+        logger.exception("No se pudo registrar el consumo de %d llamadas", len(turns))
+
+
+def _upsert(executor, model_cls, row):
+    table = model_cls.__table__
+    dialect = db.engine.dialect.name
+    if dialect in ('postgresql', 'sqlite'):
+        if dialect == 'postgresql':
+            from sqlalchemy.dialects.postgresql import insert as dialect_insert
+        else:
+            from sqlalchemy.dialects.sqlite import insert as dialect_insert
+        stmt = dialect_insert(table).values(**row)
+        stmt = stmt.on_conflict_do_update(
+            index_elements=[column.name for column in table.primary_key],
+            set_={name: table.c[name] + stmt.excluded[name] for name in _COUNTERS}
+        )
+        executor.execute(stmt)
+        return
+
+    match = [table.c[name] == row[name] for name in ('bucket', 'user_id', 'agent_id', 'model')]
+    existing = executor.execute(select(table.c.bucket).where(*match)).first()
+    if existing is None:
+        executor.execute(insert(table).values(**row))
+    else:
+        executor.execute(update(table).where(*match).values({name: table.c[name] + row[name] for name in _COUNTERS}))
+
+
+def _filtered(query, model_cls, start, end, filters):
+    if start:
+        query = query.where(model_cls.bucket >= start)
+    if end:
+        query = query.where(model_cls.bucket < end)
+    for name in ('user_id', 'agent_id', 'model'):
+        if filters.get(name) is not None:
+            query = query.where(getattr(model_cls, name) == filters[name])
+    return query
+
+
+def _totals(model_cls):
+    return [
+        func.sum(model_cls.requests).label('requests'),
+        func.sum(model_cls.prompt_tokens).label('prompt_tokens'),
+        func.sum(model_cls.completion_tokens).label('completion_tokens'),
+        func.sum(model_cls.latency_ms).label('latency_ms'),
+    ]
+
+
+def _row_to_dict(row, keys):
+    data = {key: getattr(row, key) for key in keys}
+    requests = row.requests or 0
+    data.update({
+        'requests': requests,
+        'prompt_tokens': int(row.prompt_tokens or 0),
+        'completion_tokens': int(row.completion_tokens or 0),
+        'total_tokens': int((row.prompt_tokens or 0) + (row.completion_tokens or 0)),
+        'avg_latency_ms': round(row.latency_ms / requests, 1) if requests else None,
+    })
+    if isinstance(data.get('bucket'), datetime):
+        data['bucket'] = data['bucket'].isoformat()
+    return data
+
+
+def usage_series(period, start=None, end=None, filters=None, group_by=()):
+    """
+    Serie temporal de consumo leída de los agregados.
+
+    Args:
+        period (str): 'hour' o 'day'.
+        start, end (datetime): intervalo [start, end) de inicios de periodo.
+        filters (dict): user_id, agent_id y/o model.
+        group_by (tuple): columnas de GROUP_COLUMNS además del periodo.
+
+    Returns:
+        list: un dict por periodo (y grupo), en orden cronológico.
+    """
+    model_cls = PERIODS[period]
+    keys = ['bucket'] + [f'{name}_id' if name != 'model' else name for name in group_by]
+    columns = [getattr(model_cls, key) for key in keys]
+    query = select(*columns, *_totals(model_cls)).group_by(*columns).order_by(*columns)
+    rows = db.session.execute(_filtered(query, model_cls, start, end, filters or {})).all()
+    return [_row_to_dict(row, keys) for row in rows]
+
+
+def usage_totals(period, by, start=None, end=None, filters=None, limit=20):
+    """
+    Consumo total en el intervalo agrupado por usuario, agente o modelo,
+    ordenado de mayor a menor número de tokens.
+    """
+    model_cls = PERIODS[period]
+    key = f'{by}_id' if by != 'model' else by
+    column = getattr(model_cls, key)
+    total_tokens = func.sum(model_cls.prompt_tokens) + func.sum(model_cls.completion_tokens)
+    query = select(column, *_totals(model_cls)).group_by(column).order_by(total_tokens.desc(), column).limit(limit)
+    rows = db.session.execute(_filtered(query, model_cls, start, end, filters or {})).all()
+    return [_row_to_dict(row, [key]) for row in rows]
@@ -1,4 +1,5 @@
 import os
+import json
 
 class Config:
     SQLALCHEMY_DATABASE_URI = os.getenv("DATABASE_URL")
@@ -21,3 +22,144 @@ class Config:
     # JWT
     JWT_SECRET_KEY = os.getenv('JWT_SECRET_KEY', 'your-secret-key-change-in-production')
     JWT_ACCESS_TOKEN_EXPIRES = False
+
+    # Pool de conexiones de los clientes LLM (por worker)
+    LLM_POOL_MAX_CONNECTIONS = int(os.getenv('LLM_POOL_MAX_CONNECTIONS', 20))
+    LLM_POOL_MAX_KEEPALIVE = int(os.getenv('LLM_POOL_MAX_KEEPALIVE', 10))
+    LLM_POOL_KEEPALIVE_EXPIRY = float(os.getenv('LLM_POOL_KEEPALIVE_EXPIRY', 60))
+    LLM_CONNECT_TIMEOUT = float(os.getenv('LLM_CONNECT_TIMEOUT', 5))
+    LLM_REQUEST_TIMEOUT = float(os.getenv('LLM_REQUEST_TIMEOUT', 60))
+
+    # Router de proveedores: los compatibles con OpenAI usan el cliente con
+    # pool, el resto litellm. LLM_FALLBACKS es un JSON {"proveedor/modelo" o
+    # "proveedor": ["proveedor/modelo", ...]}; LLM_LATENCY_BUDGET (segundos,
+    # 0 = sin límite) da paso al siguiente destino. Con hedging, una llamada
+    # sin streaming que supera el p95 del destino lanza un segundo intento.
+    LLM_OPENAI_COMPATIBLE_PROVIDERS = [p.strip().lower() for p in os.getenv('LLM_OPENAI_COMPATIBLE_PROVIDERS', 'openai').split(',') if p.strip()]
+    LLM_FALLBACKS = json.loads(os.getenv('LLM_FALLBACKS') or '{}')
+    LLM_LATENCY_BUDGET = float(os.getenv('LLM_LATENCY_BUDGET', 0))
+    LLM_HEDGE_ENABLED = os.getenv('LLM_HEDGE_ENABLED', 'false').lower() == 'true'
+    LLM_HEDGE_DELAY = float(os.getenv('LLM_HEDGE_DELAY', 2))
+    LLM_HEDGE_MIN_SAMPLES = int(os.getenv('LLM_HEDGE_MIN_SAMPLES', 20))
+    LLM_HEDGE_POOL_SIZE = int(os.getenv('LLM_HEDGE_POOL_SIZE', 16))
+    LLM_STATS_WINDOW = int(os.getenv('LLM_STATS_WINDOW', 200))
+
+    # Resiliencia de las llamadas al modelo: reintentos con backoff y jitter
+    # acotados por un presupuesto global (fracción de las llamadas recientes
+    # más un mínimo por segundo) y un circuito por proveedor/modelo que se
+    # abre tras LLM_BREAKER_FAILURES fallos seguidos durante LLM_BREAKER_COOLDOWN
+    LLM_MAX_RETRIES = int(os.getenv('LLM_MAX_RETRIES', 2))
+    LLM_RETRY_BASE_DELAY = float(os.getenv('LLM_RETRY_BASE_DELAY', 0.25))
+    LLM_RETRY_MAX_DELAY = float(os.getenv('LLM_RETRY_MAX_DELAY', 2))
+    LLM_RETRY_BUDGET_RATIO = float(os.getenv('LLM_RETRY_BUDGET_RATIO', 0.1))
+    LLM_RETRY_BUDGET_MIN_PER_SECOND = float(os.getenv('LLM_RETRY_BUDGET_MIN_PER_SECOND', 1))
+    LLM_RETRY_BUDGET_WINDOW = float(os.getenv('LLM_RETRY_BUDGET_WINDOW', 10))
+    LLM_BREAKER_FAILURES = int(os.getenv('LLM_BREAKER_FAILURES', 5))
+    LLM_BREAKER_COOLDOWN = float(os.getenv('LLM_BREAKER_COOLDOWN', 30))
+    LLM_UNAVAILABLE_RETRY_AFTER = float(os.getenv('LLM_UNAVAILABLE_RETRY_AFTER', 5))
+
+    # Caché de respuestas del LLM (opcional por agente)
+    LLM_CACHE_MAX_ENTRIES = int(os.getenv('LLM_CACHE_MAX_ENTRIES', 1000))
+    LLM_CACHE_MAX_BYTES = int(os.getenv('LLM_CACHE_MAX_BYTES', 16 * 1024 * 1024))
+    LLM_CACHE_TTL = float(os.getenv('LLM_CACHE_TTL', 3600))
+    LLM_CACHE_REDIS_URL = os.getenv('LLM_CACHE_REDIS_URL')
+
+    # Caché semántica (opcional por agente): vectores locales de n-gramas por
+    # hashing y búsqueda por coseno; índices por worker acotados en agentes,
+    # entradas por agente y bytes totales
+    SEMANTIC_CACHE_THRESHOLD = float(os.getenv('SEMANTIC_CACHE_THRESHOLD', 0.92))
+    SEMANTIC_CACHE_DIM = int(os.getenv('SEMANTIC_CACHE_DIM', 512))
+    SEMANTIC_CACHE_MAX_ENTRIES = int(os.getenv('SEMANTIC_CACHE_MAX_ENTRIES', 500))
+    SEMANTIC_CACHE_MAX_AGENTS = int(os.getenv('SEMANTIC_CACHE_MAX_AGENTS', 100))
+    SEMANTIC_CACHE_MAX_BYTES = int(os.getenv('SEMANTIC_CACHE_MAX_BYTES', 32 * 1024 * 1024))
+    SEMANTIC_CACHE_TTL = float(os.getenv('SEMANTIC_CACHE_TTL', 86400))
+    SEMANTIC_CACHE_MIN_WORDS = int(os.getenv('SEMANTIC_CACHE_MIN_WORDS', 2))
+    SEMANTIC_CACHE_AUDIT_SIZE = int(os.getenv('SEMANTIC_CACHE_AUDIT_SIZE', 200))
+
+    # Contexto de conversación: presupuesto de tokens del historial y resumen incremental
+    CHAT_HISTORY_TOKEN_BUDGET = int(os.getenv('CHAT_HISTORY_TOKEN_BUDGET', 2000))
+    CHAT_HISTORY_MAX_MESSAGES = int(os.getenv('CHAT_HISTORY_MAX_MESSAGES', 50))
+    CHAT_SUMMARY_ENABLED = os.getenv('CHAT_SUMMARY_ENABLED', 'true').lower() == 'true'
+    # Sin CHAT_SUMMARY_MODEL el resumen usa el proveedor y el modelo del agente
+    CHAT_SUMMARY_MODEL = os.getenv('CHAT_SUMMARY_MODEL')
+    CHAT_SUMMARY_PROVIDER = os.getenv('CHAT_SUMMARY_PROVIDER', 'openai')
+    CHAT_SUMMARY_MAX_TOKENS = int(os.getenv('CHAT_SUMMARY_MAX_TOKENS', 300))
+    CHAT_SUMMARY_BATCH = int(os.getenv('CHAT_SUMMARY_BATCH', 40))
+
+    # Borrado por lotes de historiales grandes (?async=true)
+    CHAT_DELETE_CHUNK_SIZE = int(os.getenv('CHAT_DELETE_CHUNK_SIZE', 5000))
+
+    # Trabajos en segundo plano: cada worker refresca el latido de los suyos;
+    # los que no lo actualizan en JOB_STALE_SECONDS (worker reiniciado o
+    # muerto) se reencolan hasta JOB_MAX_ATTEMPTS veces y después fallan
+    JOB_HEARTBEAT_SECONDS = float(os.getenv('JOB_HEARTBEAT_SECONDS', 15))
+    JOB_STALE_SECONDS = float(os.getenv('JOB_STALE_SECONDS', 90))
+    JOB_MAX_ATTEMPTS = int(os.getenv('JOB_MAX_ATTEMPTS', 3))
+
+    # Exportación en streaming: filas por consulta (cada tramo es una
+    # transacción corta) y filas por lectura del cursor del servidor
+    EXPORT_CHUNK_ROWS = int(os.getenv('EXPORT_CHUNK_ROWS', 10000))
+    EXPORT_YIELD_PER = int(os.getenv('EXPORT_YIELD_PER', 1000))
+
+    # Caché de usuarios autenticados (evita consultar users en cada petición)
+    AUTH_CACHE_ENABLED = os.getenv('AUTH_CACHE_ENABLED', 'true').lower() == 'true'
+    AUTH_CACHE_TTL = float(os.getenv('AUTH_CACHE_TTL', 30))
+    AUTH_CACHE_MAX_ENTRIES = int(os.getenv('AUTH_CACHE_MAX_ENTRIES', 10000))
+
+    # Caché de agentes compilados por worker; en Postgres se invalida entre
+    # workers con LISTEN/NOTIFY y el TTL es solo una red de seguridad
+    AGENT_CACHE_ENABLED = os.getenv('AGENT_CACHE_ENABLED', 'true').lower() == 'true'
+    AGENT_CACHE_TTL = float(os.getenv('AGENT_CACHE_TTL', 300))
+
+    # Auditoría: cola en memoria escrita por lotes en segundo plano
+    AUDIT_QUEUE_SIZE = int(os.getenv('AUDIT_QUEUE_SIZE', 10000))
+    AUDIT_FLUSH_EVENTS = int(os.getenv('AUDIT_FLUSH_EVENTS', 100))
+    AUDIT_FLUSH_INTERVAL_MS = int(os.getenv('AUDIT_FLUSH_INTERVAL_MS', 500))
+    AUDIT_OVERFLOW_POLICY = os.getenv('AUDIT_OVERFLOW_POLICY', 'drop_new')  # drop_new, drop_old o block
+    AUDIT_BLOCK_TIMEOUT_MS = int(os.getenv('AUDIT_BLOCK_TIMEOUT_MS', 50))
+
+    # Outbox de correo: entrega en segundo plano con reintentos
+    MAIL_WORKER_ENABLED = os.getenv('MAIL_WORKER_ENABLED', 'true').lower() == 'true'
+    MAIL_BATCH_SIZE = int(os.getenv('MAIL_BATCH_SIZE', 20))
+    MAIL_POLL_INTERVAL_SECONDS = float(os.getenv('MAIL_POLL_INTERVAL_SECONDS', 5))
+    MAIL_MAX_ATTEMPTS = int(os.getenv('MAIL_MAX_ATTEMPTS', 5))
+    MAIL_RETRY_BASE_SECONDS = float(os.getenv('MAIL_RETRY_BASE_SECONDS', 30))
+    MAIL_RETRY_MAX_SECONDS = float(os.getenv('MAIL_RETRY_MAX_SECONDS', 3600))
+    MAIL_CLAIM_TIMEOUT_SECONDS = int(os.getenv('MAIL_CLAIM_TIMEOUT_SECONDS', 300))
+
+    # Ejecución de herramientas: pool por worker, tiempo límite y rondas máximas
+    TOOL_POOL_SIZE = int(os.getenv('TOOL_POOL_SIZE', 8))
+    TOOL_DEFAULT_TIMEOUT = float(os.getenv('TOOL_DEFAULT_TIMEOUT', 10))
+    TOOL_MAX_ROUNDS = int(os.getenv('TOOL_MAX_ROUNDS', 3))
+
+    # Lotes de chat (POST /api/chat/batch): tamaño máximo, llamadas
+    # simultáneas por lote y tamaño del pool compartido por worker
+    CHAT_BATCH_MAX_ITEMS = int(os.getenv('CHAT_BATCH_MAX_ITEMS', 50))
+    CHAT_BATCH_CONCURRENCY = int(os.getenv('CHAT_BATCH_CONCURRENCY', 4))
+    CHAT_BATCH_POOL_SIZE = int(os.getenv('CHAT_BATCH_POOL_SIZE', 16))
+
+    # Admisión de peticiones que llaman al modelo: cubo de tokens (peticiones
+    # por segundo y ráfaga) y llamadas en curso, por usuario y globales. Sin
+    # ADMISSION_REDIS_URL los límites son por worker; con Redis, compartidos.
+    ADMISSION_ENABLED = os.getenv('ADMISSION_ENABLED', 'true').lower() == 'true'
+    ADMISSION_USER_RATE = float(os.getenv('ADMISSION_USER_RATE', 1.0))
+    ADMISSION_USER_BURST = float(os.getenv('ADMISSION_USER_BURST', 10))
+    ADMISSION_USER_MAX_IN_FLIGHT = int(os.getenv('ADMISSION_USER_MAX_IN_FLIGHT', 4))
+    ADMISSION_GLOBAL_RATE = float(os.getenv('ADMISSION_GLOBAL_RATE', 0))  # 0 = sin límite global de ritmo
+    ADMISSION_GLOBAL_BURST = float(os.getenv('ADMISSION_GLOBAL_BURST', 50))
+    ADMISSION_GLOBAL_MAX_IN_FLIGHT = int(os.getenv('ADMISSION_GLOBAL_MAX_IN_FLIGHT', 32))
+    ADMISSION_RETRY_AFTER = float(os.getenv('ADMISSION_RETRY_AFTER', 2))
+    ADMISSION_REDIS_URL = os.getenv('ADMISSION_REDIS_URL')
+    # Segundos que dura una plaza en Redis si nadie la libera: mayor que el stream más largo
+    ADMISSION_SLOT_TTL = int(os.getenv('ADMISSION_SLOT_TTL', 300))
+
+    # Crews: tareas por crew, tareas simultáneas por usuario y pool por worker
+    CREW_MAX_TASKS = int(os.getenv('CREW_MAX_TASKS', 20))
+    CREW_USER_CONCURRENCY = int(os.getenv('CREW_USER_CONCURRENCY', 4))
+    CREW_SLOT_TIMEOUT = float(os.getenv('CREW_SLOT_TIMEOUT', 60))  # espera por una plaza del usuario
+    CREW_POOL_SIZE = int(os.getenv('CREW_POOL_SIZE', 16))
+
+    # Métricas de Prometheus (/api/metrics): token para el scraper e IPs que
+    # pueden leerlas sin autenticarse (separadas por comas)
+    METRICS_TOKEN = os.getenv('METRICS_TOKEN')
+    METRICS_ALLOWED_IPS = [ip.strip() for ip in os.getenv('METRICS_ALLOWED_IPS', '127.0.0.1').split(',') if ip.strip()]
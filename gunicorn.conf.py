@@ -0,0 +1,53 @@
+# gunicorn.conf.py
+# Gunicorn lo carga automáticamente desde el directorio de trabajo.
+
+import gc
+import os
+import sys
+import shutil
+
+bind = os.getenv('GUNICORN_BIND', '0.0.0.0:5000')
+workers = int(os.getenv('GUNICORN_WORKERS', 4))
+# Workers con hilos para no bloquear el proceso mientras se retransmiten
+# respuestas en streaming
+worker_class = 'gthread'
+threads = int(os.getenv('GUNICORN_THREADS', 8))
+
+# Con preload_app la app se importa una vez en el maestro y los workers
+# comparten esas páginas de memoria (copy-on-write) y arrancan al instante
+preload_app = os.getenv('GUNICORN_PRELOAD', 'true').lower() == 'true'
+
+# Cada worker escribe sus métricas de Prometheus en este directorio. Se vacía
+# al cargar la configuración, antes de importar la app (también con
+# preload_app), para no arrastrar datos de una ejecución anterior.
+_metrics_dir = os.getenv('PROMETHEUS_MULTIPROC_DIR')
+if _metrics_dir:
+    shutil.rmtree(_metrics_dir, ignore_errors=True)
+    os.makedirs(_metrics_dir, exist_ok=True)
+
+
+def when_ready(server):
+    if not server.cfg.preload_app:
+        return
+    # El SDK del modelo se importa de forma perezosa; en el maestro se carga
+    # antes del fork para que todos los workers lo compartan
+    import openai  # noqa: F401
+    # Los objetos ya creados no se vuelven a recorrer en las recolecciones de
+    # los workers, lo que evita copiar sus páginas
+    gc.freeze()
+
+
+def post_fork(server, worker):
+    # Las conexiones que el maestro hubiera abierto no deben compartirse
+    wsgi = sys.modules.get('wsgi')
+    if wsgi is not None:
+        from app.extensions import db
+        with wsgi.app.app_context():
+            db.engine.dispose(close=False)
+
+
+def child_exit(server, worker):
+    # Los gauges del worker que termina dejan de contar en /api/metrics
+    if os.getenv('PROMETHEUS_MULTIPROC_DIR'):
+        from prometheus_client import multiprocess
+        multiprocess.mark_process_dead(worker.pid)
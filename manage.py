@@ -1,13 +1,129 @@
 from app import create_app, db
 from flask.cli import FlaskGroup
+import click
 
 app = create_app()
 cli = FlaskGroup(app)
 
 @cli.command("create_db")
 def create_db():
-    db.create_all()
-    print("Base de datos creada.")
+    """Alias de `flask db upgrade`: el esquema sale solo de las migraciones."""
+    from flask_migrate import upgrade
+    upgrade()
+    print("Base de datos migrada.")
+
+@cli.command("mail_worker")
+def mail_worker():
+    """Entrega el outbox de correo en un proceso dedicado."""
+    import time
+    from app.utils.mailer import deliver_pending
+    print("Entregando correos pendientes (Ctrl+C para salir)...")
+    while True:
+        if not deliver_pending():
+            time.sleep(app.config.get('MAIL_POLL_INTERVAL_SECONDS', 5))
+
+@cli.command("bench_chat_context")
+@click.option("--messages", default=200, help="Mensajes de historial del agente de prueba.")
+@click.option("--tools", default=3, help="Herramientas asociadas al agente de prueba.")
+@click.option("--iterations", default=50, help="Peticiones simuladas por escenario.")
+def bench_chat_context(messages, tools, iterations):
+    """Consultas y tiempo de BD para preparar una petición de chat."""
+    from app.utils.benchmarks import run_chat_context_benchmark
+    for row in run_chat_context_benchmark(messages, tools, iterations):
+        print(f"{row['scenario']:<22} {row['queries']:>6.1f} consultas  {row['db_ms']:>8.2f} ms BD  {row['total_ms']:>8.2f} ms total")
+
+@cli.command("bench_startup")
+@click.option("--runs", default=3, help="Arranques medidos (se muestra la mediana).")
+@click.option("--top", default=15, help="Paquetes y módulos a mostrar.")
+def bench_startup(runs, top):
+    """Tiempo de importación y de create_app, con el coste por paquete y módulo."""
+    from app.utils.benchmarks import run_startup_benchmark
+    result = run_startup_benchmark(runs, top)
+    print(f"importar app  {result['import_ms']:>8.1f} ms")
+    print(f"create_app    {result['create_app_ms']:>8.1f} ms")
+    print("\nPaquetes (tiempo propio de importación):")
+    for name, ms in result['packages']:
+        print(f"  {name:<40} {ms:>8.1f} ms")
+    print("\nMódulos de la app (tiempo acumulado):")
+    for name, ms in result['modules']:
+        print(f"  {name:<40} {ms:>8.1f} ms")
+
+@cli.command("bench_load")
+@click.option("--scenario", "scenarios", multiple=True,
+              help="Escenario a medir (repetible): login, list_agents, chat, chat_stream, list_chats. Por defecto, todos.")
+@click.option("--requests", default=200, help="Peticiones por escenario.")
+@click.option("--concurrency", default=8, help="Clientes simultáneos.")
+@click.option("--url", default=None, help="Medir una instancia ya desplegada en lugar de la app en este proceso.")
+@click.option("--history", default=5000, help="Mensajes del historial grande (list_chats).")
+@click.option("--agents", default=10, help="Agentes del usuario de prueba.")
+@click.option("--llm-latency", default=0.05, help="Segundos hasta la respuesta del modelo simulado.")
+@click.option("--llm-token-delay", default=0.005, help="Segundos entre fragmentos en streaming.")
+@click.option("--llm-tokens", default=30, help="Palabras por respuesta del modelo simulado.")
+@click.option("--tool-call-rate", default=1.0, help="Probabilidad de que el modelo pida una herramienta.")
+@click.option("--output", default=None, help="Guardar el informe en este fichero JSON.")
+@click.option("--save-baseline", is_flag=True, help="Guardar el informe como nueva línea base.")
+@click.option("--baseline", default=None, help="Línea base con la que comparar (por defecto benchmarks/baseline.json).")
+@click.option("--tolerance", default=0.2, help="Margen antes de considerar regresión (fracción).")
+def bench_load(scenarios, requests, concurrency, url, history, agents, llm_latency, llm_token_delay,
+               llm_tokens, tool_call_rate, output, save_baseline, baseline, tolerance):
+    """Prueba de carga con un modelo simulado: latencias p50/p95/p99 y requests/s."""
+    import os
+    import json
+    from app.utils import loadtest
+
+    if db.engine.dialect.name != 'postgresql':
+        print(f"Aviso: la base de datos es {db.engine.dialect.name}; los resultados no son comparables con producción.")
+
+    report = loadtest.run_load_test(
+        scenarios=scenarios or loadtest.SCENARIOS,
+        requests=requests,
+        concurrency=concurrency,
+        base_url=url,
+        agents=agents,
+        history=history,
+        fake_options={'latency': llm_latency, 'token_delay': llm_token_delay,
+                      'tokens': llm_tokens, 'tool_call_rate': tool_call_rate}
+    )
+
+    print(f"{'escenario':<12} {'req/s':>8} {'p50 ms':>9} {'p95 ms':>9} {'p99 ms':>9} {'errores':>8}")
+    for name, row in report['scenarios'].items():
+        print(f"{name:<12} {row['rps'] or 0:>8.1f} {row['p50_ms'] or 0:>9.1f} {row['p95_ms'] or 0:>9.1f} "
+              f"{row['p99_ms'] or 0:>9.1f} {row['errors']:>8}")
+        if row.get('ttft'):
+            print(f"{'  ttft':<12} {'':>8} {row['ttft']['p50_ms'] or 0:>9.1f} {row['ttft']['p95_ms'] or 0:>9.1f} "
+                  f"{row['ttft']['p99_ms'] or 0:>9.1f}")
+
+    if output:
+        with open(output, 'w', encoding='utf-8') as f:
+            json.dump(report, f, indent=2, ensure_ascii=False)
+
+    baseline_path = baseline or loadtest.DEFAULT_BASELINE
+    if save_baseline:
+        loadtest.save_baseline(report, baseline_path)
+        print(f"Línea base guardada en {baseline_path}")
+    elif os.path.exists(baseline_path):
+        regressions = loadtest.compare_with_baseline(report, loadtest.load_baseline(baseline_path), tolerance)
+        for r in regressions:
+            change = f"{r['change']:+.0%}" if r['change'] is not None else ''
+            print(f"REGRESIÓN {r['scenario']} {r['metric']}: {r['baseline']} -> {r['current']} {change}")
+        if regressions:
+            raise SystemExit(1)
+        print(f"Sin regresiones respecto a {baseline_path}")
+
+@cli.command("fake_llm")
+@click.option("--host", default="127.0.0.1")
+@click.option("--port", default=8010)
+@click.option("--latency", default=0.05, help="Segundos hasta la respuesta o el primer fragmento.")
+@click.option("--token-delay", default=0.005, help="Segundos entre fragmentos en streaming.")
+@click.option("--tokens", default=30, help="Palabras por respuesta.")
+@click.option("--tool-call-rate", default=1.0, help="Probabilidad de pedir una herramienta.")
+@click.option("--error-rate", default=0.0, help="Probabilidad de responder con un error 500 (para probar fallbacks).")
+def fake_llm(host, port, latency, token_delay, tokens, tool_call_rate, error_rate):
+    """Servidor compatible con OpenAI para pruebas de carga (OPENAI_BASE_URL=http://host:port/v1)."""
+    from app.utils.fake_llm import FakeLLMServer
+    server = FakeLLMServer(host, port, latency, token_delay, tokens, tool_call_rate, error_rate)
+    print(f"Modelo simulado en {server.base_url} (Ctrl+C para salir)")
+    server.serve_forever()
 
 if __name__ == '__main__':
     app.run(debug=True, host='0.0.0.0', port=5000)
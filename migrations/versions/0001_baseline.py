@@ -0,0 +1,108 @@
+"""Esquema inicial (usuarios, agentes, herramientas, chats y log)
+
+Revision ID: 0001
+Revises: 
+Create Date: 2026-10-17 18:00:00
+
+"""
+from alembic import op
+import sqlalchemy as sa
+from sqlalchemy.dialects import postgresql
+
+
+# revision identifiers, used by Alembic.
+revision = '0001'
+down_revision = None
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    # Las bases de datos desplegadas antes de las migraciones ya tienen estas
+    # tablas (creadas con create_all): solo se crean las que falten
+    existing = set(sa.inspect(op.get_bind()).get_table_names())
+
+    if 'users' not in existing:
+        op.create_table(
+            'users',
+            sa.Column('id', sa.Integer(), nullable=False),
+            sa.Column('username', sa.String(length=80), nullable=False),
+            sa.Column('email', sa.String(length=120), nullable=False),
+            sa.Column('password_hash', sa.String(length=200), nullable=False),
+            sa.Column('created_at', sa.DateTime(), nullable=True),
+            sa.Column('is_active', sa.Boolean(), nullable=True),
+            sa.Column('is_admin', sa.Boolean(), nullable=True),
+            sa.PrimaryKeyConstraint('id')
+        )
+        op.create_index('ix_users_username', 'users', ['username'], unique=True)
+        op.create_index('ix_users_email', 'users', ['email'], unique=True)
+
+    if 'agent' not in existing:
+        op.create_table(
+            'agent',
+            sa.Column('id', sa.Integer(), nullable=False),
+            sa.Column('name', sa.String(length=100), nullable=False),
+            sa.Column('prompt', sa.Text(), nullable=False),
+            sa.Column('provider', sa.String(length=50), nullable=False),
+            sa.Column('model', sa.String(length=50), nullable=False),
+            sa.Column('temperature', sa.Float(), nullable=False),
+            sa.Column('max_tokens', sa.Integer(), nullable=False),
+            sa.Column('user_id', sa.Integer(), nullable=False),
+            sa.ForeignKeyConstraint(['user_id'], ['users.id'], ondelete='CASCADE'),
+            sa.PrimaryKeyConstraint('id')
+        )
+
+    if 'tool' not in existing:
+        op.create_table(
+            'tool',
+            sa.Column('id', sa.Integer(), nullable=False),
+            sa.Column('name', sa.String(length=100), nullable=False),
+            sa.Column('description', sa.Text(), nullable=False),
+            sa.Column('parameters', postgresql.JSONB(astext_type=sa.Text()), nullable=False),
+            sa.PrimaryKeyConstraint('id'),
+            sa.UniqueConstraint('name')
+        )
+
+    if 'agent_tool' not in existing:
+        op.create_table(
+            'agent_tool',
+            sa.Column('id', sa.Integer(), nullable=False),
+            sa.Column('agent_id', sa.Integer(), nullable=True),
+            sa.Column('tool_id', sa.Integer(), nullable=True),
+            sa.ForeignKeyConstraint(['agent_id'], ['agent.id'], ondelete='CASCADE'),
+            sa.ForeignKeyConstraint(['tool_id'], ['tool.id'], ondelete='CASCADE'),
+            sa.PrimaryKeyConstraint('id'),
+            sa.UniqueConstraint('agent_id', 'tool_id', name='unique_agent_tool')
+        )
+
+    if 'chat_log' not in existing:
+        op.create_table(
+            'chat_log',
+            sa.Column('id', sa.Integer(), nullable=False),
+            sa.Column('agent_id', sa.Integer(), nullable=True),
+            sa.Column('message', sa.Text(), nullable=False),
+            sa.Column('role', sa.String(length=20), nullable=True),
+            sa.Column('timestamp', sa.DateTime(), nullable=True),
+            sa.ForeignKeyConstraint(['agent_id'], ['agent.id'], ondelete='CASCADE'),
+            sa.PrimaryKeyConstraint('id')
+        )
+
+    if 'log_entry' not in existing:
+        op.create_table(
+            'log_entry',
+            sa.Column('id', sa.Integer(), nullable=False),
+            sa.Column('message', sa.Text(), nullable=False),
+            sa.Column('timestamp', sa.DateTime(), nullable=True),
+            sa.PrimaryKeyConstraint('id')
+        )
+
+
+def downgrade():
+    op.drop_table('log_entry')
+    op.drop_table('chat_log')
+    op.drop_table('agent_tool')
+    op.drop_table('tool')
+    op.drop_table('agent')
+    op.drop_index('ix_users_email', table_name='users')
+    op.drop_index('ix_users_username', table_name='users')
+    op.drop_table('users')
@@ -0,0 +1,28 @@
+"""agent.cache_enabled (caché de respuestas por agente)
+
+Revision ID: 0002
+Revises: 0001
+Create Date: 2026-10-17 18:00:00
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = '0002'
+down_revision = '0001'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    columns = {column['name'] for column in sa.inspect(op.get_bind()).get_columns('agent')}
+    if 'cache_enabled' not in columns:
+        # El valor por defecto del servidor rellena las filas existentes
+        op.add_column('agent', sa.Column('cache_enabled', sa.Boolean(), nullable=False, server_default=sa.false()))
+
+
+def downgrade():
+    with op.batch_alter_table('agent') as batch_op:
+        batch_op.drop_column('cache_enabled')
@@ -0,0 +1,34 @@
+"""chat_summary (resumen incremental del historial)
+
+Revision ID: 0003
+Revises: 0002
+Create Date: 2026-10-17 18:00:00
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = '0003'
+down_revision = '0002'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    if 'chat_summary' in sa.inspect(op.get_bind()).get_table_names():
+        return
+    op.create_table(
+        'chat_summary',
+        sa.Column('agent_id', sa.Integer(), nullable=False),
+        sa.Column('summary', sa.Text(), nullable=False),
+        sa.Column('last_chat_id', sa.Integer(), nullable=False),
+        sa.Column('updated_at', sa.DateTime(), nullable=True),
+        sa.ForeignKeyConstraint(['agent_id'], ['agent.id'], ondelete='CASCADE'),
+        sa.PrimaryKeyConstraint('agent_id')
+    )
+
+
+def downgrade():
+    op.drop_table('chat_summary')
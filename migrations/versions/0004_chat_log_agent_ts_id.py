@@ -0,0 +1,31 @@
+"""Índice chat_log (agent_id, timestamp, id) para el historial paginado
+
+Revision ID: 0004
+Revises: 0003
+Create Date: 2026-10-17 18:00:00
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = '0004'
+down_revision = '0003'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    indexes = {index['name'] for index in sa.inspect(op.get_bind()).get_indexes('chat_log')}
+    if 'ix_chat_log_agent_ts_id' in indexes:
+        return
+    # chat_log es la tabla más grande: en Postgres el índice se crea sin
+    # bloquear las escrituras (CONCURRENTLY no admite transacción)
+    with op.get_context().autocommit_block():
+        op.create_index('ix_chat_log_agent_ts_id', 'chat_log', ['agent_id', 'timestamp', 'id'],
+                        postgresql_concurrently=True)
+
+
+def downgrade():
+    op.drop_index('ix_chat_log_agent_ts_id', table_name='chat_log')
@@ -0,0 +1,28 @@
+"""users.agents_version (ETag de la lista de agentes)
+
+Revision ID: 0007
+Revises: 0006
+Create Date: 2026-10-17 18:00:00
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = '0007'
+down_revision = '0006'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    columns = {column['name'] for column in sa.inspect(op.get_bind()).get_columns('users')}
+    if 'agents_version' not in columns:
+        # NOT NULL: el valor por defecto del servidor rellena las filas existentes
+        op.add_column('users', sa.Column('agents_version', sa.Integer(), nullable=False, server_default='0'))
+
+
+def downgrade():
+    with op.batch_alter_table('users') as batch_op:
+        batch_op.drop_column('agents_version')
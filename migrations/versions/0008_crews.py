@@ -0,0 +1,96 @@
+"""crew, crew_task, crew_run y crew_task_run (ejecución de grafos de agentes)
+
+Revision ID: 0008
+Revises: 0007
+Create Date: 2026-10-17 18:00:00
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = '0008'
+down_revision = '0007'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    existing = set(sa.inspect(op.get_bind()).get_table_names())
+
+    if 'crew' not in existing:
+        op.create_table(
+            'crew',
+            sa.Column('id', sa.Integer(), nullable=False),
+            sa.Column('name', sa.String(length=100), nullable=False),
+            sa.Column('description', sa.Text(), nullable=True),
+            sa.Column('user_id', sa.Integer(), nullable=False),
+            sa.Column('created_at', sa.DateTime(), nullable=True),
+            sa.ForeignKeyConstraint(['user_id'], ['users.id'], ondelete='CASCADE'),
+            sa.PrimaryKeyConstraint('id')
+        )
+        op.create_index('ix_crew_user_id', 'crew', ['user_id'])
+
+    if 'crew_task' not in existing:
+        op.create_table(
+            'crew_task',
+            sa.Column('id', sa.Integer(), nullable=False),
+            sa.Column('crew_id', sa.Integer(), nullable=False),
+            sa.Column('key', sa.String(length=50), nullable=False),
+            sa.Column('agent_id', sa.Integer(), nullable=False),
+            sa.Column('description', sa.Text(), nullable=False),
+            sa.Column('depends_on', sa.JSON(), nullable=False),
+            sa.Column('position', sa.Integer(), nullable=False),
+            sa.ForeignKeyConstraint(['agent_id'], ['agent.id'], ondelete='CASCADE'),
+            sa.ForeignKeyConstraint(['crew_id'], ['crew.id'], ondelete='CASCADE'),
+            sa.PrimaryKeyConstraint('id'),
+            sa.UniqueConstraint('crew_id', 'key', name='unique_crew_task_key')
+        )
+        op.create_index('ix_crew_task_crew_id', 'crew_task', ['crew_id'])
+
+    if 'crew_run' not in existing:
+        op.create_table(
+            'crew_run',
+            sa.Column('id', sa.Integer(), nullable=False),
+            sa.Column('crew_id', sa.Integer(), nullable=False),
+            sa.Column('user_id', sa.Integer(), nullable=False),
+            sa.Column('input', sa.Text(), nullable=True),
+            sa.Column('status', sa.String(length=20), nullable=False),
+            sa.Column('total_ms', sa.Float(), nullable=True),
+            sa.Column('created_at', sa.DateTime(), nullable=True),
+            sa.Column('finished_at', sa.DateTime(), nullable=True),
+            sa.ForeignKeyConstraint(['crew_id'], ['crew.id'], ondelete='CASCADE'),
+            sa.ForeignKeyConstraint(['user_id'], ['users.id'], ondelete='CASCADE'),
+            sa.PrimaryKeyConstraint('id')
+        )
+        op.create_index('ix_crew_run_crew_id', 'crew_run', ['crew_id'])
+
+    if 'crew_task_run' not in existing:
+        op.create_table(
+            'crew_task_run',
+            sa.Column('id', sa.Integer(), nullable=False),
+            sa.Column('run_id', sa.Integer(), nullable=False),
+            sa.Column('task_key', sa.String(length=50), nullable=False),
+            sa.Column('agent_id', sa.Integer(), nullable=True),
+            sa.Column('status', sa.String(length=20), nullable=False),
+            sa.Column('output', sa.Text(), nullable=True),
+            sa.Column('error', sa.Text(), nullable=True),
+            sa.Column('latency_ms', sa.Float(), nullable=True),
+            sa.Column('prompt_tokens', sa.Integer(), nullable=True),
+            sa.Column('completion_tokens', sa.Integer(), nullable=True),
+            sa.ForeignKeyConstraint(['run_id'], ['crew_run.id'], ondelete='CASCADE'),
+            sa.PrimaryKeyConstraint('id')
+        )
+        op.create_index('ix_crew_task_run_run_id', 'crew_task_run', ['run_id'])
+
+
+def downgrade():
+    op.drop_index('ix_crew_task_run_run_id', table_name='crew_task_run')
+    op.drop_table('crew_task_run')
+    op.drop_index('ix_crew_run_crew_id', table_name='crew_run')
+    op.drop_table('crew_run')
+    op.drop_index('ix_crew_task_crew_id', table_name='crew_task')
+    op.drop_table('crew_task')
+    op.drop_index('ix_crew_user_id', table_name='crew')
+    op.drop_table('crew')
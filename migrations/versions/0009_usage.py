@@ -0,0 +1,63 @@
+"""consumo por turno en chat_log y agregados usage_hourly / usage_daily
+
+Revision ID: 0009
+Revises: 0008
+Create Date: 2026-10-17 18:00:00
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = '0009'
+down_revision = '0008'
+branch_labels = None
+depends_on = None
+
+CHAT_LOG_COLUMNS = [
+    ('model', sa.String(length=50)),
+    ('prompt_tokens', sa.Integer()),
+    ('completion_tokens', sa.Integer()),
+    ('latency_ms', sa.Float()),
+]
+
+
+def _create_rollup(table):
+    op.create_table(
+        table,
+        sa.Column('bucket', sa.DateTime(), nullable=False),
+        sa.Column('user_id', sa.Integer(), nullable=False),
+        sa.Column('agent_id', sa.Integer(), nullable=False),
+        sa.Column('model', sa.String(length=50), nullable=False),
+        sa.Column('requests', sa.Integer(), nullable=False),
+        sa.Column('prompt_tokens', sa.BigInteger(), nullable=False),
+        sa.Column('completion_tokens', sa.BigInteger(), nullable=False),
+        sa.Column('latency_ms', sa.Float(), nullable=False),
+        sa.ForeignKeyConstraint(['user_id'], ['users.id'], ondelete='CASCADE'),
+        sa.PrimaryKeyConstraint('bucket', 'user_id', 'agent_id', 'model')
+    )
+    op.create_index(f'ix_{table}_user_bucket', table, ['user_id', 'bucket'])
+
+
+def upgrade():
+    inspector = sa.inspect(op.get_bind())
+    columns = {column['name'] for column in inspector.get_columns('chat_log')}
+    for name, type_ in CHAT_LOG_COLUMNS:
+        if name not in columns:
+            # Nulables: los mensajes anteriores no registran consumo
+            op.add_column('chat_log', sa.Column(name, type_, nullable=True))
+
+    existing = set(inspector.get_table_names())
+    for table in ('usage_hourly', 'usage_daily'):
+        if table not in existing:
+            _create_rollup(table)
+
+
+def downgrade():
+    for table in ('usage_daily', 'usage_hourly'):
+        op.drop_index(f'ix_{table}_user_bucket', table_name=table)
+        op.drop_table(table)
+    with op.batch_alter_table('chat_log') as batch_op:
+        for name, _ in reversed(CHAT_LOG_COLUMNS):
+            batch_op.drop_column(name)
@@ -0,0 +1,28 @@
+"""agent.request_timeout (timeout por llamada al modelo)
+
+Revision ID: 0010
+Revises: 0009
+Create Date: 2026-10-17 18:00:00
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = '0010'
+down_revision = '0009'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    columns = {column['name'] for column in sa.inspect(op.get_bind()).get_columns('agent')}
+    if 'request_timeout' not in columns:
+        # Nulable: sin valor se usa LLM_REQUEST_TIMEOUT
+        op.add_column('agent', sa.Column('request_timeout', sa.Float(), nullable=True))
+
+
+def downgrade():
+    with op.batch_alter_table('agent') as batch_op:
+        batch_op.drop_column('request_timeout')
@@ -0,0 +1,33 @@
+"""agent.semantic_cache_enabled y agent.semantic_cache_threshold
+
+Revision ID: 0011
+Revises: 0010
+Create Date: 2026-10-17 18:00:00
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = '0011'
+down_revision = '0010'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    columns = {column['name'] for column in sa.inspect(op.get_bind()).get_columns('agent')}
+    if 'semantic_cache_enabled' not in columns:
+        # NOT NULL: el valor por defecto del servidor rellena las filas existentes
+        op.add_column('agent', sa.Column('semantic_cache_enabled', sa.Boolean(), nullable=False,
+                                         server_default=sa.false()))
+    if 'semantic_cache_threshold' not in columns:
+        # Nulable: sin valor se usa SEMANTIC_CACHE_THRESHOLD
+        op.add_column('agent', sa.Column('semantic_cache_threshold', sa.Float(), nullable=True))
+
+
+def downgrade():
+    with op.batch_alter_table('agent') as batch_op:
+        batch_op.drop_column('semantic_cache_threshold')
+        batch_op.drop_column('semantic_cache_enabled')
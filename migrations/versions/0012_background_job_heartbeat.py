@@ -0,0 +1,36 @@
+"""background_job: latido, intentos y parámetros para recuperar trabajos huérfanos
+
+Revision ID: 0012
+Revises: 0011
+Create Date: 2026-10-17 18:00:00
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = '0012'
+down_revision = '0011'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    columns = {column['name'] for column in sa.inspect(op.get_bind()).get_columns('background_job')}
+    if 'params' not in columns:
+        op.add_column('background_job', sa.Column('params', sa.JSON(), nullable=True))
+    if 'attempts' not in columns:
+        op.add_column('background_job', sa.Column('attempts', sa.Integer(), nullable=False, server_default='0'))
+    if 'started_at' not in columns:
+        op.add_column('background_job', sa.Column('started_at', sa.DateTime(), nullable=True))
+    if 'heartbeat_at' not in columns:
+        op.add_column('background_job', sa.Column('heartbeat_at', sa.DateTime(), nullable=True))
+
+
+def downgrade():
+    with op.batch_alter_table('background_job') as batch_op:
+        batch_op.drop_column('heartbeat_at')
+        batch_op.drop_column('started_at')
+        batch_op.drop_column('attempts')
+        batch_op.drop_column('params')
@@ -0,0 +1,123 @@
+# tests/conftest.py
+
+import os
+import uuid
+import tempfile
+import pytest
+from sqlalchemy.dialects.postgresql import JSONB
+from sqlalchemy.ext.compiler import compiles
+from app.utils.fake_llm import FakeLLMServer
+
+# Config lee el entorno al importarse: se fija antes de importar la app
+_db_dir = tempfile.mkdtemp(prefix='crewai-tests-')
+os.environ.update({
+    'DATABASE_URL': f'sqlite:///{os.path.join(_db_dir, "test.db")}',
+    'JWT_SECRET_KEY': 'clave-de-pruebas-' + 'x' * 32,
+    'MAIL_USERNAME': 'pruebas',
+    'MAIL_PASSWORD': 'pruebas',
+    'MAIL_DEFAULT_SENDER': 'pruebas@example.com',
+    'DEFAULT_ADMIN_EMAIL': 'admin@example.com',
+    'DEFAULT_ADMIN_PASSWORD': 'admin123',
+    'OPENAI_API_KEY': 'sk-fake',
+    'FRONTEND_BASE_URL': 'http://localhost:5173',
+    # Los barridos de trabajos huérfanos y la entrega de correo los lanzan las pruebas
+    'JOB_HEARTBEAT_SECONDS': '3600',
+    'MAIL_WORKER_ENABLED': 'false',
+})
+
+
+@compiles(JSONB, 'sqlite')
+def _jsonb_sqlite(type_, compiler, **kw):
+    # Las pruebas usan SQLite; en producción la columna es JSONB de Postgres
+    return 'JSON'
+
+
+@pytest.fixture(scope='session')
+def fake_llm():
+    """Servidor local compatible con OpenAI, sin latencia ni herramientas."""
+    server = FakeLLMServer(latency=0, token_delay=0, tokens=5, tool_call_rate=0).start()
+    os.environ['OPENAI_BASE_URL'] = server.base_url
+    yield server
+    server.stop()
+
+
+MIGRATIONS_DIR = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), 'migrations')
+
+
+@pytest.fixture(scope='session')
+def app(fake_llm):
+    from flask_migrate import upgrade
+    from app import create_app
+    from app.bootstrap import init_database
+
+    app = create_app()
+    app.config.update(TESTING=True, ADMISSION_ENABLED=False)
+    with app.app_context():
+        # El esquema de las pruebas es el de las migraciones, como en producción
+        upgrade(directory=MIGRATIONS_DIR)
+        init_database()
+    return app
+
+
+@pytest.fixture
+def client(app):
+    return app.test_client()
+
+
+def login(client, login, password):
+    response = client.post('/api/auth/login', json={'login': login, 'password': password})
+    assert response.status_code == 200, response.get_json()
+    return {'Authorization': 'Bearer ' + response.get_json()['token']}
+
+
+@pytest.fixture
+def admin_headers(client):
+    return login(client, 'admin@example.com', 'admin123')
+
+
+@pytest.fixture
+def user_headers(app, client):
+    """Usuario sin privilegios, nuevo en cada prueba."""
+    from app.models import User, db
+
+    name = 'user' + uuid.uuid4().hex[:8]
+    with app.app_context():
+        db.session.add(User(name, f'{name}@example.com', 'secreto123'))
+        db.session.commit()
+    return login(client, name, 'secreto123')
+
+
+@pytest.fixture
+def make_agent(client):
+    """Crea agentes por la API con el usuario indicado; devuelve su id."""
+    def make(headers, **fields):
+        data = {'name': 'agente', 'prompt': 'Eres un asistente.', 'llm_provider': 'openai', 'model': 'gpt-test'}
+        data.update(fields)
+        response = client.post('/api/agents', json=data, headers=headers)
+        assert response.status_code == 201, response.get_json()
+        return response.get_json()['agent_id']
+    return make
+
+
+@pytest.fixture
+def fake_provider(app, monkeypatch):
+    """
+    Registra un proveedor compatible con OpenAI servido por un FakeLLMServer
+    propio; devuelve (nombre del proveedor, servidor).
+    """
+    servers = []
+
+    def make(**options):
+        options = {'latency': 0, 'token_delay': 0, 'tokens': 5, 'tool_call_rate': 0, **options}
+        server = FakeLLMServer(**options).start()
+        servers.append(server)
+        name = 'fake' + uuid.uuid4().hex[:8]
+        monkeypatch.setenv(f'{name.upper()}_API_KEY', 'sk-fake')
+        monkeypatch.setenv(f'{name.upper()}_BASE_URL', server.base_url)
+        monkeypatch.setitem(app.config, 'LLM_OPENAI_COMPATIBLE_PROVIDERS',
+                            app.config['LLM_OPENAI_COMPATIBLE_PROVIDERS'] + [name])
+        return name, server
+
+    yield make
+    for server in servers:
+        server.stop()
@@ -0,0 +1,174 @@
+# tests/test_admission.py
+
+import time
+import pytest
+from app.utils import admission
+from app.utils.admission import AdmissionRejected, MemoryAdmissionBackend, RedisAdmissionBackend, admit
+
+
+@pytest.fixture
+def backend(app, monkeypatch):
+    """Backend en memoria nuevo y límites pequeños para cada prueba."""
+    backend = MemoryAdmissionBackend()
+    monkeypatch.setattr(admission, '_backend', backend)
+    config = {
+        'ADMISSION_USER_RATE': 1.0,
+        'ADMISSION_USER_BURST': 3,
+        'ADMISSION_GLOBAL_RATE': None,
+        'ADMISSION_USER_MAX_IN_FLIGHT': 2,
+        'ADMISSION_GLOBAL_MAX_IN_FLIGHT': 4,
+    }
+    for key, value in config.items():
+        monkeypatch.setitem(app.config, key, value)
+    with app.app_context():
+        yield backend
+
+
+def user_tokens(backend, user_id=1):
+    return backend._buckets['user:%s' % user_id][0]
+
+
+def test_token_bucket_burst_and_refill(monkeypatch):
+    now = [100.0]
+    monkeypatch.setattr(admission.time, 'monotonic', lambda: now[0])
+    backend = MemoryAdmissionBackend()
+
+    assert [backend.take_tokens('k', 2.0, 3, 1)[0] for _ in range(4)] == [True, True, True, False]
+    allowed, wait = backend.take_tokens('k', 2.0, 3, 1)
+    assert not allowed and wait == pytest.approx(0.5)
+
+    now[0] += 0.5
+    assert backend.take_tokens('k', 2.0, 3, 1) == (True, 0.0)
+    # La recarga no supera la ráfaga
+    now[0] += 60
+    assert [backend.take_tokens('k', 2.0, 3, 1)[0] for _ in range(4)] == [True, True, True, False]
+
+
+def test_slots_are_released(backend):
+    first = admit(1)
+    second = admit(1)
+    with pytest.raises(AdmissionRejected) as rejected:
+        admit(1)
+    assert rejected.value.status == 429
+    assert rejected.value.reason == 'rejected_user_in_flight'
+
+    first.release()
+    first.release()  # idempotente
+    assert backend.in_flight('user:1') == 1
+    assert backend.in_flight('global') == 1
+    second.release()
+    assert backend.in_flight('user:1') == 0
+    assert backend.in_flight('global') == 0
+
+
+def test_slot_rejection_does_not_burn_tokens(backend):
+    held = admit(1, slots=2)
+    tokens = user_tokens(backend)
+    for _ in range(5):
+        with pytest.raises(AdmissionRejected):
+            admit(1)
+    assert user_tokens(backend) == pytest.approx(tokens, abs=0.1)
+
+    held.release()
+    admit(1).release()
+
+
+def test_global_rate_rejection_refunds_user_tokens(app, backend, monkeypatch):
+    monkeypatch.setitem(app.config, 'ADMISSION_GLOBAL_RATE', 0.001)
+    monkeypatch.setitem(app.config, 'ADMISSION_GLOBAL_BURST', 1)
+    admit(1).release()
+    tokens = user_tokens(backend)
+
+    with pytest.raises(AdmissionRejected) as rejected:
+        admit(1)
+    assert rejected.value.status == 503
+    assert user_tokens(backend) == pytest.approx(tokens, abs=0.1)
+    assert backend.in_flight('user:1') == 0
+    assert backend.in_flight('global') == 0
+
+
+def test_rate_rejection_releases_slots(backend):
+    for _ in range(3):
+        admit(1).release()
+    with pytest.raises(AdmissionRejected) as rejected:
+        admit(1)
+    assert rejected.value.reason == 'rejected_user_rate'
+    assert rejected.value.retry_after >= 1
+    assert backend.in_flight('user:1') == 0
+
+
+def test_slots_are_capped_by_limits(backend):
+    ticket = admit(1, slots=10)
+    assert backend.in_flight('user:1') == 2
+    ticket.release()
+    assert backend.in_flight('user:1') == 0
+
+
+def test_route_returns_retry_after(app, client, user_headers, make_agent, backend, monkeypatch):
+    agent_id = make_agent(user_headers)
+    monkeypatch.setitem(app.config, 'ADMISSION_ENABLED', True)
+    monkeypatch.setitem(app.config, 'ADMISSION_USER_BURST', 1)
+    monkeypatch.setitem(app.config, 'ADMISSION_USER_RATE', 0.001)
+
+    responses = [client.post(f'/api/chat/{agent_id}', json={'message': 'hola'},
+                            headers=user_headers) for _ in range(2)]
+    assert responses[0].status_code == 200, responses[0].get_json()
+    assert responses[1].status_code == 429
+    assert int(responses[1].headers['Retry-After']) >= 1
+    assert backend._slots == {}
+
+
+@pytest.fixture
+def redis_backend(monkeypatch):
+    """Backend Redis sobre fakeredis, que ejecuta los scripts Lua de verdad."""
+    fakeredis = pytest.importorskip('fakeredis')
+    pytest.importorskip('lupa')
+    import redis
+
+    server = fakeredis.FakeServer()
+    monkeypatch.setattr(redis.Redis, 'from_url', lambda url, **kwargs: fakeredis.FakeRedis(server=server))
+    return RedisAdmissionBackend('redis://fake', slot_ttl=0.3)
+
+
+def test_redis_slots_limit_and_release(redis_backend):
+    assert redis_backend.acquire_slots('user:1', 2, 3, 'a')
+    assert not redis_backend.acquire_slots('user:1', 2, 3, 'b')
+    assert redis_backend.acquire_slots('user:1', 1, 3, 'c')
+    assert redis_backend.in_flight('user:1') == 3
+
+    redis_backend.release_slots('user:1', 2, 'a')
+    redis_backend.release_slots('user:1', 2, 'a')  # liberar dos veces no resta plazas ajenas
+    assert redis_backend.in_flight('user:1') == 1
+    assert redis_backend.acquire_slots('user:1', 2, 3, 'b')
+
+
+def test_redis_leaked_slots_expire(redis_backend):
+    assert redis_backend.acquire_slots('global', 2, 2, 'muerto')
+    time.sleep(0.2)
+    # Otro intento no alarga el plazo de las plazas ya ocupadas
+    assert not redis_backend.acquire_slots('global', 1, 2, 'b')
+    time.sleep(0.15)
+    assert redis_backend.in_flight('global') == 0
+    assert redis_backend.acquire_slots('global', 2, 2, 'b')
+
+
+def test_redis_release_after_expiry_keeps_count(redis_backend):
+    assert redis_backend.acquire_slots('global', 1, 2, 'lento')
+    time.sleep(0.35)
+    assert redis_backend.acquire_slots('global', 2, 2, 'b')
+    # El stream que superó el plazo libera tarde: el contador no baja de lo ocupado
+    redis_backend.release_slots('global', 1, 'lento')
+    assert redis_backend.in_flight('global') == 2
+    assert not redis_backend.acquire_slots('global', 1, 2, 'c')
+
+
+def test_admit_with_redis_backend(backend, redis_backend, monkeypatch):
+    monkeypatch.setattr(admission, '_backend', redis_backend)
+    first = admit(1)
+    second = admit(1)
+    with pytest.raises(AdmissionRejected):
+        admit(1)
+    assert redis_backend.in_flight('user:1') == redis_backend.in_flight('global') == 2
+    first.release()
+    second.release()
+    assert redis_backend.in_flight('user:1') == redis_backend.in_flight('global') == 0
@@ -0,0 +1,123 @@
+# tests/test_agent_cache.py
+
+import threading
+import uuid
+import pytest
+from app.models import Agent, db
+from app.utils import agent_cache
+from app.utils.agent_cache import get_agent_cache_stats, get_compiled_agent, invalidate_agents
+
+
+@pytest.fixture
+def tool(client, admin_headers):
+    """Crea una herramienta; devuelve (id, nombre)."""
+    name = 'herramienta_' + uuid.uuid4().hex[:8]
+    response = client.post('/api/tools', json={'name': name, 'description': 'Busca cosas',
+                                               'parameters': {'q': {'type': 'string'}}}, headers=admin_headers)
+    assert response.status_code == 201, response.get_json()
+    return response.get_json()['tool_id'], name
+
+
+@pytest.fixture
+def cached_agent(app, user_headers, make_agent, tool):
+    """Agente con la herramienta, ya compilado en la caché del worker."""
+    agent_id = make_agent(user_headers, tools=[tool[1]])
+    with app.app_context():
+        get_compiled_agent(agent_id)
+        hits = get_agent_cache_stats()['hits']
+        get_compiled_agent(agent_id)
+        assert get_agent_cache_stats()['hits'] == hits + 1
+    return agent_id
+
+
+def compiled(app, agent_id):
+    with app.app_context():
+        return get_compiled_agent(agent_id)
+
+
+def test_update_agent_evicts(app, client, user_headers, cached_agent):
+    response = client.put(f'/api/agents/{cached_agent}', json={'prompt': 'Prompt nuevo'}, headers=user_headers)
+    assert response.status_code == 200
+    assert compiled(app, cached_agent).prompt == 'Prompt nuevo'
+
+
+def test_update_tool_evicts_agents_using_it(app, client, admin_headers, tool, cached_agent):
+    assert compiled(app, cached_agent).tools[0]['function']['description'] == 'Busca cosas'
+    response = client.put(f'/api/tools/{tool[0]}', json={'description': 'Busca mejor'}, headers=admin_headers)
+    assert response.status_code == 200
+    assert compiled(app, cached_agent).tools[0]['function']['description'] == 'Busca mejor'
+
+
+def test_delete_tool_evicts_agents_using_it(app, client, admin_headers, tool, cached_agent):
+    response = client.delete(f'/api/tools/{tool[0]}', headers=admin_headers)
+    assert response.status_code == 200
+    assert compiled(app, cached_agent).tools == []
+
+
+def test_rolled_back_change_does_not_evict(app, cached_agent):
+    with app.app_context():
+        invalidations = get_agent_cache_stats()['invalidations']
+        db.session.get(Agent, cached_agent).prompt = 'Cambio descartado'
+        invalidate_agents([cached_agent])
+        db.session.rollback()
+
+        assert get_agent_cache_stats()['invalidations'] == invalidations
+        assert get_compiled_agent(cached_agent).prompt == 'Eres un asistente.'
+
+
+def test_notification_from_another_worker_evicts(app, cached_agent):
+    with app.app_context():
+        entries = get_agent_cache_stats()['entries']
+        agent_cache._dispatch(f'agent:{cached_agent}')
+        assert get_agent_cache_stats()['entries'] == entries - 1
+        # Avisos de otros tipos o mal formados no vacían nada
+        agent_cache._dispatch('desconocido:1')
+        agent_cache._dispatch('agent')
+
+
+@pytest.fixture
+def postgres(monkeypatch):
+    """Simula Postgres con el listener desconectado; devuelve su evento de conexión."""
+    ready = threading.Event()
+    monkeypatch.setattr(agent_cache, '_is_postgres', lambda: True)
+    monkeypatch.setattr(agent_cache, '_ensure_listener', lambda: None)
+    monkeypatch.setattr(agent_cache, '_listener_ready', ready)
+    return ready
+
+
+def test_cache_only_used_while_listening(app, user_headers, make_agent, postgres):
+    agent_id = make_agent(user_headers)
+    with app.app_context():
+        before = get_agent_cache_stats()
+        get_compiled_agent(agent_id)
+        get_compiled_agent(agent_id)
+        after = get_agent_cache_stats()
+        assert (after['hits'], after['entries'], after['listener_connected']) == (before['hits'], before['entries'], False)
+
+        postgres.set()
+        get_compiled_agent(agent_id)
+        get_compiled_agent(agent_id)
+        assert get_agent_cache_stats()['hits'] == before['hits'] + 1
+
+
+def test_notify_is_sent_inside_the_update_transaction(client, user_headers, make_agent, postgres, monkeypatch):
+    agent_id = make_agent(user_headers)
+    calls = []
+    execute, commit = db.session.execute, db.session.commit
+
+    def spy_execute(statement, params=None, *args, **kwargs):
+        if 'pg_notify' in str(statement):
+            calls.append(('notify', params['payload'], db.session().in_transaction()))
+            return None
+        return execute(statement, params, *args, **kwargs)
+
+    def spy_commit():
+        calls.append(('commit',))
+        return commit()
+
+    monkeypatch.setattr(db.session, 'execute', spy_execute)
+    monkeypatch.setattr(db.session, 'commit', spy_commit)
+    response = client.put(f'/api/agents/{agent_id}', json={'prompt': 'Prompt nuevo'}, headers=user_headers)
+
+    assert response.status_code == 200
+    assert calls == [('notify', f'agent:{agent_id}', True), ('commit',)]
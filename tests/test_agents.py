@@ -0,0 +1,88 @@
+# tests/test_agents.py
+
+import uuid
+import pytest
+
+
+def etag_of(client, url, headers):
+    response = client.get(url, headers=headers)
+    assert response.status_code == 200, response.get_json()
+    return response.headers['ETag']
+
+
+def if_none_match(headers, etag):
+    return {**headers, 'If-None-Match': etag}
+
+
+@pytest.mark.parametrize('url', ['/api/agents', '/api/agents/{agent_id}', '/api/agents?fields=id,name'])
+def test_unchanged_agents_return_304(client, user_headers, make_agent, url):
+    url = url.format(agent_id=make_agent(user_headers))
+    etag = etag_of(client, url, user_headers)
+
+    response = client.get(url, headers=if_none_match(user_headers, etag))
+    assert response.status_code == 304
+    assert response.data == b''
+    assert response.headers['ETag'] == etag
+
+
+def test_fields_change_the_etag(client, user_headers, make_agent):
+    make_agent(user_headers)
+    assert etag_of(client, '/api/agents?fields=id', user_headers) != etag_of(client, '/api/agents', user_headers)
+
+
+def test_etag_is_per_user(client, user_headers, admin_headers, make_agent):
+    make_agent(user_headers)
+    etag = etag_of(client, '/api/agents', user_headers)
+    assert client.get('/api/agents', headers=if_none_match(admin_headers, etag)).status_code == 200
+
+
+@pytest.mark.parametrize('change', ['create', 'update', 'delete'])
+def test_agent_changes_bump_version(client, user_headers, make_agent, change):
+    agent_id = make_agent(user_headers)
+    etag = etag_of(client, '/api/agents', user_headers)
+
+    if change == 'create':
+        make_agent(user_headers, name='otro')
+    elif change == 'update':
+        assert client.put(f'/api/agents/{agent_id}', json={'name': 'renombrado'},
+                          headers=user_headers).status_code == 200
+    else:
+        assert client.delete(f'/api/agents/{agent_id}', headers=user_headers).status_code == 200
+
+    response = client.get('/api/agents', headers=if_none_match(user_headers, etag))
+    assert response.status_code == 200
+    assert response.headers['ETag'] != etag
+
+
+@pytest.mark.parametrize('fields', ['bogus', 'id,bogus', ','])
+def test_invalid_fields_return_400(client, user_headers, make_agent, fields):
+    agent_id = make_agent(user_headers)
+    for url in ('/api/agents', f'/api/agents/{agent_id}'):
+        response = client.get(url, query_string={'fields': fields}, headers=user_headers)
+        assert response.status_code == 400
+        assert response.get_json()['message'] == 'Parámetro fields inválido'
+
+
+def test_fields_limit_the_response(client, user_headers, make_agent):
+    agent_id = make_agent(user_headers)
+    response = client.get(f'/api/agents/{agent_id}?fields=name,id', headers=user_headers)
+    assert response.get_json() == {'name': 'agente', 'id': agent_id}
+
+
+def test_update_tool_invalidates_etag_of_its_users(client, admin_headers, user_headers, make_agent):
+    name = 'herramienta_' + uuid.uuid4().hex[:8]
+    response = client.post('/api/tools', json={'name': name, 'description': 'Busca cosas',
+                                               'parameters': {'q': {'type': 'string'}}}, headers=admin_headers)
+    tool_id = response.get_json()['tool_id']
+    make_agent(user_headers, tools=[name])
+    etag = etag_of(client, '/api/agents', user_headers)
+    admin_etag = etag_of(client, '/api/agents', admin_headers)
+
+    response = client.put(f'/api/tools/{tool_id}', json={'name': name + '_v2'}, headers=admin_headers)
+    assert response.status_code == 200
+
+    response = client.get('/api/agents', headers=if_none_match(user_headers, etag))
+    assert response.status_code == 200
+    assert response.get_json()[0]['tools'] == [name + '_v2']
+    # Quien no tiene agentes con la herramienta conserva su versión
+    assert client.get('/api/agents', headers=if_none_match(admin_headers, admin_etag)).status_code == 304
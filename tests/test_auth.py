@@ -0,0 +1,88 @@
+# tests/test_auth.py
+
+import pytest
+from sqlalchemy import update
+from app import auth
+from app.auth import verify_principal
+from app.models import User, db
+from app.utils import agent_cache
+
+
+def user_id(client, headers):
+    return client.get('/api/auth/me', headers=headers).get_json()['user']['id']
+
+
+def token(headers):
+    return headers['Authorization'].split(' ')[1]
+
+
+def test_role_change_takes_effect_immediately(client, admin_headers, user_headers):
+    target = user_id(client, user_headers)
+    # El principal queda en caché como usuario sin privilegios
+    assert client.get('/api/admin/users', headers=user_headers).status_code == 403
+
+    response = client.put(f'/api/admin/users/{target}/role', json={'is_admin': True}, headers=admin_headers)
+    assert response.status_code == 200
+    assert client.get('/api/admin/users', headers=user_headers).status_code == 200
+
+    client.put(f'/api/admin/users/{target}/role', json={'is_admin': False}, headers=admin_headers)
+    assert client.get('/api/admin/users', headers=user_headers).status_code == 403
+
+
+def test_deactivation_revokes_tokens_immediately(client, admin_headers, user_headers):
+    target = user_id(client, user_headers)
+
+    response = client.put(f'/api/admin/users/{target}/status', json={'is_active': False}, headers=admin_headers)
+    assert response.status_code == 200
+    assert client.get('/api/auth/me', headers=user_headers).status_code == 401
+
+    client.put(f'/api/admin/users/{target}/status', json={'is_active': True}, headers=admin_headers)
+    assert client.get('/api/auth/me', headers=user_headers).status_code == 200
+
+
+def test_status_route_requires_admin(client, admin_headers, user_headers):
+    target = user_id(client, user_headers)
+    assert client.put(f'/api/admin/users/{target}/status', json={'is_active': False},
+                      headers=user_headers).status_code == 403
+    assert client.put(f'/api/admin/users/{target}/status', json={}, headers=admin_headers).status_code == 400
+
+
+def test_notification_from_another_worker_evicts_principal(app, client, user_headers):
+    target = user_id(client, user_headers)
+    with app.app_context():
+        assert verify_principal(token(user_headers)).is_admin is False
+        # Otro worker cambia el rol: aquí solo llega su NOTIFY
+        db.session.execute(update(User).where(User.id == target).values(is_admin=True))
+        db.session.commit()
+        assert verify_principal(token(user_headers)).is_admin is False
+
+        agent_cache._dispatch(f'user:{target}')
+        assert verify_principal(token(user_headers)).is_admin is True
+
+
+def test_invalidation_is_discarded_on_rollback(app, client, user_headers):
+    target = user_id(client, user_headers)
+    with app.app_context():
+        verify_principal(token(user_headers))
+        before = auth.get_principal_cache_stats()['invalidations']
+
+        user = db.session.get(User, target)
+        user.is_admin = True
+        auth.invalidate_principal(target)
+        db.session.rollback()
+        assert auth.get_principal_cache_stats()['invalidations'] == before
+
+        db.session.commit()
+        assert auth.get_principal_cache_stats()['invalidations'] == before
+
+
+def test_principal_cache_unused_without_listener(app, client, user_headers, monkeypatch):
+    monkeypatch.setattr(agent_cache, '_is_postgres', lambda: True)
+    monkeypatch.setattr(agent_cache, '_ensure_listener', lambda: None)
+    monkeypatch.setattr(agent_cache, '_listener_ready', type(agent_cache._listener_ready)())
+    with app.app_context():
+        before = auth.get_principal_cache_stats()
+        verify_principal(token(user_headers))
+        verify_principal(token(user_headers))
+        after = auth.get_principal_cache_stats()
+    assert (after['hits'], after['misses']) == (before['hits'], before['misses'])
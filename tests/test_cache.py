@@ -0,0 +1,131 @@
+# tests/test_cache.py
+
+import pytest
+from app.utils import cache as cache_module
+from app.utils.cache import LRUCache, ResponseCache, make_cache_key, get_response_cache
+
+
+class Clock:
+    def __init__(self):
+        self.now = 1000.0
+
+    def __call__(self):
+        return self.now
+
+
+@pytest.fixture
+def clock(monkeypatch):
+    clock = Clock()
+    monkeypatch.setattr(cache_module.time, 'monotonic', clock)
+    return clock
+
+
+def test_entry_expires_after_ttl(clock):
+    cache = LRUCache(ttl=10)
+    cache.set('k', 'v')
+    clock.now += 9.9
+    assert cache.get('k') == 'v'
+    clock.now += 0.2
+    assert cache.get('k') is None
+    assert cache.info()['entries'] == 0
+    assert cache.info()['bytes'] == 0
+
+
+def test_per_entry_ttl_overrides_default(clock):
+    cache = LRUCache(ttl=10)
+    cache.set('k', 'v', ttl=60)
+    clock.now += 30
+    assert cache.get('k') == 'v'
+
+
+def test_evicts_least_recently_used_entry(clock):
+    cache = LRUCache(max_entries=2)
+    cache.set('a', '1')
+    cache.set('b', '2')
+    assert cache.get('a') == '1'  # 'b' pasa a ser la menos usada
+    cache.set('c', '3')
+    assert cache.get('b') is None
+    assert cache.get('a') == '1'
+    assert cache.get('c') == '3'
+    assert cache.evictions == 1
+
+
+def test_evicts_by_total_bytes(clock):
+    cache = LRUCache(max_entries=100, max_bytes=10)
+    cache.set('a', 'x' * 6)
+    cache.set('b', 'y' * 6)
+    assert cache.get('a') is None
+    assert cache.get('b') == 'y' * 6
+    assert cache.info()['bytes'] == 6
+
+
+def test_value_larger_than_limit_is_not_stored(clock):
+    cache = LRUCache(max_bytes=4)
+    cache.set('a', 'ñññ')  # 6 bytes en UTF-8
+    assert cache.get('a') is None
+
+
+def test_overwrite_keeps_byte_count(clock):
+    cache = LRUCache()
+    cache.set('a', 'xx')
+    cache.set('a', 'xxxx')
+    info = cache.info()
+    assert (info['entries'], info['bytes']) == (1, 4)
+
+
+def test_response_cache_counts_hits_and_misses(clock):
+    cache = ResponseCache(LRUCache())
+    assert cache.get('k') is None
+    cache.set('k', 'respuesta')
+    cache.set('vacía', '')  # las respuestas vacías no se guardan
+    assert cache.get('k') == 'respuesta'
+    assert cache.get('vacía') is None
+    stats = cache.stats()
+    assert (stats['hits'], stats['misses'], stats['stores']) == (1, 2, 1)
+    assert stats['hit_rate'] == 0.333
+
+
+class FailingTier:
+    def get(self, key):
+        raise ConnectionError('sin backend')
+
+    def set(self, key, value, ttl):
+        raise ConnectionError('sin backend')
+
+    def clear(self):
+        raise ConnectionError('sin backend')
+
+
+def test_shared_tier_errors_count_as_misses(clock):
+    cache = ResponseCache(LRUCache(), FailingTier())
+    assert cache.get('k') is None
+    cache.set('k', 'v')
+    assert cache.get('k') == 'v'  # servida por el nivel local
+    assert cache.stats()['shared_errors'] == 2
+
+
+def test_cache_key_normalizes_whitespace_and_tool_order():
+    tools = [{'function': {'name': 'b'}}, {'function': {'name': 'a'}}]
+    key = make_cache_key('gpt', [{'role': 'user', 'content': 'hola  mundo'}], tools, 0.1, 50)
+    assert key == make_cache_key('gpt', [{'role': 'user', 'content': ' hola mundo\n'}], tools[::-1], 0.1, 50)
+    assert key != make_cache_key('gpt', [{'role': 'user', 'content': 'hola mundo'}], tools, 0.2, 50)
+    assert key != make_cache_key('gpt', [{'role': 'user', 'content': 'hola mundo'}], tools, 0.1, 51)
+
+
+def test_chat_reuses_cached_response(app, client, fake_llm, user_headers, make_agent):
+    agent_id = make_agent(user_headers, cache_enabled=True)
+    message = {'message': 'pregunta repetida ' + str(agent_id)}
+
+    before = fake_llm.requests
+    first = client.post(f'/api/chat/{agent_id}', json=message, headers=user_headers)
+    calls = fake_llm.requests
+    assert calls == before + 1
+    # El historial cambia tras el primer turno: se borra para repetir la misma llamada
+    client.delete(f'/api/agents/{agent_id}/chats', headers=user_headers)
+    second = client.post(f'/api/chat/{agent_id}', json=message, headers=user_headers)
+
+    assert first.status_code == second.status_code == 200
+    assert second.get_json() == first.get_json()
+    assert fake_llm.requests == calls
+    with app.app_context():
+        assert get_response_cache().stats()['hits'] >= 1
@@ -0,0 +1,131 @@
+# tests/test_chat_batch.py
+
+import threading
+import time
+import pytest
+from app import services
+from app.models import ChatLog
+from app.utils.resilience import LLMUnavailable
+
+
+@pytest.fixture
+def tracked(monkeypatch):
+    """
+    Sustituye la llamada al modelo: responde con eco tras esperar los segundos
+    indicados por 'lento:<s>', falla con 'falla' o 'caído', y registra el
+    máximo de llamadas simultáneas.
+    """
+    state = {'running': 0, 'peak': 0}
+    lock = threading.Lock()
+
+    def complete_chat(router, ctx, messages, usage):
+        message = messages[-1]['content']
+        with lock:
+            state['running'] += 1
+            state['peak'] = max(state['peak'], state['running'])
+        try:
+            time.sleep(float(message.split(':')[1]) if message.startswith('lento:') else 0.05)
+            if message == 'falla':
+                raise RuntimeError('respuesta inválida')
+            if message == 'caído':
+                raise LLMUnavailable('Proveedor caído', 7, 'upstream_error')
+            usage.update(prompt_tokens=3, completion_tokens=2)
+            return f'eco: {message}'
+        finally:
+            with lock:
+                state['running'] -= 1
+
+    monkeypatch.setattr(services, 'complete_chat', complete_chat)
+    return state
+
+
+def batch(client, headers, items, **options):
+    return client.post('/api/chat/batch', json={'items': items, **options}, headers=headers)
+
+
+def saved_messages(app, agent_id):
+    with app.app_context():
+        return [log.message for log in ChatLog.query.filter_by(agent_id=agent_id).order_by(ChatLog.id)]
+
+
+def test_results_follow_request_order(client, user_headers, make_agent, tracked):
+    first, second = make_agent(user_headers), make_agent(user_headers)
+    items = [{'agent_id': first, 'message': 'lento:0.2'}, {'agent_id': second, 'message': 'rápido'},
+             {'agent_ids': [second, first], 'message': 'lento:0.1'}]
+
+    response = batch(client, user_headers, items)
+    assert response.status_code == 200, response.get_json()
+    results = response.get_json()['results']
+    assert [(r['index'], r['agent_id'], r['respuesta']) for r in results] == [
+        (0, first, 'eco: lento:0.2'), (1, second, 'eco: rápido'),
+        (2, second, 'eco: lento:0.1'), (3, first, 'eco: lento:0.1'),
+    ]
+
+
+def test_unknown_agent_fails_only_its_item(app, client, user_headers, admin_headers, make_agent, tracked):
+    own, foreign = make_agent(user_headers), make_agent(admin_headers)
+    items = [{'agent_id': own, 'message': 'hola'}, {'agent_id': foreign, 'message': 'hola'},
+             {'agent_id': 999999, 'message': 'hola'}]
+
+    data = batch(client, user_headers, items).get_json()
+    assert [r['status'] for r in data['results']] == ['ok', 'error', 'error']
+    assert data['results'][1]['error'] == data['results'][2]['error'] == 'Agente no encontrado'
+    assert (data['succeeded'], data['failed']) == (1, 2)
+    assert saved_messages(app, foreign) == []
+
+
+def test_failed_model_call_fails_only_its_item(app, client, user_headers, make_agent, tracked):
+    agent_id = make_agent(user_headers)
+    items = [{'agent_id': agent_id, 'message': message} for message in ('uno', 'falla', 'caído', 'dos')]
+
+    results = batch(client, user_headers, items).get_json()['results']
+    assert [r['status'] for r in results] == ['ok', 'error', 'error', 'ok']
+    assert results[1]['error'] == 'respuesta inválida'
+    assert (results[2]['reason'], results[2]['retry_after']) == ('upstream_error', 7)
+    assert saved_messages(app, agent_id) == ['uno', 'eco: uno', 'dos', 'eco: dos']
+
+
+@pytest.mark.parametrize('requested, peak', [(2, 2), (1, 1), (50, 4)])
+def test_concurrency_is_capped(app, client, user_headers, make_agent, tracked, monkeypatch, requested, peak):
+    monkeypatch.setitem(app.config, 'CHAT_BATCH_CONCURRENCY', 4)
+    agent_id = make_agent(user_headers)
+    items = [{'agent_id': agent_id, 'message': 'lento:0.1'}] * 8
+
+    assert batch(client, user_headers, items, concurrency=requested).status_code == 200
+    assert tracked['peak'] == peak
+
+
+def test_concurrency_is_capped_by_admission_slots(app, client, user_headers, make_agent, tracked, monkeypatch):
+    monkeypatch.setitem(app.config, 'ADMISSION_ENABLED', True)
+    monkeypatch.setitem(app.config, 'ADMISSION_USER_MAX_IN_FLIGHT', 2)
+    monkeypatch.setitem(app.config, 'ADMISSION_USER_BURST', 50)
+    agent_id = make_agent(user_headers)
+
+    response = batch(client, user_headers, [{'agent_id': agent_id, 'message': 'lento:0.1'}] * 6, concurrency=8)
+    assert response.status_code == 200, response.get_json()
+    assert tracked['peak'] == 2
+
+
+def test_turns_are_saved_in_one_transaction(app, client, user_headers, make_agent, tracked, monkeypatch):
+    agent_id = make_agent(user_headers)
+
+    def broken_usage(turns, *args, **kwargs):
+        raise RuntimeError('fallo al guardar el consumo')
+
+    # Si falla cualquier parte del guardado no queda ningún turno a medias
+    monkeypatch.setattr(services, 'record_usage', broken_usage)
+    response = batch(client, user_headers, [{'agent_id': agent_id, 'message': 'uno'},
+                                            {'agent_id': agent_id, 'message': 'dos'}])
+    assert response.status_code == 500
+    assert saved_messages(app, agent_id) == []
+
+
+@pytest.mark.parametrize('body', [
+    {'items': []},
+    {'items': [{'agent_id': 1}]},
+    {'items': [{'agent_id': 'uno', 'message': 'hola'}]},
+    {'items': [{'agent_ids': [], 'message': 'hola'}]},
+    {'items': [{'agent_id': 1, 'message': 'hola'}], 'concurrency': 'muchas'},
+])
+def test_invalid_batches_return_400(client, user_headers, body):
+    assert client.post('/api/chat/batch', json=body, headers=user_headers).status_code == 400
@@ -0,0 +1,77 @@
+# tests/test_chat_pagination.py
+
+from datetime import datetime, timedelta
+import pytest
+
+
+@pytest.fixture
+def history(app, user_headers, make_agent):
+    """Agente con 7 mensajes; los dos primeros comparten timestamp."""
+    from app.models import ChatLog, db
+
+    agent_id = make_agent(user_headers)
+    start = datetime(2026, 1, 1)
+    with app.app_context():
+        rows = [ChatLog(agent_id=agent_id, message=f'm{i}', timestamp=start + timedelta(seconds=max(i, 1)))
+                for i in range(7)]
+        db.session.add_all(rows)
+        db.session.commit()
+        ids = [row.id for row in rows]
+    return agent_id, ids
+
+
+def page(client, headers, agent_id, **params):
+    response = client.get(f'/api/agents/{agent_id}/chats', query_string=params, headers=headers)
+    assert response.status_code == 200, response.get_json()
+    return [chat['id'] for chat in response.get_json()], response.headers
+
+
+def test_latest_page_in_chronological_order(client, user_headers, history):
+    agent_id, ids = history
+    chats, headers = page(client, user_headers, agent_id, limit=3)
+    assert chats == ids[4:]
+    assert headers['X-Has-More'] == 'true'
+    assert headers['X-Next-Cursor'] == str(ids[4])
+
+
+def test_walks_back_to_the_first_message(client, user_headers, history):
+    agent_id, ids = history
+    seen, cursor = [], None
+    while True:
+        params = {'limit': 3, **({'before': cursor} if cursor else {})}
+        chats, headers = page(client, user_headers, agent_id, **params)
+        seen = chats + seen
+        if headers['X-Has-More'] == 'false':
+            assert 'X-Next-Cursor' not in headers
+            break
+        cursor = headers['X-Next-Cursor']
+    assert seen == ids
+
+
+def test_walks_forward_with_after(client, user_headers, history):
+    agent_id, ids = history
+    chats, headers = page(client, user_headers, agent_id, limit=3, after=ids[0])
+    assert chats == ids[1:4]
+    assert headers['X-Next-Cursor'] == str(ids[3])
+    chats, headers = page(client, user_headers, agent_id, limit=3, after=headers['X-Next-Cursor'])
+    assert chats == ids[4:]
+    assert headers['X-Has-More'] == 'false'
+
+
+def test_limit_is_clamped(client, user_headers, history):
+    agent_id, ids = history
+    chats, _ = page(client, user_headers, agent_id, limit=0)
+    assert chats == ids[-1:]
+
+
+def test_unknown_cursor_is_rejected(client, user_headers, history, make_agent):
+    agent_id, ids = history
+    other = make_agent(user_headers)
+    # Un id de otro agente tampoco sirve como cursor
+    response = client.get(f'/api/agents/{other}/chats', query_string={'before': ids[3]}, headers=user_headers)
+    assert response.status_code == 400
+
+
+def test_other_users_cannot_list(client, admin_headers, history):
+    agent_id, _ = history
+    assert client.get(f'/api/agents/{agent_id}/chats', headers=admin_headers).status_code == 404
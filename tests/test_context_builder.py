@@ -0,0 +1,149 @@
+# tests/test_context_builder.py
+
+from types import SimpleNamespace
+import pytest
+from app.utils import context_builder
+from app.utils.context_builder import (
+    DEFAULT_CONTEXT_WINDOW, MESSAGE_OVERHEAD_TOKENS, SUMMARY_PREFIX, build_history, context_window,
+    estimate_tokens, history_token_budget, select_history
+)
+
+
+def chat(id, message, role='user'):
+    return SimpleNamespace(id=id, role=role, message=message)
+
+
+def agent(**fields):
+    data = {'id': 1, 'provider': 'anthropic', 'model': 'claude-test', 'max_tokens': 50,
+            'prompt': 'Eres un asistente.', 'request_timeout': 12.0}
+    data.update(fields)
+    return SimpleNamespace(**data)
+
+
+@pytest.fixture
+def config(app):
+    with app.app_context():
+        saved = dict(app.config)
+        yield app.config
+        app.config.clear()
+        app.config.update(saved)
+
+
+def test_estimate_tokens_counts_overhead():
+    assert estimate_tokens('') == MESSAGE_OVERHEAD_TOKENS
+    assert estimate_tokens('x' * 40) == 10 + 1 + MESSAGE_OVERHEAD_TOKENS
+
+
+def test_context_window_by_model_prefix():
+    assert context_window('gpt-4o-mini') == 128000
+    assert context_window('GPT-4-32k') == 32768
+    assert context_window('gpt-4') == 8192
+    assert context_window('modelo-desconocido') == DEFAULT_CONTEXT_WINDOW
+    assert context_window(None) == DEFAULT_CONTEXT_WINDOW
+
+
+def test_budget_is_capped_by_config(config):
+    config['CHAT_HISTORY_TOKEN_BUDGET'] = 2000
+    assert history_token_budget('gpt-4o', 500, 'prompt') == 2000
+
+
+def test_budget_discounts_prompt_summary_and_answer(config):
+    config['CHAT_HISTORY_TOKEN_BUDGET'] = 100000
+    prompt, summary = 'p' * 400, 's' * 800
+    expected = 8192 - 1000 - estimate_tokens(prompt) - estimate_tokens(summary)
+    assert history_token_budget('gpt-4', 1000, prompt, summary) == expected
+
+
+def test_budget_never_negative(config):
+    assert history_token_budget('gpt-4', 10000, 'prompt') == 0
+
+
+def test_select_history_keeps_newest_messages_in_order():
+    recent = [chat(3, 'c' * 36), chat(2, 'b' * 36), chat(1, 'a' * 36)]  # 14 tokens cada uno
+    assert [c.id for c in select_history(recent, 30)] == [2, 3]
+    assert [c.id for c in select_history(recent, 42)] == [1, 2, 3]
+    assert select_history(recent, 13) == []
+
+
+def test_select_history_stops_at_first_message_over_budget():
+    recent = [chat(3, 'corto'), chat(2, 'x' * 400), chat(1, 'corto')]
+    assert [c.id for c in select_history(recent, 50)] == [3]
+
+
+def test_build_history_prepends_summary_and_schedules_update(config, monkeypatch):
+    scheduled = []
+    monkeypatch.setattr(context_builder, 'schedule_summary_update', lambda *args: scheduled.append(args))
+    config.update(CHAT_HISTORY_TOKEN_BUDGET=20, CHAT_SUMMARY_ENABLED=True, CHAT_HISTORY_MAX_MESSAGES=50)
+    recent = [chat(12, 'y' * 36, 'assistant'), chat(11, 'x' * 36), chat(10, 'w' * 36)]
+    summary = SimpleNamespace(summary='lo anterior', last_chat_id=5)
+
+    history = build_history(agent(), recent, summary)
+
+    assert history == [
+        {'role': 'system', 'content': SUMMARY_PREFIX + 'lo anterior'},
+        {'role': 'assistant', 'content': 'y' * 36},
+    ]
+    # Los mensajes 6 a 11 quedan fuera: se resumen con el proveedor del agente
+    assert scheduled == [(1, 12, 'anthropic', 'claude-test', 12.0)]
+
+
+def test_build_history_without_truncation_does_not_schedule(config, monkeypatch):
+    scheduled = []
+    monkeypatch.setattr(context_builder, 'schedule_summary_update', lambda *args: scheduled.append(args))
+    config.update(CHAT_HISTORY_TOKEN_BUDGET=2000, CHAT_HISTORY_MAX_MESSAGES=50)
+    history = build_history(agent(), [chat(2, 'hola', 'assistant'), chat(1, 'hola')], None)
+    assert [m['role'] for m in history] == ['user', 'assistant']
+    assert scheduled == []
+
+
+class RecordingRouter:
+    def __init__(self):
+        self.calls = []
+
+    def completion(self, provider, model, timeout=None, **params):
+        self.calls.append((provider, model, timeout))
+        message = SimpleNamespace(content='resumen nuevo')
+        usage = SimpleNamespace(prompt_tokens=30, completion_tokens=5)
+        return SimpleNamespace(choices=[SimpleNamespace(message=message)], usage=usage)
+
+
+def _agent_with_history(messages):
+    from app.models import Agent, ChatLog, User, db
+
+    user = User.query.filter_by(username='admin').first()
+    row = Agent(name='resumen', prompt='p', provider='anthropic', model='claude-test', user_id=user.id)
+    db.session.add(row)
+    db.session.flush()
+    db.session.add_all(ChatLog(agent_id=row.id, message=f'mensaje {i}') for i in range(messages))
+    db.session.commit()
+    ids = [c.id for c in ChatLog.query.filter_by(agent_id=row.id).order_by(ChatLog.id)]
+    return row.id, ids
+
+
+def test_update_summary_uses_agent_provider_and_timeout(config, monkeypatch):
+    from app.models import ChatSummary, UsageDaily, db
+
+    router = RecordingRouter()
+    monkeypatch.setattr(context_builder, 'get_llm_router', lambda: router)
+    config.update(CHAT_SUMMARY_MODEL=None, CHAT_SUMMARY_BATCH=2)
+    agent_id, ids = _agent_with_history(5)
+
+    context_builder.update_summary(agent_id, ids[4], 'anthropic', 'claude-test', 12.0)
+
+    assert router.calls == [('anthropic', 'claude-test', 12.0)] * 2
+    summary = db.session.get(ChatSummary, agent_id)
+    assert (summary.summary, summary.last_chat_id) == ('resumen nuevo', ids[3])
+    # Las llamadas del resumen cuentan en el consumo del agente
+    daily = UsageDaily.query.filter_by(agent_id=agent_id).one()
+    assert (daily.model, daily.requests, daily.prompt_tokens, daily.completion_tokens) == ('claude-test', 2, 60, 10)
+
+
+def test_update_summary_with_configured_model_uses_its_provider(config, monkeypatch):
+    router = RecordingRouter()
+    monkeypatch.setattr(context_builder, 'get_llm_router', lambda: router)
+    config.update(CHAT_SUMMARY_MODEL='gpt-4o-mini', CHAT_SUMMARY_PROVIDER='openai')
+    agent_id, ids = _agent_with_history(2)
+
+    context_builder.update_summary(agent_id, ids[-1] + 1, 'anthropic', 'claude-test', None)
+
+    assert router.calls == [('openai', 'gpt-4o-mini', None)]
@@ -0,0 +1,143 @@
+# tests/test_crews.py
+
+import threading
+import time
+import pytest
+from app.services import ChatContext
+from app.utils import crew_engine
+from app.utils.crew_engine import TaskPlan, crew_width, execute_crew, validate_crew_tasks
+
+
+@pytest.fixture
+def ctx(app):
+    with app.app_context():
+        yield app
+
+
+def task(key, *depends_on):
+    return {'key': key, 'agent_id': 1, 'description': f'tarea {key}', 'depends_on': list(depends_on)}
+
+
+def context(agent_id=1):
+    return ChatContext(agent_id, 'Eres un asistente.', 'openai', 'gpt-test', 0.7, None, [], [],
+                       False, None, False, None)
+
+
+def test_validate_accepts_dag(ctx):
+    assert validate_crew_tasks([task('a'), task('b', 'a'), task('c', 'a', 'b')]) is None
+
+
+@pytest.mark.parametrize('tasks, expected', [
+    ([], 'al menos una tarea'),
+    ([task('a'), task('a')], 'duplicada: a'),
+    ([task('a', 'z')], 'inexistentes: z'),
+    ([task('a', 'a')], 'ciclo: a'),
+    ([task('a', 'c'), task('b', 'a'), task('c', 'b'), task('d')], 'ciclo: a, b, c'),
+])
+def test_validate_rejects_invalid_graphs(ctx, tasks, expected):
+    assert expected in validate_crew_tasks(tasks)
+
+
+@pytest.mark.parametrize('tasks, width', [
+    ([task('a'), task('b', 'a'), task('c', 'b')], 1),
+    ([task('a'), task('b'), task('c')], 3),
+    ([task('a'), task('b', 'a'), task('c', 'a'), task('d', 'a')], 3),
+    ([task('a'), task('b', 'a'), task('c', 'a'), task('d', 'b', 'c')], 2),
+    # c depende de a solo de forma indirecta: no puede ir junto a a
+    ([task('a'), task('b', 'a'), task('c', 'b'), task('x'), task('y', 'x')], 2),
+])
+def test_crew_width(tasks, width):
+    assert crew_width(tasks) == width
+
+
+@pytest.fixture
+def tracked(monkeypatch):
+    """Sustituye la llamada al modelo y registra el máximo de tareas simultáneas."""
+    state = {'running': 0, 'peak': 0}
+    lock = threading.Lock()
+
+    def complete_chat(router, ctx, messages, usage):
+        with lock:
+            state['running'] += 1
+            state['peak'] = max(state['peak'], state['running'])
+        time.sleep(0.05)
+        with lock:
+            state['running'] -= 1
+        return messages[-1]['content']
+
+    monkeypatch.setattr(crew_engine, 'complete_chat', complete_chat)
+    return state
+
+
+def test_execute_respects_max_parallel(ctx, tracked):
+    plans = [TaskPlan(key, 1, key, []) for key in 'abcd']
+    events = list(execute_crew(plans, {1: context()}, user_id=-1, max_parallel=2))
+
+    assert tracked['peak'] == 2
+    assert sorted(data['key'] for event, data in events if event == 'task_done') == list('abcd')
+
+
+def test_execute_passes_outputs_to_dependents(ctx, tracked):
+    plans = [TaskPlan('a', 1, 'primera', []), TaskPlan('b', 1, 'segunda', ['a'])]
+    done = {data['key']: data['output'] for event, data in execute_crew(plans, {1: context()}, user_id=-2)
+            if event == 'task_done'}
+
+    assert "Resultado de la tarea 'a':\nprimera" in done['b']
+
+
+def test_execute_fails_task_without_free_slot(ctx, tracked):
+    ctx.config['CREW_SLOT_TIMEOUT'] = 0.05
+    semaphore = crew_engine._user_semaphore(-3)
+    held = 0
+    while semaphore.acquire(blocking=False):
+        held += 1
+    try:
+        plans = [TaskPlan('a', 1, 'a', []), TaskPlan('b', 1, 'b', ['a'])]
+        events = [(event, data['key']) for event, data in execute_crew(plans, {1: context()}, user_id=-3)]
+    finally:
+        for _ in range(held):
+            semaphore.release()
+        ctx.config['CREW_SLOT_TIMEOUT'] = 60
+
+    assert events == [('task_error', 'a'), ('task_skipped', 'b')]
+    assert tracked['peak'] == 0
+
+
+def test_run_route(client, user_headers, make_agent):
+    agent_id = make_agent(user_headers)
+    tasks = [dict(task('a'), agent_id=agent_id), dict(task('b', 'a'), agent_id=agent_id)]
+    response = client.post('/api/crews', json={'name': 'crew', 'tasks': tasks}, headers=user_headers)
+    assert response.status_code == 201, response.get_json()
+    crew_id = response.get_json()['crew']['id']
+
+    response = client.post(f'/api/crews/{crew_id}/run', json={'input': 'hola'}, headers=user_headers)
+    assert response.status_code == 200, response.get_json()
+    run = response.get_json()
+    assert run['status'] == 'done'
+    assert [task_run['status'] for task_run in run['tasks']] == ['done', 'done']
+
+
+def test_create_rejects_cycle(client, user_headers, make_agent):
+    agent_id = make_agent(user_headers)
+    tasks = [dict(task('a', 'b'), agent_id=agent_id), dict(task('b', 'a'), agent_id=agent_id)]
+    response = client.post('/api/crews', json={'name': 'crew', 'tasks': tasks}, headers=user_headers)
+    assert response.status_code == 400
+    assert 'ciclo' in response.get_json()['message']
+
+
+def test_crew_run_slots_use_dag_width(app, client, user_headers, make_agent):
+    from app.routes import _crew_run_slots
+
+    agent_id = make_agent(user_headers)
+    tasks = [dict(task(key), agent_id=agent_id) for key in 'abcdef']
+    crew_id = client.post('/api/crews', json={'name': 'ancho', 'tasks': tasks},
+                          headers=user_headers).get_json()['crew']['id']
+
+    with app.test_request_context(f'/api/crews/{crew_id}/run', method='POST'):
+        app.config.update(ADMISSION_ENABLED=True, CREW_USER_CONCURRENCY=4, ADMISSION_USER_MAX_IN_FLIGHT=3)
+        try:
+            assert _crew_run_slots() == 3
+            app.config['ADMISSION_USER_MAX_IN_FLIGHT'] = 8
+            assert _crew_run_slots() == 4
+        finally:
+            app.config.update(ADMISSION_ENABLED=False, ADMISSION_USER_MAX_IN_FLIGHT=4)
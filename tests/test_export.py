@@ -0,0 +1,118 @@
+# tests/test_export.py
+
+import csv
+import gzip
+import io
+import json
+from datetime import datetime, timedelta
+import pytest
+
+
+@pytest.fixture
+def history(app, user_headers, make_agent):
+    """Agente con 7 mensajes; los dos primeros comparten timestamp."""
+    from app.models import ChatLog, db
+
+    agent_id = make_agent(user_headers)
+    start = datetime(2026, 1, 1)
+    with app.app_context():
+        rows = [ChatLog(agent_id=agent_id, role='user' if i % 2 == 0 else 'assistant',
+                        message=f'm{i}, "con comillas"\ny salto' if i == 3 else f'm{i}',
+                        timestamp=start + timedelta(seconds=max(i, 1)))
+                for i in range(7)]
+        db.session.add_all(rows)
+        db.session.commit()
+        ids = [row.id for row in rows]
+    return agent_id, ids
+
+
+def export(client, headers, agent_id, status=200, **params):
+    response = client.get(f'/api/agents/{agent_id}/chats/export', query_string=params, headers=headers)
+    assert response.status_code == status, response.data[:200]
+    return response
+
+
+def ndjson_ids(data):
+    return [json.loads(line)['id'] for line in data.decode('utf-8').splitlines()]
+
+
+def test_ndjson_export(client, user_headers, history):
+    agent_id, ids = history
+    response = export(client, user_headers, agent_id)
+    assert response.is_streamed
+    assert response.mimetype == 'application/x-ndjson'
+    assert f'agent-{agent_id}-chats.ndjson' in response.headers['Content-Disposition']
+    lines = [json.loads(line) for line in response.data.decode('utf-8').splitlines()]
+    assert [line['id'] for line in lines] == ids
+    assert lines[0]['timestamp'] == '2026-01-01T00:00:01'
+    assert lines[3]['message'] == 'm3, "con comillas"\ny salto'
+
+
+def test_csv_export(client, user_headers, history):
+    agent_id, ids = history
+    response = export(client, user_headers, agent_id, format='csv')
+    assert response.mimetype == 'text/csv'
+    rows = list(csv.reader(io.StringIO(response.data.decode('utf-8'))))
+    assert rows[0][:3] == ['id', 'role', 'message']
+    assert [int(row[0]) for row in rows[1:]] == ids
+    assert rows[4][2] == 'm3, "con comillas"\ny salto'
+
+
+def test_gzip_export(client, user_headers, history):
+    agent_id, ids = history
+    plain = export(client, user_headers, agent_id).data
+    response = export(client, user_headers, agent_id, gzip='1')
+    assert response.mimetype == 'application/gzip'
+    assert response.headers['Content-Disposition'].endswith('.ndjson.gz"')
+    assert gzip.decompress(response.data) == plain
+
+
+@pytest.mark.parametrize('chunk_rows', [1, 2, 3, 7, 100])
+def test_chunk_boundaries(app, client, user_headers, history, monkeypatch, chunk_rows):
+    agent_id, ids = history
+    monkeypatch.setitem(app.config, 'EXPORT_CHUNK_ROWS', chunk_rows)
+    monkeypatch.setitem(app.config, 'EXPORT_YIELD_PER', 2)
+    assert ndjson_ids(export(client, user_headers, agent_id).data) == ids
+    assert ndjson_ids(export(client, user_headers, agent_id, after=ids[1]).data) == ids[2:]
+
+
+def test_resume_after_message(client, user_headers, history):
+    agent_id, ids = history
+    # ids[0] y ids[1] comparten timestamp: la reanudación usa (timestamp, id)
+    assert ndjson_ids(export(client, user_headers, agent_id, after=ids[0]).data) == ids[1:]
+    assert ndjson_ids(export(client, user_headers, agent_id, after=ids[-1]).data) == []
+
+
+def test_time_range(client, user_headers, history):
+    agent_id, ids = history
+    data = export(client, user_headers, agent_id, **{'from': '2026-01-01T00:00:03Z', 'to': '2026-01-01T00:00:05Z'}).data
+    assert ndjson_ids(data) == ids[3:5]
+
+
+@pytest.mark.parametrize('params', [
+    {'format': 'xml'},
+    {'from': 'ayer'},
+    {'after': 'abc'},
+    {'after': '999999999'},
+])
+def test_invalid_parameters(client, user_headers, history, params):
+    agent_id, _ = history
+    response = export(client, user_headers, agent_id, status=400, **params)
+    assert response.get_json()['message']
+
+
+def test_other_users_agent(client, user_headers, admin_headers, history, make_agent):
+    agent_id, ids = history
+    other_agent = make_agent(admin_headers)
+    export(client, user_headers, other_agent, status=404)
+    export(client, user_headers, 999999999, status=404)
+    # Los administradores exportan el historial de cualquier agente
+    assert ndjson_ids(export(client, admin_headers, agent_id).data) == ids
+
+
+def test_log_export(client, user_headers, admin_headers):
+    response = client.get('/api/admin/logs/export', headers=user_headers)
+    assert response.status_code == 403
+    response = client.get('/api/admin/logs/export', query_string={'format': 'csv'}, headers=admin_headers)
+    assert response.status_code == 200
+    assert response.data.decode('utf-8').splitlines()[0] == 'id,timestamp,message'
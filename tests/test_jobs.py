@@ -0,0 +1,95 @@
+# tests/test_jobs.py
+
+import time
+from datetime import datetime, timedelta
+import pytest
+from app.models import Agent, BackgroundJob, ChatLog, User, db
+from app.utils.jobs import sweep_stale_jobs
+
+
+@pytest.fixture
+def ctx(app):
+    with app.app_context():
+        yield app
+
+
+def wait_for_job(job_id, timeout=5):
+    deadline = time.monotonic() + timeout
+    while time.monotonic() < deadline:
+        db.session.expire_all()
+        job = db.session.get(BackgroundJob, job_id)
+        if job.status in ('done', 'error'):
+            return job
+        time.sleep(0.02)
+    raise AssertionError(f'El trabajo {job_id} no terminó')
+
+
+def agent_with_chats(count):
+    user = User.query.filter_by(username='admin').first()
+    agent = Agent(name='trabajos', prompt='p', provider='openai', model='gpt-test', user_id=user.id)
+    db.session.add(agent)
+    db.session.flush()
+    db.session.add_all(ChatLog(agent_id=agent.id, message=f'm{i}') for i in range(count))
+    db.session.commit()
+    return user.id, agent.id
+
+
+def orphan(user_id, params, attempts=1, seconds_ago=3600, status='running'):
+    seen = datetime.utcnow() - timedelta(seconds=seconds_ago)
+    job = BackgroundJob(user_id=user_id, kind='delete_chats', status=status, params=params,
+                        attempts=attempts, started_at=seen, heartbeat_at=seen, updated_at=seen)
+    db.session.add(job)
+    db.session.commit()
+    return job.id
+
+
+def test_async_delete_runs_as_job(ctx, client, admin_headers):
+    _, agent_id = agent_with_chats(3)
+    response = client.delete(f'/api/agents/{agent_id}/chats?async=true', headers=admin_headers)
+    assert response.status_code == 202
+    job = wait_for_job(response.get_json()['job_id'])
+    assert (job.status, job.attempts, job.progress) == ('done', 1, 3)
+    assert job.started_at is not None and job.heartbeat_at is not None
+    assert job.params == {'fn': 'app.services:purge_chat_history', 'args': [agent_id]}
+    assert ChatLog.query.filter_by(agent_id=agent_id).count() == 0
+
+
+def test_sweep_requeues_orphaned_job(ctx):
+    user_id, agent_id = agent_with_chats(4)
+    job_id = orphan(user_id, {'fn': 'app.services:purge_chat_history', 'args': [agent_id]})
+
+    assert sweep_stale_jobs() == 1
+    job = wait_for_job(job_id)
+    assert (job.status, job.attempts) == ('done', 2)
+    assert ChatLog.query.filter_by(agent_id=agent_id).count() == 0
+
+
+def test_sweep_fails_job_after_max_attempts(ctx):
+    ctx.config['JOB_MAX_ATTEMPTS'] = 3
+    user_id, agent_id = agent_with_chats(1)
+    job_id = orphan(user_id, {'fn': 'app.services:purge_chat_history', 'args': [agent_id]}, attempts=3)
+
+    assert sweep_stale_jobs() == 1
+    job = db.session.get(BackgroundJob, job_id)
+    assert job.status == 'error'
+    assert 'interrumpido' in job.error
+    assert ChatLog.query.filter_by(agent_id=agent_id).count() == 1
+
+
+def test_sweep_fails_job_without_resolvable_function(ctx):
+    user_id, _ = agent_with_chats(0)
+    unknown = orphan(user_id, {'fn': 'app.services:no_existe', 'args': []})
+    legacy = orphan(user_id, None, attempts=0, status='pending')  # anterior a la migración
+
+    assert sweep_stale_jobs() == 2
+    for job_id in (unknown, legacy):
+        assert db.session.get(BackgroundJob, job_id).status == 'error'
+
+
+def test_sweep_ignores_live_jobs(ctx):
+    ctx.config['JOB_STALE_SECONDS'] = 90
+    user_id, agent_id = agent_with_chats(1)
+    job_id = orphan(user_id, {'fn': 'app.services:purge_chat_history', 'args': [agent_id]}, seconds_ago=10)
+
+    assert sweep_stale_jobs() == 0
+    assert db.session.get(BackgroundJob, job_id).status == 'running'
@@ -0,0 +1,128 @@
+# tests/test_llm_router.py
+
+import threading
+import time
+import pytest
+from app.utils.llm_router import LLMRouter
+
+
+@pytest.fixture
+def router(app, monkeypatch):
+    monkeypatch.setitem(app.config, 'LLM_RETRY_BASE_DELAY', 0.001)
+    monkeypatch.setitem(app.config, 'LLM_RETRY_MAX_DELAY', 0.001)
+    with app.app_context():
+        yield LLMRouter()
+
+
+def ask(router, provider, model='gpt-test', **params):
+    response = router.completion(provider, model, messages=[{'role': 'user', 'content': 'hola'}], **params)
+    return response.choices[0].message.content
+
+
+def test_targets_follow_fallbacks(app, router, monkeypatch):
+    monkeypatch.setitem(app.config, 'LLM_FALLBACKS', {
+        'openai/gpt-4o': ['anthropic/claude', 'openai'],
+        'openai': ['groq/llama', 'OpenAI/gpt-4o'],
+    })
+    assert router.targets('OpenAI', 'gpt-4o') == [('openai', 'gpt-4o'), ('anthropic', 'claude')]
+    assert router.targets('openai', 'mini') == [('openai', 'mini'), ('groq', 'llama'), ('openai', 'gpt-4o')]
+    assert router.targets(None, 'mini')[0] == ('openai', 'mini')
+    assert router.targets('mistral', 'small') == [('mistral', 'small')]
+
+
+def test_routes_to_agent_provider(router, fake_provider):
+    provider, server = fake_provider()
+    assert ask(router, provider).startswith('eco: hola')
+    assert server.requests == 1
+    assert router.stats()['targets'][f'{provider}/gpt-test']['requests'] == 1
+
+
+def test_falls_back_when_provider_fails(app, router, fake_provider, monkeypatch):
+    broken, broken_server = fake_provider(error_rate=1)
+    backup, backup_server = fake_provider()
+    monkeypatch.setitem(app.config, 'LLM_FALLBACKS', {broken: [f'{backup}/gpt-backup']})
+    monkeypatch.setitem(app.config, 'LLM_MAX_RETRIES', 0)
+
+    assert ask(router, broken).startswith('eco: hola')
+    assert (broken_server.requests, backup_server.requests) == (1, 1)
+    stats = router.stats()['targets']
+    assert stats[f'{broken}/gpt-test']['fallbacks'] == 1
+    assert stats[f'{backup}/gpt-backup']['requests'] == 1
+
+
+def test_latency_budget_moves_to_fallback(app, router, fake_provider, monkeypatch):
+    slow, _ = fake_provider(latency=1)
+    backup, backup_server = fake_provider()
+    monkeypatch.setitem(app.config, 'LLM_FALLBACKS', {slow: [backup]})
+    monkeypatch.setitem(app.config, 'LLM_LATENCY_BUDGET', 0.1)
+
+    started = time.monotonic()
+    assert ask(router, slow).startswith('eco: hola')
+    assert time.monotonic() - started < 0.8
+    assert backup_server.requests == 1
+    assert router.stats()['targets'][f'{slow}/gpt-test']['timeouts'] == 1
+
+
+def test_hedge_wins_over_slow_attempt(app, router, fake_provider, monkeypatch):
+    provider, server = fake_provider()
+    # Con el cliente ya creado, los dos intentos salen separados por el retraso del hedge
+    ask(router, provider)
+    monkeypatch.setitem(app.config, 'LLM_HEDGE_ENABLED', True)
+    monkeypatch.setitem(app.config, 'LLM_HEDGE_DELAY', 0.05)
+    server.latency = 1
+
+    def speed_up():
+        # Solo el primer intento es lento; el hedge responde al momento
+        while server.requests == 1:
+            time.sleep(0.005)
+        server.latency = 0
+
+    threading.Thread(target=speed_up, daemon=True).start()
+    started = time.monotonic()
+    assert ask(router, provider).startswith('eco: hola')
+    assert time.monotonic() - started < 0.8
+    stats = router.stats()['targets'][f'{provider}/gpt-test']
+    assert (stats['hedges'], stats['hedge_wins']) == (1, 1)
+
+
+def test_no_hedge_for_fast_calls_or_streams(app, router, fake_provider, monkeypatch):
+    provider, server = fake_provider()
+    monkeypatch.setitem(app.config, 'LLM_HEDGE_ENABLED', True)
+    monkeypatch.setitem(app.config, 'LLM_HEDGE_DELAY', 0.5)
+
+    ask(router, provider)
+    chunks = list(router.completion(provider, 'gpt-test', messages=[{'role': 'user', 'content': 'hola'}],
+                                    stream=True))
+    assert chunks
+    assert server.requests == 2
+    assert router.stats()['targets'][f'{provider}/gpt-test']['hedges'] == 0
+
+
+class StatusError(Exception):
+    def __init__(self, status_code):
+        super().__init__(f'HTTP {status_code}')
+        self.status_code = status_code
+
+
+@pytest.mark.parametrize('status, falls_back', [(400, False), (422, False), (401, True), (503, True)])
+def test_only_target_errors_fall_back(app, router, fake_provider, monkeypatch, status, falls_back):
+    broken, _ = fake_provider()
+    backup, backup_server = fake_provider()
+    monkeypatch.setitem(app.config, 'LLM_FALLBACKS', {broken: [backup]})
+    monkeypatch.setitem(app.config, 'LLM_MAX_RETRIES', 0)
+    attempt = router._attempt
+
+    def failing_attempt(target, params, timeout):
+        if target[0] == broken:
+            raise StatusError(status)
+        return attempt(target, params, timeout)
+
+    monkeypatch.setattr(router, '_attempt', failing_attempt)
+    if falls_back:
+        assert ask(router, broken).startswith('eco: hola')
+        assert backup_server.requests == 1
+    else:
+        with pytest.raises(StatusError):
+            ask(router, broken)
+        assert backup_server.requests == 0
+        assert router.stats()['targets'].get(f'{broken}/gpt-test', {}).get('fallbacks', 0) == 0
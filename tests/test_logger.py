@@ -0,0 +1,112 @@
+# tests/test_logger.py
+
+import queue
+import threading
+import time
+import uuid
+import pytest
+from app.models import LogEntry, Tool, db
+from app.utils import logger
+from app.utils.logger import flush_audit_log, log_event
+
+
+@pytest.fixture
+def audit(app, monkeypatch):
+    """
+    Cola de auditoría pequeña y sin hilo de escritura: cada prueba decide
+    cuándo se vacía. Al terminar, el siguiente log_event arranca otro hilo.
+    """
+    with app.app_context():
+        log_event('inicio de las pruebas de auditoría')
+    flush_audit_log()
+    monkeypatch.setattr(logger, '_queue', queue.Queue(maxsize=2))
+    monkeypatch.setattr(logger, '_ensure_flusher', lambda: None)
+    for key, value in {'overflow': 'drop_new', 'block_timeout': 0.05, 'batch_size': 3, 'interval': 0.2}.items():
+        monkeypatch.setitem(logger._config, key, value)
+    with app.app_context():
+        yield logger._queue
+    logger._flusher = None
+    logger._stop.clear()
+
+
+def queued(audit_queue):
+    return [event['message'] for event in list(audit_queue.queue)]
+
+
+def test_log_event_does_not_touch_caller_session(audit, monkeypatch):
+    tag = uuid.uuid4().hex
+    pending = Tool(name='pendiente' + tag[:8], description='d', parameters={})
+    db.session.add(pending)
+    with monkeypatch.context() as patched:
+        patched.setattr(db.session, 'commit', lambda: pytest.fail('log_event confirmó la sesión'))
+        patched.setattr(db.session, 'rollback', lambda: pytest.fail('log_event deshizo la sesión'))
+        log_event(f'evento {tag}')
+    assert pending in db.session.new
+
+    flush_audit_log()
+    db.session.rollback()
+    assert LogEntry.query.filter_by(message=f'evento {tag}').count() == 1
+    assert Tool.query.filter_by(name=pending.name).first() is None
+
+
+@pytest.mark.parametrize('policy, kept', [
+    ('drop_new', ['uno', 'dos']),
+    ('drop_old', ['dos', 'tres']),
+    ('block', ['uno', 'dos']),
+])
+def test_overflow_policies(audit, policy, kept):
+    logger._config['overflow'] = policy
+    dropped = logger.get_audit_stats()['dropped']
+
+    for message in ('uno', 'dos', 'tres'):
+        log_event(message)
+
+    assert queued(audit) == kept
+    assert logger.get_audit_stats()['dropped'] == dropped + 1
+
+
+def test_block_waits_for_space(audit):
+    logger._config.update(overflow='block', block_timeout=1.0)
+    log_event('uno')
+    log_event('dos')
+
+    # Un consumidor libera sitio mientras log_event espera
+    threading.Timer(0.05, audit.get_nowait).start()
+    started = time.monotonic()
+    log_event('tres')
+    assert 0.03 < time.monotonic() - started < 1.0
+    assert queued(audit) == ['dos', 'tres']
+
+
+def test_block_gives_up_after_timeout(audit):
+    logger._config.update(overflow='block', block_timeout=0.1)
+    log_event('uno')
+    log_event('dos')
+
+    started = time.monotonic()
+    log_event('tres')
+    assert time.monotonic() - started >= 0.1
+    assert queued(audit) == ['uno', 'dos']
+
+
+def test_flusher_writes_in_batches(audit, monkeypatch):
+    tag = uuid.uuid4().hex
+    monkeypatch.setattr(logger, '_queue', queue.Queue())
+    sizes = []
+    write_batch = logger._write_batch
+    monkeypatch.setattr(logger, '_write_batch', lambda batch: (sizes.append(len(batch)), write_batch(batch)))
+
+    for i in range(7):
+        log_event(f'{tag} {i}')
+    logger._stop.clear()
+    flusher = threading.Thread(target=logger._flush_loop, daemon=True)
+    flusher.start()
+    deadline = time.monotonic() + 5
+    while sum(sizes) < 7 and time.monotonic() < deadline:
+        time.sleep(0.01)
+    logger._stop.set()
+    flusher.join(2)
+
+    # Lotes completos de AUDIT_FLUSH_EVENTS y el resto al vencer el intervalo
+    assert sizes == [3, 3, 1]
+    assert LogEntry.query.filter(LogEntry.message.like(f'{tag} %')).count() == 7
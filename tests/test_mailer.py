@@ -0,0 +1,142 @@
+# tests/test_mailer.py
+
+import socket
+from datetime import datetime, timedelta
+import pytest
+from app.models import MailOutbox, db
+from app.utils.mailer import deliver_pending, queue_mail
+
+
+def free_port():
+    with socket.socket() as sock:
+        sock.bind(('127.0.0.1', 0))
+        return sock.getsockname()[1]
+
+
+class RecordingHandler:
+    """Guarda los mensajes recibidos y rechaza los destinatarios que empiezan por 'rechazo'."""
+
+    def __init__(self):
+        self.messages = []
+        self.sessions = []
+
+    async def handle_RCPT(self, server, session, envelope, address, rcpt_options):
+        if address.startswith('rechazo'):
+            return '550 Destinatario rechazado'
+        envelope.rcpt_tos.append(address)
+        return '250 OK'
+
+    async def handle_DATA(self, server, session, envelope):
+        if session not in self.sessions:
+            self.sessions.append(session)
+        self.messages.append(envelope.rcpt_tos)
+        return '250 Mensaje aceptado'
+
+
+@pytest.fixture
+def smtp(app, monkeypatch):
+    """Servidor SMTP local (aiosmtpd) y Flask-Mail apuntando a él; outbox vacío."""
+    controller_module = pytest.importorskip('aiosmtpd.controller')
+    handler = RecordingHandler()
+    port = free_port()
+    controller = controller_module.Controller(handler, hostname='127.0.0.1', port=port)
+    controller.start()
+
+    state = app.extensions['mail']
+    for name, value in {'server': '127.0.0.1', 'port': port,
+                        'use_tls': False, 'use_ssl': False, 'username': None, 'password': None}.items():
+        monkeypatch.setattr(state, name, value)
+    with app.app_context():
+        MailOutbox.query.delete()
+        db.session.commit()
+        yield handler
+        db.session.rollback()
+    controller.stop()
+
+
+def queue(*recipients):
+    items = [queue_mail('Asunto', [recipient], 'Cuerpo') for recipient in recipients]
+    db.session.commit()
+    return [item.id for item in items]
+
+
+def rows():
+    db.session.expire_all()
+    return {row.id: row for row in MailOutbox.query.all()}
+
+
+def test_batch_is_claimed_and_sent_over_one_connection(smtp):
+    ids = queue('a@example.com', 'b@example.com', 'c@example.com')
+
+    assert deliver_pending() == 3
+    assert smtp.messages == [['a@example.com'], ['b@example.com'], ['c@example.com']]
+    assert len(smtp.sessions) == 1
+    for row in rows().values():
+        assert (row.status, row.attempts, row.last_error) == ('sent', 1, None)
+        assert row.claimed_at is not None and row.sent_at is not None
+    assert sorted(rows()) == sorted(ids)
+    # Nada más que reclamar
+    assert deliver_pending() == 0
+
+
+def test_batch_size_limits_the_claim(smtp):
+    queue('a@example.com', 'b@example.com', 'c@example.com')
+
+    assert deliver_pending(batch_size=2) == 2
+    assert sorted(row.status for row in rows().values()) == ['pending', 'sent', 'sent']
+    assert deliver_pending(batch_size=2) == 1
+    assert len(smtp.sessions) == 2
+
+
+def test_rejected_mail_retries_with_backoff_until_failed(app, smtp, monkeypatch):
+    monkeypatch.setitem(app.config, 'MAIL_MAX_ATTEMPTS', 2)
+    monkeypatch.setitem(app.config, 'MAIL_RETRY_BASE_SECONDS', 30)
+    (ok_id, rejected_id) = queue('ok@example.com', 'rechazo@example.com')
+
+    before = datetime.utcnow()
+    assert deliver_pending() == 2
+    row = rows()[rejected_id]
+    assert (row.status, row.attempts) == ('pending', 1)
+    assert 'rechazado' in row.last_error
+    # Primer reintento a 30 s ± 20 %
+    assert before + timedelta(seconds=23) < row.next_attempt_at < before + timedelta(seconds=37)
+    assert rows()[ok_id].status == 'sent'
+
+    # Todavía no toca reintentar
+    assert deliver_pending() == 0
+
+    MailOutbox.query.filter_by(id=rejected_id).update({'next_attempt_at': datetime.utcnow()})
+    db.session.commit()
+    assert deliver_pending() == 1
+    row = rows()[rejected_id]
+    assert (row.status, row.attempts) == ('failed', 2)
+    assert deliver_pending() == 0
+
+
+def test_connection_failure_retries_whole_batch(app, smtp, monkeypatch):
+    monkeypatch.setattr(app.extensions['mail'], 'port', free_port())
+    queue('a@example.com', 'b@example.com')
+
+    assert deliver_pending() == 2
+    assert [(row.status, row.attempts) for row in rows().values()] == [('pending', 1)] * 2
+    assert all(row.last_error for row in rows().values())
+
+
+def test_stuck_sending_rows_are_reclaimed(app, smtp):
+    now = datetime.utcnow()
+    stale = timedelta(seconds=app.config['MAIL_CLAIM_TIMEOUT_SECONDS'] + 60)
+    stuck, recent = (
+        MailOutbox(subject='Asunto', recipients=[recipient], body='Cuerpo', status='sending',
+                   claimed_at=claimed_at, attempts=1)
+        for recipient, claimed_at in (('atascado@example.com', now - stale), ('enviando@example.com', now))
+    )
+    db.session.add_all([stuck, recent])
+    db.session.commit()
+    stuck_id, recent_id = stuck.id, recent.id
+
+    # Solo se reclama el correo cuyo worker dejó de responder
+    assert deliver_pending() == 1
+    assert smtp.messages == [['atascado@example.com']]
+    current = rows()
+    assert (current[stuck_id].status, current[stuck_id].attempts) == ('sent', 2)
+    assert current[recent_id].status == 'sending'
@@ -0,0 +1,35 @@
+# tests/test_metrics.py
+
+import pytest
+from sqlalchemy import text
+from sqlalchemy.exc import OperationalError
+from app.models import db
+from app.utils.benchmarks import count_queries
+
+
+def test_failed_query_does_not_leak_start_time(app):
+    with app.app_context():
+        conn = db.session.connection()
+        for _ in range(3):
+            with pytest.raises(OperationalError):
+                conn.execute(text('SELECT * FROM tabla_inexistente'))
+        assert conn.info.get('metrics_query_started') == []
+        db.session.rollback()
+
+
+def test_request_leaves_query_stack_empty(app, client, admin_headers):
+    response = client.get('/api/agents', headers=admin_headers)
+    assert response.status_code == 200
+    with app.app_context():
+        assert db.session.connection().info.get('metrics_query_started', []) == []
+
+
+def test_count_queries_includes_failed_statements(app):
+    with app.app_context(), count_queries() as stats:
+        conn = db.session.connection()
+        conn.execute(text('SELECT 1'))
+        with pytest.raises(OperationalError):
+            conn.execute(text('SELECT * FROM tabla_inexistente'))
+        assert stats['queries'] == 2
+        assert conn.info.get('bench_started') == []
+        db.session.rollback()
@@ -0,0 +1,12 @@
+# tests/test_migrations.py
+
+from alembic.autogenerate import compare_metadata
+from alembic.migration import MigrationContext
+from app.models import db
+
+
+def test_migrations_match_models(app):
+    # Un cambio de modelos sin su revisión en migrations/versions falla aquí
+    with app.app_context(), db.engine.connect() as connection:
+        context = MigrationContext.configure(connection, opts={'compare_type': True, 'compare_server_default': True})
+        assert compare_metadata(context, db.metadata) == []
@@ -0,0 +1,197 @@
+# tests/test_resilience.py
+
+import time
+import pytest
+from app.utils import resilience
+from app.utils.llm_router import LLMRouter
+from app.utils.resilience import (
+    CircuitBreaker, CircuitOpen, LLMUnavailable, RetryBudget, backoff_delay, is_retryable
+)
+
+
+class Clock:
+    def __init__(self):
+        self.now = 1000.0
+
+    def __call__(self):
+        return self.now
+
+
+@pytest.fixture
+def clock(monkeypatch):
+    clock = Clock()
+    monkeypatch.setattr(resilience.time, 'monotonic', clock)
+    return clock
+
+
+class StatusError(Exception):
+    def __init__(self, status_code):
+        self.status_code = status_code
+
+
+class APITimeoutError(Exception):
+    pass
+
+
+@pytest.mark.parametrize('error, retryable', [
+    (TimeoutError(), True),
+    (ConnectionError(), True),
+    (APITimeoutError(), True),
+    (StatusError(429), True),
+    (StatusError(503), True),
+    (StatusError(529), True),
+    (StatusError(400), False),
+    (StatusError(401), False),
+    (ValueError(), False),
+    (LLMUnavailable('caído', 5, 'provider_error'), False),
+])
+def test_is_retryable(error, retryable):
+    assert is_retryable(error) is retryable
+
+
+def test_backoff_is_capped():
+    for attempt in range(8):
+        delays = [backoff_delay(attempt, 0.25, 2) for _ in range(50)]
+        assert all(0 <= delay <= min(2, 0.25 * 2 ** attempt) for delay in delays)
+
+
+def test_breaker_opens_and_probes(clock):
+    breaker = CircuitBreaker('p/m', failure_threshold=3, cooldown=10)
+    for _ in range(2):
+        breaker.before_call()
+        breaker.record_failure()
+    assert breaker.state == breaker.CLOSED
+    breaker.before_call()
+    breaker.record_failure()
+    assert breaker.state == breaker.OPEN
+
+    with pytest.raises(CircuitOpen) as rejected:
+        breaker.before_call()
+    assert rejected.value.retry_after == 10
+
+    # Tras el enfriamiento pasa una sola llamada de prueba
+    clock.now += 10
+    breaker.before_call()
+    assert breaker.state == breaker.HALF_OPEN
+    with pytest.raises(CircuitOpen):
+        breaker.before_call()
+    breaker.record_failure()
+    assert breaker.state == breaker.OPEN
+
+    clock.now += 10
+    breaker.before_call()
+    breaker.record_success()
+    assert breaker.state == breaker.CLOSED
+    assert breaker.stats()['consecutive_failures'] == 0
+
+
+def test_breaker_release_frees_probe(clock):
+    breaker = CircuitBreaker('p/m', failure_threshold=1, cooldown=1)
+    breaker.before_call()
+    breaker.record_failure()
+    clock.now += 1
+    breaker.before_call()
+    breaker.release()
+    breaker.before_call()
+    assert breaker.state == breaker.HALF_OPEN
+
+
+def test_success_resets_consecutive_failures(clock):
+    breaker = CircuitBreaker('p/m', failure_threshold=2)
+    breaker.record_failure()
+    breaker.record_success()
+    breaker.record_failure()
+    assert breaker.state == breaker.CLOSED
+
+
+def test_retry_budget(clock):
+    budget = RetryBudget(ratio=0.5, min_per_second=0.1, window=10)
+    # Sin llamadas solo queda el mínimo: 0.1 por segundo durante 10 s
+    assert budget.try_spend()
+    assert not budget.try_spend()
+
+    for _ in range(4):
+        budget.record_call()
+    assert [budget.try_spend() for _ in range(3)] == [True, True, False]
+    assert budget.stats()['exhausted'] == 2
+
+    # Las llamadas y reintentos antiguos salen de la ventana
+    clock.now += 11
+    assert budget.stats()['calls'] == 0
+    assert budget.try_spend()
+
+
+@pytest.fixture
+def router(app, monkeypatch):
+    monkeypatch.setitem(app.config, 'LLM_RETRY_BASE_DELAY', 0.001)
+    monkeypatch.setitem(app.config, 'LLM_RETRY_MAX_DELAY', 0.001)
+    monkeypatch.setitem(app.config, 'LLM_MAX_RETRIES', 2)
+    monkeypatch.setitem(app.config, 'LLM_BREAKER_FAILURES', 5)
+    with app.app_context():
+        yield LLMRouter()
+
+
+def ask(router, provider, **params):
+    return router.completion(provider, 'gpt-test', messages=[{'role': 'user', 'content': 'hola'}], **params)
+
+
+def test_retries_then_reports_unavailable(router, fake_provider):
+    provider, server = fake_provider(error_rate=1)
+    with pytest.raises(LLMUnavailable) as unavailable:
+        ask(router, provider)
+    assert unavailable.value.reason == 'provider_error'
+    assert server.requests == 3
+    assert router.stats()['targets'][f'{provider}/gpt-test']['retries'] == 2
+
+
+def test_open_circuit_short_circuits(app, router, fake_provider, monkeypatch):
+    monkeypatch.setitem(app.config, 'LLM_BREAKER_FAILURES', 3)
+    provider, server = fake_provider(error_rate=1)
+    with pytest.raises(LLMUnavailable):
+        ask(router, provider)
+    assert server.requests == 3
+
+    with pytest.raises(CircuitOpen):
+        ask(router, provider)
+    assert server.requests == 3
+    assert router.stats()['circuits'][f'{provider}/gpt-test']['state'] == 'open'
+
+
+def test_exhausted_budget_stops_retries(app, router, fake_provider, monkeypatch):
+    monkeypatch.setitem(app.config, 'LLM_RETRY_BUDGET_RATIO', 0)
+    monkeypatch.setitem(app.config, 'LLM_RETRY_BUDGET_MIN_PER_SECOND', 0)
+    provider, server = fake_provider(error_rate=1)
+    with pytest.raises(LLMUnavailable):
+        ask(router, provider)
+    assert server.requests == 1
+    assert router.retry_budget().stats()['exhausted'] == 1
+
+
+def test_client_errors_are_not_retried(router, monkeypatch):
+    calls = []
+
+    def attempt(target, params, timeout):
+        calls.append(target)
+        raise StatusError(400)
+
+    monkeypatch.setattr(router, '_attempt', attempt)
+    with pytest.raises(StatusError):
+        ask(router, 'openai')
+    assert len(calls) == 1
+    assert router.stats()['circuits']['openai/gpt-test']['consecutive_failures'] == 0
+
+
+def test_agent_timeout_bounds_each_attempt(app, router, fake_provider, monkeypatch):
+    monkeypatch.setitem(app.config, 'LLM_MAX_RETRIES', 0)
+    provider, _ = fake_provider(latency=1)
+    started = time.monotonic()
+    with pytest.raises(LLMUnavailable):
+        ask(router, provider, timeout=0.1)
+    assert time.monotonic() - started < 0.8
+    assert router.stats()['targets'][f'{provider}/gpt-test']['timeouts'] == 1
+
+
+def test_agent_request_timeout_is_stored(client, user_headers, make_agent):
+    agent_id = make_agent(user_headers, request_timeout=12.5)
+    response = client.get(f'/api/agents/{agent_id}', headers=user_headers)
+    assert response.get_json()['request_timeout'] == 12.5
@@ -0,0 +1,142 @@
+# tests/test_semantic_cache.py
+
+import pytest
+from app.services import ChatContext, build_messages, complete_chat
+from app.utils.llm_router import get_llm_router
+from app.utils.semantic_cache import SemanticCache, embed, is_follow_up, key_tokens, semantic_scope
+
+SCOPE = semantic_scope('gpt-test', 'Eres un asistente.', [], 0.7, None)
+
+
+@pytest.fixture
+def cache():
+    return SemanticCache(dim=512, max_entries=10)
+
+
+@pytest.mark.parametrize('stored, asked', [
+    ('What are your opening hours on Monday?', 'What are your opening hours on Sunday?'),
+    ('¿Qué incluye el plan A?', '¿Qué incluye el plan B?'),
+    ('¿Dónde está mi pedido 12345?', '¿Dónde está mi pedido 67890?'),
+    ('¿Cuánto cuesta el envío a Madrid?', '¿Cuánto cuesta el envío a Barcelona?'),
+    ('¿Qué incluye el plan?', '¿Qué incluye el plan B?'),
+])
+def test_different_numbers_or_names_never_match(cache, stored, asked):
+    cache.store(1, SCOPE, stored, 'respuesta')
+    # Ni con un umbral muy bajo: la diferencia es un desacierto seguro
+    assert cache.lookup(1, SCOPE, asked, threshold=0.3) is None
+
+
+@pytest.mark.parametrize('stored, asked', [
+    ('¿Cuál es el horario de atención al cliente?', 'cual es el horario de atencion al cliente'),
+    ('How do I reset my password?', 'how can I reset my password'),
+    ('¿Dónde está mi pedido 12345?', 'donde esta mi pedido 12345'),
+])
+def test_paraphrases_hit_default_threshold(app, cache, stored, asked):
+    cache.store(1, SCOPE, stored, 'respuesta')
+    assert cache.lookup(1, SCOPE, asked, threshold=app.config['SEMANTIC_CACHE_THRESHOLD']) == 'respuesta'
+
+
+def test_default_threshold_is_strict(app):
+    threshold = app.config['SEMANTIC_CACHE_THRESHOLD']
+    assert threshold >= 0.92
+    # Preguntas relacionadas pero distintas quedan por debajo
+    assert float(embed('¿Cómo cambio mi contraseña?') @ embed('¿Cómo puedo cambiar mi contraseña?')) < threshold
+
+
+def test_key_tokens():
+    assert key_tokens('¿Qué incluye el plan A? Lo quiero el lunes') == {'a', 'lunes'}
+    assert key_tokens('Madrid. Envío a Sevilla, pedido 42') == {'sevilla', '42'}
+    assert key_tokens('Can I pay with a card?') == set()
+    assert key_tokens('¿A qué hora abrís?') == set()
+
+
+@pytest.mark.parametrize('text, expected', [
+    ('¿y qué incluye exactamente?', True),
+    ('Pero, ¿cuánto cuesta eso?', True),
+    ('What about the premium one?', True),
+    ('Can you explain it again?', True),
+    ('¿Cuál es el horario de atención al cliente?', False),
+    ('donde esta mi pedido 12345', False),
+    ('What are your opening hours on Monday?', False),
+])
+def test_is_follow_up(text, expected):
+    assert is_follow_up(text) is expected
+
+
+def test_scope_is_64_bits_and_depends_on_context():
+    turn = [{'role': 'user', 'content': 'Háblame del plan básico'}, {'role': 'assistant', 'content': 'Cuesta 5 €'}]
+    scopes = {
+        SCOPE,
+        semantic_scope('gpt-test', 'Eres un asistente.', [], 0.7, None, turn),
+        semantic_scope('gpt-test', 'Eres un asistente.', [], 0.2, None),
+        semantic_scope('gpt-test', 'Otro prompt.', [], 0.7, None),
+    }
+    assert len(scopes) == 4
+    assert all(0 <= scope < 2 ** 64 for scope in scopes)
+    assert any(scope >= 2 ** 32 for scope in scopes)
+
+
+def test_scopes_above_63_bits_are_compared_exactly(cache):
+    high = 2 ** 64 - 1
+    cache.store(1, high, '¿Cuál es el horario de atención?', 'respuesta')
+    assert cache.lookup(1, high, '¿Cuál es el horario de atención?', 0.92) == 'respuesta'
+    assert cache.lookup(1, high - 1, '¿Cuál es el horario de atención?', 0.92) is None
+
+
+@pytest.fixture
+def chat(app, fake_llm):
+    """Envía una pregunta con el historial indicado; devuelve (respuesta, llamadas al modelo)."""
+    from app.utils.semantic_cache import get_semantic_cache
+
+    ctx = ChatContext(-1, 'Eres un asistente.', 'openai', 'gpt-test', 0.7, None, [], [],
+                      False, None, True, None)
+
+    def send(question, history=()):
+        before = fake_llm.requests
+        reply = complete_chat(get_llm_router(), ctx, build_messages(ctx.prompt, list(history), question))
+        return reply, fake_llm.requests - before
+
+    with app.app_context():
+        get_semantic_cache().invalidate(ctx.agent_id)
+        yield send
+        get_semantic_cache().invalidate(ctx.agent_id)
+
+
+def test_follow_up_depends_on_last_turn(chat):
+    about_basic = [{'role': 'user', 'content': 'Háblame del plan básico'},
+                   {'role': 'assistant', 'content': 'El plan básico cuesta 5 €'}]
+    about_premium = [{'role': 'user', 'content': 'Háblame del plan premium'},
+                     {'role': 'assistant', 'content': 'El plan premium cuesta 20 €'}]
+
+    first, calls = chat('¿y qué incluye exactamente?', about_basic)
+    assert calls == 1
+    assert chat('y que incluye exactamente', about_basic) == (first, 0)
+    assert chat('¿y qué incluye exactamente?', about_premium)[1] == 1
+    assert chat('¿y qué incluye exactamente?')[1] == 1
+
+
+def test_standalone_question_ignores_history(chat):
+    first, calls = chat('¿Cuál es el horario de atención al cliente?',
+                        [{'role': 'user', 'content': 'Háblame del plan básico'},
+                         {'role': 'assistant', 'content': 'El plan básico cuesta 5 €'}])
+    assert calls == 1
+    assert chat('cual es el horario de atencion al cliente',
+                [{'role': 'user', 'content': '¿Hacéis envíos a Canarias?'},
+                 {'role': 'assistant', 'content': 'Sí, en 72 horas'}]) == (first, 0)
+
+
+def test_route_paraphrase_hits_after_unrelated_turns(client, fake_llm, user_headers, make_agent):
+    agent_id = make_agent(user_headers, semantic_cache_enabled=True)
+
+    def send(message):
+        response = client.post(f'/api/chat/{agent_id}', json={'message': message}, headers=user_headers)
+        assert response.status_code == 200, response.get_json()
+        return response.get_json()['respuesta']
+
+    first = send('¿Cuál es el horario de atención al cliente?')
+    send('Háblame del plan básico')
+    send('¿Hacéis envíos a Canarias?')
+
+    before = fake_llm.requests
+    assert send('cual es el horario de atencion al cliente') == first
+    assert fake_llm.requests == before
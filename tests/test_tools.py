@@ -0,0 +1,109 @@
+# tests/test_tools.py
+
+import json
+import threading
+import time
+import uuid
+from types import SimpleNamespace
+import pytest
+from app.services import ChatContext, build_messages, complete_chat
+from app.utils import tools
+from app.utils.tools import ToolSpec, run_tool_calls
+
+
+@pytest.fixture
+def ctx(app):
+    with app.app_context():
+        yield app
+
+
+@pytest.fixture
+def register(monkeypatch):
+    """Registra herramientas solo durante la prueba; devuelve su nombre."""
+    def make(fn, timeout=None, cancellable=False):
+        name = 'prueba_' + uuid.uuid4().hex[:8]
+        monkeypatch.setitem(tools._registry, name, ToolSpec(fn, timeout, cancellable))
+        return name
+    return make
+
+
+def call(name, **arguments):
+    return {'id': 'call_' + uuid.uuid4().hex[:8], 'name': name, 'arguments': json.dumps(arguments)}
+
+
+def test_tool_calls_run_concurrently(ctx, register):
+    spans = []
+
+    def slow(label):
+        started = time.monotonic()
+        time.sleep(0.2)
+        spans.append((started, time.monotonic()))
+        return f'hecho {label}'
+
+    name = register(slow)
+    started = time.monotonic()
+    results = run_tool_calls([call(name, label=i) for i in range(3)])
+
+    assert results == ['hecho 0', 'hecho 1', 'hecho 2']
+    assert time.monotonic() - started < 0.5
+    # Todas las llamadas estaban en curso a la vez
+    assert max(start for start, _ in spans) < min(end for _, end in spans)
+
+
+def test_timeout_becomes_text_and_sets_cancel_event(ctx, register):
+    cancelled = threading.Event()
+
+    def stuck(cancel_event):
+        if cancel_event.wait(5):
+            cancelled.set()
+        return 'no debería llegar'
+
+    slow = register(stuck, timeout=0.1, cancellable=True)
+    fast = register(lambda: {'ok': True})
+    started = time.monotonic()
+    results = run_tool_calls([call(slow), call(fast)])
+
+    assert time.monotonic() - started < 1
+    assert results == [f"Error: la herramienta '{slow}' superó el tiempo límite", '{"ok": true}']
+    assert cancelled.wait(1)
+    assert tools.get_tool_stats()['tools'][slow]['timeouts'] == 1
+
+
+def test_tool_error_becomes_text(ctx, register):
+    def broken():
+        raise ValueError('sin conexión')
+
+    name = register(broken)
+    assert run_tool_calls([call(name)]) == [f"Error al ejecutar la herramienta '{name}': sin conexión"]
+
+
+class ToolHungryRouter:
+    """Pide una herramienta siempre que se le ofrecen; registra si se ofrecieron."""
+
+    def __init__(self):
+        self.offered = []
+
+    def completion(self, provider, model, tools=None, **params):
+        self.offered.append(bool(tools))
+        if tools:
+            tool_call = SimpleNamespace(model_dump=lambda: {
+                'id': 'call_1', 'type': 'function',
+                'function': {'name': 'buscar_web', 'arguments': '{"query": "hola"}'}
+            })
+            message = SimpleNamespace(content=None, tool_calls=[tool_call])
+        else:
+            message = SimpleNamespace(content='respuesta final', tool_calls=None)
+        return SimpleNamespace(choices=[SimpleNamespace(message=message)], usage=None)
+
+
+def test_last_round_is_sent_without_tools(ctx, monkeypatch):
+    monkeypatch.setitem(ctx.config, 'TOOL_MAX_ROUNDS', 2)
+    agent_tools = [{'type': 'function', 'function': {'name': 'buscar_web', 'description': 'Busca',
+                                                     'parameters': {'type': 'object', 'properties': {}}}}]
+    chat = ChatContext(-1, 'Eres un asistente.', 'openai', 'gpt-test', 0.7, None, agent_tools, [],
+                       False, None, False, None)
+    router = ToolHungryRouter()
+    reply = complete_chat(router, chat, build_messages(chat.prompt, [], 'hola'))
+
+    assert reply == 'respuesta final'
+    assert router.offered == [True, True, False]
@@ -0,0 +1,104 @@
+# tests/test_usage.py
+
+import uuid
+from datetime import datetime
+from types import SimpleNamespace
+import pytest
+from app.models import Tool, UsageDaily, UsageHourly, db
+from app.services import call_llm
+from app.utils.usage import TurnUsage, record_usage
+
+
+@pytest.fixture
+def ctx(app):
+    with app.app_context():
+        yield app
+
+
+def new_agent_id():
+    # agent_id no es clave foránea: basta con un id que no use otra prueba
+    return uuid.uuid4().int % 10 ** 9 + 10 ** 6
+
+
+def turn(agent_id, prompt_tokens, completion_tokens, latency_ms, model='gpt-test'):
+    return TurnUsage(1, agent_id, model, prompt_tokens, completion_tokens, latency_ms)
+
+
+def rollup(model_cls, agent_id):
+    return [(row.bucket, row.model, row.requests, row.prompt_tokens, row.completion_tokens, row.latency_ms)
+            for row in model_cls.query.filter_by(agent_id=agent_id).order_by(model_cls.bucket, model_cls.model)]
+
+
+def test_record_usage_upserts_hourly_and_daily(ctx):
+    agent_id = new_agent_id()
+    record_usage([turn(agent_id, 10, 2, 100.0)], datetime(2026, 3, 1, 10, 15))
+    record_usage([turn(agent_id, 20, 3, 50.0), turn(agent_id, 5, 1, 10.0, model='otro')], datetime(2026, 3, 1, 10, 45))
+    record_usage([turn(agent_id, 7, 7, 20.0)], datetime(2026, 3, 1, 11, 5))
+    db.session.commit()
+
+    assert rollup(UsageHourly, agent_id) == [
+        (datetime(2026, 3, 1, 10), 'gpt-test', 2, 30, 5, 150.0),
+        (datetime(2026, 3, 1, 10), 'otro', 1, 5, 1, 10.0),
+        (datetime(2026, 3, 1, 11), 'gpt-test', 1, 7, 7, 20.0),
+    ]
+    assert rollup(UsageDaily, agent_id) == [
+        (datetime(2026, 3, 1), 'gpt-test', 3, 37, 12, 170.0),
+        (datetime(2026, 3, 1), 'otro', 1, 5, 1, 10.0),
+    ]
+
+
+def test_record_usage_without_commit_is_rolled_back_with_caller(ctx):
+    agent_id = new_agent_id()
+    record_usage([turn(agent_id, 10, 2, 100.0)])
+    db.session.rollback()
+    assert rollup(UsageDaily, agent_id) == []
+
+
+def test_call_llm_records_usage_without_touching_caller_session(ctx):
+    agent = SimpleNamespace(id=new_agent_id(), user_id=1, prompt='Eres un asistente.', provider='openai',
+                            model='gpt-test', temperature=0.7, max_tokens=None, request_timeout=None)
+    pending = Tool(name='pendiente' + uuid.uuid4().hex[:8], description='d', parameters={})
+    db.session.add(pending)
+
+    assert call_llm(agent, 'hola', use_tools=False).startswith('eco')
+    # La transacción del llamador sigue abierta y sin confirmar
+    assert pending in db.session.new
+    db.session.rollback()
+    assert Tool.query.filter_by(name=pending.name).first() is None
+
+    (_, model, requests, prompt_tokens, completion_tokens, _), = rollup(UsageDaily, agent.id)
+    assert (model, requests) == ('gpt-test', 1)
+    assert prompt_tokens > 0 and completion_tokens > 0
+
+
+def test_usage_routes(client, admin_headers, user_headers, make_agent):
+    agent_id = make_agent(user_headers)
+    for message in ('hola', 'otra pregunta'):
+        response = client.post(f'/api/chat/{agent_id}', json={'message': message}, headers=user_headers)
+        assert response.status_code == 200, response.get_json()
+
+    response = client.get(f'/api/admin/usage?period=hour&agent_id={agent_id}&group_by=model', headers=admin_headers)
+    assert response.status_code == 200, response.get_json()
+    (row,) = response.get_json()
+    assert (row['model'], row['requests']) == ('gpt-test', 2)
+    assert row['total_tokens'] == row['prompt_tokens'] + row['completion_tokens'] > 0
+    assert row['avg_latency_ms'] is not None
+
+    response = client.get(f'/api/admin/usage/top?by=agent&agent_id={agent_id}', headers=admin_headers)
+    assert response.status_code == 200, response.get_json()
+    assert [(row['agent_id'], row['requests']) for row in response.get_json()] == [(agent_id, 2)]
+
+
+@pytest.mark.parametrize('url, status', [
+    ('/api/admin/usage?period=week', 400),
+    ('/api/admin/usage?from=ayer', 400),
+    ('/api/admin/usage?group_by=tool', 400),
+    ('/api/admin/usage/top?by=tool', 400),
+])
+def test_usage_routes_validate_params(client, admin_headers, url, status):
+    assert client.get(url, headers=admin_headers).status_code == status
+
+
+def test_usage_routes_require_admin(client, user_headers):
+    assert client.get('/api/admin/usage', headers=user_headers).status_code == 403
+    assert client.get('/api/admin/usage/top', headers=user_headers).status_code == 403